@@ -0,0 +1,170 @@
+# ====================================================== 程序声明 ======================================================
+print("\n\033[93m【常驻 SN 解析进程：保持厂商 SDK 常驻，通过 Unix 套接字按需返回设备 SN 码】\033[0m")
+print("\033[91m【在程序中使用硬编码路径读取，在实际使用时需要检查路径问题】\033[0m\n")
+# ----------------------------------------------------------------------------------------------------------------------
+venv_site_packages = '/home/ur/Vitai0506/venv312/lib/python3.12/site-packages'
+# 调用路径，本程序运行环境是由厂商SDK决定，在使用时，需要手动修改路径
+
+import os
+import sys
+import json
+import signal
+import time
+import socket
+import socketserver
+from threading import Thread, Lock, Timer
+sys.path.insert(0, venv_site_packages)
+
+from pyvitaisdk import VTSDeviceFinder
+
+SN_SOCKET = "/tmp/vitai_sn_resolver.sock"  # 请求/应答套接字，每行一个 JSON
+USB_DEVICES = "/sys/bus/usb/devices"
+NETLINK_KOBJECT_UEVENT = 15
+REFRESH_DELAY = 1.0  # USB 设备变化后等待 SDK 可见再预取（秒）
+WATCH_RETRY = 1.0  # USB 热插拔监听出错后重新订阅的间隔（秒）
+
+
+def read_attr(path):  # 读取 sysfs 属性，不存在时返回 None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def bind_ports(sns):
+    """按 USB 设备的 serial 属性把 SN 绑定到 USB 总线路径（如 1-1.2），返回 {总线路径: SN}"""
+    ports = {}
+    try:
+        names = os.listdir(USB_DEVICES)
+    except OSError:
+        return ports
+    for name in names:
+        if ":" in name:  # 跳过 USB 接口，只看 USB 设备
+            continue
+        serial = read_attr(os.path.join(USB_DEVICES, name, "serial"))
+        if serial and serial in sns:
+            ports[name] = serial
+    return ports
+
+
+# SN 缓存：首次请求或 USB 设备变化后才调用 SDK
+class SNResolver:
+    def __init__(self):
+        self.lock = Lock()
+        self.cache = None  # {"sns": [...], "ports": {总线路径: SN}, "updated": 时间}
+        self.timer = None
+
+    def resolve(self):
+        with self.lock:
+            if self.cache is None:
+                sns = [str(sn) for sn in VTSDeviceFinder().get_sns()]
+                self.cache = {"sns": sns, "ports": bind_ports(sns), "updated": time.time()}
+            return self.cache
+
+    def invalidate(self):  # USB 设备变化：清空缓存并延迟预取，下一次请求无需等待 SDK
+        with self.lock:
+            self.cache = None
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = Timer(REFRESH_DELAY, self._prefetch)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _prefetch(self):
+        try:
+            self.resolve()
+        except Exception as e:
+            print(f"预取SN码时发生错误：{e}")
+
+
+def open_uevent_socket():  # 订阅内核 uevent 广播
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    try:
+        sock.bind((0, 1))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def watch_usb(resolver):  # 监听内核 USB 设备的 uevent，设备接入/拔出时使缓存失效
+    try:
+        sock = open_uevent_socket()
+    except OSError as e:
+        print(f"\033[33m警告：USB 热插拔监听不可用（{e}），缓存仅在 refresh 请求时更新\033[0m")
+        return
+    while True:
+        try:
+            data = sock.recv(1 << 16)
+            fields = dict(f.split(b"=", 1) for f in data.split(b"\0")[1:] if b"=" in f)
+            if fields.get(b"SUBSYSTEM") == b"usb" and fields.get(b"DEVTYPE") == b"usb_device" \
+                    and fields.get(b"ACTION") in (b"add", b"remove"):
+                resolver.invalidate()
+        except Exception as e:  # 如事件过多时接收缓冲区溢出（ENOBUFS）：可能漏掉事件，使缓存失效并重新订阅
+            print(f"\033[33m警告：USB 热插拔监听出错（{e}），重新订阅\033[0m")
+            resolver.invalidate()
+            sock.close()
+            while True:
+                time.sleep(WATCH_RETRY)
+                try:
+                    sock = open_uevent_socket()
+                    break
+                except OSError as e:
+                    print(f"\033[33m警告：重新订阅 USB 热插拔事件失败（{e}）\033[0m")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                cmd = request.get("cmd")
+                if cmd == "ping":
+                    response = {"ok": True, "pid": os.getpid()}
+                elif cmd == "sns":
+                    response = dict(self.server.resolver.resolve(), ok=True)
+                elif cmd == "lookup":  # 按 USB 总线路径查询 SN
+                    sn = self.server.resolver.resolve()["ports"].get(request.get("port"))
+                    response = {"ok": sn is not None, "sn": sn}
+                elif cmd == "refresh":
+                    self.server.resolver.invalidate()
+                    response = dict(self.server.resolver.resolve(), ok=True)
+                else:
+                    response = {"ok": False, "error": f"未知命令: {cmd}"}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+
+
+class SNServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:  # 已有解析进程在运行则直接退出
+        probe.connect(SN_SOCKET)
+        print("SN 解析进程已在运行")
+        return
+    except OSError:
+        pass
+    finally:
+        probe.close()
+    if os.path.exists(SN_SOCKET):  # 清理上次异常退出遗留的套接字文件
+        os.unlink(SN_SOCKET)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))  # 被终止时同样删除套接字文件
+    resolver = SNResolver()
+    Thread(target=watch_usb, args=(resolver,), daemon=True).start()
+    with SNServer(SN_SOCKET, RequestHandler) as server:
+        server.resolver = resolver
+        print(f"SN 解析进程已启动：{SN_SOCKET}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(SN_SOCKET)
+
+
+if __name__ == "__main__":
+    main()
+# ----------------------------------------------------------------------------------------------------------------------
@@ -1,10 +1,18 @@
 # ====================================================== 程序声明 ======================================================
-print("\n\033[93m【相机预览与参数查看程序：实时预览摄像头画面，显示驱动信息和参数表格】\033[0m\n")
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【相机预览与参数查看程序：实时预览摄像头画面，显示驱动信息和参数表格】\033[0m\n", file=BANNER_OUT)
 # ----------------------------------------------------------------------------------------------------------------------
 import os
 import cv2
 import subprocess
 from prettytable import PrettyTable
+from queue import Queue, Empty
+from v4l2_enum import list_video_nodes, VideoNode
+from hotplug import CameraRegistry
+from contextlib import redirect_stdout
+from discovery import Probe, run_probes
+from json_output import NDJSONWriter, json_mode
 
 # 十六进制参数 ID 与中文名称的映射
 PARAM_MAP = {
@@ -26,7 +34,7 @@ PARAM_MAP = {
     "0x009a090c": "连续自动对焦",
 }
 
-# 菜单参数选项的预设值映射q
+# 菜单参数选项的预设值映射
 MENU_OPTIONS_MAP = {
     "0x00980918": {
         "options": {0: "表示禁用", 1: "表示 50Hz", 2: "表示 60Hz"},
@@ -42,31 +50,8 @@ MENU_OPTIONS_MAP = {
 }
 
 def get_available_cameras():
-    """自动发现所有物理摄像头设备"""
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]
-
-    for device in video_devices:
-        try:
-            # 检查设备是否为物理摄像头（基于驱动名称）
-            result = subprocess.run(
-                ["v4l2-ctl", "-d", device, "--all"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            output = result.stdout
-
-            if "Driver name      : uvcvideo" in output:
-                # 尝试用 OpenCV 打开设备
-                cap = cv2.VideoCapture(device)
-                if cap.isOpened():
-                    available.append(device)
-                    cap.release()
-        except Exception as e:
-            print(f"检测设备 {device} 时出错: {str(e)}")
-
-    return available
+    """自动发现所有物理摄像头设备：读取 sysfs 与 VIDIOC_QUERYCAP，只保留 uvcvideo 视频采集节点"""
+    return [node.path for node in list_video_nodes(driver="uvcvideo")]
 
 
 def get_driver_info(device_path):
@@ -223,6 +208,9 @@ def print_driver_info(driver_info, device_index): # 打印驱动信息
     print(f"帧率\t{driver_info.get('FrameRate', '未知')}")
     print()
 
+# 参数表格各列在 JSON 记录中的字段名
+CONTROL_FIELDS = ["name", "english_name", "id", "type", "min", "max", "step", "default", "value", "note"]
+
 def print_parameter_table(table, device_index): # 打印参数表格
     table_obj = PrettyTable()
     table_obj.field_names = ["中文名称", "英文名称", "参数 ID", "类型", "最小值", "最大值", "步长", "默认值", "当前值", "备注"]
@@ -235,69 +223,102 @@ def print_parameter_table(table, device_index): # 打印参数表格
 # 获取设备信息
 def get_device_id(device_path):
     """获取设备的 VID-PID 组合"""
-    try:
-        cmd = ["udevadm", "info", "-q", "property", device_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        vid = "N/A"
-        pid = "N/A"
-        # 获取设备信息
-        for line in result.stdout.splitlines():
-            if line.startswith("ID_VENDOR_ID="):
-                vid = line.split('=')[1].strip().upper()
-            elif line.startswith("ID_MODEL_ID="):
-                pid = line.split('=')[1].strip().upper()
-        return f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-    except Exception as e:
-        print(f"获取设备ID失败: {str(e)}")
-        return "UNKNOWN"
+    return VideoNode(os.path.basename(device_path)).device_id
+
+
+def describe_camera(device_path): # 驱动信息与参数，用于 --json 输出
+    return {
+        "device": device_path,
+        "device_index": int(device_path[len("/dev/video"):]),
+        "device_id": get_device_id(device_path),
+        "driver": get_driver_info(device_path),
+        "controls": [dict(zip(CONTROL_FIELDS, row)) for row in convert_to_table(parse_v4l2_controls(device_path))],
+    }
+
 
+# --json：并发查询各摄像头，每台查询完成后立即输出一条 camera 记录，不打开预览
+if json_mode():
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr): # 提示与错误信息输出到标准错误
+        run_probes([Probe(path, describe_camera, args=(path,)) for path in get_available_cameras()],
+                   on_result=lambda probe: writer.emit("camera", **probe.result) if probe.result is not None
+                   else writer.emit("error", device=probe.name, status=probe.status))
+    sys.exit(0)
 
 # 主程序
-available_devices = get_available_cameras() # 获取可用摄像头列表
-caps = [] # 保存摄像头对象
-device_ids = [] # 保存设备ID
+cameras = {} # {设备路径: (摄像头对象, 设备ID)}
+events = Queue() # 热插拔事件，在预览循环中处理
+failures = {} # {设备路径: 连续读取失败次数}
+READ_RETRIES = 30 # 设备仍存在时，连续读取失败多少次后重新打开
 
-# 打开摄像头
-for idx, device_path in enumerate(available_devices):
+
+def open_camera(device_path): # 打开摄像头并打印驱动信息与参数
     cap = cv2.VideoCapture(device_path)
     if not cap.isOpened():
         print(f"无法打开摄像头设备 {device_path}")
-        continue
-
-    # 获取设备ID
-    device_id = get_device_id(device_path)
-    device_ids.append(device_id)
-
-    # 获取驱动信息
-    driver_info = get_driver_info(device_path)
-    caps.append(cap)
-    driver_info = get_driver_info(device_path)
+        return
+    device_index = int(device_path[len("/dev/video"):])
+    device_id = get_device_id(device_path) # 获取设备ID
+    driver_info = get_driver_info(device_path) # 获取驱动信息
     all_controls = parse_v4l2_controls(device_path)
     parameter_table = convert_to_table(all_controls)
-
     # 打印参数信息
-    print_driver_info(driver_info, idx)
-    print_parameter_table(parameter_table, idx)
+    print_driver_info(driver_info, device_index)
+    print_parameter_table(parameter_table, device_index)
+    cameras[device_path] = (cap, device_id)
+
+
+def close_camera(device_path): # 关闭摄像头，其余摄像头继续预览
+    cap, device_id = cameras.pop(device_path)
+    failures.pop(device_path, None)
+    cap.release()
+    try:
+        cv2.destroyWindow(device_id)
+    except cv2.error:  # 尚未显示过画面，窗口不存在
+        pass
+
+
+registry = CameraRegistry( # 监听相机接入/拔出
+    on_add=lambda node: events.put(("add", node.path)) if node.driver == "uvcvideo" else None,
+    on_remove=lambda index: events.put(("remove", f"/dev/video{index}")))
+hotplug = registry.start()
+for device_path in get_available_cameras(): # 获取可用摄像头列表
+    open_camera(device_path)
 
 print("\n\033[93m【预览按下 Q 键退出】\033[0m\n")
-while True:
-    all_frames_read = True # 是否所有摄像头都读取到了画面
-    for i, cap in enumerate(caps): # 逐个读取摄像头画面
+while cameras or hotplug:
+    try:
+        action, device_path = events.get(block=not cameras, timeout=0.1) # 没有相机时等待接入，超时后照常处理按键
+        if action == "add" and device_path not in cameras:
+            open_camera(device_path)
+        elif action == "remove" and device_path in cameras:
+            print(f"摄像头 {device_path} 已拔出")
+            close_camera(device_path)
+    except Empty:
+        pass
+    for device_path, (cap, device_id) in list(cameras.items()): # 逐个读取摄像头画面
         ret, frame = cap.read()
         if not ret:
-            print(f"无法读取摄像头 {i} 画面")
-            all_frames_read = False
-            break
-        cv2.imshow(device_ids[i], frame) # 显示画面
-
-    if not all_frames_read:
-        break
+            if not hotplug or not os.path.exists(device_path): # 没有热插拔监听或设备已消失：关闭
+                print(f"无法读取摄像头 {device_id} 画面")
+                close_camera(device_path)
+                continue
+            failures[device_path] = failures.get(device_path, 0) + 1 # 设备仍存在：重试，拔出由 remove 事件处理
+            if failures[device_path] == 1:
+                print(f"\033[33m无法读取摄像头 {device_id} 画面，重试中\033[0m")
+            if failures[device_path] % READ_RETRIES == 0: # 连续失败：重新打开设备
+                cap.release()
+                cap.open(device_path)
+            continue
+        failures.pop(device_path, None)
+        cv2.imshow(device_id, frame) # 显示画面
 
     if cv2.waitKey(1) & 0xFF == ord('q'): # 按下 q 键退出
         break
 
 # 释放资源
-for cap in caps:
+registry.stop()
+for cap, _ in cameras.values():
     cap.release()
 cv2.destroyAllWindows()
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,206 @@
+# ====================================================== 模块声明 ======================================================
+# 每台相机一个采集进程：解码、缩放在子进程中完成，多台相机可并行占用多个 CPU 核心
+# 子进程运行工具自身的 CameraController，预览帧写入共享内存帧环，只把帧序号（帧句柄）发回主进程
+# 主进程中的 CameraWorker 与 CameraController 接口一致，参数写入通过管道转发给子进程
+# 子进程订阅的驱动参数事件经帧句柄管道以 ("ctrl", 事件) 发回主进程，由 on_ctrl_event 同步到界面
+# 控制器实例上的采集需求（如带宽规划结果 capture_mode）随启动参数传给子进程，子进程按相同模式打开相机
+# ----------------------------------------------------------------------------------------------------------------------
+import signal
+import multiprocessing
+from threading import Thread, Lock
+from frame_ring import FrameRingWriter, FrameRingReader
+from latency import latency_report
+
+PREVIEW_SLOTS = 8  # 预览帧环槽位数
+START_TIMEOUT = 15  # 等待子进程初始化相机的超时（秒）
+STOP_TIMEOUT = 3  # 等待子进程释放相机的超时（秒）
+NO_RESPONSE = "工作进程无响应"
+
+
+def preview_name(name):  # 预览帧环名称，与 SHARED_RING 的全分辨率帧环区分
+    return f"{name} preview"
+
+
+# 子进程中替代 FrameSlot：帧写入帧环，帧序号发回主进程
+class RingSlot:
+    def __init__(self, name, device_id, conn):
+        self.ring = FrameRingWriter(preview_name(name), device_id, slots=PREVIEW_SLOTS)
+        self.conn = conn
+        self.lock = Lock()  # 采集线程与参数事件监听线程共用管道
+        self.dropped = 0
+
+    @property
+    def seq(self):
+        return self.ring.seq
+
+    def put(self, frame, timestamp=None):
+        seq = self.ring.publish(frame, timestamp=timestamp)
+        self.send(seq)
+        return seq
+
+    def send(self, message):  # 帧序号或 ("ctrl", 事件)
+        with self.lock:
+            try:
+                self.conn.send(message)
+            except OSError:  # 主进程已退出
+                pass
+
+
+def _worker_main(controller_cls, index, device_id, capture_mode, cmd_conn, frame_conn):  # 子进程入口
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程统一处理
+    controller = controller_cls(index, device_id)
+    if capture_mode is not None:  # 主进程为本台相机规划的采集需求，须在打开相机前设置
+        controller.capture_mode = capture_mode
+    controller.slot = RingSlot(controller.name, device_id, frame_conn)
+    controller.on_ctrl_event = lambda event: controller.slot.send(("ctrl", event))  # 参数事件转发给主进程
+    ok = controller.initialize()
+    cmd_conn.send(ok)
+    if not ok:
+        return
+    thread = Thread(target=controller.run, daemon=True)  # 采集线程
+    thread.start()
+    while True:  # 处理主进程的参数命令
+        try:
+            cmd, args = cmd_conn.recv()
+        except (EOFError, OSError):  # 主进程已退出
+            break
+        if cmd == "exit":
+            break
+        if cmd == "set_param":
+            param_idx, value = args
+            result = controller.device.set_param(controller.camera_params[param_idx], value)
+        elif cmd == "get_param":
+            result = controller.device.get_param(controller.camera_params[args[0]])
+        elif cmd == "apply_values":
+            result = controller.apply_values(args[0])
+        else:
+            result = None
+        cmd_conn.send(result)
+    controller.exit_event.set()
+    thread.join(STOP_TIMEOUT)
+    controller.slot.ring.close()
+    print(latency_report())  # 子进程内的采集阶段延迟
+
+
+# 主进程中的参数控制代理，接口与 V4L2Device.set_param / get_param 一致
+class WorkerDevice:
+    def __init__(self, worker):
+        self.worker = worker
+
+    def set_param(self, param, value):
+        result = self.worker.call("set_param", self.worker.param_index(param), value)
+        return result if result is not None else (False, NO_RESPONSE)
+
+    def get_param(self, param):  # 子进程无响应时与读取失败一样返回 None
+        return self.worker.call("get_param", self.worker.param_index(param))
+
+
+# 主进程中的相机代理：run() 只负责把帧句柄转换为共享内存视图放入显示槽位
+class CameraWorker:
+    def __init__(self, controller):
+        self.controller_cls = type(controller)
+        self.index = controller.index
+        self.device_id = controller.device_id
+        self.capture_mode = getattr(controller, "capture_mode", None)  # 采集需求字典，可序列化传给子进程
+        self.name = controller.name
+        self.camera_params = controller.camera_params
+        self.slot = controller.slot
+        self.exit_event = controller.exit_event
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.device = WorkerDevice(self)
+        self.lock = Lock()  # 命令请求/应答成对进行
+        self.process = None
+        self.cmd_conn = None
+        self.frame_conn = None
+        self.reader = None
+        self.closed = False
+
+    def initialize(self):  # 启动子进程并等待相机初始化结果
+        ctx = multiprocessing.get_context("spawn")  # 不继承 Tk 等主进程状态
+        self.cmd_conn, child_cmd = ctx.Pipe()
+        self.frame_conn, child_frame = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(target=_worker_main, name=self.name, daemon=True,
+                                   args=(self.controller_cls, self.index, self.device_id, self.capture_mode,
+                                         child_cmd, child_frame))
+        self.process.start()
+        child_cmd.close()  # 子进程退出后主进程读取端才能收到 EOF
+        child_frame.close()
+        ok = False
+        try:
+            if self.cmd_conn.poll(START_TIMEOUT):
+                ok = self.cmd_conn.recv()
+        except (EOFError, OSError):
+            pass
+        if not ok:
+            self.close()
+        return ok
+
+    def param_index(self, param):  # 参数在列表中的位置，子进程按位置查找自己的参数副本
+        for param_idx, item in enumerate(self.camera_params):
+            if item is param:
+                return param_idx
+        raise ValueError(f"未知参数: {param.get('v4l2_param')}")
+
+    def call(self, cmd, *args):  # 发送命令并等待结果，子进程不可用时返回 None
+        with self.lock:
+            if self.closed or not self.process.is_alive():
+                return None
+            try:
+                self.cmd_conn.send((cmd, args))
+                return self.cmd_conn.recv()
+            except (EOFError, OSError):
+                return None
+
+    def apply_values(self, values):  # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        result = self.call("apply_values", list(values))
+        return result if result is not None else {param_idx: NO_RESPONSE for param_idx in range(len(values))}
+
+    def init_params(self):  # 初始化参数：子进程中的控制器只打开相机，参数由主进程的命令线程下发
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items():
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
+
+    def run(self):  # 接收帧句柄与参数事件，按序号读取共享内存中的预览帧
+        last_seq = 0
+        while not self.exit_event.is_set():
+            try:
+                if not self.frame_conn.poll(0.5):
+                    continue
+                new_frame = False
+                while self.frame_conn.poll():  # 积压的帧句柄只保留最新一个，参数事件逐个转发
+                    message = self.frame_conn.recv()
+                    if isinstance(message, tuple):
+                        if self.on_ctrl_event is not None:
+                            self.on_ctrl_event(message[1])
+                    else:
+                        new_frame = True
+            except (EOFError, OSError):  # 子进程已退出
+                break
+            if not new_frame:
+                continue
+            if self.reader is None:
+                self.reader = FrameRingReader(preview_name(self.name))
+            # 拷贝出共享内存：子进程持续写入帧环，显示线程稍有停顿就会覆盖视图，画面出现撕裂
+            frame = self.reader.read(last_seq)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            self.slot.put(frame.image, frame.timestamp)
+        self.close()
+
+    def close(self):  # 通知子进程释放相机并退出
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.process is not None and self.process.is_alive():
+                try:
+                    self.cmd_conn.send(("exit", ()))
+                except OSError:
+                    pass
+                self.process.join(STOP_TIMEOUT)
+                if self.process.is_alive():
+                    self.process.terminate()
+            if self.reader is not None:
+                self.reader.close()
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,228 @@
+# ====================================================== 模块声明 ======================================================
+# 本地参数与状态接口：HTTP（仅监听本机地址）或 Unix 套接字上的 JSON 接口，每个请求一个线程
+# 参数读写与方案应用提交到各相机的参数命令线程（ctrl_executor），对多台相机的请求并行执行；帧快照按需编码为 JPEG
+#   GET  /schemes                        方案列表
+#   GET  /devices                        相机列表
+#   GET  /devices/<序号>/controls         读取全部参数
+#   POST /devices/<序号|all>/controls     写入参数，请求体 {"brightness": 10, ...}，键为 v4l2 名称或参数 ID
+#   POST /devices/<序号|all>/scheme       应用方案，请求体 {"scheme": "产品1"}
+#   GET  /devices/<序号>/frame.jpg        最新一帧 JPEG，可带 ?quality=80
+#   GET  /stats                          各相机帧数与延迟统计
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import socketserver
+from threading import Thread
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from latency import get_latency
+
+COMMAND_TIMEOUT = 5.0  # 等待参数命令完成的超时（秒）
+MAX_BODY = 64 * 1024  # 请求体大小上限（字节）
+JPEG_QUALITY = 85
+
+
+class APIError(Exception):  # 以指定状态码返回 {"error": 信息}
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _param_info(param, value):
+    return {
+        "name": param["v4l2_param"],
+        "chinese_name": param["chinese_name"],
+        "id": param["hex_numbers"],
+        "type": param["type"],
+        "min": param["min"],
+        "max": param["max"],
+        "options": param["options"],
+        "value": value,
+    }
+
+
+def _wait(futures, timeout=COMMAND_TIMEOUT):  # 等待一组 Future，返回结果列表；超时返回 504
+    try:
+        return [future.result(timeout) for future in futures]
+    except FutureTimeout:
+        raise APIError(504, "参数命令执行超时")
+
+
+class ControlAPI:
+    def __init__(self, cameras, schemes):
+        self.cameras = cameras  # 可调用对象，返回 {设备序号: (相机控制器, 参数命令线程)}
+        self.schemes = schemes
+
+    def _targets(self, key, allow_all=False):  # 按序号（或 all）选出相机
+        cameras = self.cameras()
+        if allow_all and key == "all":
+            return list(cameras.values())
+        if not key.isdigit() or int(key) not in cameras:
+            raise APIError(404, f"相机 {key} 不存在")
+        return [cameras[int(key)]]
+
+    def list_devices(self):
+        return [{"index": index, "name": controller.name, "device_id": controller.device_id}
+                for index, (controller, _) in sorted(self.cameras().items())]
+
+    def read_controls(self, key):
+        controller, executor = self._targets(key)[0]
+        values = _wait([executor.get(param) for param in controller.camera_params])
+        return [_param_info(param, value) for param, value in zip(controller.camera_params, values)]
+
+    def write_controls(self, key, body):
+        if not isinstance(body, dict) or not body:
+            raise APIError(400, "请求体应为 {参数名称: 值}")
+        targets = self._targets(key, allow_all=True)
+        pending = []  # (相机名称, 参数名称, Future)，先全部提交，多台相机并行执行
+        for controller, executor in targets:
+            params = {}
+            for param in controller.camera_params:
+                params[param["v4l2_param"]] = param
+                params[param["hex_numbers"]] = param
+            for name, value in body.items():
+                if name not in params:
+                    raise APIError(400, f"未知参数 {name}")
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise APIError(400, f"参数 {name} 的值应为整数")
+            for name, value in body.items():
+                pending.append((controller.name, params[name]["v4l2_param"], executor.set(params[name], value)))
+        results = _wait([future for _, _, future in pending])
+        errors = {}
+        for (camera, name, _), (ok, error) in zip(pending, results):
+            if not ok:
+                errors.setdefault(camera, {})[name] = error
+        return {"errors": errors}
+
+    def apply_scheme(self, key, body):
+        scheme = body.get("scheme") if isinstance(body, dict) else None
+        if scheme not in self.schemes:
+            raise APIError(400, f"未知方案 {scheme}，可选：{'、'.join(self.schemes)}")
+        targets = self._targets(key, allow_all=True)
+        futures = [executor.apply_profile(self.schemes[scheme]) for _, executor in targets]  # 各相机的命令线程并行写入
+        errors = {}
+        for (controller, _), result in zip(targets, _wait(futures)):
+            if result:
+                errors[controller.name] = {controller.camera_params[idx]["v4l2_param"]: error for idx, error in result.items()}
+        return {"scheme": scheme, "errors": errors}
+
+    def frame_jpeg(self, key, quality=JPEG_QUALITY):
+        import cv2  # 只有请求帧快照时才需要 OpenCV
+        controller, _ = self._targets(key)[0]
+        snapshot = getattr(controller.slot, "snapshot", None)
+        if snapshot is None:
+            raise APIError(404, f"{controller.name} 未启用帧快照")
+        taken = snapshot()
+        if taken is None:
+            raise APIError(504, f"{controller.name} 等待画面超时")
+        ok, data = cv2.imencode(".jpg", taken[0], [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise APIError(500, "JPEG 编码失败")
+        return data.tobytes()
+
+    def stats(self):
+        return [{"index": index, "name": controller.name, "frames": controller.slot.seq,
+                 "dropped": controller.slot.dropped, "latency": get_latency(controller.name).as_dict()}
+                for index, (controller, _) in sorted(self.cameras().items())]
+
+    def handle(self, method, path, query, body):
+        """路由请求，返回 (状态码, JSON 对象或 JPEG 字节)"""
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["schemes"]:
+            return 200, self.schemes
+        if method == "GET" and parts == ["devices"]:
+            return 200, self.list_devices()
+        if method == "GET" and parts == ["stats"]:
+            return 200, self.stats()
+        if len(parts) == 3 and parts[0] == "devices":
+            key, action = parts[1], parts[2]
+            if method == "GET" and action == "controls":
+                return 200, self.read_controls(key)
+            if method == "POST" and action == "controls":
+                return 200, self.write_controls(key, body)
+            if method == "POST" and action == "scheme":
+                return 200, self.apply_scheme(key, body)
+            if method == "GET" and action == "frame.jpg":
+                try:
+                    quality = int(query.get("quality", [JPEG_QUALITY])[0])
+                except ValueError:
+                    raise APIError(400, "quality 应为 1 ~ 100 的整数") from None
+                return 200, self.frame_jpeg(key, max(1, min(100, quality)))
+        raise APIError(404, f"未知接口 {method} {path}")
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    api = None  # ControlAPI，由 start_api 设置
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        try:
+            body = None
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise APIError(413, "请求体过大")
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    raise APIError(400, "请求体不是有效的 JSON")
+            status, payload = self.api.handle(method, url.path, parse_qs(url.query), body)
+        except APIError as e:
+            status, payload = e.status, {"error": str(e)}
+            self.close_connection = status == 413  # 未读取的请求体不能留在连接中
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        if isinstance(payload, bytes):
+            content_type, data = "image/jpeg", payload
+        else:
+            content_type, data = "application/json; charset=utf-8", json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):  # Unix 套接字没有客户端地址
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):  # 只记录出错的请求
+        if len(args) > 1 and str(args[1]).startswith(("4", "5")):
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):  # 清理上次异常退出遗留的套接字文件
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def start_api(address, cameras, schemes):
+    """在后台线程中启动接口，address 为 "127.0.0.1:8765" 或 "unix:/run/vitai.sock"，返回服务器对象"""
+    handler = type("Handler", (APIRequestHandler,), {"api": ControlAPI(cameras, schemes)})
+    if address.startswith("unix:"):
+        server = UnixHTTPServer(address[len("unix:"):], handler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+        server.daemon_threads = True
+    Thread(target=server.serve_forever, name="control api", daemon=True).start()
+    return server
+
+
+def stop_api(server):  # 停止接口并删除 Unix 套接字文件
+    server.shutdown()
+    server.server_close()
+    if isinstance(server, UnixHTTPServer) and os.path.exists(server.server_address):
+        os.unlink(server.server_address)
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,61 @@
+# ====================================================== 模块声明 ======================================================
+# 参数命令执行：每台设备一个命令线程，按提交顺序执行 set / get / apply_profile，调用方立即拿到 Future
+# 界面线程不再等待 ioctl / v4l2-ctl，结果由 Future 完成回调返回；多台相机各自一个线程，批量写入互不等待
+# 同一台设备的全部写入（包括 ctrl_writer 合并后的滑块写入）都经由该线程，写入顺序与提交顺序一致
+# ----------------------------------------------------------------------------------------------------------------------
+from collections import deque
+from threading import Thread, Condition
+from concurrent.futures import Future
+
+STOP_TIMEOUT = 3.0  # 关闭时等待已提交命令执行完毕的超时（秒）
+
+
+class ControlExecutor:
+    def __init__(self, controller, name="ControlExecutor"):
+        self.controller = controller  # CameraController 或 CameraWorker，提供 device 与 apply_values
+        self.commands = deque()  # (Future, 函数, 参数)
+        self.cond = Condition()
+        self.running = True
+        self.thread = Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args):  # 提交命令，立即返回 Future
+        future = Future()
+        with self.cond:
+            if not self.running:
+                future.set_exception(RuntimeError("参数命令线程已关闭"))
+                return future
+            self.commands.append((future, func, args))
+            self.cond.notify()
+        return future
+
+    def set(self, param, value):  # 写入单个参数，结果为 (成功与否, 错误信息)
+        return self.submit(self.controller.device.set_param, param, value)
+
+    def get(self, param):  # 读取单个参数，结果为当前值，失败为 None
+        return self.submit(self.controller.device.get_param, param)
+
+    def apply_profile(self, values):  # 按参数顺序批量写入（只写入变化的参数），结果为 {参数索引: 错误信息}
+        return self.submit(self.controller.apply_values, list(values))
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.commands:
+                    self.cond.wait()
+                if not self.commands:  # 已关闭且没有待执行的命令
+                    return
+                future, func, args = self.commands.popleft()
+            if not future.set_running_or_notify_cancel():  # 已被调用方取消
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self, timeout=STOP_TIMEOUT):  # 执行完已提交的命令后停止命令线程
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout)
+# ----------------------------------------------------------------------------------------------------------------------
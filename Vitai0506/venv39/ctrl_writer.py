@@ -0,0 +1,68 @@
+# ====================================================== 模块声明 ======================================================
+# 参数写入合并：拖动滑块时界面线程只登记每个参数的最新值，由每台设备一个写入线程按固定间隔写入
+# 尚未写入就被新值覆盖的旧值直接丢弃，界面线程不等待 ioctl / v4l2-ctl，写入结果通过回调异步返回
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from threading import Thread, Condition
+
+WRITE_INTERVAL = 0.05  # 同一台设备两轮写入的最小间隔（秒），即每个参数最多每秒写入 20 次
+
+
+class ControlWriter:
+    def __init__(self, write, on_done=None, min_interval=WRITE_INTERVAL, name="ControlWriter"):
+        self.write = write  # write(*args) -> (成功与否, 错误信息)，在写入线程中调用
+        self.on_done = on_done  # on_done(key, args, 成功与否, 错误信息)，在写入线程中调用
+        self.min_interval = min_interval
+        self.pending = {}  # 参数键 -> 最新的写入参数，保持登记顺序
+        self.cond = Condition()
+        self.running = True
+        self.submitted = 0  # 登记次数
+        self.written = 0  # 实际写入次数
+        self.thread = Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def coalesced(self):  # 被新值覆盖而未写入的次数
+        with self.cond:
+            return self.submitted - self.written - len(self.pending)
+
+    def submit(self, key, *args):  # 登记写入，覆盖同一参数尚未写入的旧值，立即返回
+        with self.cond:
+            if not self.running:
+                return False
+            self.pending.pop(key, None)  # 重新登记到末尾，保持各参数的修改顺序
+            self.pending[key] = args
+            self.submitted += 1
+            self.cond.notify()
+            return True
+
+    def _run(self):
+        last_batch = 0.0
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.pending:  # 已关闭且没有待写入的值
+                    return
+                delay = last_batch + self.min_interval - time.monotonic()
+                if delay > 0 and self.running:  # 限速期间继续合并新值
+                    self.cond.wait(delay)
+                    continue
+                batch, self.pending = self.pending, {}
+            last_batch = time.monotonic()
+            for key, args in batch.items():
+                try:
+                    ok, error = self.write(*args)
+                except Exception as e:
+                    ok, error = False, str(e)
+                with self.cond:
+                    self.written += 1
+                if self.on_done:
+                    self.on_done(key, args, ok, error)
+
+    def close(self, timeout=1.0):  # 写完已登记的值后停止写入线程
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout)
+# ----------------------------------------------------------------------------------------------------------------------
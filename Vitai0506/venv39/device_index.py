@@ -0,0 +1,153 @@
+# ====================================================== 模块声明 ======================================================
+# 设备索引：以 USB 物理设备为单位，把 SDK SN 码、sysfs serial、USB 端口路径与 /dev/videoN 节点合并为一条记录
+# SN 码按 USB 设备 serial 属性绑定，不依赖 lsusb 与 SDK 的列举顺序；按 SN、端口、节点、总线号/设备号查询均为字典查找
+# 热插拔时可用 add_node / remove_node 增量更新，无需重新扫描全部设备
+# ----------------------------------------------------------------------------------------------------------------------
+from v4l2_enum import VideoNode, list_video_nodes
+
+
+def _node_index(node):  # 接受 0、"video0"、"/dev/video0"，返回设备序号
+    if isinstance(node, int):
+        return node
+    name = str(node).rsplit("/", 1)[-1]
+    return int(name[len("video"):]) if name.startswith("video") and name[len("video"):].isdigit() else None
+
+
+# 单个物理传感器
+class SensorRecord:
+    def __init__(self, port, node):
+        self.port = port  # USB 端口路径，如 1-1.2
+        self.vid = node.vid
+        self.pid = node.pid
+        self.device_id = node.device_id
+        self.serial = node.serial  # USB 描述符中的序列号
+        self.product = node.product
+        self.manufacturer = node.manufacturer
+        self.busnum = node.usb_attr("busnum")  # 与 lsusb 的 Bus 对应
+        self.devnum = node.usb_attr("devnum")  # 与 lsusb 的 Device 对应
+        self.nodes = {}  # 设备序号 -> VideoNode（视频节点与元数据节点）
+        self.sn = None  # 与 SDK 列出的 SN 码匹配后填入
+
+    @property
+    def capture_nodes(self):  # 可采集视频的节点，按序号排列
+        return [self.nodes[i] for i in sorted(self.nodes) if self.nodes[i].is_capture]
+
+    @property
+    def video_index(self):  # 主视频节点序号，没有采集节点时为 None
+        nodes = self.capture_nodes
+        return nodes[0].index if nodes else None
+
+    def as_dict(self):
+        return {
+            "sn": self.sn,
+            "port": self.port,
+            "device_id": self.device_id,
+            "vid": self.vid,
+            "pid": self.pid,
+            "serial": self.serial,
+            "product": self.product,
+            "manufacturer": self.manufacturer,
+            "busnum": self.busnum,
+            "devnum": self.devnum,
+            "nodes": [self.nodes[i].path for i in sorted(self.nodes)],
+            "video_index": self.video_index,
+        }
+
+    def describe(self):  # as_dict 加上各采集节点的 VIDIOC_QUERYCAP 结果
+        info = self.as_dict()
+        info["caps"] = {node.path: node.caps for node in self.capture_nodes}
+        return info
+
+    def __repr__(self):
+        return f"SensorRecord({self.sn or self.serial}, {self.port}, {[self.nodes[i].path for i in sorted(self.nodes)]})"
+
+
+class DeviceIndex:
+    def __init__(self):
+        self.by_port = {}  # USB 端口路径 -> SensorRecord
+        self.by_node = {}  # 设备序号 -> SensorRecord
+        self.by_sn = {}  # SN 码 -> SensorRecord
+        self.by_busdev = {}  # (总线号, 设备号) -> SensorRecord
+        self.sns = set()  # SDK 列出的全部 SN 码
+        self.unbound_sns = []  # 没有找到对应 USB 设备的 SN 码
+
+    @classmethod
+    def build(cls, sns=(), ports=None):
+        """扫描全部视频节点并绑定 SN 码；ports 为 SN 解析进程返回的 {USB 端口路径: SN}，可选"""
+        index = cls()
+        for node in list_video_nodes(capture_only=False):
+            index.add_node(node)
+        index.bind_sns(sns, ports)
+        return index
+
+    def add_node(self, node):
+        """加入一个视频节点（VideoNode、序号或节点名），返回所属记录；非 USB 设备返回 None"""
+        if not isinstance(node, VideoNode):
+            node = VideoNode(f"video{_node_index(node)}")
+        if node.usb_dir is None:
+            return None
+        record = self.by_port.get(node.port)
+        if record is None:
+            record = SensorRecord(node.port, node)
+            self.by_port[record.port] = record
+            if record.busnum and record.devnum:
+                self.by_busdev[(int(record.busnum), int(record.devnum))] = record
+            self._bind(record)
+        record.nodes[node.index] = node
+        self.by_node[node.index] = record
+        return record
+
+    def remove_node(self, node):
+        """移除一个视频节点；物理设备的所有节点都已移除时删除整条记录"""
+        record = self.by_node.pop(_node_index(node), None)
+        if record is None:
+            return None
+        record.nodes.pop(_node_index(node), None)
+        if not record.nodes:
+            self.by_port.pop(record.port, None)
+            if record.busnum and record.devnum:
+                self.by_busdev.pop((int(record.busnum), int(record.devnum)), None)
+            if record.sn is not None:
+                self.by_sn.pop(record.sn, None)
+        return record
+
+    def bind_sns(self, sns, ports=None):
+        """按 USB 设备 serial 属性（或 SN 解析进程给出的端口）绑定 SN 码"""
+        self.sns = set(str(sn) for sn in sns)
+        self.by_sn = {}
+        for record in self.by_port.values():
+            record.sn = None
+        for port, sn in (ports or {}).items():
+            record = self.by_port.get(port)
+            if record is not None and sn in self.sns:
+                record.sn = sn
+                self.by_sn[sn] = record
+        for record in self.by_port.values():
+            self._bind(record)
+        self.unbound_sns = [sn for sn in sns if str(sn) not in self.by_sn]
+
+    def _bind(self, record):
+        if record.sn is None and record.serial in self.sns:
+            record.sn = record.serial
+            self.by_sn[record.sn] = record
+            if record.sn in self.unbound_sns:
+                self.unbound_sns.remove(record.sn)
+
+    def get(self, key):
+        """按 SN 码、USB 端口路径或视频节点（序号 / videoN / /dev/videoN）查询记录，不存在时返回 None"""
+        if isinstance(key, int):
+            return self.by_node.get(key)
+        record = self.by_sn.get(key) or self.by_port.get(key)
+        if record is None and _node_index(key) is not None:
+            record = self.by_node.get(_node_index(key))
+        return record
+
+    def lookup_usb(self, busnum, devnum):  # 按 lsusb 的 Bus / Device 编号查询
+        return self.by_busdev.get((int(busnum), int(devnum)))
+
+    def records(self):  # 按 USB 端口路径排序，输出顺序与物理位置一致
+        return [self.by_port[port] for port in sorted(self.by_port)]
+
+    def __len__(self):
+        return len(self.by_port)
+# ----------------------------------------------------------------------------------------------------------------------
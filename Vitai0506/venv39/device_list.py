@@ -1,9 +1,16 @@
 # ====================================================== 程序声明 ======================================================
-print("\n\033[93m【检测系统中所有可用摄像头，获取设备索引、节点路径及 USB 设备详细信息】\033[0m")
-print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n")
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【检测系统中所有可用摄像头，获取设备索引、节点路径及 USB 设备详细信息】\033[0m", file=BANNER_OUT)
+print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n", file=BANNER_OUT)
 # ----------------------------------------------------------------------------------------------------------------------
-import cv2  # OpenCV
+import time  # 探测计时
 import subprocess  # 执行系统命令
+from v4l2_enum import list_video_nodes  # 摄像头枚举
+from device_index import DeviceIndex  # USB 端口与视频节点索引
+from contextlib import redirect_stdout
+from discovery import Probe, run_probes, print_probe_report, probe_summary, PROBE_TIMEOUT  # 并发探测
+from json_output import NDJSONWriter, json_mode  # NDJSON 输出
 
 # 目标设备关键词
 TARGET_DEVICE_NAME = "ViTai"
@@ -11,28 +18,15 @@ TARGET_DEVICE_NAME = "ViTai"
 TARGET_VID_PID_COMBINATIONS = ["F225-0001"]
 
 def list_cameras():
-    """获取可用摄像头索引"""
-    index = 0
-    camera_indices = []
-    while True:  # 遍历可用摄像头索引
-        cap = cv2.VideoCapture(index, cv2.CAP_V4L2)  # 打开摄像头
-        if cap.isOpened():  # 检查摄像头是否可用
-            camera_indices.append(index)  # 添加可用摄像头索引
-            cap.release()
-            index += 1
-            continue
-        cap.release()  # 释放摄像头资源
-        if index > 3:  # 防止无限循环，可根据实际情况调整
-            break
-        index += 1
-    return camera_indices  # 返回可用摄像头索引列表
+    """获取可用摄像头索引（sysfs + VIDIOC_QUERYCAP，不打开视频流）"""
+    return [node.index for node in list_video_nodes()]
 
 
 def get_camera_devices():
     """获取摄像头设备节点信息"""
     try:
         cmd = ["v4l2-ctl", "--list-devices"]  # 执行v4l2-ctl命令
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)
         devices = []  # 存储设备节点信息
         for block in result.stdout.strip().split('\n\n'):  # 遍历设备块
             lines = block.split('\n')
@@ -57,7 +51,7 @@ class USBDeviceInfo:  # USB 设备信息类
     def get_info(self):
         """获取 USB 设备信息并分类"""
         try:
-            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True)  # 执行 lsusb 命令
+            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)  # 执行 lsusb 命令
             output = result.stdout.splitlines()  # 获取 lsusb 命令输出
             for line in output:
                 parts = line.split()
@@ -134,22 +128,57 @@ class USBDeviceInfo:  # USB 设备信息类
         print("-" * 80)
 
 
+def get_usb_info():  # 在独立对象中获取 USB 设备信息，超时后仍在运行的探测不影响输出
+    usb_info = USBDeviceInfo()
+    usb_info.get_info()
+    return usb_info
+
+
 def main():
-    # 获取摄像头信息
-    camera_indices = list_cameras()
+    # 并发获取摄像头索引、设备节点与 USB 设备信息
+    start = time.monotonic()
+    probes = [
+        Probe("摄像头索引", list_cameras, default=[]),
+        Probe("设备节点", get_camera_devices, default=[]),
+        Probe("USB 设备", get_usb_info, default=USBDeviceInfo()),
+    ]
+    camera_indices, devices, usb_info = run_probes(probes).values()
     print("\n检测到的摄像头索引：", camera_indices)
-    # 获取设备节点信息
-    devices = get_camera_devices()
     print("\n摄像头设备节点信息：")
     for name, nodes in devices:
         print(f"设备名称：{name}")
         print(f"设备节点：{nodes}\n")
-    # 获取 USB 设备信息
-    usb_info = USBDeviceInfo()
-    usb_info.get_info()
     usb_info.print_info()
+    print_probe_report(probes, time.monotonic() - start)
+
+
+def main_json():
+    """--json：每台相机探测完成后立即输出一条 camera 记录，lsusb 完成后输出 usb 记录，最后输出 summary 记录"""
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):  # 提示与错误信息输出到标准错误
+        start = time.monotonic()
+        index = DeviceIndex.build()
+        usb_probe = Probe("USB 设备", get_usb_info, default=USBDeviceInfo())
+        probes = [Probe(record.port, record.describe) for record in index.records()] + [usb_probe]
+
+        def on_result(probe):
+            if probe is usb_probe:
+                for device in probe.result.target_devices:
+                    writer.emit("usb", target=True, **device)
+                for device in probe.result.non_target_devices:
+                    writer.emit("usb", target=False, **device)
+            elif probe.result is not None:
+                writer.emit("camera", **probe.result)
+            else:
+                writer.emit("error", port=probe.name, status=probe.status)
+
+        run_probes(probes, on_result=on_result)
+        writer.emit("summary", cameras=len(index), **probe_summary(probes, time.monotonic() - start))
 
 
 if __name__ == '__main__':
-    main()
+    if json_mode():
+        main_json()
+    else:
+        main()
 # ----------------------------------------------------------------------------------------------------------------------
@@ -1,9 +1,17 @@
 # ====================================================== 程序声明 ======================================================
-print("\n\033[93m【检测系统中所有可用摄像头，整合 VID、PID、SN 信息】\033[0m")
-print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n")
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【检测系统中所有可用摄像头，整合 VID、PID、SN 信息】\033[0m", file=BANNER_OUT)
+print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n", file=BANNER_OUT)
 # ----------------------------------------------------------------------------------------------------------------------
-import cv2  # OpenCV
+import time  # 探测计时
 import subprocess  # 执行系统命令
+from v4l2_enum import list_video_nodes  # 摄像头枚举
+from contextlib import redirect_stdout
+from discovery import Probe, run_probes, print_probe_report, probe_summary, PROBE_TIMEOUT  # 并发探测
+from json_output import NDJSONWriter, json_mode  # NDJSON 输出
+from sn_client import get_sns  # 常驻 SN 解析进程客户端
+from device_index import DeviceIndex  # SN、USB 端口与视频节点索引
 
 # 目标设备关键词
 TARGET_DEVICE_NAME = "ViTai"
@@ -15,8 +23,14 @@ PYTHON_VENV312 = "/home/ur/Vitai0506/venv312/bin/python"
 DEVICE_SN = "/home/ur/Vitai0506/venv312/device_sn.py"
 # SN码开头固定标识前缀
 SN_PREFIX='GF225'
-
-def get_sn_codes(): # 获取SN码
+# SN 查询超时（秒），首次查询需启动解析进程并加载厂商SDK
+SN_PROBE_TIMEOUT = 30
+
+def get_sn_codes(): # 获取SN码，返回 (SN 列表, {USB 端口路径: SN})：优先查询常驻 SN 解析进程，不可用时回退为单次启动 device_sn.py
+    result = get_sns()
+    if result is not None:
+        ports = {port: sn for port, sn in result["ports"].items() if sn.startswith(SN_PREFIX)}
+        return [sn for sn in result["sns"] if sn.startswith(SN_PREFIX)], ports
     try:
         python_312_path = PYTHON_VENV312 # Python解释器路径
         script_path = DEVICE_SN # 脚本路径
@@ -24,41 +38,29 @@ def get_sn_codes(): # 获取SN码
             [python_312_path, script_path],
             capture_output=True,
             text=True,
-            check=True
+            check=True,
+            timeout=SN_PROBE_TIMEOUT
         )
         sns = [line.strip() for line in result.stdout.split('\n') if line.startswith(SN_PREFIX)] # 提取SN码
-        return sns
+        return sns, {} # device_sn.py 只输出 SN 列表，按 USB 设备 serial 属性绑定
     except subprocess.CalledProcessError as e:
         print(f"调用 {DEVICE_SN} 失败，错误输出：{e.stderr}")
-        return []
+        return [], {}
     except Exception as e:
         print(f"获取SN码时发生未知错误：{e}")
-        return []
+        return [], {}
 
 
 def list_cameras():
-    """获取可用摄像头索引"""
-    index = 0
-    camera_indices = []
-    while True:  # 遍历可用摄像头索引
-        cap = cv2.VideoCapture(index, cv2.CAP_V4L2)  # 打开摄像头
-        if cap.isOpened():  # 检查摄像头是否可用
-            camera_indices.append(index)  # 添加可用摄像头索引
-            cap.release()
-            index += 1
-            continue
-        cap.release()  # 释放摄像头资源
-        if index > 3:  # 防止无限循环，可根据实际情况调整
-            break
-        index += 1
-    return camera_indices  # 返回可用摄像头索引列表
+    """获取可用摄像头索引（sysfs + VIDIOC_QUERYCAP，不打开视频流）"""
+    return [node.index for node in list_video_nodes()]
 
 
 def get_camera_devices():
     """获取摄像头设备节点信息"""
     try:
         cmd = ["v4l2-ctl", "--list-devices"]  # 执行v4l2-ctl命令
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)
         devices = []  # 存储设备节点信息
         for block in result.stdout.strip().split('\n\n'):  # 遍历设备块
             lines = block.split('\n')
@@ -83,7 +85,7 @@ class USBDeviceInfo:  # USB 设备信息类
     def get_info(self):
         """获取 USB 设备信息并分类"""
         try:
-            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True)  # 执行 lsusb 命令
+            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)  # 执行 lsusb 命令
             output = result.stdout.splitlines()  # 获取 lsusb 命令输出
             for line in output:
                 parts = line.split()
@@ -94,6 +96,9 @@ class USBDeviceInfo:  # USB 设备信息类
                 vid = vid_pid[0].upper()
                 pid = vid_pid[1].upper()
                 vid_pid_combination = f"{vid}-{pid}"
+                # 提取总线号与设备号，用于在设备索引中定位物理设备
+                bus = int(parts[1])
+                devnum = int(parts[3].rstrip(':'))
                 # 提取设备名称和制造商
                 device_name = ' '.join(parts[6:])
                 manufacturer = self._parse_manufacturer(device_name)
@@ -103,7 +108,9 @@ class USBDeviceInfo:  # USB 设备信息类
                     "vid": vid,
                     "pid": pid,
                     "manufacturer": manufacturer,
-                    "vid_pid_combination": vid_pid_combination
+                    "vid_pid_combination": vid_pid_combination,
+                    "bus": bus,
+                    "devnum": devnum
                 }
                 # 分类设备
                 if TARGET_DEVICE_NAME.lower() in device_name.lower():  # 目标设备
@@ -138,51 +145,101 @@ class USBDeviceInfo:  # USB 设备信息类
         return "N/A"
 
 
-    def print_combined_info(self, sns): # 格式化输出设备信息
-        """格式化输出设备信息"""
+    def print_combined_info(self, index): # 格式化输出设备信息
+        """格式化输出设备信息，SN 码按设备索引中的 USB 物理设备绑定"""
         if not (self.target_devices or self.non_target_devices):
             print("未找到 USB 设备信息")
             return
-        # 添加 SN 码
-        for idx, device in enumerate(self.target_devices):
-            device["sn"] = sns[idx] if idx < len(sns) else "N/A"
+        # 添加 SN 码、USB 端口与视频节点
+        for device in self.target_devices:
+            record = index.lookup_usb(device["bus"], device["devnum"])
+            device["sn"] = record.sn if record and record.sn else "N/A"
+            device["port"] = record.port if record else "N/A"
+            device["nodes"] = ",".join(n.path for n in record.capture_nodes) if record else "N/A"
         print("\nUSB 设备信息：")
 
 
-        print("序号   | 设备名称                        | VID        | PID    | 制造商                 | SN")
-        print("-" * 100)
+        print("序号   | 设备名称                        | VID        | PID    | 制造商                 | SN               | 端口      | 视频节点")
+        print("-" * 130)
         # 打印非目标设备
         for idx, device in enumerate(self.non_target_devices, 1):
             print(
                 f"{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']:<20} | ")
         # 打印分隔线（如果有混合设备）
         if self.target_devices and self.non_target_devices:
-            print("-" * 100)
+            print("-" * 130)
         # 打印目标设备（绿色高亮）
         for idx, device in enumerate(self.target_devices, 1):
             print(
                 # f"\033[32m{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']}\033[0m")
-                f"\033[32m{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']:<20} | {device.get('sn', 'N/A')}\033[0m")
-        print("-" * 100)
+                f"\033[32m{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']:<20} | {device.get('sn', 'N/A'):<16} | {device.get('port', 'N/A'):<9} | {device.get('nodes', 'N/A')}\033[0m")
+        print("-" * 130)
+        # SDK 列出但没有对应 USB 设备的 SN 码
+        if index.unbound_sns:
+            print(f"\033[33m警告：以下 SN 码未匹配到 USB 设备：{', '.join(index.unbound_sns)}\033[0m")
+
+
+def get_usb_info():  # 在独立对象中获取 USB 设备信息，超时后仍在运行的探测不影响输出
+    usb_info = USBDeviceInfo()
+    usb_info.get_info()
+    return usb_info
 
 
 def main():
-    # 获取摄像头信息
-    camera_indices = list_cameras()
+    # 并发获取摄像头索引、设备节点、USB 设备信息、设备索引与 SN 码
+    start = time.monotonic()
+    probes = [
+        Probe("摄像头索引", list_cameras, default=[]),
+        Probe("设备节点", get_camera_devices, default=[]),
+        Probe("USB 设备", get_usb_info, default=USBDeviceInfo()),
+        Probe("设备索引", DeviceIndex.build, default=DeviceIndex()),
+        Probe("SN 码", get_sn_codes, timeout=SN_PROBE_TIMEOUT, default=([], {})),
+    ]
+    camera_indices, devices, usb_info, index, (sns, ports) = run_probes(probes).values()
     print("\n检测到的摄像头索引：", camera_indices)
-    # 获取设备节点信息
-    devices = get_camera_devices()
     print("\n摄像头设备节点信息：")
     for name, nodes in devices:
         print(f"设备名称：{name}")
         print(f"设备节点：{nodes}\n")
-    # 获取 USB 设备信息
-    usb_info = USBDeviceInfo()
-    usb_info.get_info()
-    sns = get_sn_codes()
-    usb_info.print_combined_info(sns) 
+    index.bind_sns(sns, ports)
+    usb_info.print_combined_info(index)
+    print_probe_report(probes, time.monotonic() - start)
+
+
+def main_json():
+    """--json：每台相机探测完成后立即输出一条 camera 记录，SN 查询完成后为每台已绑定相机输出 sn 记录，最后输出 summary 记录"""
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):  # 提示与错误信息输出到标准错误
+        start = time.monotonic()
+        index = DeviceIndex.build()
+        usb_probe = Probe("USB 设备", get_usb_info, default=USBDeviceInfo())
+        sn_probe = Probe("SN 码", get_sn_codes, timeout=SN_PROBE_TIMEOUT, default=([], {}))
+        probes = [Probe(record.port, record.describe) for record in index.records()] + [usb_probe, sn_probe]
+
+        def on_result(probe):
+            if probe is usb_probe:
+                for device in probe.result.target_devices:
+                    writer.emit("usb", target=True, **device)
+                for device in probe.result.non_target_devices:
+                    writer.emit("usb", target=False, **device)
+            elif probe is sn_probe:
+                index.bind_sns(*probe.result)
+                for record in index.records():
+                    if record.sn is not None:
+                        writer.emit("sn", sn=record.sn, port=record.port, video_index=record.video_index)
+            elif probe.result is not None:
+                writer.emit("camera", **probe.result)
+            else:
+                writer.emit("error", port=probe.name, status=probe.status)
+
+        run_probes(probes, on_result=on_result)
+        writer.emit("summary", cameras=len(index), unbound_sns=index.unbound_sns,
+                    **probe_summary(probes, time.monotonic() - start))
 
 
 if __name__ == '__main__':
-    main()
+    if json_mode():
+        main_json()
+    else:
+        main()
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,103 @@
+# ====================================================== 模块声明 ======================================================
+# 并发设备探测：lsusb、v4l2-ctl、SN 查询等探测项在有界线程池中同时运行，每项独立超时，总耗时约等于最慢的一项
+# 超时的探测项返回默认值并由新线程补位，工作线程为守护线程，卡住的探测不会阻止程序退出
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from queue import Queue, Empty
+from threading import Thread
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+MAX_WORKERS = 8  # 同时运行的探测项上限
+PROBE_TIMEOUT = 5.0  # 默认单项超时（秒），从该项开始运行时计时
+POLL_INTERVAL = 0.05  # 有探测项尚未开始时的检查间隔（秒）
+
+
+# 单个探测项
+class Probe:
+    def __init__(self, name, func, args=(), timeout=PROBE_TIMEOUT, default=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+        self.default = default  # 超时或出错时的结果
+        self.future = Future()
+        self.started = None
+        self.elapsed = None
+        self.status = "等待"  # 完成 / 超时 / 错误：...
+        self.result = default
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        self.started = time.monotonic()
+        try:
+            self.future.set_result(self.func(*self.args))
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def finish(self, result, status):
+        self.result = result
+        self.status = status
+        self.elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+
+
+def _worker(tasks):
+    while True:
+        try:
+            probe = tasks.get_nowait()
+        except Empty:
+            return
+        probe.run()
+
+
+def run_probes(probes, workers=MAX_WORKERS, on_result=None):
+    """并发运行探测项，返回 {名称: 结果}；on_result(probe) 在每项完成或超时时于调用线程中回调"""
+    tasks = Queue()
+    for probe in probes:
+        tasks.put(probe)
+    for _ in range(min(workers, len(probes))):
+        Thread(target=_worker, args=(tasks,), daemon=True).start()
+    pending = {probe.future: probe for probe in probes}
+    while pending:
+        now = time.monotonic()
+        deadlines = [p.started + p.timeout for p in pending.values() if p.started is not None]
+        idle = any(p.started is None for p in pending.values())
+        timeout = max(0.0, min(deadlines) - now) if deadlines else None
+        if idle:
+            timeout = POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            probe = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                probe.finish(future.result(), "完成")
+            else:
+                probe.finish(probe.default, f"错误：{error}")
+            if on_result:
+                on_result(probe)
+        now = time.monotonic()
+        for future, probe in list(pending.items()):
+            if probe.started is not None and now - probe.started >= probe.timeout:
+                del pending[future]
+                probe.finish(probe.default, "超时")
+                Thread(target=_worker, args=(tasks,), daemon=True).start()  # 补位卡住的工作线程
+                if on_result:
+                    on_result(probe)
+    return {probe.name: probe.result for probe in probes}
+
+
+def probe_summary(probes, wall_time):  # 各探测项耗时，用于 JSON 输出
+    return {
+        "wall_time": round(wall_time, 3),
+        "probes": [{"name": p.name, "status": p.status,
+                    "elapsed": round(p.elapsed, 3) if p.elapsed is not None else None} for p in probes],
+    }
+
+
+def print_probe_report(probes, wall_time):  # 输出各探测项耗时
+    print(f"\n探测耗时（总计 {wall_time:.2f} s）：")
+    for probe in probes:
+        elapsed = f"{probe.elapsed:.2f} s" if probe.elapsed is not None else "N/A"
+        line = f"  {probe.name:<12} {elapsed:>8}  {probe.status}"
+        print(line if probe.status == "完成" else f"\033[33m{line}\033[0m")
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,207 @@
+# ====================================================== 模块声明 ======================================================
+# 共享内存帧环：采集进程把每帧写入 multiprocessing.shared_memory 环形缓冲区，其他分析进程直接映射读取
+# 内存布局：全局头（魔数、槽位数、槽位大小、最新序号、帧间隔、代数、关闭标志）+ N 个槽位（槽位头 + 图像数据）
+# 槽位头记录 device_id、序号、时间戳、形状与 dtype；写入期间序号置 0，读者据此丢弃被覆盖的帧
+# 帧尺寸变大时发布端先在旧共享内存中置关闭标志再按新尺寸重建（代数加 1，序号连续），读者发现关闭标志后重新映射
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import re
+import mmap
+import time
+import struct
+import numpy as np
+from multiprocessing import shared_memory
+
+RING_PREFIX = "vitai_"  # 共享内存名称前缀（/dev/shm 下）
+RING_MAGIC = b"VITAIRNG"
+RING_VERSION = 2
+
+# 全局头：魔数、版本、槽位数、槽位数据大小、最新序号、帧间隔、代数、关闭标志
+RING_HEADER = struct.Struct("<8sIIQQdQQ")
+RING_HEADER_SIZE = 64
+RING_SEQ_OFFSET = 24  # 最新序号在全局头中的偏移
+RING_CLOSED_OFFSET = 48  # 关闭标志在全局头中的偏移，非 0 表示该共享内存已被发布端废弃
+
+# 槽位头：序号、驱动帧序号、时间戳、高、宽、通道、dtype、device_id、数据字节数
+SLOT_HEADER = struct.Struct("<QQdIII8s32sQ")
+SLOT_HEADER_SIZE = 128
+
+
+def ring_name(name):  # 由窗口/设备名称生成共享内存名称
+    return RING_PREFIX + re.sub(r"\W", "_", name)
+
+
+def list_rings():  # 列出当前存在的帧环
+    try:
+        return sorted(n for n in os.listdir("/dev/shm") if n.startswith(RING_PREFIX))
+    except OSError:
+        return []
+
+
+# 环中的一帧；image 在 copy=False 时是共享内存上的只读视图
+class RingFrame:
+    def __init__(self, seq, sequence, timestamp, device_id, image):
+        self.seq = seq  # 帧环序号
+        self.sequence = sequence  # 驱动帧序号
+        self.timestamp = timestamp  # 采集时间戳（单调时钟）
+        self.device_id = device_id
+        self.image = image
+
+
+# 发布端：由采集线程调用，首帧到达时按帧尺寸创建共享内存
+class FrameRingWriter:
+    def __init__(self, name, device_id="", slots=4, frame_interval=0.0):
+        self.name = ring_name(name)
+        self.device_id = device_id
+        self.slots = slots
+        self.frame_interval = frame_interval
+        self.shm = None
+        self.slot_size = 0
+        self.seq = 0
+        self.generation = 0  # 本发布端创建共享内存的次数
+
+    def _create(self, nbytes):  # 创建（或按新尺寸重建）共享内存；序号不清零，读者重新映射后沿用原来的 last_seq
+        self.close()
+        try:  # 清理上次异常退出遗留的同名帧环，仍映射着它的读者据关闭标志重新映射
+            stale = shared_memory.SharedMemory(name=self.name)
+            struct.pack_into("<Q", stale.buf, RING_CLOSED_OFFSET, 1)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.slot_size = nbytes
+        self.generation += 1
+        size = RING_HEADER_SIZE + self.slots * (SLOT_HEADER_SIZE + nbytes)
+        self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        RING_HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, RING_VERSION, self.slots, nbytes, self.seq,
+                              self.frame_interval, self.generation, 0)
+
+    def publish(self, image, sequence=0, timestamp=None):
+        """写入一帧，返回帧环序号"""
+        if self.shm is None or image.nbytes > self.slot_size:
+            self._create(image.nbytes)
+        seq = self.seq + 1
+        offset = RING_HEADER_SIZE + (seq - 1) % self.slots * (SLOT_HEADER_SIZE + self.slot_size)
+        struct.pack_into("<Q", self.shm.buf, offset, 0)  # 写入期间标记槽位无效
+        dst = np.ndarray(image.shape, image.dtype, buffer=self.shm.buf, offset=offset + SLOT_HEADER_SIZE)
+        np.copyto(dst, image)
+        del dst
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim > 2 else 1
+        SLOT_HEADER.pack_into(self.shm.buf, offset, seq, sequence,
+                              time.monotonic() if timestamp is None else timestamp,
+                              height, width, channels, image.dtype.str.encode(),
+                              self.device_id.encode()[:32], image.nbytes)
+        struct.pack_into("<Q", self.shm.buf, RING_SEQ_OFFSET, seq)  # 最后更新最新序号
+        self.seq = seq
+        return seq
+
+    def close(self):  # 置关闭标志后关闭并删除共享内存
+        if self.shm is None:
+            return
+        struct.pack_into("<Q", self.shm.buf, RING_CLOSED_OFFSET, 1)
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+
+
+def _release(buf):  # 关闭读者的映射
+    try:
+        buf.close()
+    except BufferError:  # 仍有视图引用共享内存，交由视图释放或进程退出时回收
+        pass
+
+
+# 读取端：可在任意进程中创建，多个读者互不影响
+class FrameRingReader:
+    def __init__(self, name):
+        self.name = name if name.startswith(RING_PREFIX) else ring_name(name)
+        self._use(*self._map())
+
+    def _map(self):  # 只读映射当前的 /dev/shm 文件，返回 (映射, 全局头)
+        # 直接只读映射 /dev/shm 文件：读者不登记到 resource_tracker，退出时不会误删发布端的共享内存
+        fd = os.open(f"/dev/shm/{self.name}", os.O_RDONLY)
+        try:
+            buf = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        header = RING_HEADER.unpack_from(buf, 0)
+        if header[0] != RING_MAGIC or header[1] != RING_VERSION:
+            buf.close()
+            raise ValueError(f"{self.name} 不是有效的帧环")
+        return buf, header
+
+    def _use(self, buf, header):
+        _, _, self.slots, self.slot_size, _, self.frame_interval, self.generation, _ = header
+        self.buf = buf
+
+    def _reattach(self):  # 发布端已重建帧环：映射新的共享内存；尚未重建或已退出时保持原映射，返回 False
+        try:
+            buf, header = self._map()
+        except (OSError, ValueError):
+            return False
+        if header[7]:  # 仍是已废弃的共享内存
+            _release(buf)
+            return False
+        _release(self.buf)
+        self._use(buf, header)
+        return True
+
+    @property
+    def closed(self):  # 当前映射的共享内存是否已被发布端废弃
+        return struct.unpack_from("<Q", self.buf, RING_CLOSED_OFFSET)[0] != 0
+
+    @property
+    def seq(self):  # 最新帧环序号
+        return struct.unpack_from("<Q", self.buf, RING_SEQ_OFFSET)[0]
+
+    def _offset(self, seq):
+        return RING_HEADER_SIZE + (seq - 1) % self.slots * (SLOT_HEADER_SIZE + self.slot_size)
+
+    def read(self, last_seq=0, copy=True):
+        """读取比 last_seq 更新的最新帧，没有新帧或读取期间被覆盖时返回 None
+        copy=False 时返回共享内存上的只读视图，处理完毕后用 valid() 确认未被覆盖"""
+        if self.closed and not self._reattach():  # 发布端重建帧环后自动重新映射
+            return None
+        seq = self.seq
+        if seq <= last_seq:
+            return None
+        offset = self._offset(seq)
+        slot_seq, sequence, timestamp, height, width, channels, dtype, device_id, nbytes = \
+            SLOT_HEADER.unpack_from(self.buf, offset)
+        if slot_seq != seq:  # 正在被改写
+            return None
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        image = np.ndarray(shape, np.dtype(dtype.rstrip(b"\0").decode()), buffer=self.buf,
+                           offset=offset + SLOT_HEADER_SIZE)
+        if copy:
+            image = image.copy()
+            if not self.valid(seq):  # 复制期间被覆盖
+                return None
+        return RingFrame(seq, sequence, timestamp, device_id.rstrip(b"\0").decode(), image)
+
+    def valid(self, frame):  # 帧所在槽位是否仍未被覆盖
+        seq = frame.seq if isinstance(frame, RingFrame) else frame
+        return struct.unpack_from("<Q", self.buf, self._offset(seq))[0] == seq
+
+    def wait(self, last_seq=0, timeout=1.0, copy=True):  # 等待新帧，按发布端帧间隔轮询
+        deadline = time.monotonic() + timeout
+        interval = min(max(self.frame_interval / 4, 0.001), 0.01)
+        while True:
+            frame = self.read(last_seq, copy)
+            if frame is not None or time.monotonic() >= deadline:
+                return frame
+            time.sleep(interval)
+
+    def close(self):
+        _release(self.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+# ----------------------------------------------------------------------------------------------------------------------
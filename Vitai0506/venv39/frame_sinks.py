@@ -0,0 +1,166 @@
+# ====================================================== 模块声明 ======================================================
+# 无界面运行的帧输出：接口与 FrameSlot 一致（put(帧, 时间戳)、seq、dropped），可直接作为 CameraController.slot
+# put() 在采集线程中同步调用，全分辨率帧位于采集源的轮换缓冲区，需要保留帧的输出自行拷贝
+# accepts_encoded 为 True 的输出在全分辨率、相机输出 MJPEG 时改用 put_encoded(压缩数据, 时间戳)，采集线程不解码
+# 输出规格：null（只计数）、ring（共享内存帧环，供其他进程读取）、jpeg:目录[:间隔帧数]（定期保存最新一帧）；SnapshotSink 包装任意输出，按需提供帧快照
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import cv2
+from threading import Condition
+from frame_ring import FrameRingWriter
+from v4l2_capture import decode_jpeg
+
+RING_SLOTS = 4  # ring 输出的帧环槽位数
+JPEG_EVERY = 30  # jpeg 输出默认每隔多少帧保存一次
+JPEG_QUALITY = 90
+SNAPSHOT_TIMEOUT = 2.0  # 等待下一帧快照的超时（秒）
+
+
+# 帧输出基类：只计数
+class FrameSink:
+    accepts_encoded = False  # 是否接受 MJPEG 压缩数据
+
+    def __init__(self, name, device_id=""):
+        self.name = name
+        self.device_id = device_id
+        self.seq = 0  # 已输出帧数
+        self.dropped = 0  # 输出失败的帧数
+
+    def put(self, frame, timestamp=None):
+        return self._output(self.write, frame, timestamp)
+
+    def put_encoded(self, data, timestamp=None):  # data 为采集缓冲区的 memoryview，只在调用期间有效
+        return self._output(self.write_encoded, data, timestamp)
+
+    def _output(self, write, data, timestamp):
+        self.seq += 1
+        try:
+            write(data, timestamp)
+        except Exception as e:
+            self.dropped += 1
+            if self.dropped == 1:  # 只提示第一次，避免每帧刷屏
+                print(f"\033[33m警告：{self.name} 帧输出失败（{e}）\033[0m")
+        return self.seq
+
+    def write(self, frame, timestamp):
+        pass
+
+    def write_encoded(self, data, timestamp):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullSink(FrameSink):  # 丢弃帧，用于测量采集吞吐与延迟
+    accepts_encoded = True
+
+
+class RingSink(FrameSink):  # 发布到共享内存帧环，其他进程用 FrameRingReader 读取；帧环保存像素，需要解码后的帧
+    def __init__(self, name, device_id="", slots=RING_SLOTS):
+        super().__init__(name, device_id)
+        self.ring = FrameRingWriter(name, device_id, slots=slots)
+
+    def write(self, frame, timestamp):
+        self.ring.publish(frame, self.seq, timestamp)
+
+    def close(self):
+        self.ring.close()
+
+
+class JpegSink(FrameSink):  # 每隔 every 帧把最新一帧写入 目录/名称.jpg，先写临时文件再替换，读者不会读到半帧
+    accepts_encoded = True  # 相机输出 MJPEG 时直接保存压缩数据，不解码也不重新编码
+
+    def __init__(self, name, device_id="", directory=".", every=JPEG_EVERY, quality=JPEG_QUALITY):
+        super().__init__(name, device_id)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, name.replace(" ", "_").replace("/", "_") + ".jpg")
+        self.every = max(1, int(every))
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    def write(self, frame, timestamp):
+        if self.seq % self.every:
+            return
+        ok, data = cv2.imencode(".jpg", frame, self.params)
+        if not ok:
+            raise ValueError("JPEG 编码失败")
+        self._save(data.tobytes())
+
+    def write_encoded(self, data, timestamp):
+        if self.seq % self.every:
+            return
+        self._save(data)
+
+    def _save(self, data):
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, self.path)
+
+
+class SnapshotSink:  # 包装其他帧输出：有快照请求时拷贝下一帧，没有请求时不额外拷贝
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.device_id = inner.device_id
+        self.cond = Condition()
+        self.waiting = 0  # 正在等待快照的请求数
+        self.latest = (0, None, None)  # (序号, 帧拷贝或 MJPEG 数据, 采集时间戳)
+        self.accepts_encoded = inner.accepts_encoded
+
+    @property
+    def seq(self):
+        return self.inner.seq
+
+    @property
+    def dropped(self):
+        return self.inner.dropped
+
+    def put(self, frame, timestamp=None):
+        seq = self.inner.put(frame, timestamp)
+        if self.waiting:
+            with self.cond:
+                self.latest = (seq, frame.copy(), timestamp)
+                self.cond.notify_all()
+        return seq
+
+    def put_encoded(self, data, timestamp=None):
+        seq = self.inner.put_encoded(data, timestamp)
+        if self.waiting:
+            with self.cond:
+                self.latest = (seq, bytes(data), timestamp)  # 只拷贝压缩数据，请求线程中再解码
+                self.cond.notify_all()
+        return seq
+
+    def snapshot(self, timeout=SNAPSHOT_TIMEOUT):
+        """等待并返回下一帧的拷贝 (帧, 采集时间戳)，超时返回 None"""
+        with self.cond:
+            start = self.latest[0]
+            self.waiting += 1
+            try:
+                if not self.cond.wait_for(lambda: self.latest[0] > start, timeout):
+                    return None
+            finally:
+                self.waiting -= 1
+            _, frame, timestamp = self.latest
+        if isinstance(frame, bytes):
+            frame = decode_jpeg(frame)
+        return frame, timestamp
+
+    def close(self):
+        self.inner.close()
+
+
+SINKS = {"null": NullSink, "ring": RingSink, "jpeg": JpegSink}
+
+
+def make_sink(spec, name, device_id=""):
+    """按输出规格创建帧输出，如 "null"、"ring"、"jpeg:/var/lib/vitai:10"；规格无效时抛出 ValueError"""
+    kind, _, arg = spec.partition(":")
+    if kind not in SINKS:
+        raise ValueError(f"未知帧输出 {kind}，可选：{'、'.join(SINKS)}")
+    if kind == "jpeg":
+        directory, _, every = arg.rpartition(":") if arg.rpartition(":")[2].isdigit() else (arg, "", "")
+        return JpegSink(name, device_id, directory or ".", int(every) if every else JPEG_EVERY)
+    return SINKS[kind](name, device_id)
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,71 @@
+# ====================================================== 模块声明 ======================================================
+# 每台相机独立的“最新帧”信箱：采集线程只覆盖自己的槽位，显示线程按各自帧率取走最新帧
+# 槽位内容以 (序号, 帧, 发布时间, 采集时间戳) 元组整体替换，单生产者/单消费者下依赖引用赋值的原子性，无需加锁
+# 被覆盖而未取走的帧计入 dropped，便于统计每台设备的丢帧
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from threading import Event
+
+
+# 单台相机的最新帧槽位
+class FrameSlot:
+    def __init__(self, name, notify=None):
+        self.name = name
+        self.notify = notify  # 有新帧时通知消费者的 Event
+        self.latest = (0, None, 0.0, 0.0)  # (序号, 帧, 发布时间, 采集时间戳)
+        self.taken_seq = 0  # 消费者最近取走的序号
+        self.dropped = 0  # 未取走即被覆盖的帧数
+
+    @property
+    def seq(self):  # 已发布帧数
+        return self.latest[0]
+
+    def put(self, frame, timestamp=None):  # 发布新帧，覆盖尚未取走的旧帧；timestamp 为帧的采集时间
+        seq = self.latest[0]
+        if seq > self.taken_seq:
+            self.dropped += 1
+        published = time.monotonic()
+        self.latest = (seq + 1, frame, published, published if timestamp is None else timestamp)
+        if self.notify is not None:
+            self.notify.set()
+        return seq + 1
+
+    def take(self):
+        """取走比上次更新的帧，返回 (序号, 帧, 发布时间, 采集时间戳)；没有新帧时返回 None"""
+        latest = self.latest
+        if latest[0] <= self.taken_seq:
+            return None
+        self.taken_seq = latest[0]
+        return latest
+
+    def peek(self):  # 查看最新帧但不标记为已取走
+        seq, frame = self.latest[:2]
+        return (seq, frame) if seq else None
+
+
+# 多相机槽位集合
+class FrameSlots:
+    def __init__(self):
+        self.slots = {}
+        self.event = Event()  # 任一槽位有新帧
+
+    def slot(self, name):  # 获取或创建槽位
+        if name not in self.slots:
+            self.slots[name] = FrameSlot(name, self.event)
+        return self.slots[name]
+
+    def remove(self, name):
+        self.slots.pop(name, None)
+
+    def items(self):
+        return list(self.slots.items())
+
+    def wait(self, timeout):  # 等待任一槽位出现新帧
+        ready = self.event.wait(timeout)
+        self.event.clear()
+        return ready
+
+    def stats(self):
+        """每台设备的已发布帧数与丢帧数 {名称: (序号, 丢帧)}"""
+        return {name: (slot.seq, slot.dropped) for name, slot in self.items()}
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,173 @@
+# ====================================================== 程序声明 ======================================================
+print("\n\033[93m【无界面相机运行程序：按方案初始化全部相机参数，帧输出到帧环 / JPEG，提供本地参数接口，不依赖显示器，可作为 systemd 服务运行】\033[0m\n")
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import signal
+from types import SimpleNamespace
+from threading import Thread, Event, Lock
+from v4l2_enum import list_video_nodes
+from hotplug import CameraRegistry
+from latency import latency_report
+import scheme_camera
+from scheme_camera import SCHEMES, SCHEME_MODES, initialize_params_with_scheme
+from v4l2_modes import parse_mode_spec
+from preprocess import parse_preprocess
+from usb_bandwidth import BandwidthPlanner
+from frame_sinks import make_sink, SnapshotSink
+from ctrl_executor import ControlExecutor
+from control_api import start_api, stop_api
+from synthetic_camera import SyntheticCamera, SYNTHETIC_INDEX_BASE
+
+# 全局配置，均可通过环境变量覆盖（systemd 单元中用 Environment= 设置）
+SCHEME_NAME = os.environ.get("VITAI_SCHEME", "默认值")  # 启动时应用的方案，方案定义见 scheme_camera.py
+SINK = os.environ.get("VITAI_SINK", "ring")  # 帧输出：null / ring / jpeg:目录[:间隔帧数]
+MAX_FPS = float(os.environ.get("VITAI_MAX_FPS", "30"))  # 最大帧率
+FRAME_SIZE = os.environ.get("VITAI_FRAME_SIZE", "")  # 输出帧尺寸，如 640x480；留空输出全分辨率帧
+PREPROCESS = os.environ.get("VITAI_PREPROCESS", "")  # 预处理 crop=x:y:宽:高,color=rgb|gray，如 crop=320:0:1280:1080,color=gray；size=宽x高 覆盖输出帧尺寸
+CAPTURE_MODE = os.environ.get("VITAI_CAPTURE_MODE", "")  # 采集需求 [格式:]宽x高[@帧率]，如 MJPG:1280x720@30；留空使用方案声明或按输出尺寸协商
+STATS_INTERVAL = float(os.environ.get("VITAI_STATS_INTERVAL", "60"))  # 周期输出帧数统计的间隔（秒），0 不输出
+API_ADDRESS = os.environ.get("VITAI_API", "127.0.0.1:8765")  # 本地参数接口地址，unix:路径 使用 Unix 套接字，留空不启动
+BANDWIDTH_PLAN = os.environ.get("VITAI_BANDWIDTH_PLAN", "1") != "0"  # 按 USB 总线带宽为每台相机规划采集模式，0 关闭
+SYNTHETIC = int(os.environ.get("VITAI_SYNTHETIC", "0"))  # 大于 0 时不打开真实相机，改为启动指定数量的合成相机（用于测试）
+
+
+# 摄像头控制器：与 v4l2_test_scheme.py 相同的采集与参数写入，帧直接交给帧输出
+class CameraController(scheme_camera.CameraController):
+    max_fps = MAX_FPS
+    preview_size = tuple(int(v) for v in FRAME_SIZE.lower().split("x")) if FRAME_SIZE else None
+
+
+def serve_camera(controller, executor): # 相机线程：采集到相机拔出或退出，方案参数由参数命令线程并行写入
+    try:
+        controller.run()
+    finally:
+        executor.close()
+        controller.slot.close()
+
+
+def main():
+    if SCHEME_NAME not in SCHEMES:
+        print(f"\033[31m错误：未知方案 {SCHEME_NAME}，可选：{'、'.join(SCHEMES)}\033[0m")
+        return 1
+    initialize_params_with_scheme(SCHEMES[SCHEME_NAME])
+    try:
+        CameraController.capture_mode = parse_mode_spec(CAPTURE_MODE) if CAPTURE_MODE else SCHEME_MODES.get(SCHEME_NAME)
+        preprocess = parse_preprocess(PREPROCESS)
+        CameraController.preview_size = preprocess.pop("size", CameraController.preview_size)
+        CameraController.preprocess = preprocess
+    except ValueError as e:
+        print(f"\033[31m错误：{e}\033[0m")
+        return 1
+    stop_event = Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_event.set())  # systemctl stop
+    signal.signal(signal.SIGINT, lambda *args: stop_event.set())
+
+    cameras = {} # {设备序号: (相机控制器, 相机线程, 参数命令线程)}
+    lock = Lock() # 启动时、热插拔监听线程与接口线程同时访问 cameras
+    planner = BandwidthPlanner() if BANDWIDTH_PLAN and not SYNTHETIC else None
+    planned = {} # 启动时整体规划的结果 {设备序号: Assignment}，热插拔接入的相机单独规划
+
+    def start_camera(node, controller_cls=CameraController): # 启动相机：启动时及热插拔接入时调用
+        with lock:
+            if node.index in cameras or stop_event.is_set():
+                return
+            controller = controller_cls(node.index, node.device_id)
+            if planner is not None and controller_cls is CameraController:
+                assignment = planned.pop(node.index, None)  # 启动时的规划说明已整体输出
+                if assignment is None:
+                    assignment = planner.add(node, controller.base_request())
+                    for step in assignment.steps if assignment is not None else []:
+                        print(f"\033[33m{controller.name}: {step}\033[0m")
+                if assignment is not None:
+                    if assignment.mode is None:
+                        return
+                    controller.capture_mode = assignment.capture_request()
+            try:
+                controller.slot = SnapshotSink(make_sink(SINK, controller.name, node.device_id))  # 接口请求时才拷贝帧
+            except ValueError as e:
+                print(f"\033[31m错误：{e}\033[0m")
+                stop_event.set()
+                return
+            if not controller.initialize():
+                print(f"\033[31m错误：{controller.name} 相机初始化失败，未开启\033[0m")
+                if planner is not None:
+                    planner.remove(node.index)
+                return
+            if planner is not None:
+                planner.observe(node.index)  # 以实际备用设置修正保留带宽，供之后接入的相机规划
+            executor = ControlExecutor(controller, name=f"{controller.name} 参数命令")
+            executor.submit(controller.init_params)  # 多台相机各自的命令线程并行写入方案参数
+            thread = Thread(target=serve_camera, args=(controller, executor), name=controller.name, daemon=True)
+            thread.start()
+            cameras[node.index] = (controller, thread, executor)
+            print(f"{controller.name} 已启动，方案 {SCHEME_NAME}，帧输出 {SINK}")
+
+    def stop_camera(index): # 相机拔出：采集线程退出并关闭帧输出
+        with lock:
+            entry = cameras.pop(index, None)
+            if planner is not None:
+                planner.remove(index)
+        if entry is not None:
+            entry[0].exit_event.set()
+            print(f"\033[33m{entry[0].name} 已拔出\033[0m")
+
+    def api_cameras(): # 接口使用的相机列表
+        with lock:
+            return {index: (controller, executor) for index, (controller, _, executor) in cameras.items()}
+
+    registry = CameraRegistry(on_add=start_camera, on_remove=stop_camera)  # 回调在监听线程中执行
+    if SYNTHETIC:  # 测试模式：合成相机，不监听热插拔
+        hotplug = False
+        nodes = []
+        for i in range(SYNTHETIC):
+            start_camera(SimpleNamespace(index=SYNTHETIC_INDEX_BASE + i, device_id="synthetic"), SyntheticCamera)
+    else:
+        hotplug = registry.start()
+        nodes = list_video_nodes()
+        if planner is not None and nodes:  # 同一总线上的相机一起规划，超出预算时逐台降级
+            with lock:
+                planned.update(planner.plan(nodes, CameraController.base_request()))
+            for line in planner.explain():
+                print(line)
+    if not nodes and not cameras:
+        if not hotplug:
+            print("未检测到摄像头设备")
+            return 1
+        print("未检测到摄像头设备，等待相机接入")
+    for node in nodes:
+        start_camera(node)
+    server = None
+    if API_ADDRESS:
+        try:
+            server = start_api(API_ADDRESS, api_cameras, SCHEMES)
+            print(f"参数接口已启动：{API_ADDRESS}")
+        except (OSError, ValueError) as e:
+            print(f"\033[33m警告：参数接口启动失败（{e}），继续无接口运行\033[0m")
+
+    last_seq = {}
+    while not stop_event.wait(STATS_INTERVAL or None):  # 主线程只等待退出信号
+        with lock:
+            entries = list(cameras.values())
+        for controller, _, _ in entries:
+            seq = controller.slot.seq
+            fps = (seq - last_seq.get(controller.name, 0)) / STATS_INTERVAL
+            last_seq[controller.name] = seq
+            print(f"{controller.name}: 输出 {seq} 帧，{fps:.1f} fps，输出失败 {controller.slot.dropped} 帧")
+
+    if server is not None:
+        stop_api(server)
+    registry.stop()
+    with lock:
+        entries = list(cameras.values())
+        cameras.clear()
+    for controller, _, _ in entries: # 关闭相机
+        controller.exit_event.set()
+    for _, thread, _ in entries: # 等待采集线程释放摄像头与帧输出
+        thread.join(3)
+    print(latency_report())  # 退出时输出各设备延迟统计
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+# ----------------------------------------------------------------------------------------------------------------------
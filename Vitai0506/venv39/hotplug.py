@@ -0,0 +1,94 @@
+# ====================================================== 模块声明 ======================================================
+# 相机热插拔：通过 NETLINK_KOBJECT_UEVENT 套接字接收内核 uevent，视频节点接入/拔出时回调，不做周期性重新扫描
+# 回调在监听线程中执行，涉及 Tk 界面时由调用方转回主线程（root.after）
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import time
+import socket
+from threading import Thread
+from v4l2_enum import VideoNode
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP_KERNEL = 1  # 内核广播组（udev 处理之前的原始事件）
+UEVENT_BUFFER_SIZE = 1 << 20  # 接收缓冲区，避免批量插拔时丢事件
+NODE_WAIT = 2.0  # 等待 udev 创建 /dev 节点并设置权限的上限（秒）
+
+
+def parse_uevent(data):
+    """解析内核 uevent 报文 'action@devpath\\0KEY=VALUE\\0...'，返回属性字典"""
+    event = {}
+    for field in data.split(b"\0")[1:]:
+        key, sep, value = field.partition(b"=")
+        if sep:
+            event[key.decode(errors="replace")] = value.decode(errors="replace")
+    return event
+
+
+# 内核 uevent 监听套接字
+class UeventMonitor:
+    def __init__(self, subsystem=None):
+        self.subsystem = subsystem  # 只关心的子系统，如 video4linux、usb
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER_SIZE)
+        self.sock.bind((0, UEVENT_GROUP_KERNEL))  # 端口号为 0 时由内核分配，多个监听者互不冲突
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+        """阻塞接收一个事件，返回属性字典；不属于关注子系统时返回 None"""
+        event = parse_uevent(self.sock.recv(UEVENT_BUFFER_SIZE))
+        if self.subsystem and event.get("SUBSYSTEM") != self.subsystem:
+            return None
+        return event
+
+    def close(self):
+        self.sock.close()
+
+
+# 相机注册表：视频采集节点接入时回调 on_add(VideoNode)，拔出时回调 on_remove(设备序号)
+class CameraRegistry:
+    def __init__(self, on_add, on_remove):
+        self.on_add = on_add
+        self.on_remove = on_remove
+        self.monitor = None
+        self.running = False
+
+    def start(self):  # 启动监听线程，系统不支持 netlink 时返回 False
+        try:
+            self.monitor = UeventMonitor("video4linux")
+        except OSError as e:
+            print(f"\033[33m警告：热插拔监听不可用（{e}），仅使用启动时检测到的相机\033[0m")
+            return False
+        self.running = True
+        Thread(target=self._run, daemon=True).start()
+        return True
+
+    def _run(self):
+        while self.running:
+            try:
+                event = self.monitor.receive()
+            except OSError:  # 监听已关闭
+                break
+            node = os.path.basename(event.get("DEVNAME", "")) if event else ""
+            if not node.startswith("video") or not node[len("video"):].isdigit():
+                continue
+            if event.get("ACTION") == "add":
+                self._handle_add(node)
+            elif event.get("ACTION") == "remove":
+                self.on_remove(int(node[len("video"):]))
+
+    def _handle_add(self, name):
+        node = VideoNode(name)
+        deadline = time.monotonic() + NODE_WAIT
+        while node.caps is None and time.monotonic() < deadline:  # 内核事件早于 udev 创建设备节点
+            time.sleep(0.05)
+            node = VideoNode(name)
+        if node.is_capture:  # 元数据节点不启动
+            self.on_add(node)
+
+    def stop(self):  # 阻塞中的 recv 在下一个事件到来时退出，线程为守护线程
+        self.running = False
+        if self.monitor is not None:
+            self.monitor.close()
+# ----------------------------------------------------------------------------------------------------------------------
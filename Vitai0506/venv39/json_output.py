@@ -0,0 +1,29 @@
+# ====================================================== 模块声明 ======================================================
+# 结构化输出：以 --json 运行时，标准输出每行一个 JSON 记录（NDJSON），每条记录带 type 字段区分种类
+# 记录在对应探测完成后立即写出并刷新，调用方可在其余设备探测完成前开始处理；提示与错误信息改为输出到标准错误
+# ----------------------------------------------------------------------------------------------------------------------
+import sys
+import json
+import time
+from threading import Lock
+
+JSON_FLAG = "--json"  # 命令行参数
+
+
+def json_mode():  # 是否以 --json 运行
+    return JSON_FLAG in sys.argv[1:]
+
+
+# NDJSON 写出器，可在多个线程中调用
+class NDJSONWriter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout  # 在重定向标准输出之前创建，保留原标准输出
+        self.lock = Lock()
+
+    def emit(self, record_type, **fields):
+        record = dict(type=record_type, time=round(time.time(), 3), **fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,103 @@
+# ====================================================== 模块声明 ======================================================
+# 逐帧延迟统计：按设备记录各阶段耗时（出队、解码、缩放、排队、拼接、显示）及传感器到显示的总延迟
+# 所有时间均为 CLOCK_MONOTONIC 秒，起点为 V4L2 缓冲区时间戳；直方图按固定边界分桶（毫秒，含 50 ms 目标边界），可随时打印
+# 每个阶段只由一个线程写入，计数在 GIL 下更新，无需加锁
+# ----------------------------------------------------------------------------------------------------------------------
+from threading import Lock
+
+STAGES = ("dequeue", "decode", "preprocess", "queue", "compose", "imshow", "total")
+STAGE_NAMES = {
+    "dequeue": "出队",  # 驱动写入缓冲区 → 用户态出队
+    "decode": "解码",  # 原始数据 → BGR
+    "preprocess": "预处理",  # 裁剪、缩放与颜色转换
+    "queue": "排队",  # 放入显示槽位 → 显示线程取走
+    "compose": "拼接",  # 帧缩放写入拼接画布并绘制叠加信息
+    "imshow": "显示",  # 拼接画布 cv2.imshow 调用耗时（不含窗口刷新），同一次显示的各相机相同
+    "total": "总延迟",  # 传感器时间戳 → 显示完成
+}
+BUCKET_BOUNDS = (1, 2, 3, 5, 8, 10, 15, 20, 30, 40, 50, 60, 80, 100, 150, 200, 300)  # 分桶上界（毫秒），最后一桶为溢出
+LATENCY_TARGET = 50  # 闭环抓取要求的总延迟上限（毫秒）
+
+_registry = {}
+_registry_lock = Lock()
+
+
+# 单个阶段的直方图
+class StageHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        idx = 0
+        while idx < len(BUCKET_BOUNDS) and ms > BUCKET_BOUNDS[idx]:
+            idx += 1
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):  # 按分桶上界估算百分位（毫秒）
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(BUCKET_BOUNDS[idx], self.max) if idx < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+# 单台设备的延迟统计
+class LatencyStats:
+    def __init__(self, name):
+        self.name = name
+        self.stages = {stage: StageHistogram() for stage in STAGES}
+
+    def record(self, stage, seconds):
+        self.stages[stage].record(seconds * 1000)
+
+    def as_dict(self):  # 各阶段统计（毫秒），用于 JSON 输出
+        return {stage: {"count": hist.count, "mean": round(hist.total / hist.count, 3), "p50": hist.percentile(50),
+                        "p95": hist.percentile(95), "p99": hist.percentile(99), "max": round(hist.max, 3)}
+                for stage, hist in self.stages.items() if hist.count}
+
+    def report(self, width=40):
+        """多行文本：每个阶段的平均值/百分位及直方图"""
+        lines = [f"===== {self.name} 延迟统计（毫秒）====="]
+        for stage in STAGES:
+            hist = self.stages[stage]
+            if not hist.count:
+                continue
+            p95 = hist.percentile(95)
+            line = (f"{STAGE_NAMES[stage]:<4} n={hist.count:<6} 平均 {hist.total / hist.count:7.2f}  "
+                    f"p50≤{hist.percentile(50):<6.4g} p95≤{p95:<6.4g} p99≤{hist.percentile(99):<6.4g} 最大 {hist.max:7.2f}")
+            if stage == "total" and p95 > LATENCY_TARGET:
+                line = f"\033[33m{line}  超过 {LATENCY_TARGET} ms\033[0m"
+            lines.append(line)
+            peak = max(hist.buckets)
+            lower = 0
+            for idx, n in enumerate(hist.buckets):
+                upper = f"{BUCKET_BOUNDS[idx]:g}" if idx < len(BUCKET_BOUNDS) else "∞"
+                if n:
+                    lines.append(f"    {lower:>5g} ~ {upper:<5} {'█' * max(1, n * width // peak)} {n}")
+                lower = BUCKET_BOUNDS[idx] if idx < len(BUCKET_BOUNDS) else lower
+        return "\n".join(lines)
+
+
+def get_latency(name):  # 获取（或创建）设备的延迟统计
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LatencyStats(name)
+        return _registry[name]
+
+
+def latency_report():  # 当前进程内所有设备的延迟报告
+    with _registry_lock:
+        stats = list(_registry.values())
+    return "\n".join(item.report() for item in stats)
+# ----------------------------------------------------------------------------------------------------------------------
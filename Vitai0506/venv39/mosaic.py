@@ -0,0 +1,147 @@
+# ====================================================== 模块声明 ======================================================
+# 拼接显示：全部相机画面拼接到一个窗口，取代每台相机一个 HighGUI 窗口
+# 画布按相机数量一次性分配，每台相机对应画布中的一格（NumPy 视图），新帧直接缩放写入格子（cv2.resize 的 dst），不逐帧分配内存
+# 格子左上角叠加设备名称、帧率与丢帧数；每个屏幕刷新周期最多调用一次 imshow，同一周期内到达的帧合并显示
+# ----------------------------------------------------------------------------------------------------------------------
+import math
+import time
+import cv2
+import numpy as np
+from latency import get_latency, latency_report
+
+MOSAIC_TITLE = "ViTai"  # 拼接窗口标题
+TILE_SIZE = (640, 480)  # 单格最大尺寸（宽, 高）
+MAX_CANVAS = (1920, 1080)  # 画布最大尺寸，相机较多时按比例缩小格子
+REFRESH_HZ = 60  # 显示刷新率，两次 imshow 之间至少间隔 1/REFRESH_HZ 秒
+FPS_WINDOW = 1.0  # 帧率统计窗口（秒）
+FONT = cv2.FONT_HERSHEY_SIMPLEX  # HighGUI 字体只支持 ASCII，叠加信息不使用中文
+
+
+# 单个格子的帧率统计
+class TileStats:
+    def __init__(self):
+        self.seq = 0  # 统计窗口起点的帧序号
+        self.start = time.monotonic()
+        self.count = 0  # 窗口内显示的帧数
+        self.fps = 0.0
+
+
+class Mosaic:
+    def __init__(self, title=MOSAIC_TITLE, tile_size=TILE_SIZE, max_size=MAX_CANVAS):
+        self.title = title
+        self.tile_size = tile_size
+        self.max_size = max_size
+        self.names = []  # 格子顺序
+        self.canvas = None
+        self.tiles = {}  # 名称 -> 画布中的格子视图
+        self.gray = {}  # 名称 -> 灰度帧缩放用的暂存区（预处理输出灰度时使用）
+        self.stats = {}  # 名称 -> TileStats
+        self.dirty = False  # 画布有未显示的变化
+        self.window = False  # 窗口是否已创建
+
+    def sync(self, names):
+        """相机集合变化时重新分配画布与格子；未变化时不做任何事"""
+        names = list(names)
+        if names == self.names:
+            return
+        self.names = names
+        if not names:  # 没有相机：窗口保留最后的画面，不再显示
+            self.canvas, self.tiles, self.dirty = None, {}, False
+            return
+        if not self.window:  # 有相机后才创建窗口，只创建一次
+            cv2.namedWindow(self.title, cv2.WINDOW_NORMAL)
+            self.window = True
+        count = len(names)
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+        width, height = self.tile_size
+        scale = min(1.0, self.max_size[0] / (columns * width), self.max_size[1] / (rows * height))
+        width, height = int(width * scale) & ~1, int(height * scale) & ~1
+        self.canvas = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        self.tiles, self.gray = {}, {}
+        for i, name in enumerate(names):
+            row, column = divmod(i, columns)
+            self.tiles[name] = self.canvas[row * height:(row + 1) * height, column * width:(column + 1) * width]
+            self._overlay(name, self.tiles[name], "waiting")
+        self.stats = {name: self.stats.get(name, TileStats()) for name in names}
+        cv2.resizeWindow(self.title, columns * width, rows * height)
+        self.dirty = True
+
+    def draw(self, name, frame, seq=None, dropped=0):
+        """把一帧写入对应格子并更新叠加信息；seq 为帧序号（用于计算帧率），dropped 为未显示即被覆盖的帧数"""
+        tile = self.tiles.get(name)
+        if tile is None or frame is None:
+            return
+        if frame.ndim == 2:  # 灰度帧：缩放到暂存区后转换为 BGR 写入格子
+            if frame.shape != tile.shape[:2]:
+                if name not in self.gray:
+                    self.gray[name] = np.empty(tile.shape[:2], dtype=np.uint8)
+                frame = cv2.resize(frame, (tile.shape[1], tile.shape[0]), dst=self.gray[name], interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=tile)
+        elif frame.shape == tile.shape:
+            np.copyto(tile, frame)
+        else:
+            cv2.resize(frame, (tile.shape[1], tile.shape[0]), dst=tile, interpolation=cv2.INTER_AREA)
+        stats = self.stats[name]
+        stats.count += 1
+        now = time.monotonic()
+        if now - stats.start >= FPS_WINDOW:
+            frames = seq - stats.seq if seq is not None and stats.seq else stats.count
+            stats.fps = frames / (now - stats.start)
+            stats.seq, stats.start, stats.count = seq or 0, now, 0
+        self._overlay(name, tile, f"{stats.fps:.1f} fps  drop {dropped}")
+        self.dirty = True
+
+    def _overlay(self, name, tile, info):  # 在格子左上角绘制设备名称与状态，底色保证在亮画面上可读
+        scale = max(0.4, tile.shape[1] / 1280)
+        line = int(24 * scale / 0.5)
+        cv2.rectangle(tile, (0, 0), (min(tile.shape[1] - 1, int(560 * scale)), 2 * line + 4), (0, 0, 0), -1)
+        cv2.putText(tile, name, (6, line - 4), FONT, scale, (255, 255, 255), 1, cv2.LINE_AA)
+        cv2.putText(tile, info, (6, 2 * line - 4), FONT, scale, (0, 255, 0), 1, cv2.LINE_AA)
+
+    def show(self):  # 整个画布只调用一次 imshow
+        cv2.imshow(self.title, self.canvas)
+        self.dirty = False
+
+
+def display_mosaic(frame_slots, title=MOSAIC_TITLE, refresh_hz=REFRESH_HZ):
+    """显示线程主循环：拼接全部槽位的最新帧，每个刷新周期最多显示一次；按 l 打印延迟统计，按 q 退出"""
+    mosaic = Mosaic(title)
+    interval = 1 / refresh_hz
+    next_show = 0.0
+    while True:
+        try:
+            frame_slots.wait(0.1)  # 任一相机有新帧时唤醒
+            delay = next_show - time.monotonic()
+            if delay > 0:  # 距上次显示不足一个刷新周期：等到下个周期，期间到达的帧一起显示
+                time.sleep(delay)
+            items = frame_slots.items()
+            mosaic.sync(name for name, _ in items)
+            shown_frames = []  # (延迟统计, 采集时间戳)
+            for name, slot in items:
+                latest = slot.take()  # 只取比上次更新的帧
+                if latest is None:
+                    continue
+                taken = time.monotonic()
+                mosaic.draw(name, latest[1], latest[0], slot.dropped)
+                latency = get_latency(name)
+                latency.record("queue", taken - latest[2])  # 放入槽位 → 取走
+                latency.record("compose", time.monotonic() - taken)
+                shown_frames.append((latency, latest[3]))
+            if mosaic.dirty:
+                shown = time.monotonic()
+                mosaic.show()
+                done = time.monotonic()
+                next_show = shown + interval
+                for latency, captured in shown_frames:
+                    latency.record("imshow", done - shown)
+                    latency.record("total", done - captured)  # 传感器时间戳 → 显示
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('l'): # 按下l键打印延迟统计
+                print(latency_report())
+            elif key == ord('q'): # 按下q键退出
+                break
+        except Exception as e:
+            print(f"显示异常: {str(e)}")
+    cv2.destroyAllWindows()
+# ----------------------------------------------------------------------------------------------------------------------
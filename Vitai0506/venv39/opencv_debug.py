@@ -2,19 +2,26 @@
 print("\n\033[93m【借助OpenCV调节摄像头参数，支持保存与重置，可实时预览】\033[0m")
 print("\033[91m【在采用OpenCV调试的过程中，存在部分参数无法设置，已放弃】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
 import cv2
 import json
 import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
 from queue import Queue, Empty
+from collections import deque
 from threading import Thread, Event, Lock
+from v4l2_ctrl import V4L2Device, parse_ctrl_id
+from v4l2_events import ControlEventListener, V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from mosaic import Mosaic
+from preprocess import Preprocessor
 
 # 全局配置
 MAX_FPS = 30 # 最大帧率
 CONFIG_FILE = "camera_params.json" # 配置文件路径，由于OpenCV支持有问题所以放弃，对此只是保留但是没有实际作用
+ECHO_LIMIT = 32 # 每个参数记录的待确认写入值上限
 
 # 定义队列用于传递帧数据
 frame_queue = Queue(maxsize=2)
@@ -145,6 +152,8 @@ class CameraController:
         self.exit_event = Event()
         self.lock = Lock()
         self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
 
     def initialize(self): # 初始化摄像头
         with self.lock:
@@ -152,10 +161,31 @@ class CameraController:
             if not self.cap.isOpened(): # 检查是否打开成功
                 return False
             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数（如自动曝光调整曝光时间）直接推送到界面，不再写后回读
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self): # 初始化参数
+    def cv_set(self, param_id, config, value): # 经 OpenCV 写入参数，返回 cap.set 的结果
+        # OpenCV 使用另一个文件描述符，写入会产生参数事件：只在值与缓存不同时登记回传，写入失败时撤销登记
+        # 值未变化或写入失败时驱动不发送事件，残留的登记会吞掉之后驱动自行调整到该值的事件
+        echoes = config.setdefault("echoes", deque(maxlen=ECHO_LIMIT))
+        expected = self.device.cached(param_id) != value
+        if expected:
+            echoes.append(value)
+        ret = False
+        try:
+            with self.lock: # 与采集线程的 cap.read() 互斥
+                ret = self.cap.set(config["cv_constant"], value)
+        finally:
+            if expected and not ret:
+                try:
+                    echoes.remove(value)
+                except ValueError:
+                    pass
+        return ret
+
+    def init_params(self): # 初始化参数，由控制界面的参数命令线程执行
         try:
             with open(CONFIG_FILE, 'r') as f: # 读取配置文件
                 saved_params = json.load(f).get(self.device_id, {})
@@ -166,37 +196,41 @@ class CameraController:
             value = saved_params.get(param_id, config["value"]) # 获取参数值
             if config["cv_constant"] is not None: # 使用 OpenCV 设置参数
                 try:
-                    ret = self.cap.set(config["cv_constant"], value) # 设置参数
+                    ret = self.cv_set(param_id, config, value) # 设置参数
                     if not ret:
                         print(f"{self.device_id} 参数 {config['chinese_name']} 初始化失败")
                 except Exception as e:
                     print(f"{self.device_id} 参数 {config['chinese_name']} 初始化错误: {str(e)}")
             elif param_id == "0x0098091a":  # 白平衡温度
-                try:
-                    device = f"/dev/video{self.index}"
-                    command = f"v4l2-ctl -d {device} --set-ctrl=white_balance_temperature={value}"
-                    subprocess.run(command, shell=True, check=True)
-                except subprocess.CalledProcessError as e:
-                    print(f"{self.device_id} 参数 {config['chinese_name']} 初始化错误: {e}")
+                ok, error = self.device.set_ctrl(param_id, value, "white_balance_temperature")
+                if not ok:
+                    print(f"{self.device_id} 参数 {config['chinese_name']} 初始化错误: {error}")
 
     def run(self): # 运行摄像头
+        preprocessor = Preprocessor((640, 480))  # 缩放结果写入预分配的轮换缓冲区，轮换深度大于帧队列长度
         while not self.exit_event.is_set(): # 循环读取摄像头
-            with self.lock:
-                if self.cap.isOpened():
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS: # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read()
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full(): # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480)) # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
+            remaining = 1 / MAX_FPS - (time.time() - self.last_frame_time)
+            if remaining > 0 and self.exit_event.wait(remaining): # 限制帧率，等待期间不持锁也不空转
+                break
+            with self.lock: # cap.read() 阻塞到驱动出帧，仅读取期间持锁
+                if not self.cap.isOpened():
+                    break
+                ret, frame = self.cap.read()
+            self.last_frame_time = time.time()
+            if ret and not frame_queue.full(): # 将帧放入队列
+                frame = preprocessor.apply(frame) # 缩放
+                frame_queue.put((self.device_id, frame), block=False)
 
 class CameraControlPro(tk.Toplevel): # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller # 摄像头控制器
+        self.applying = False # 是否正在按参数事件同步界面
+        camera_controller.on_ctrl_event = self.on_ctrl_event # 接收驱动侧参数变化
+        self.closing = False # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.device_id} 参数写入") # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.device_id} 参数命令") # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params) # 多台相机各自的命令线程并行初始化
         self.title(camera_controller.device_id) # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app) # 退出时关闭窗口
         self.row = 0
@@ -211,6 +245,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
 
     def create_controls(self): # 创建控件
         param_list = list(CameraConfig.PARAM_MAP.items()) # 参数列表
+        self.params_by_id = {parse_ctrl_id(param_id): config for param_id, config in param_list} # 参数 ID -> 参数配置
         for i in range(0, len(param_list), 3):
             for col in range(3):
                 if i + col < len(param_list):
@@ -223,6 +258,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
     def _create_control_widget(self, frame, config, param_id): # 创建控件
         range_default = ttk.Label(frame, text=f"范围: {config['range'][0]} ~ {config['range'][1]} | 默认: {config['value']}") # 范围
         range_default.pack(fill=tk.X)
+        config["range_label"] = range_default
 
         control_frame = ttk.Frame(frame) # 控件框架
         control_frame.pack(fill=tk.X, pady=2) # 控件框架
@@ -233,6 +269,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
             cb = ttk.Combobox(control_frame, textvariable=var, values=options) # 下拉框
             cb.pack(side=tk.LEFT, fill=tk.X, expand=True)
             config["var"] = var # 保存变量
+            config["widgets"] = [cb]
             cb.bind("<<ComboboxSelected>>", lambda e, c=config, pid=param_id: self.on_param_change(e, c, pid)) # 绑定下拉框事件
         else:
             var = tk.IntVar(value=config["value"]) # 滑块变量
@@ -241,6 +278,8 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
             config["var"] = var
+            config["scale"] = slider
+            config["widgets"] = [slider, entry]
             var.trace("w", lambda *args, c=config, pid=param_id: self.on_param_change(None, c, pid)) # 绑定滑块事件
 
         status_label = ttk.Label(frame, text="设置状态: 未设置", foreground="gray") # 设置状态
@@ -248,6 +287,8 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
         config["status_label"] = status_label
 
     def on_param_change(self, event, config, param_id): # 参数改变事件
+        if self.applying: # 按参数事件同步界面时不回写设备
+            return
         try:
             value = config["var"].get() # 获取参数值
             if config.get("options", ""):
@@ -264,6 +305,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
                 return
             config['old_value'] = value
 
+            auto_focus_on = False
             if param_id == "0x009a090a":  # 绝对焦点
                 auto_focus_config = CameraConfig.PARAM_MAP["0x009a090c"]  # 连续自动对焦参数
                 auto_focus_value = auto_focus_config["var"].get()
@@ -271,49 +313,8 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
                     auto_focus_val = auto_focus_config["options"].split("；").index(auto_focus_value)
                 else:
                     auto_focus_val = auto_focus_value
-                if auto_focus_val == 1:  # 若连续自动对焦开启
-                    device = f"/dev/video{self.camera_controller.index}"
-                    try:
-                        command = f"v4l2-ctl -d {device} --set-ctrl=focus_automatic_continuous=0"
-                        subprocess.run(command, shell=True, check=True)
-                        auto_focus_config["var"].set("关闭")
-                        print(f"{self.device_id} 已关闭连续自动对焦")
-                    except subprocess.CalledProcessError as e:
-                        print(f"{self.device_id} 关闭连续自动对焦失败，无法设置手动焦点")
-                        return
-
-            color = None  # 初始化 color 变量
-            if param_id == "0x0098091a":  # 白平衡温度
-                try:
-                    device = f"/dev/video{self.camera_controller.index}"
-                    command = f"v4l2-ctl -d {device} --set-ctrl=white_balance_temperature={value}"
-                    subprocess.run(command, shell=True, check=True)
-                    color = "green"
-                    status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 成功"
-                except subprocess.CalledProcessError as e:
-                    color = "red"
-                    status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，错误信息: {e}"
-            elif config["cv_constant"] is not None:
-                with self.camera_controller.lock:
-                    ret = self.camera_controller.cap.set(config["cv_constant"], value)
-                    current_value = self.camera_controller.cap.get(config["cv_constant"])
-                    ret = ret and (current_value == value)
-
-                color = "green" if ret else "red"
-                status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: {'成功' if ret else '失败'}"
-            else:
-                color = "red"
-                status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，不支持该参数设置"
-
-            print(f"\033[{32 if color == 'green' else 31}m{status_msg}\033[0m")
-            config["status_label"].config(text=f"设置状态: {'成功' if color == 'green' else '失败'}", foreground=color)
-            if color == "green":
-                if param_id != "0x0098091a":
-                    with self.camera_controller.lock:
-                        current_value = self.camera_controller.cap.get(config["cv_constant"])
-                    if current_value != value:
-                        print(
-                            f"{self.device_id} 参数 {config['chinese_name']} 设置后自动恢复，期望 {value}，实际 {current_value}")
+                auto_focus_on = auto_focus_val == 1
+            self.writer.submit(param_id, config, param_id, value, auto_focus_on) # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             color = "red"
             status_msg = f"{self.device_id} 参数错误: {str(ve)}"
@@ -325,6 +326,81 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
             print(f"\033[31m{status_msg}\033[0m")
             config["status_label"].config(text="设置状态: 出错", foreground=color)
 
+    def _write_param(self, config, param_id, value, auto_focus_on): # 在写入线程中执行，经命令线程写入，与重置保持顺序
+        return self.executor.submit(self._write_device, config, param_id, value, auto_focus_on).result()
+
+    def _write_device(self, config, param_id, value, auto_focus_on): # 在命令线程中执行，返回 (成功与否, 状态信息)
+        if auto_focus_on:  # 若连续自动对焦开启，先关闭
+            ok, _ = self.camera_controller.device.set_ctrl("0x009a090c", 0, "focus_automatic_continuous")
+            if not ok:
+                return False, f"{self.device_id} 关闭连续自动对焦失败，无法设置手动焦点"
+            self._call_ui(CameraConfig.PARAM_MAP["0x009a090c"]["var"].set, "关闭")
+            print(f"{self.device_id} 已关闭连续自动对焦")
+        if param_id == "0x0098091a":  # 白平衡温度
+            ok, error = self.camera_controller.device.set_ctrl(param_id, value, "white_balance_temperature")
+            if ok:
+                return True, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 成功"
+            return False, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，错误信息: {error}"
+        if config["cv_constant"] is not None:
+            ret = self.camera_controller.cv_set(param_id, config, value) # 只阻塞写入线程
+            return ret, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: {'成功' if ret else '失败'}"
+        return False, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，不支持该参数设置"
+
+    def _call_ui(self, func, *args): # 从其他线程转到界面线程执行
+        if self.closing: # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError): # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, status_msg): # 写入线程回调
+        self._call_ui(self._show_write_result, args[0], ok, status_msg)
+
+    def _show_write_result(self, config, ok, status_msg): # 显示写入结果
+        print(f"\033[{32 if ok else 31}m{status_msg}\033[0m")
+        config["status_label"].config(text=f"设置状态: {'成功' if ok else '失败'}", foreground="green" if ok else "red")
+
+    def on_ctrl_event(self, event): # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError): # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event): # 驱动侧参数变化同步到界面
+        config = self.params_by_id.get(event["id"])
+        if config is None or "var" not in config:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in config:
+            config["range"] = (event["min"], event["max"])
+            config["scale"].config(from_=event["min"], to=event["max"])
+            config["range_label"].config(text=f"范围: {event['min']} ~ {event['max']} | 默认: {config['value']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in config["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                config["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if not event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            return
+        value = event["value"]
+        echoes = config.get("echoes")
+        if echoes and value in echoes: # 本程序经 OpenCV 写入产生的事件
+            while echoes.popleft() != value:
+                pass
+            return
+        print(f"\033[33m{self.device_id} 参数 {config['chinese_name']} 被驱动调整为 {value}\033[0m")
+        config["old_value"] = value
+        self.applying = True
+        try:
+            if config.get("options", ""):
+                options = config["options"].split("；")
+                if 0 <= value < len(options):
+                    config["var"].set(options[value])
+            else:
+                config["var"].set(value)
+        finally:
+            self.applying = False
+
     def add_buttons(self): # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -332,40 +408,53 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
         ttk.Button(button_frame, text="保存(S)", command=self.save_params).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self): # 重置参数
-        for param_id, config in CameraConfig.PARAM_MAP.items():
-            if config["cv_constant"] is not None:
-                try:
-                    default_val = config["value"] # 默认值
+    def reset_params(self): # 重置参数：界面立即更新，写入由命令线程执行
+        items = [] # (参数配置, 参数 ID, 默认值)
+        self.applying = True # 同步界面期间不逐项触发写入
+        try:
+            for param_id, config in CameraConfig.PARAM_MAP.items():
+                if config["cv_constant"] is None and param_id != "0x0098091a":
+                    continue
+                default_val = config["value"] # 默认值
+                if config["cv_constant"] is not None:
                     if config.get("options", ""):
                         options = config["options"].split("；")
                         config["var"].set(options[default_val])
                     else:
                         config["var"].set(default_val) # 设置默认值
-                    with self.camera_controller.lock:
-                        ret = self.camera_controller.cap.set(config["cv_constant"], default_val) # 设置参数
-                        current_value = self.camera_controller.cap.get(config["cv_constant"]) # 验证设置是否成功
-                        ret = ret and (current_value == default_val)
-
-                    color = "green" if ret else "red"
-                    status_msg = f"{self.device_id} 重置 {config['chinese_name']} 成功"
-                    print(f"\033[{32 if color == 'green' else 31}m{status_msg}\033[0m")
-                    config["status_label"].config(text="设置状态: 成功", foreground=color)
-                except Exception as e:
-                    print(f"\033[31m{self.device_id} 重置出错: {str(e)}\033[0m")
-            elif param_id == "0x0098091a":  # 白平衡温度
-                try:
-                    device = f"/dev/video{self.camera_controller.index}"
-                    default_val = config["value"]
-                    command = f"v4l2-ctl -d {device} --set-ctrl=white_balance_temperature={default_val}"
-                    subprocess.run(command, shell=True, check=True)
-                    color = "green"
-                    status_msg = f"{self.device_id} 重置 {config['chinese_name']} 成功"
-                except subprocess.CalledProcessError as e:
-                    color = "red"
-                    status_msg = f"{self.device_id} 重置 {config['chinese_name']} 失败，错误信息: {e}"
-                print(f"\033[{32 if color == 'green' else 31}m{status_msg}\033[0m")
-                config["status_label"].config(text=f"设置状态: {'成功' if color == 'green' else '失败'}", foreground=color)
+                config["status_label"].config(text="设置状态: 应用中", foreground="gray")
+                items.append((config, param_id, default_val))
+        finally:
+            self.applying = False
+        future = self.executor.submit(self._reset_device, items)
+        future.add_done_callback(lambda future: self._call_ui(self._show_reset_result, future))
+        return future
+
+    def _reset_device(self, items): # 在命令线程中执行，返回 [(参数配置, 成功与否, 状态信息)]
+        results = []
+        for config, param_id, default_val in items:
+            if param_id == "0x0098091a":  # 白平衡温度
+                ok, error = self.camera_controller.device.set_ctrl(param_id, default_val, "white_balance_temperature")
+                if ok:
+                    results.append((config, True, f"{self.device_id} 重置 {config['chinese_name']} 成功"))
+                else:
+                    results.append((config, False, f"{self.device_id} 重置 {config['chinese_name']} 失败，错误信息: {error}"))
+                continue
+            try:
+                ret = self.camera_controller.cv_set(param_id, config, default_val) # 设置参数，实际值由参数事件推送
+                results.append((config, ret, f"{self.device_id} 重置 {config['chinese_name']} {'成功' if ret else '失败'}"))
+            except Exception as e:
+                results.append((config, False, f"{self.device_id} 重置出错: {str(e)}"))
+        return results
+
+    def _show_reset_result(self, future): # 显示重置结果
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"\033[31m{self.device_id} 重置出错: {str(e)}\033[0m")
+            return
+        for config, ok, status_msg in results:
+            self._show_write_result(config, ok, status_msg)
 
     def save_params(self): # 保存参数
         params_to_save = {}
@@ -386,54 +475,32 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
         print(f"{self.device_id} 参数已保存至 {CONFIG_FILE}")
 
     def exit_app(self):
+        self.closing = True
+        self.writer.close() # 写完已登记的参数
+        self.executor.close() # 执行完已提交的命令
         self.camera_controller.exit_event.set()
+        self.camera_controller.device.close()
         self.destroy()
 
-def list_cameras(): # 检测摄像头
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")] # 视频设备
+def list_cameras(): # 检测摄像头：读取 sysfs 与 VIDIOC_QUERYCAP，不启动子进程，过滤元数据节点
+    return [(node.index, node.device_id) for node in list_video_nodes(driver="uvcvideo")]
 
-    for device in video_devices: # 检测设备
-        try:
-            result = subprocess.run(
-                ["v4l2-ctl", "-d", device, "--all"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            output = result.stdout # 获取输出
-
-            if "Driver name      : uvcvideo" in output:
-                cap = cv2.VideoCapture(device)
-                if cap.isOpened():
-                    index = int(device.split('video')[1])
-                    try:
-                        cmd = ["udevadm", "info", "-q", "property", device]
-                        result = subprocess.run(cmd, capture_output=True, text=True)
-                        vid, pid = "N/A", "N/A"
-                        for line in result.stdout.splitlines():
-                            if line.startswith("ID_VENDOR_ID="):
-                                vid = line.split('=')[1].strip().upper()
-                            elif line.startswith("ID_MODEL_ID="):
-                                pid = line.split('=')[1].strip().upper()
-                        device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-                        available.append((index, device_id))
-                    except:
-                        available.append((index, "UNKNOWN"))
-                    cap.release()
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
-
-def display_frames():  # 显示帧
-    windows = {}
+def display_frames():  # 显示帧：全部相机拼接到一个窗口
+    mosaic = Mosaic()
+    names = []
     while True:
         try:
             device_id, frame = frame_queue.get(timeout=0.1) # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL) # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame)
+            while True:
+                if device_id not in names:  # 新相机：重新分配画布
+                    names.append(device_id)
+                    mosaic.sync(names)
+                mosaic.draw(device_id, frame)
+                try:
+                    device_id, frame = frame_queue.get_nowait()  # 队列中已有的帧一起显示
+                except Empty:
+                    break
+            mosaic.show()
             cv2.waitKey(1)
         except Empty:
             pass
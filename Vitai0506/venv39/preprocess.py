@@ -0,0 +1,152 @@
+# ====================================================== 模块声明 ======================================================
+# 帧预处理：裁剪（ROI）→ 缩放 → 颜色转换（RGB / 灰度），替代采集循环中逐帧分配新数组的 cv2.resize(frame, 尺寸)
+# 各步骤通过 OpenCV 的 dst 参数写入预分配缓冲区：每台相机一个 BufferPool，按 (步骤, 形状, 类型) 轮换复用，稳定运行后不再分配内存
+# 输出位于轮换缓冲区中，POOL_DEPTH 帧后被覆盖；显示槽位与队列只保留最近几帧，需要长期保留的使用方自行拷贝
+# BatchPreprocessor 对多台相机执行同一预处理，结果堆叠为一个 (相机数, 高, 宽[, 通道]) 数组，颜色转换对整个堆叠只调用一次
+# 规格字符串：crop=x:y:宽:高,size=宽x高,color=bgr|rgb|gray，各项可省略，例如 crop=320:0:1280:1080,size=640x480,color=gray
+# ----------------------------------------------------------------------------------------------------------------------
+import cv2
+import numpy as np
+from v4l2_capture import reduced_scale
+
+POOL_DEPTH = 4  # 每个步骤轮换的缓冲区数，与采集源的 output_buffers 一致
+COLOR_CODES = {  # 颜色转换 → (OpenCV 转换码, 输出通道数)；输入均为 BGR
+    "bgr": None,
+    "rgb": (cv2.COLOR_BGR2RGB, 3),
+    "gray": (cv2.COLOR_BGR2GRAY, 1),
+}
+
+
+def color_code(color):  # 颜色转换名称 → (转换码, 通道数)，保持 BGR 时为 None
+    if color is not None and color not in COLOR_CODES:
+        raise ValueError(f"未知的颜色转换 {color}，可选：{'、'.join(COLOR_CODES)}")
+    return COLOR_CODES[color] if color is not None else None
+
+
+def parse_preprocess(spec):
+    """解析预处理规格字符串，返回 {"roi": (x, y, 宽, 高), "size": (宽, 高), "color": 名称}，格式错误时抛出 ValueError"""
+    options = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        key, value = key.strip().lower(), value.strip().lower()
+        try:
+            if key in ("crop", "roi"):
+                x, y, width, height = (int(v) for v in value.split(":"))
+                if width <= 0 or height <= 0 or x < 0 or y < 0:
+                    raise ValueError
+                options["roi"] = (x, y, width, height)
+            elif key == "size":
+                width, height = (int(v) for v in value.split("x"))
+                if width <= 0 or height <= 0:
+                    raise ValueError
+                options["size"] = (width, height)
+            elif key == "color" and value in COLOR_CODES:
+                options["color"] = value
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"无效的预处理规格 {item}（格式：crop=x:y:宽:高,size=宽x高,color=bgr|rgb|gray）") from None
+    return options
+
+
+# 轮换复用的输出缓冲区，每台相机（每个 Preprocessor）一个
+class BufferPool:
+    def __init__(self, depth=POOL_DEPTH):
+        self.depth = depth
+        self.buffers = {}  # (步骤, 形状, 类型) -> [缓冲区列表, 下次使用的序号]
+
+    def get(self, stage, shape, dtype=np.uint8):
+        """取下一个缓冲区；不足 depth 个时分配新缓冲区，之后轮换复用，不再分配"""
+        key = (stage, tuple(shape), np.dtype(dtype).str)
+        entry = self.buffers.get(key)
+        if entry is None:
+            entry = self.buffers[key] = [[], 0]
+        buffers, index = entry
+        if len(buffers) < self.depth:
+            buffers.append(np.empty(shape, dtype))
+        entry[1] = index + 1
+        return buffers[index % len(buffers)]
+
+
+# 单台相机的预处理，在采集线程中调用
+class Preprocessor:
+    def __init__(self, size=None, roi=None, color=None, depth=POOL_DEPTH):
+        self.size = tuple(size) if size else None  # 输出尺寸 (宽, 高)，None 时保持裁剪后的尺寸
+        self.roi = tuple(roi) if roi else None  # 裁剪区域 (x, y, 宽, 高)，按全分辨率坐标
+        self.color = color_code(color)  # (转换码, 通道数)，None 时保持 BGR
+        self.pool = BufferPool(depth)
+
+    @property
+    def identity(self):  # 不做任何处理，输出即采集帧（此时帧输出可直接接收 MJPEG 压缩数据）
+        return self.size is None and self.roi is None and self.color is None
+
+    def decode_scale(self, cap):
+        """MJPEG 缩小解码倍数：裁剪区域缩小后仍不小于输出尺寸"""
+        scale = cap.decode_scale(self.size)  # 采集源不支持缩小解码时为 1
+        if scale > 1 and self.roi is not None:
+            scale = reduced_scale(self.roi[2], self.roi[3], self.size)
+        return scale
+
+    def apply(self, frame, scale=1, dst=None):
+        """预处理一帧 BGR 图像，scale 为解码时的缩小倍数（裁剪坐标随之缩小）；dst 为最后一步的输出位置，省略时使用轮换缓冲区"""
+        image = frame
+        if self.roi is not None:  # 裁剪只取视图，不拷贝
+            x, y, width, height = (v // scale for v in self.roi)
+            image = image[y:y + height, x:x + width]
+        if self.size is not None and image.shape[1::-1] != self.size:
+            last = self.color is None
+            shape = (self.size[1], self.size[0]) + image.shape[2:]
+            out = dst if last and dst is not None else self.pool.get("resize", shape, image.dtype)
+            shrink = image.shape[1] > self.size[0]  # 缩小用 INTER_AREA 避免混叠，放大用双线性
+            image = cv2.resize(image, self.size, dst=out, interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+        if self.color is not None and image.ndim == 3:
+            code, channels = self.color
+            shape = image.shape[:2] + ((channels,) if channels > 1 else ())
+            out = dst if dst is not None else self.pool.get("color", shape, image.dtype)
+            image = cv2.cvtColor(image, code, dst=out)
+        elif dst is not None and image is not dst:  # 只裁剪或尺寸已符合：拷贝到指定位置
+            np.copyto(dst, image)
+            image = dst
+        return image
+
+
+# 多台相机的批量预处理：同一规格，结果堆叠为一个数组
+class BatchPreprocessor:
+    def __init__(self, size, roi=None, color=None, depth=POOL_DEPTH):
+        if not size:
+            raise ValueError("批量预处理需要指定输出尺寸")
+        self.stage = Preprocessor(size, roi, depth=1)  # 逐台相机裁剪、缩放，直接写入堆叠数组的对应行
+        self.size = self.stage.size
+        self.color = color_code(color)
+        self.pool = BufferPool(depth)
+
+    def apply(self, frames, scales=None):
+        """frames 为各相机的 BGR 帧列表（尺寸可以不同），返回 (相机数, 高, 宽[, 通道]) 堆叠数组，位于轮换缓冲区中
+        相机数量变化时按新形状分配，数量不变时复用"""
+        width, height = self.size
+        stack = self.pool.get("stack", (len(frames), height, width, 3))
+        for i, frame in enumerate(frames):
+            self.stage.apply(frame, scales[i] if scales else 1, dst=stack[i])
+        if self.color is None:
+            return stack
+        code, channels = self.color
+        shape = (len(frames), height, width) + ((channels,) if channels > 1 else ())
+        out = self.pool.get("color", shape)
+        # 堆叠数组连续存放，按 (相机数 × 高, 宽) 的一张大图转换，整批只调用一次 cvtColor
+        cv2.cvtColor(stack.reshape(-1, width, 3), code, dst=out.reshape((-1, width) + shape[3:]))
+        return out
+
+    def gather(self, frame_slots):
+        """取各槽位的最新帧（不标记为已取走）批量预处理，返回 (名称列表, 帧序号列表, 堆叠数组)；没有帧时返回 None"""
+        names, seqs, frames = [], [], []
+        for name, slot in frame_slots.items():
+            latest = slot.peek()
+            if latest is None or latest[1] is None or latest[1].ndim != 3:
+                continue
+            names.append(name)
+            seqs.append(latest[0])
+            frames.append(latest[1])
+        if not frames:
+            return None
+        return names, seqs, self.apply(frames)
+# ----------------------------------------------------------------------------------------------------------------------
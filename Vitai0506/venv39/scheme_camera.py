@@ -0,0 +1,311 @@
+# ====================================================== 模块声明 ======================================================
+# 方案相机控制器：方案定义、参数定义结构与 CameraController，供 v4l2_test_scheme.py 与 headless_runner.py 共用
+# 只依赖 V4L2 采集与参数模块，不导入 Tk，也不调用 HighGUI；帧输出到 slot.put(帧, 时间戳)，槽位或帧输出由调用方提供
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from threading import Event, Lock
+from v4l2_ctrl import V4L2Device
+from v4l2_events import ControlEventListener
+from v4l2_capture import OpenCVCapture, V4L2_PIX_FMT_MJPEG, fourcc_to_str, throttle_interval
+from v4l2_modes import open_capture
+from latency import get_latency
+from preprocess import Preprocessor
+from frame_ring import FrameRingWriter
+
+MAX_FPS = 30  # 默认最大帧率
+PREVIEW_SIZE = (640, 480)  # 默认帧缩放尺寸
+PREPROCESS = {}  # 缩放之外的默认预处理：{"roi": (x, y, 宽, 高), "color": "rgb" / "gray"}，见 preprocess.py
+DEFAULT_SCHEME = "默认值"  # 导入时使用的初始方案
+
+# "方案"：[亮度,对比度,饱和度,色调,自动白平衡,伽马值,增益,电源频率,白平衡,清晰度,背光补偿,自动曝光,绝对曝光时间,动态帧率曝光,绝对对焦,连续自动对焦]
+# 下面提供4组方案仅参考，用户可以自行添加方案，也可以修改当前方案的数值
+SCHEMES = {
+    "默认值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 3, 20, 0, 68, 1],
+    "厂商值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 1, 20, 0, 68, 1],
+    "产品1": [-64, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
+    "产品2": [0, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
+}
+
+# 方案的采集需求：{"format": 像素格式, "size": (宽, 高), "fps": 帧率}，各项可省略；未列出的方案按帧缩放尺寸与最大帧率协商
+# 启动时选出满足需求且开销最小的原生模式（见 v4l2_modes.py），运行中切换方案只写入参数，不重新协商
+SCHEME_MODES = {
+    # "产品1": {"format": "MJPG", "size": (1280, 720), "fps": 30},
+}
+
+# 参数定义结构
+BASE_CAMERA_PARAMS = [
+    {
+        "chinese_name": "亮度",
+        "v4l2_param": "brightness",
+        "hex_numbers": "0x00980900",
+        "type": "int",
+        "min": -64,
+        "max": 64,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "对比度",
+        "v4l2_param": "contrast",
+        "hex_numbers": "0x00980901",
+        "type": "int",
+        "min": 0,
+        "max": 100,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "饱和度",
+        "v4l2_param": "saturation",
+        "hex_numbers": "0x00980902",
+        "type": "int",
+        "min": 0,
+        "max": 100,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "色调",
+        "v4l2_param": "hue",
+        "hex_numbers": "0x00980903",
+        "type": "int",
+        "min": -180,
+        "max": 180,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "自动白平衡",
+        "v4l2_param": "white_balance_automatic",
+        "hex_numbers": "0x0098090c",
+        "type": "bool",
+        "min": None,
+        "max": None,
+        "step": None,
+        "options": "0 表示关闭；1 表示开启",
+    },
+    {
+        "chinese_name": "伽马值",
+        "v4l2_param": "gamma",
+        "hex_numbers": "0x00980910",
+        "type": "int",
+        "min": 100,
+        "max": 500,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "增益",
+        "v4l2_param": "gain",
+        "hex_numbers": "0x00980913",
+        "type": "int",
+        "min": 1,
+        "max": 128,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "电源频率",
+        "v4l2_param": "power_line_frequency",
+        "hex_numbers": "0x00980918",
+        "type": "menu",
+        "min": 0,
+        "max": 2,
+        "step": None,
+        "options": "0 表示禁用；1 表示 50Hz；2 表示 60Hz",
+    },
+    {
+        "chinese_name": "白平衡温度",
+        "v4l2_param": "white_balance_temperature",
+        "hex_numbers": "0x0098091a",
+        "type": "int",
+        "min": 2800,
+        "max": 6500,
+        "step": 10,
+        "options": "",
+    },
+    {
+        "chinese_name": "清晰度",
+        "v4l2_param": "sharpness",
+        "hex_numbers": "0x0098091b",
+        "type": "int",
+        "min": 0,
+        "max": 100,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "背光补偿",
+        "v4l2_param": "backlight_compensation",
+        "hex_numbers": "0x0098091c",
+        "type": "int",
+        "min": 0,
+        "max": 2,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "自动曝光",
+        "v4l2_param": "auto_exposure",
+        "hex_numbers": "0x009a0901",
+        "type": "menu",
+        "min": 0,
+        "max": 3,
+        "step": None,
+        "options": "1 表示手动模式；3 表示光圈优先模式",
+    },
+    {
+        "chinese_name": "绝对曝光时间",
+        "v4l2_param": "exposure_time_absolute",
+        "hex_numbers": "0x009a0902",
+        "type": "int",
+        "min": 0,
+        "max": 10000,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "动态帧率曝光",
+        "v4l2_param": "exposure_dynamic_framerate",
+        "hex_numbers": "0x009a0903",
+        "type": "bool",
+        "min": None,
+        "max": None,
+        "step": None,
+        "options": "0 表示关闭；1 表示开启",
+    },
+    {
+        "chinese_name": "绝对对焦",
+        "v4l2_param": "focus_absolute",
+        "hex_numbers": "0x009a090a",
+        "type": "int",
+        "min": 0,
+        "max": 1023,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "连续自动对焦",
+        "v4l2_param": "focus_automatic_continuous",
+        "hex_numbers": "0x009a090c",
+        "type": "bool",
+        "min": None,
+        "max": None,
+        "step": None,
+        "options": "0 表示关闭；1 表示开启",
+    }
+]
+
+# 根据方案初始化参数
+def initialize_params_with_scheme(scheme):
+    for i, param in enumerate(BASE_CAMERA_PARAMS): # 初始化参数
+        param["default"] = scheme[i]
+        param["value"] = scheme[i]
+        param["setvalue"] = scheme[i]
+    return BASE_CAMERA_PARAMS
+
+# 初始化参数，使用方在创建控制器前可按所选方案重新初始化
+BASE_CAMERA_PARAMS = initialize_params_with_scheme(SCHEMES[DEFAULT_SCHEME])
+
+
+# 摄像头控制器：采集与参数读写，不依赖 Tk 与 HighGUI
+class CameraController: # 摄像头控制器
+    max_fps = MAX_FPS  # 最大帧率
+    shared_ring = False  # 是否把全分辨率帧发布到共享内存帧环，供其他进程读取
+    preview_size = PREVIEW_SIZE  # 帧缩放尺寸，None 时输出全分辨率帧
+    preprocess = PREPROCESS  # 裁剪与颜色转换，缩放尺寸取 preview_size
+    pixelformat = V4L2_PIX_FMT_MJPEG  # 优先协商的像素格式，驱动不支持时使用驱动调整后的格式
+    capture_mode = None  # 采集需求（格式见 SCHEME_MODES），None 时由 mode_request() 按帧缩放尺寸与最大帧率生成
+    frame_slots = None  # 最新帧槽位集合（FrameSlots），为 None 时由调用方设置 slot
+
+    def __init__(self, index, device_id):
+        self.cap = None
+        self.index = index
+        self.device_id = device_id
+        self.exit_event = Event()
+        self.lock = Lock()
+        self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.name = f"{device_id} video{index}"  # 窗口名称，同型号多台相机时保持唯一
+        self.slot = self.frame_slots.slot(self.name) if self.frame_slots is not None else None  # 最新帧槽位或帧输出
+        self.latency = get_latency(self.name)  # 各阶段延迟统计
+        self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS] # 摄像头参数
+
+    @classmethod
+    def base_request(cls):  # 类配置的采集需求：帧环与全分辨率输出不限制尺寸，取满足帧率的最大模式
+        if cls.capture_mode is not None:
+            return cls.capture_mode
+        size = None if cls.shared_ring else cls.preview_size
+        return {"format": fourcc_to_str(cls.pixelformat), "size": size, "fps": cls.max_fps}
+
+    def mode_request(self):  # 本台相机的采集需求，带宽规划可按相机覆盖 capture_mode
+        return self.capture_mode if self.capture_mode is not None else self.base_request()
+
+    def initialize(self):  # 初始化摄像头
+        with self.lock:
+            # 按需求协商原生模式后 mmap 零拷贝采集，与参数控制共用设备
+            self.cap = open_capture(self.device, self.device_id, self.mode_request(), self.name)
+            if self.cap is None:  # 原生采集不可用时回退 OpenCV
+                self.cap = OpenCVCapture(self.index)
+            if not self.cap.isOpened():  # 检查是否打开成功
+                return False # 打开失败
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数值、范围与非激活标志同步到缓存和界面
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
+            return True
+
+    def init_params(self):  # 初始化参数，由控制界面的参数命令线程执行
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items(): # 批量原子写入
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
+
+    def apply_values(self, values): # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        return self.device.apply_params(self.camera_params, values)  # 只写入与缓存值不同的参数
+
+    def run(self):  # 运行摄像头：由设备可读事件驱动，仅在出队期间持锁
+        frame_interval = self.cap.frame_interval  # 驱动报告的帧间隔
+        ring = FrameRingWriter(self.name, self.device_id, frame_interval=frame_interval) if self.shared_ring else None
+        min_interval = throttle_interval(frame_interval, self.max_fps)  # 驱动帧率高于 max_fps 时按时间戳丢帧
+        preprocessor = Preprocessor(self.preview_size, **self.preprocess)  # 输出写入本台相机预分配的轮换缓冲区
+        scale = preprocessor.decode_scale(self.cap) if ring is None else 1  # 帧环需要全分辨率帧
+        passthrough = preprocessor.identity and ring is None and getattr(self.slot, "accepts_encoded", False)
+        while not self.exit_event.is_set():  # 循环读取摄像头
+            if not self.cap.wait(0.5):  # 阻塞等待新帧，空闲时不占用 CPU
+                continue
+            with self.lock:  # 出队
+                try:
+                    frame = self.cap.grab_frame(timeout=0) if self.cap.isOpened() else None
+                except OSError:  # 设备已拔出
+                    break
+            if frame is None:
+                continue
+            with frame:  # 处理完毕后缓冲区归还驱动
+                if frame.timestamp - self.last_frame_time < min_interval:  # 丢弃的帧不解码
+                    continue
+                self.last_frame_time = frame.timestamp
+                self.latency.record("dequeue", frame.dequeued - frame.timestamp)  # 驱动写入 → 出队
+                if passthrough and frame.encoded is not None:  # 帧输出直接使用 MJPEG 压缩数据，不解码
+                    self.slot.put_encoded(frame.encoded, frame.timestamp)
+                    continue
+                bgr = frame.to_bgr(scale=scale)  # MJPEG 按缩小倍数解码
+                if bgr is None:  # MJPEG 数据损坏（如 USB 传输出错），丢弃该帧
+                    continue
+                decoded = time.monotonic()
+                self.latency.record("decode", decoded - frame.dequeued)
+                if not preprocessor.identity:
+                    image = preprocessor.apply(bgr, scale)  # 裁剪、缩放、颜色转换，不逐帧分配内存
+                    self.latency.record("preprocess", time.monotonic() - decoded)
+                else:
+                    image = bgr  # 全分辨率帧，写入采集源的轮换缓冲区，帧输出需在 put() 内处理完毕或自行拷贝
+                if ring is not None:  # 发布到共享内存帧环
+                    ring.publish(bgr, frame.sequence, frame.timestamp)
+            self.slot.put(image, frame.timestamp)  # 覆盖槽位中尚未显示的旧帧
+        with self.lock:
+            if self.cap.isOpened():
+                self.cap.release()
+        self.device.close()
+        if ring is not None:
+            ring.close()
+        print(f"{self.name}: 采集 {self.slot.seq} 帧，未显示即被覆盖 {self.slot.dropped} 帧")  # 丢帧统计
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,74 @@
+# ====================================================== 模块声明 ======================================================
+# 常驻 SN 解析进程（venv312/sn_daemon.py）的客户端：通过 Unix 套接字按行收发 JSON
+# 解析进程未运行时自动以 Python 3.12 启动并等待就绪，之后每次查询只需毫秒级
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import time
+import socket
+import subprocess
+
+SN_SOCKET = "/tmp/vitai_sn_resolver.sock"  # 与 sn_daemon.py 一致
+# venv312环境的Python解释器路径
+PYTHON_VENV312 = "/home/ur/Vitai0506/venv312/bin/python"
+# 常驻 SN 解析进程脚本路径
+SN_DAEMON = "/home/ur/Vitai0506/venv312/sn_daemon.py"
+START_TIMEOUT = 15  # 等待解析进程加载 SDK 的超时（秒）
+REQUEST_TIMEOUT = 10  # 单次请求超时，缓存失效时需等待 SDK 枚举设备（秒）
+
+
+def request(cmd, timeout=REQUEST_TIMEOUT, **args):
+    """发送一条命令并返回应答字典；连接失败时抛出 OSError"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(SN_SOCKET)
+        sock.sendall((json.dumps(dict(args, cmd=cmd)) + "\n").encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("SN 解析进程关闭了连接")
+            data += chunk
+    return json.loads(data)
+
+
+def start_daemon():  # 后台启动解析进程并等待就绪；解析进程提前退出（如 SDK 导入失败）时立即返回
+    try:
+        proc = subprocess.Popen([PYTHON_VENV312, SN_DAEMON], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)  # 脱离当前终端，调用方退出后继续常驻
+    except OSError as e:
+        print(f"启动 {SN_DAEMON} 失败：{e}")
+        return False
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            return request("ping", timeout=1).get("ok", False)
+        except (OSError, ValueError):
+            if proc.poll() is not None:  # 解析进程已退出，不再等待
+                print(f"{SN_DAEMON} 启动后退出（返回码 {proc.returncode}），请检查 venv312 环境与 SDK 路径")
+                return False
+            time.sleep(0.1)
+    return False
+
+
+def query(cmd, **args):
+    """查询解析进程，必要时先启动；不可用时返回 None"""
+    try:
+        return request(cmd, **args)
+    except (OSError, ValueError):
+        pass
+    if not start_daemon():
+        return None
+    try:
+        return request(cmd, **args)
+    except (OSError, ValueError) as e:
+        print(f"查询 SN 解析进程失败：{e}")
+        return None
+
+
+def get_sns():
+    """返回 {"sns": [SN...], "ports": {USB 总线路径: SN}}，解析进程不可用时返回 None"""
+    response = query("sns")
+    if not response or not response.get("ok"):
+        return None
+    return {"sns": response.get("sns", []), "ports": response.get("ports", {})}
+# ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,95 @@
+# ====================================================== 模块声明 ======================================================
+# 合成相机：接口与 scheme_camera.CameraController 一致，不打开任何设备，参数保存在内存中，按帧率生成测试画面
+# 画面亮度随 brightness 参数变化，可在没有相机的机器上验证无界面运行、参数接口与帧快照
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+import numpy as np
+from threading import Event, Lock
+from v4l2_ctrl import parse_ctrl_id
+from latency import get_latency
+from scheme_camera import BASE_CAMERA_PARAMS
+
+FRAME_SIZE = (640, 480)  # 合成画面尺寸（宽, 高）
+SYNTHETIC_INDEX_BASE = 1000  # 合成相机的设备序号起点，不与 /dev/videoN 冲突
+
+
+# 内存中的参数设备，接口与 V4L2Device 的参数读写部分一致
+class SyntheticDevice:
+    def __init__(self, params):
+        self.limits = {parse_ctrl_id(p["hex_numbers"]): (p["min"], p["max"]) for p in params}
+        self.values = {}  # 参数值缓存：参数 ID -> 当前值
+        self.lock = Lock()
+
+    def close(self):
+        pass
+
+    def cached(self, ctrl_id):
+        return self.values.get(parse_ctrl_id(ctrl_id))
+
+    def get_param(self, param):
+        return self.cached(param["hex_numbers"])
+
+    def set_param(self, param, value):
+        ctrl_id = parse_ctrl_id(param["hex_numbers"])
+        low, high = self.limits.get(ctrl_id, (None, None))
+        if low is not None and not (low <= int(value) <= high):
+            return False, "Numerical result out of range"
+        with self.lock:
+            self.values[ctrl_id] = int(value)
+        return True, ""
+
+    def apply_params(self, params, values):  # 与 V4L2Device.apply_params 一致：只写入变化的参数，返回 {索引: 错误信息}
+        errors = {}
+        for idx, (param, value) in enumerate(zip(params, values)):
+            if self.cached(param["hex_numbers"]) == int(value):
+                continue
+            ok, error = self.set_param(param, value)
+            if not ok:
+                errors[idx] = error
+        return errors
+
+
+# 合成相机：序号与名称不与真实设备冲突
+class SyntheticCamera:
+    max_fps = 30
+
+    def __init__(self, index, device_id="synthetic"):
+        self.index = index
+        self.device_id = device_id
+        self.exit_event = Event()
+        self.lock = Lock()
+        self.name = f"{device_id} video{index}"
+        self.slot = None  # 帧输出，由调用方设置
+        self.latency = get_latency(self.name)
+        self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS]
+        self.device = SyntheticDevice(self.camera_params)
+        self.on_ctrl_event = None
+
+    def initialize(self):
+        return True
+
+    def init_params(self):
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items():
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
+
+    def apply_values(self, values):
+        return self.device.apply_params(self.camera_params, values)
+
+    def run(self):  # 按帧率生成水平渐变画面，整体亮度跟随 brightness 参数
+        width, height = FRAME_SIZE
+        ramp = np.tile(np.linspace(0, 191, width, dtype=np.float32), (height, 1))
+        frame = np.empty((height, width, 3), np.uint8)
+        brightness = next(param for param in self.camera_params if param["v4l2_param"] == "brightness")
+        next_frame = time.monotonic()
+        while not self.exit_event.wait(max(0.0, next_frame - time.monotonic())):
+            next_frame += 1 / self.max_fps
+            timestamp = time.monotonic()
+            offset = (self.device.get_param(brightness) or 0) + 64  # brightness 范围 -64 ~ 64
+            np.clip(ramp + offset, 0, 255, out=frame[..., 0], casting="unsafe")
+            frame[..., 1] = frame[..., 0]
+            frame[..., 2] = frame[..., 0]
+            self.latency.record("decode", time.monotonic() - timestamp)
+            self.slot.put(frame, timestamp)
+        print(f"{self.name}: 生成 {self.slot.seq} 帧")
+# ----------------------------------------------------------------------------------------------------------------------
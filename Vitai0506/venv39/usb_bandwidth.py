@@ -0,0 +1,314 @@
+# ====================================================== 模块声明 ======================================================
+# USB 带宽规划：按 sysfs USB 拓扑（总线号 / 根集线器）把相机分组，估计每个候选采集模式占用的等时带宽，为每台相机选择模式使同一总线上的相机都能启动
+# UVC 驱动按相机申请的每微帧负载选择视频流接口的备用设置（alternate setting），并按该设置的端点容量整块保留带宽；同一总线的保留总量超过周期传输上限时 STREAMON 返回 ENOSPC
+# 端点容量来自 sysfs descriptors 中视频流接口各备用设置的等时端点；未压缩格式按帧大小 × 帧率估计，MJPEG 按压缩率估计，相机启动后以实际备用设置修正
+# 超出预算时逐步降级：先换 MJPEG 等带宽更低且仍满足需求的模式，再降低帧率，最后降低分辨率；仍放不下的相机不启动，每一步都记录原因
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+from v4l2_ctrl import V4L2Device
+from v4l2_capture import fourcc_to_str, V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_GREY
+from v4l2_modes import enum_modes, choose_mode, format_rank, FPS_TOLERANCE
+
+SYSFS_USB = "/sys/bus/usb/devices"
+BYTES_PER_PIXEL = {V4L2_PIX_FMT_YUYV: 2, V4L2_PIX_FMT_GREY: 1, V4L2_PIX_FMT_MJPEG: 2}  # MJPEG 按压缩前的 YUV422 计算
+MJPEG_RATIO = 0.25  # MJPEG 负载估计为未压缩的比例；多数相机按峰值码率申请，取偏保守的值
+PAYLOAD_HEADER = 12  # UVC 每个负载包的头部字节数
+# 周期传输（等时 + 中断）可占用的总线带宽（字节/秒），按根集线器速率（Mbit/s）：全速 90%，高速及以上 80%
+BUS_BUDGET = {
+    12: 12e6 / 8 * 0.9,
+    480: 480e6 / 8 * 0.8,
+    5000: 5e9 * 0.8 / 8 * 0.8,  # 8b/10b 编码
+    10000: 10e9 * 128 / 132 / 8 * 0.8,  # 128b/132b 编码
+}
+DEFAULT_SPEED = 480
+
+# 描述符类型与视频类代码
+USB_DT_INTERFACE = 4
+USB_DT_ENDPOINT = 5
+USB_DT_SS_ENDPOINT_COMP = 0x30
+USB_CLASS_VIDEO = 0x0E
+USB_SUBCLASS_VIDEOSTREAMING = 0x02
+
+# 降级原因，按代价从低到高
+STEP_REASONS = ("改用带宽更低的格式", "降低帧率", "降低分辨率")
+
+
+def _read_attr(path):
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _speed(value):  # sysfs speed 属性（如 "480"、"5000"、"1.5"）转为 Mbit/s
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_SPEED
+
+
+def bus_budget(speed):
+    """总线可用于周期传输的带宽（字节/秒）"""
+    for limit in sorted(BUS_BUDGET):
+        if speed <= limit:
+            return BUS_BUDGET[limit]
+    return BUS_BUDGET[max(BUS_BUDGET)]
+
+
+def streaming_alt_settings(usb_dir, speed):
+    """解析 USB 设备 descriptors，返回 {(接口号, 备用设置): 端点容量（字节/秒）}，只含视频流接口的等时输入端点"""
+    try:
+        with open(os.path.join(usb_dir, "descriptors"), "rb") as f:
+            data = f.read()
+    except (OSError, TypeError):
+        return {}
+    per_second = 8000 if speed >= 480 else 1000  # 高速及以上按微帧（125us）服务，全速按帧（1ms）
+    alts = {}
+    current = None  # 当前所在的视频流接口 (接口号, 备用设置)
+    pos = 0
+    while pos + 2 <= len(data):
+        length, dtype = data[pos], data[pos + 1]
+        if length < 2:
+            break
+        desc = data[pos:pos + length]
+        if dtype == USB_DT_INTERFACE and length >= 9:
+            current = (desc[2], desc[3]) if (desc[5], desc[6]) == (USB_CLASS_VIDEO, USB_SUBCLASS_VIDEOSTREAMING) else None
+        elif dtype == USB_DT_ENDPOINT and current is not None and length >= 7 and desc[3] & 0x03 == 1 and desc[2] & 0x80:
+            packet = desc[4] | (desc[5] << 8)
+            size, mult = packet & 0x7FF, (packet >> 11) & 0x03  # 高速端点每微帧可附加 1~2 次传输
+            interval = 2 ** (max(desc[6], 1) - 1)
+            alts[current] = size * (mult + 1) * per_second // interval
+        elif dtype == USB_DT_SS_ENDPOINT_COMP and current in alts and length >= 4:
+            alts[current] *= (desc[2] + 1) * ((desc[3] & 0x03) + 1)  # 超高速端点：突发数 × 倍数
+        pos += length
+    return alts
+
+
+def current_alt_setting(usb_dir):
+    """正在使用的视频流接口备用设置 (接口号, 备用设置)；未开始采集时为 None"""
+    if not usb_dir:
+        return None
+    for entry in os.listdir(usb_dir) if os.path.isdir(usb_dir) else []:
+        path = os.path.join(usb_dir, entry)
+        if ":" not in entry or _read_attr(os.path.join(path, "bInterfaceClass")) != "0e":
+            continue
+        if _read_attr(os.path.join(path, "bInterfaceSubClass")) != "02":
+            continue
+        alt = _read_attr(os.path.join(path, "bAlternateSetting"))
+        number = _read_attr(os.path.join(path, "bInterfaceNumber"))
+        if alt and number and alt.strip() != "0":
+            return int(number, 16), int(alt)
+    return None
+
+
+def payload_rate(mode):
+    """采集模式的估计负载（字节/秒），含 UVC 包头"""
+    rate = mode.width * mode.height * BYTES_PER_PIXEL.get(mode.pixelformat, 2) * (mode.fps or 30)
+    if mode.pixelformat == V4L2_PIX_FMT_MJPEG:
+        rate *= MJPEG_RATIO
+    return rate + PAYLOAD_HEADER * 8000
+
+
+def _fmt_rate(rate):
+    return f"{rate / 1e6:.1f} MB/s"
+
+
+# 单台相机：拓扑、端点容量与候选模式
+class CameraLink:
+    def __init__(self, node, modes, request):
+        self.node = node
+        self.index = node.index
+        self.name = f"{node.device_id} video{node.index}"
+        self.device_id = node.device_id
+        self.usb_dir = node.usb_dir
+        self.port = node.port
+        self.busnum = node.usb_attr("busnum") or "N/A"
+        self.speed = _speed(node.usb_attr("speed"))
+        self.alts = streaming_alt_settings(self.usb_dir, self.speed)
+        self.capacities = sorted(set(self.alts.values()))  # 各备用设置的端点容量，升序
+        self.modes = modes
+        self.request = request
+        self.observed = {}  # 实测的保留带宽：str(模式) -> 字节/秒
+
+    def reservation(self, mode):
+        """返回 (保留带宽, 来源)：实测值优先；否则取能容纳估计负载的最小备用设置"""
+        if str(mode) in self.observed:
+            return self.observed[str(mode)], "实测"
+        rate = payload_rate(mode)
+        for capacity in self.capacities:
+            if capacity >= rate:
+                return capacity, "估计"
+        return (self.capacities[-1] if self.capacities else rate), "估计"
+
+    def observe(self, mode):  # 采集开始后读取实际备用设置，修正该模式的保留带宽
+        alt = current_alt_setting(self.usb_dir)
+        if alt in self.alts:
+            self.observed[str(mode)] = self.alts[alt]
+        return self.observed.get(str(mode))
+
+    def level(self, mode):  # 相对需求的降级程度：0 满足需求，1 帧率不足，2 尺寸不足
+        size, fps = self.request.get("size"), self.request.get("fps")
+        if size and (mode.width < size[0] or mode.height < size[1]):
+            return 2
+        if fps and mode.interval and mode.fps < fps * FPS_TOLERANCE:
+            return 1
+        return 0
+
+    def rank(self, mode):
+        """降级候选的排序键：仍满足需求时与 choose_mode 相同取开销最小的，帧率不足时取帧率最高的，尺寸不足时取尺寸最大的"""
+        level = self.level(mode)
+        if level == 0:
+            return 0, mode.pixels, format_rank(mode, self.request), mode.fps
+        if level == 1:
+            return 1, -mode.fps, mode.pixels, format_rank(mode, self.request)
+        return 2, -mode.pixels, -mode.fps, format_rank(mode, self.request)
+
+    def ladder(self, current):
+        """比 current 保留带宽更低的候选模式，按 rank 排列"""
+        reserved = self.reservation(current)[0]
+        return sorted((m for m in self.modes if self.reservation(m)[0] < reserved), key=self.rank)
+
+
+# 一台相机的规划结果
+class Assignment:
+    def __init__(self, link, mode):
+        self.link = link
+        self.mode = mode  # None 表示带宽不足，不启动
+        self.steps = []  # 降级记录
+
+    @property
+    def reserved(self):
+        return self.link.reservation(self.mode)[0] if self.mode else 0
+
+    def capture_request(self):
+        """供 CameraController.capture_mode 使用的采集需求，精确对应所选模式"""
+        if self.mode is None:
+            return None
+        request = {"format": fourcc_to_str(self.mode.pixelformat), "size": (self.mode.width, self.mode.height)}
+        if self.mode.interval:
+            request["fps"] = self.mode.fps
+        return request
+
+    def as_dict(self):
+        reserved, source = self.link.reservation(self.mode) if self.mode else (0, "")
+        return {"index": self.link.index, "name": self.link.name, "bus": self.link.busnum, "port": self.link.port,
+                "speed": self.link.speed, "mode": str(self.mode) if self.mode else None,
+                "reserved": round(reserved), "source": source, "steps": list(self.steps)}
+
+
+# 带宽规划器：启动时整体规划，热插拔时在已启动相机不变的前提下为新相机选择模式
+class BandwidthPlanner:
+    def __init__(self):
+        self.assignments = {}  # 设备序号 -> Assignment
+        self.notes = []  # 规划说明
+
+    def bus_speed(self, busnum):  # 根集线器速率，如 usb1 为 480、usb2 为 5000
+        return _speed(_read_attr(os.path.join(SYSFS_USB, f"usb{busnum}", "speed")))
+
+    def bus_total(self, busnum):
+        return sum(a.reserved for a in self.assignments.values() if a.link.busnum == busnum)
+
+    def link(self, node, request):  # 枚举相机模式并读取拓扑；设备无法打开时返回 None
+        device = V4L2Device(node.index)
+        if not device.open():
+            return None
+        try:
+            modes = enum_modes(device, request)
+        finally:
+            device.close()
+        return CameraLink(node, modes, request) if modes else None
+
+    def plan(self, nodes, request):
+        """为全部相机规划模式，返回 {设备序号: Assignment}；request 为采集需求或按节点返回需求的函数"""
+        links = []
+        for node in nodes:
+            link = self.link(node, request(node) if callable(request) else request)
+            if link is None:
+                self.notes.append(f"video{node.index}：无法枚举采集模式，不参与规划")
+                continue
+            links.append(link)
+            self.assignments[link.index] = Assignment(link, choose_mode(link.modes, link.request))
+        for busnum in sorted({link.busnum for link in links}):
+            self._fit(busnum, [self.assignments[link.index] for link in links if link.busnum == busnum])
+        return {link.index: self.assignments[link.index] for link in links}
+
+    def add(self, node, request):
+        """热插拔接入：已启动的相机保持不变，只为新相机选择模式；无法枚举时返回 None"""
+        link = self.link(node, request)
+        if link is None:
+            return None
+        assignment = Assignment(link, choose_mode(link.modes, link.request))
+        self.assignments[link.index] = assignment
+        self._fit(link.busnum, [assignment])
+        return assignment
+
+    def remove(self, index):  # 相机拔出，释放其带宽
+        self.assignments.pop(index, None)
+
+    def observe(self, index):  # 相机开始采集后以实际备用设置修正保留带宽
+        assignment = self.assignments.get(index)
+        if assignment is not None and assignment.mode is not None:
+            return assignment.link.observe(assignment.mode)
+        return None
+
+    def _fit(self, busnum, movable):
+        """逐步降级 movable 中的相机，直到总线保留带宽不超过预算；仍超出时从最后接入的相机开始不启动"""
+        if busnum == "N/A":  # 非 USB 相机不占用 USB 带宽
+            return
+        budget = bus_budget(self.bus_speed(busnum))
+        while self.bus_total(busnum) > budget:
+            best = None  # (降级程度, -当前保留带宽, 相机, 下一模式)
+            for assignment in movable:
+                if assignment.mode is None:
+                    continue
+                ladder = assignment.link.ladder(assignment.mode)
+                if ladder:
+                    key = (assignment.link.level(ladder[0]), -assignment.reserved)
+                    if best is None or key < best[0]:
+                        best = (key, assignment, ladder[0])
+            if best is None:
+                break
+            _, assignment, mode = best
+            self._step(assignment, mode, budget)
+        while self.bus_total(busnum) > budget:
+            active = [a for a in movable if a.mode is not None]
+            if not active:
+                break
+            assignment = max(active, key=lambda a: a.link.index)
+            assignment.steps.append(f"最低带宽模式 {assignment.mode} 仍需 {_fmt_rate(assignment.reserved)}，总线 {busnum} 预算 {_fmt_rate(budget)} 不足，不启动")
+            assignment.mode = None
+
+    def _step(self, assignment, mode, budget):
+        old, old_reserved = assignment.mode, assignment.reserved
+        level = assignment.link.level(mode)
+        if level == 0:
+            reason = STEP_REASONS[0] if mode.pixelformat != old.pixelformat else "改用带宽更低的模式"
+        else:
+            reason = STEP_REASONS[level]
+        assignment.mode = mode
+        assignment.steps.append(f"{old} → {mode}：{reason}（{_fmt_rate(old_reserved)} → {_fmt_rate(assignment.reserved)}，"
+                                f"总线 {assignment.link.busnum} 预算 {_fmt_rate(budget)}）")
+
+    def explain(self):
+        """按总线输出规划说明（字符串列表）"""
+        lines = []
+        for busnum in sorted({a.link.busnum for a in self.assignments.values()}):
+            speed = self.bus_speed(busnum)
+            budget = bus_budget(speed)
+            total = self.bus_total(busnum)
+            lines.append(f"总线 {busnum}（usb{busnum}，{speed:g}M）：预计保留 {_fmt_rate(total)} / 预算 {_fmt_rate(budget)}")
+            for index in sorted(self.assignments):
+                assignment = self.assignments[index]
+                link = assignment.link
+                if link.busnum != busnum:
+                    continue
+                if assignment.mode is None:
+                    lines.append(f"  {link.name}（端口 {link.port}，{link.speed:g}M）：不启动")
+                else:
+                    reserved, source = link.reservation(assignment.mode)
+                    lines.append(f"  {link.name}（端口 {link.port}，{link.speed:g}M）：{assignment.mode}，保留 {_fmt_rate(reserved)}（{source}）")
+                for step in assignment.steps:
+                    lines.append(f"    - {step}")
+        return lines + self.notes
+# ----------------------------------------------------------------------------------------------------------------------
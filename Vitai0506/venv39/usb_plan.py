@@ -0,0 +1,48 @@
+# ====================================================== 程序声明 ======================================================
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【USB 带宽规划程序：按 USB 总线分组已接入的相机，估计各采集模式的等时带宽，给出每台相机的模式与原因】\033[0m\n", file=BANNER_OUT)
+# ----------------------------------------------------------------------------------------------------------------------
+from contextlib import redirect_stdout
+from v4l2_enum import list_video_nodes
+from usb_bandwidth import BandwidthPlanner, bus_budget
+from json_output import NDJSONWriter, json_mode
+
+# 每台相机的采集需求，与预览工具一致；格式见 v4l2_modes.py
+REQUEST = {"format": "MJPG", "size": (640, 480), "fps": 30}
+
+
+def main():
+    nodes = list_video_nodes()
+    if not nodes:
+        print("未检测到摄像头设备")
+        return
+    planner = BandwidthPlanner()
+    assignments = planner.plan(nodes, REQUEST)
+    for line in planner.explain():
+        print(line)
+    running = sum(1 for a in assignments.values() if a.mode is not None)
+    print(f"\n需求 {REQUEST}：{len(assignments)} 台相机中可同时运行 {running} 台")
+
+
+def main_json():
+    """--json：每台相机输出一条 camera 记录，每条总线输出一条 bus 记录，最后输出 summary 记录"""
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):
+        planner = BandwidthPlanner()
+        assignments = planner.plan(list_video_nodes(), REQUEST)
+        for index in sorted(assignments):
+            writer.emit("camera", **assignments[index].as_dict())
+        for busnum in sorted({a.link.busnum for a in assignments.values()}):
+            speed = planner.bus_speed(busnum)
+            writer.emit("bus", bus=busnum, speed=speed, budget=round(bus_budget(speed)), reserved=round(planner.bus_total(busnum)))
+        writer.emit("summary", cameras=len(assignments), running=sum(1 for a in assignments.values() if a.mode is not None),
+                    notes=planner.notes)
+
+
+if __name__ == '__main__':
+    if json_mode():
+        main_json()
+    else:
+        main()
+# ----------------------------------------------------------------------------------------------------------------------
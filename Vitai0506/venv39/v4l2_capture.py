@@ -0,0 +1,516 @@
+# ====================================================== 模块声明 ======================================================
+# V4L2 mmap 流式采集模块：基于 VIDIOC_REQBUFS/QBUF/DQBUF 的零拷贝采集引擎
+# 驱动缓冲区通过 mmap 映射后以 NumPy 视图交给调用方，只有调用方需要时才转换/拷贝
+# 提供与 cv2.VideoCapture 相同的 isOpened/read/release 接口，可直接替换控制器中的采集源
+# wait() 通过 select 等待设备可读，采集线程空闲时阻塞而不占用 CPU；帧间隔可通过 VIDIOC_S_PARM 指定，实际值取自 VIDIOC_G_PARM
+# MJPEG 帧以压缩数据在管线中传递（V4L2Frame.encoded），只有调用 to_bgr() 时才解码，预览可按 1/2、1/4、1/8 缩小解码
+# ----------------------------------------------------------------------------------------------------------------------
+import mmap
+import time
+import errno
+import select
+import ctypes
+import cv2
+import numpy as np
+from v4l2_ctrl import _IOW, _IOWR
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_MEMORY_MMAP = 1
+V4L2_FIELD_ANY = 0
+V4L2_BUF_FLAG_TIMESTAMP_MASK = 0xe000
+V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC = 0x2000
+
+
+def fourcc(code):  # 像素格式四字符码
+    return ord(code[0]) | (ord(code[1]) << 8) | (ord(code[2]) << 16) | (ord(code[3]) << 24)
+
+
+def fourcc_to_str(value):
+    return "".join(chr((value >> shift) & 0xFF) for shift in (0, 8, 16, 24))
+
+
+V4L2_PIX_FMT_YUYV = fourcc("YUYV")
+V4L2_PIX_FMT_MJPEG = fourcc("MJPG")
+V4L2_PIX_FMT_GREY = fourcc("GREY")
+
+SUPPORTED_PIX_FMTS = (V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_GREY)
+REDUCED_SCALES = (8, 4, 2)  # libjpeg DCT 缩放解码支持的缩小倍数
+JPEG_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def reduced_scale(width, height, size):
+    """解码后仍不小于目标尺寸 size=(宽, 高) 的最大缩小倍数（1、2、4、8）"""
+    if not size or not width or not height:
+        return 1
+    for scale in REDUCED_SCALES:
+        if width // scale >= size[0] and height // scale >= size[1]:
+            return scale
+    return 1
+
+
+def decode_jpeg(data, scale=1):  # 解码 JPEG，scale 为 2/4/8 时由 libjpeg 在 DCT 阶段直接缩小，解码耗时随之下降
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), JPEG_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR))
+
+
+def throttle_interval(frame_interval, max_fps):
+    """按时间戳丢帧的最小间隔：驱动帧间隔已知且短于 1/max_fps 时丢帧，留半个帧间隔的余量吸收时间戳抖动；
+    帧间隔未知（0，如 OpenCV 回退）时不丢帧，避免正常抖动的帧被当作过早而丢弃"""
+    if 0 < frame_interval < 1 / max_fps:
+        return 1 / max_fps - frame_interval / 2
+    return 0
+
+
+class v4l2_pix_format(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("pixelformat", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("bytesperline", ctypes.c_uint32),
+        ("sizeimage", ctypes.c_uint32),
+        ("colorspace", ctypes.c_uint32),
+        ("priv", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("ycbcr_enc", ctypes.c_uint32),
+        ("quantization", ctypes.c_uint32),
+        ("xfer_func", ctypes.c_uint32),
+    ]
+
+
+class v4l2_format_fmt(ctypes.Union):
+    _fields_ = [
+        ("pix", v4l2_pix_format),
+        ("raw_data", ctypes.c_uint8 * 200),
+        ("_align", ctypes.c_void_p),  # 内核联合体含指针成员，按指针对齐
+    ]
+
+
+class v4l2_format(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("fmt", v4l2_format_fmt),
+    ]
+
+
+class v4l2_requestbuffers(ctypes.Structure):
+    _fields_ = [
+        ("count", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("flags", ctypes.c_uint8),
+        ("reserved", ctypes.c_uint8 * 3),
+    ]
+
+
+class timeval(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_usec", ctypes.c_long),
+    ]
+
+
+class v4l2_timecode(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("frames", ctypes.c_uint8),
+        ("seconds", ctypes.c_uint8),
+        ("minutes", ctypes.c_uint8),
+        ("hours", ctypes.c_uint8),
+        ("userbits", ctypes.c_uint8 * 4),
+    ]
+
+
+class v4l2_buffer_m(ctypes.Union):
+    _fields_ = [
+        ("offset", ctypes.c_uint32),
+        ("userptr", ctypes.c_ulong),
+        ("planes", ctypes.c_void_p),
+        ("fd", ctypes.c_int32),
+    ]
+
+
+class v4l2_buffer(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("bytesused", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("timestamp", timeval),
+        ("timecode", v4l2_timecode),
+        ("sequence", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("m", v4l2_buffer_m),
+        ("length", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+    ]
+
+
+class v4l2_fract(ctypes.Structure):
+    _fields_ = [
+        ("numerator", ctypes.c_uint32),
+        ("denominator", ctypes.c_uint32),
+    ]
+
+
+class v4l2_captureparm(ctypes.Structure):
+    _fields_ = [
+        ("capability", ctypes.c_uint32),
+        ("capturemode", ctypes.c_uint32),
+        ("timeperframe", v4l2_fract),
+        ("extendedmode", ctypes.c_uint32),
+        ("readbuffers", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 4),
+    ]
+
+
+class v4l2_streamparm_parm(ctypes.Union):
+    _fields_ = [
+        ("capture", v4l2_captureparm),
+        ("raw_data", ctypes.c_uint8 * 200),
+    ]
+
+
+class v4l2_streamparm(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("parm", v4l2_streamparm_parm),
+    ]
+
+
+VIDIOC_G_FMT = _IOWR(4, v4l2_format)
+VIDIOC_S_FMT = _IOWR(5, v4l2_format)
+VIDIOC_REQBUFS = _IOWR(8, v4l2_requestbuffers)
+VIDIOC_QUERYBUF = _IOWR(9, v4l2_buffer)
+VIDIOC_QBUF = _IOWR(15, v4l2_buffer)
+VIDIOC_DQBUF = _IOWR(17, v4l2_buffer)
+VIDIOC_STREAMON = _IOW(18, ctypes.c_int)
+VIDIOC_STREAMOFF = _IOW(19, ctypes.c_int)
+VIDIOC_G_PARM = _IOWR(21, v4l2_streamparm)
+VIDIOC_S_PARM = _IOWR(22, v4l2_streamparm)
+
+
+# 采集帧：驱动缓冲区的零拷贝视图
+class V4L2Frame:
+    def __init__(self, capture, index, bytesused, sequence, timestamp, dequeued):
+        self.capture = capture
+        self.index = index  # 驱动缓冲区序号
+        self.bytesused = bytesused
+        self.sequence = sequence  # 驱动帧序号
+        self.timestamp = timestamp  # 驱动写入缓冲区的时间（CLOCK_MONOTONIC 秒）
+        self.dequeued = dequeued  # 用户态出队时间（CLOCK_MONOTONIC 秒）
+        self.released = False
+
+    @property
+    def data(self):
+        """只读 NumPy 视图，直接指向 mmap 缓冲区；release() 之后内容会被驱动覆盖"""
+        return self.capture.view(self.index, self.bytesused)
+
+    @property
+    def encoded(self):
+        """MJPEG 帧的压缩数据（只读视图，不解码），其他像素格式为 None；release() 之后失效"""
+        return self.data if self.capture.pixelformat == V4L2_PIX_FMT_MJPEG else None
+
+    def to_bgr(self, dst=None, scale=1):  # 转换为 BGR，未传入 dst 时写入采集源的轮换缓冲区；scale 为缩小倍数
+        return self.capture.convert(self.index, self.bytesused, dst, scale)
+
+    def copy(self):  # 显式拷贝原始数据
+        return np.array(self.data)
+
+    def release(self):  # 将缓冲区归还驱动
+        if not self.released:
+            self.released = True
+            try:
+                self.capture.queue_buffer(self.index)
+            except OSError:  # 采集已停止，缓冲区无需归还
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# mmap 采集引擎
+class V4L2Capture:
+    def __init__(self, device, width=None, height=None, pixelformat=None, interval=None, buffer_count=4, output_buffers=4):
+        self.device = device  # 共享 V4L2Device 的文件描述符，参数控制与采集复用同一次打开
+        self.width = width
+        self.height = height
+        self.pixelformat = pixelformat
+        self.interval = interval  # 请求的帧间隔 (分子, 分母) 秒，None 时使用驱动当前值
+        self.bytesperline = 0
+        self.buffer_count = buffer_count
+        self.buffers = []  # mmap 缓冲区
+        self.streaming = False
+        self.frame_interval = 0  # 驱动报告的帧间隔（秒），未知为 0
+        self.output_buffers = output_buffers  # read() 轮换使用的 BGR 输出缓冲区数量
+        self._outputs = []
+        self._output_idx = 0
+
+    def open(self):
+        """设置格式、申请并映射缓冲区、开始采集；任一步失败返回 False"""
+        if not self.device.open():
+            return False
+        try:
+            self._set_format()
+            if self.interval:
+                self._set_frame_interval(*self.interval)
+            self._request_buffers()
+            for index in range(len(self.buffers)):
+                self.queue_buffer(index)
+            self.device.ioctl(VIDIOC_STREAMON, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+            self.streaming = True
+            self.frame_interval = self._get_frame_interval()
+            return True
+        except (OSError, ValueError) as e:
+            if getattr(e, "errno", None) == errno.ENOSPC:  # UVC 驱动无法保留所需的等时带宽
+                print(f"\033[33m警告：{self.device.path} 所在 USB 总线带宽不足，同一主控制器上的相机过多，可运行 usb_plan.py 查看带宽规划\033[0m")
+            else:
+                print(f"\033[33m警告：{self.device.path} mmap 采集初始化失败（{e}）\033[0m")
+            self.release()
+            return False
+
+    def _set_format(self):  # 协商像素格式与分辨率
+        fmt = v4l2_format(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        self.device.ioctl(VIDIOC_G_FMT, fmt)
+        pix = fmt.fmt.pix
+        changed = False
+        if self.pixelformat and pix.pixelformat != self.pixelformat:
+            pix.pixelformat = self.pixelformat
+            changed = True
+        elif pix.pixelformat not in SUPPORTED_PIX_FMTS:
+            pix.pixelformat = V4L2_PIX_FMT_YUYV
+            changed = True
+        if self.width and self.height and (pix.width, pix.height) != (self.width, self.height):
+            pix.width, pix.height = self.width, self.height
+            changed = True
+        if changed:
+            pix.field = V4L2_FIELD_ANY
+            self.device.ioctl(VIDIOC_S_FMT, fmt)  # 驱动可能调整为最接近的模式
+        if pix.pixelformat not in SUPPORTED_PIX_FMTS:
+            raise ValueError(f"不支持的像素格式 {fourcc_to_str(pix.pixelformat)}")
+        self.width, self.height = pix.width, pix.height
+        self.pixelformat = pix.pixelformat
+        self.bytesperline = pix.bytesperline
+
+    def _set_frame_interval(self, numerator, denominator):  # 通过 VIDIOC_S_PARM 设置帧间隔，驱动不支持时保持原帧率
+        parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        parm.parm.capture.timeperframe.numerator = numerator
+        parm.parm.capture.timeperframe.denominator = denominator
+        try:
+            self.device.ioctl(VIDIOC_S_PARM, parm)
+        except OSError:
+            pass
+
+    def _get_frame_interval(self):  # 通过 VIDIOC_G_PARM 读取驱动帧间隔
+        parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        try:
+            self.device.ioctl(VIDIOC_G_PARM, parm)
+        except OSError:
+            return 0
+        tpf = parm.parm.capture.timeperframe
+        return tpf.numerator / tpf.denominator if tpf.denominator else 0
+
+    def _request_buffers(self):  # 申请并映射驱动缓冲区
+        req = v4l2_requestbuffers(count=self.buffer_count, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self.device.ioctl(VIDIOC_REQBUFS, req)
+        if req.count < 2:
+            raise ValueError("驱动缓冲区不足")
+        for index in range(req.count):
+            buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+            self.device.ioctl(VIDIOC_QUERYBUF, buf)
+            self.buffers.append(mmap.mmap(self.device.fd, buf.length, mmap.MAP_SHARED, mmap.PROT_READ, offset=buf.m.offset))
+
+    def queue_buffer(self, index):  # 缓冲区入队
+        buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self.device.ioctl(VIDIOC_QBUF, buf)
+
+    def _dequeue_buffer(self):  # 缓冲区出队，无可用帧时返回 None
+        buf = v4l2_buffer(type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        try:
+            self.device.ioctl(VIDIOC_DQBUF, buf)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return None
+            raise
+        dequeued = time.monotonic()
+        if buf.flags & V4L2_BUF_FLAG_TIMESTAMP_MASK == V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC:
+            timestamp = buf.timestamp.tv_sec + buf.timestamp.tv_usec / 1e6  # 与 time.monotonic() 同一时钟
+        else:  # 驱动时间戳无法与本机单调时钟比较时退化为出队时间
+            timestamp = dequeued
+        return V4L2Frame(self, buf.index, buf.bytesused, buf.sequence, timestamp, dequeued)
+
+    def fileno(self):
+        return self.device.fd
+
+    def wait(self, timeout):
+        """阻塞等待设备可读（有新帧），无需持锁；超时或已停止返回 False"""
+        if not self.streaming:
+            time.sleep(timeout)
+            return False
+        try:
+            readable, _, _ = select.select([self.device.fd], [], [], timeout)
+        except (OSError, ValueError, TypeError):  # 设备已在其他线程关闭
+            return False
+        return bool(readable)
+
+    def grab_frame(self, timeout=1.0):
+        """等待并取出最新一帧（较旧的已就绪帧直接归还驱动），超时返回 None"""
+        if not self.wait(timeout):
+            return None
+        frame = None
+        while True:  # 取尽已就绪的帧，只保留最新一帧，降低延迟
+            newer = self._dequeue_buffer()
+            if newer is None:
+                return frame
+            if frame is not None:
+                frame.release()
+            frame = newer
+
+    def view(self, index, bytesused):  # 缓冲区的只读 NumPy 视图
+        data = np.frombuffer(self.buffers[index], dtype=np.uint8, count=bytesused)
+        if self.pixelformat == V4L2_PIX_FMT_YUYV and self.bytesperline == self.width * 2:
+            return data.reshape(self.height, self.width, 2)
+        if self.pixelformat == V4L2_PIX_FMT_GREY and self.bytesperline == self.width:
+            return data.reshape(self.height, self.width)
+        return data
+
+    def decode_scale(self, size):  # 输出尺寸 size 对应的缩小解码倍数
+        return reduced_scale(self.width, self.height, size)
+
+    def convert(self, index, bytesused, dst=None, scale=1):  # 转换为 BGR，scale > 1 时输出缩小后的图像
+        data = self.view(index, bytesused)
+        if self.pixelformat == V4L2_PIX_FMT_MJPEG:
+            return decode_jpeg(data, scale)
+        if scale > 1 and data.ndim > 1:  # 未压缩格式按行抽取后转换，只转换 1/scale 的行
+            code = cv2.COLOR_GRAY2BGR if self.pixelformat == V4L2_PIX_FMT_GREY else cv2.COLOR_YUV2BGR_YUYV
+            return np.ascontiguousarray(cv2.cvtColor(data[::scale], code)[:, ::scale])
+        if dst is None:
+            dst = self._next_output()
+        if self.pixelformat == V4L2_PIX_FMT_GREY:
+            return cv2.cvtColor(data, cv2.COLOR_GRAY2BGR, dst=dst)
+        return cv2.cvtColor(data, cv2.COLOR_YUV2BGR_YUYV, dst=dst)
+
+    def _next_output(self):  # 轮换使用预分配的 BGR 缓冲区，避免每帧分配
+        if len(self._outputs) < self.output_buffers:
+            self._outputs.append(np.empty((self.height, self.width, 3), dtype=np.uint8))
+        dst = self._outputs[self._output_idx % len(self._outputs)]
+        self._output_idx += 1
+        return dst
+
+    # ---------------- cv2.VideoCapture 兼容接口 ----------------
+    def isOpened(self):
+        return self.streaming
+
+    def read(self):
+        """返回 (ret, BGR 图像)；图像位于轮换缓冲区中，output_buffers 次读取后会被覆盖"""
+        frame = self.grab_frame()
+        if frame is None:
+            return False, None
+        with frame:
+            return True, frame.to_bgr()
+
+    def set(self, prop_id, value):  # 采集参数在 open() 前通过构造参数指定
+        return False
+
+    def release(self):  # 停止采集并释放缓冲区
+        if self.streaming:
+            try:
+                self.device.ioctl(VIDIOC_STREAMOFF, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+            except OSError:
+                pass
+            self.streaming = False
+        for buf in self.buffers:
+            try:
+                buf.close()
+            except BufferError:  # 仍有视图引用，交由垃圾回收
+                pass
+        self.buffers = []
+        self._outputs = []
+        if self.device.native:  # 释放驱动侧缓冲区，便于重新开始采集
+            try:
+                self.device.ioctl(VIDIOC_REQBUFS, v4l2_requestbuffers(count=0, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP))
+            except OSError:
+                pass
+
+
+# 已解码帧：OpenCV 回退采集源的帧对象，接口与 V4L2Frame 一致
+class ImageFrame:
+    def __init__(self, image, sequence, timestamp):
+        self.data = image
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.dequeued = timestamp  # 回退采集源只能取得读取完成的时间
+
+    encoded = None  # 回退采集源的帧已由 OpenCV 解码
+
+    def to_bgr(self, dst=None, scale=1):
+        return self.data if scale == 1 else self.data[::scale, ::scale]
+
+    def copy(self):
+        return self.data.copy()
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# OpenCV 回退采集源：设备无法以 mmap 方式采集时使用，接口与 V4L2Capture 一致
+class OpenCVCapture:
+    def __init__(self, index, width=None, height=None):
+        self.cap = cv2.VideoCapture(index)  # 打开摄像头
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        self.frame_interval = 1 / fps if fps > 0 else 0
+        self.grabbed = False
+        self.sequence = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def wait(self, timeout):  # cap.grab() 本身阻塞到驱动出帧，无需持锁
+        self.grabbed = self.cap.isOpened() and self.cap.grab()
+        if not self.grabbed:
+            time.sleep(timeout)  # 读取失败时按超时等待，避免空转
+        return self.grabbed
+
+    def grab_frame(self, timeout=1.0):
+        if not self.grabbed and not self.wait(timeout):
+            return None
+        self.grabbed = False
+        ret, image = self.cap.retrieve()
+        if not ret:
+            return None
+        self.sequence += 1
+        return ImageFrame(image, self.sequence, time.monotonic())
+
+    def read(self):
+        return self.cap.read()
+
+    def decode_scale(self, size):  # OpenCV 已解码全分辨率帧，不再缩小解码
+        return 1
+
+    def set(self, prop_id, value):
+        return self.cap.set(prop_id, value)
+
+    def release(self):
+        self.cap.release()
+# ----------------------------------------------------------------------------------------------------------------------
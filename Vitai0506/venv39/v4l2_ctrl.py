@@ -0,0 +1,430 @@
+# ====================================================== 模块声明 ======================================================
+# V4L2 原生控制模块：打开一次 /dev/videoN，通过 fcntl.ioctl 直接下发 VIDIOC_S_CTRL/G_CTRL/QUERYCTRL
+# 批量参数通过 VIDIOC_TRY_EXT_CTRLS + VIDIOC_S_EXT_CTRLS 一次性原子写入
+# 打开设备时用一次 VIDIOC_G_EXT_CTRLS 读取全部参数作为缓存，按方案写入时只下发与缓存值不同的参数
+# 仅在设备无法以原生方式访问时，回退到 v4l2-ctl 子进程
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import errno
+import ctypes
+import subprocess
+from threading import Lock
+
+try:
+    import fcntl  # 仅 Linux 可用
+except ImportError:
+    fcntl = None
+
+# ioctl 编号计算（对应内核 asm-generic/ioctl.h）
+_IOC_NONE = 0
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def _IOC(direction, nr, size):
+    return (direction << 30) | (size << 16) | (ord('V') << 8) | nr
+
+
+def _IOR(nr, struct):
+    return _IOC(_IOC_READ, nr, ctypes.sizeof(struct))
+
+
+def _IOW(nr, struct):
+    return _IOC(_IOC_WRITE, nr, ctypes.sizeof(struct))
+
+
+def _IOWR(nr, struct):
+    return _IOC(_IOC_READ | _IOC_WRITE, nr, ctypes.sizeof(struct))
+
+
+# 控制类型
+V4L2_CTRL_TYPE_INTEGER = 1
+V4L2_CTRL_TYPE_BOOLEAN = 2
+V4L2_CTRL_TYPE_MENU = 3
+V4L2_CTRL_TYPE_BUTTON = 4
+V4L2_CTRL_TYPE_INTEGER64 = 5
+V4L2_CTRL_TYPE_CTRL_CLASS = 6
+V4L2_CTRL_TYPE_INTEGER_MENU = 9
+
+CTRL_TYPE_NAMES = {
+    V4L2_CTRL_TYPE_INTEGER: "int",
+    V4L2_CTRL_TYPE_BOOLEAN: "bool",
+    V4L2_CTRL_TYPE_MENU: "menu",
+    V4L2_CTRL_TYPE_BUTTON: "button",
+    V4L2_CTRL_TYPE_INTEGER64: "int64",
+    V4L2_CTRL_TYPE_CTRL_CLASS: "class",
+    V4L2_CTRL_TYPE_INTEGER_MENU: "intmenu",
+}
+
+# 控制标志
+V4L2_CTRL_FLAG_DISABLED = 0x0001
+V4L2_CTRL_FLAG_GRABBED = 0x0002
+V4L2_CTRL_FLAG_READ_ONLY = 0x0004
+V4L2_CTRL_FLAG_INACTIVE = 0x0010
+V4L2_CTRL_FLAG_VOLATILE = 0x0080
+V4L2_CTRL_FLAG_WRITE_ONLY = 0x0040
+V4L2_CTRL_FLAG_NEXT_CTRL = 0x80000000
+
+V4L2_CTRL_WHICH_CUR_VAL = 0  # 允许一次调用混合多个参数类别
+
+
+class v4l2_control(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("value", ctypes.c_int32),
+    ]
+
+
+class v4l2_queryctrl(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_querymenu(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("index", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("reserved", ctypes.c_uint32),
+    ]
+
+
+class v4l2_ext_control_value(ctypes.Union):
+    _pack_ = 1
+    _fields_ = [
+        ("value", ctypes.c_int32),
+        ("value64", ctypes.c_int64),
+        ("ptr", ctypes.c_void_p),
+    ]
+
+
+class v4l2_ext_control(ctypes.Structure):
+    _pack_ = 1
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32 * 1),
+        ("u", v4l2_ext_control_value),
+    ]
+
+
+class v4l2_ext_controls(ctypes.Structure):
+    _fields_ = [
+        ("which", ctypes.c_uint32),
+        ("count", ctypes.c_uint32),
+        ("error_idx", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+        ("reserved", ctypes.c_uint32 * 1),
+        ("controls", ctypes.POINTER(v4l2_ext_control)),
+    ]
+
+
+VIDIOC_G_CTRL = _IOWR(27, v4l2_control)
+VIDIOC_S_CTRL = _IOWR(28, v4l2_control)
+VIDIOC_QUERYCTRL = _IOWR(36, v4l2_queryctrl)
+VIDIOC_QUERYMENU = _IOWR(37, v4l2_querymenu)
+VIDIOC_G_EXT_CTRLS = _IOWR(71, v4l2_ext_controls)
+VIDIOC_S_EXT_CTRLS = _IOWR(72, v4l2_ext_controls)
+VIDIOC_TRY_EXT_CTRLS = _IOWR(73, v4l2_ext_controls)
+
+
+def parse_ctrl_id(ctrl_id):
+    """参数 ID 支持整数或十六进制字符串（如 "0x00980900"）"""
+    if isinstance(ctrl_id, str):
+        return int(ctrl_id, 16)
+    return int(ctrl_id)
+
+
+def ctrl_name_to_v4l2(name):
+    """将驱动返回的控制名称转换为 v4l2-ctl 风格的名称（如 White Balance Temperature -> white_balance_temperature）"""
+    result = []
+    for ch in name.lower():
+        if ch.isalnum():
+            result.append(ch)
+        elif result and result[-1] != "_":
+            result.append("_")
+    return "".join(result).strip("_")
+
+
+# V4L2 设备
+class V4L2Device:
+    def __init__(self, index):
+        self.index = index
+        self.path = f"/dev/video{index}"
+        self.fd = None
+        self.lock = Lock()
+        self.ctrl_names = {}  # 参数 ID -> v4l2-ctl 名称，用于子进程回退
+        self.values = {}  # 参数值缓存：参数 ID -> 设备当前值，仅原生模式可用
+        self.volatile = set()  # 由驱动自行改变的参数（VOLATILE 标志），不缓存
+        self.listeners = []  # 参数事件监听器（v4l2_events.ControlEventListener）
+
+    def open(self):  # 打开设备，失败时保持回退模式
+        if self.fd is not None:
+            return True
+        if fcntl is None:
+            return False
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        except OSError as e:
+            print(f"\033[33m警告：无法以原生方式打开 {self.path}（{e.strerror}），将使用 v4l2-ctl 回退\033[0m")
+            self.fd = None
+            return False
+        self.load_values()
+        return True
+
+    def close(self):  # 关闭设备
+        for listener in list(self.listeners):  # 先停止监听线程，再关闭文件描述符
+            listener.stop()
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            self.values = {}
+
+    @property
+    def native(self):  # 是否可用原生 ioctl
+        return self.fd is not None
+
+    def ioctl(self, request, arg):  # 执行 ioctl
+        return fcntl.ioctl(self.fd, request, arg)
+
+    def query_ctrl(self, ctrl_id):
+        """查询参数信息，返回字典；设备不支持时返回 None"""
+        if not self.native:
+            return None
+        qc = v4l2_queryctrl(id=parse_ctrl_id(ctrl_id))
+        try:
+            self.ioctl(VIDIOC_QUERYCTRL, qc)
+        except OSError:
+            return None
+        if qc.flags & V4L2_CTRL_FLAG_DISABLED:
+            return None
+        info = {
+            "id": qc.id,
+            "name": qc.name.decode(errors="replace"),
+            "v4l2_param": ctrl_name_to_v4l2(qc.name.decode(errors="replace")),
+            "type": CTRL_TYPE_NAMES.get(qc.type, str(qc.type)),
+            "min": qc.minimum,
+            "max": qc.maximum,
+            "step": qc.step,
+            "default": qc.default_value,
+            "flags": qc.flags,
+            "inactive": bool(qc.flags & V4L2_CTRL_FLAG_INACTIVE),
+        }
+        self.ctrl_names.setdefault(qc.id, info["v4l2_param"])
+        return info
+
+    def query_menu(self, ctrl_id, minimum, maximum):
+        """查询菜单参数的选项，返回 {索引: 名称}"""
+        options = {}
+        if not self.native:
+            return options
+        for index in range(minimum, maximum + 1):
+            qm = v4l2_querymenu(id=parse_ctrl_id(ctrl_id), index=index)
+            try:
+                self.ioctl(VIDIOC_QUERYMENU, qm)
+            except OSError:
+                continue  # 菜单索引可以不连续
+            options[index] = qm.name.decode(errors="replace")
+        return options
+
+    def list_ctrls(self):
+        """通过 V4L2_CTRL_FLAG_NEXT_CTRL 枚举设备全部参数"""
+        ctrls = []
+        if not self.native:
+            return ctrls
+        qc = v4l2_queryctrl(id=V4L2_CTRL_FLAG_NEXT_CTRL)
+        while True:
+            try:
+                self.ioctl(VIDIOC_QUERYCTRL, qc)
+            except OSError:
+                break
+            if qc.type != V4L2_CTRL_TYPE_CTRL_CLASS and not qc.flags & V4L2_CTRL_FLAG_DISABLED:
+                info = self.query_ctrl(qc.id)
+                if info:
+                    ctrls.append(info)
+            qc = v4l2_queryctrl(id=qc.id | V4L2_CTRL_FLAG_NEXT_CTRL)
+        return ctrls
+
+    def get_ctrls(self, ctrl_ids):
+        """一次 VIDIOC_G_EXT_CTRLS 批量读取，返回 {参数 ID: 值}；驱动不支持时逐项读取，非原生模式返回空字典"""
+        ids = [parse_ctrl_id(ctrl_id) for ctrl_id in ctrl_ids]
+        if not self.native or not ids:
+            return {}
+        controls = (v4l2_ext_control * len(ids))()
+        for slot, ctrl_id in enumerate(ids):
+            controls[slot].id = ctrl_id
+        ext = v4l2_ext_controls(which=V4L2_CTRL_WHICH_CUR_VAL, count=len(ids), controls=controls)
+        try:
+            self.ioctl(VIDIOC_G_EXT_CTRLS, ext)
+            return {ctrl_id: controls[slot].value for slot, ctrl_id in enumerate(ids)}
+        except OSError:
+            values = {}
+            for ctrl_id in ids:
+                value = self.get_ctrl(ctrl_id)
+                if value is not None:
+                    values[ctrl_id] = value
+            return values
+
+    def load_values(self):
+        """枚举全部参数并批量读取当前值，重建参数值缓存"""
+        ctrls = [ctrl for ctrl in self.list_ctrls()
+                 if ctrl["type"] in ("int", "bool", "menu", "intmenu") and not ctrl["flags"] & V4L2_CTRL_FLAG_WRITE_ONLY]
+        self.volatile = {ctrl["id"] for ctrl in ctrls if ctrl["flags"] & V4L2_CTRL_FLAG_VOLATILE}
+        self.values = self.get_ctrls(ctrl["id"] for ctrl in ctrls if ctrl["id"] not in self.volatile)
+        return self.values
+
+    def update_cache(self, ctrl_id, value):  # 参数值已知（写入成功或收到参数事件）时更新缓存
+        ctrl_id = parse_ctrl_id(ctrl_id)
+        if self.native and ctrl_id not in self.volatile:
+            self.values[ctrl_id] = int(value)
+
+    def cached(self, ctrl_id):  # 缓存中的当前值，未缓存时返回 None
+        return self.values.get(parse_ctrl_id(ctrl_id))
+
+    def get_ctrl(self, ctrl_id, name=None):
+        """读取参数当前值，失败返回 None"""
+        ctrl_id = parse_ctrl_id(ctrl_id)
+        if self.native:
+            ctrl = v4l2_control(id=ctrl_id)
+            try:
+                self.ioctl(VIDIOC_G_CTRL, ctrl)
+                self.update_cache(ctrl_id, ctrl.value)
+                return ctrl.value
+            except OSError as e:
+                if e.errno != errno.ENOTTY:
+                    return None
+        return self._get_ctrl_subprocess(ctrl_id, name)
+
+    def set_ctrl(self, ctrl_id, value, name=None):
+        """写入参数，成功返回 (True, "")，失败返回 (False, 错误信息)"""
+        ctrl_id = parse_ctrl_id(ctrl_id)
+        if self.native:
+            ctrl = v4l2_control(id=ctrl_id, value=int(value))
+            try:
+                self.ioctl(VIDIOC_S_CTRL, ctrl)
+                self.update_cache(ctrl_id, ctrl.value)  # 驱动可能把值调整到步长上
+                return True, ""
+            except OSError as e:
+                self.values.pop(ctrl_id, None)  # 写入失败后设备状态未知
+                if e.errno != errno.ENOTTY:
+                    return False, e.strerror
+        return self._set_ctrl_subprocess(ctrl_id, value, name)
+
+    def set_ctrls(self, items):
+        """批量写入 [(参数 ID, 值, 名称)]，返回 {索引: 错误信息}，空字典表示全部成功
+
+        先用 VIDIOC_TRY_EXT_CTRLS 校验，剔除驱动通过 error_idx 指出的无效参数，
+        再用一次 VIDIOC_S_EXT_CTRLS 原子写入其余参数，避免传感器输出半生效的画面
+        """
+        items = [(parse_ctrl_id(ctrl_id), value, name) for ctrl_id, value, name in items]
+        errors = {}
+        if not self.native:
+            return self._set_ctrls_each(items)
+        pending = list(range(len(items)))  # 仍待写入的参数索引
+        request = VIDIOC_TRY_EXT_CTRLS
+        while pending:
+            controls = (v4l2_ext_control * len(pending))()
+            for slot, idx in enumerate(pending):
+                controls[slot].id = items[idx][0]
+                controls[slot].value = int(items[idx][1])
+            ext = v4l2_ext_controls(which=V4L2_CTRL_WHICH_CUR_VAL, count=len(pending), controls=controls)
+            try:
+                self.ioctl(request, ext)
+            except OSError as e:
+                if request == VIDIOC_S_EXT_CTRLS:  # 写入失败时可能已部分生效，相关缓存作废
+                    for idx in pending:
+                        self.values.pop(items[idx][0], None)
+                if e.errno == errno.ENOTTY:  # 驱动不支持扩展参数接口
+                    errors.update(self._set_ctrls_each([items[idx] for idx in pending], pending))
+                    return errors
+                if ext.error_idx >= len(pending):  # 无法定位到具体参数，整批失败
+                    for idx in pending:
+                        errors[idx] = e.strerror
+                    return errors
+                errors[pending.pop(ext.error_idx)] = e.strerror
+                request = VIDIOC_TRY_EXT_CTRLS  # 剔除后重新校验
+                continue
+            if request == VIDIOC_S_EXT_CTRLS:
+                for slot, idx in enumerate(pending):
+                    self.update_cache(items[idx][0], controls[slot].value)
+                break
+            request = VIDIOC_S_EXT_CTRLS
+        return errors
+
+    def _set_ctrls_each(self, items, indices=None):  # 逐项写入（回退路径）
+        errors = {}
+        for pos, (ctrl_id, value, name) in enumerate(items):
+            ok, error = self.set_ctrl(ctrl_id, value, name)
+            if not ok:
+                errors[indices[pos] if indices else pos] = error
+        return errors
+
+    def get_param(self, param):  # 按参数定义结构读取
+        return self.get_ctrl(param["hex_numbers"], param["v4l2_param"])
+
+    def set_param(self, param, value):  # 按参数定义结构写入
+        return self.set_ctrl(param["hex_numbers"], value, param["v4l2_param"])
+
+    def set_params(self, params, values):  # 按参数定义结构批量原子写入，返回 {索引: 错误信息}
+        return self.set_ctrls([(param["hex_numbers"], value, param["v4l2_param"]) for param, value in zip(params, values)])
+
+    def changed_params(self, params, values):  # 与缓存值不同（或未缓存）的参数索引
+        return [idx for idx, (param, value) in enumerate(zip(params, values))
+                if self.cached(param["hex_numbers"]) != int(value)]
+
+    def apply_params(self, params, values):
+        """按参数定义结构写入，只下发与缓存值不同的参数；返回 {索引: 错误信息}，索引对应传入的参数顺序"""
+        changed = self.changed_params(params, values)
+        if not changed:
+            return {}
+        errors = self.set_params([params[idx] for idx in changed], [values[idx] for idx in changed])
+        return {changed[pos]: error for pos, error in errors.items()}
+
+    def _get_ctrl_subprocess(self, ctrl_id, name):  # v4l2-ctl 回退读取
+        name = name or self.ctrl_names.get(ctrl_id)
+        if not name:
+            return None
+        cmd = ["v4l2-ctl", "-d", self.path, f"--get-ctrl={name}"]
+        try:
+            result = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        except OSError:
+            return None
+        if result.returncode != 0 or ":" not in result.stdout:
+            return None
+        try:
+            return int(result.stdout.split(":", 1)[1].strip())
+        except ValueError:
+            return None
+
+    def _set_ctrl_subprocess(self, ctrl_id, value, name):  # v4l2-ctl 回退写入
+        name = name or self.ctrl_names.get(ctrl_id)
+        if not name:
+            return False, f"未知参数 {ctrl_id:#010x}"
+        cmd = ["v4l2-ctl", "-d", self.path, f"--set-ctrl={name}={value}"]
+        print(f"执行命令: {' '.join(cmd)}")
+        try:
+            result = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        except OSError as e:
+            return False, str(e)
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, ""
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+# ----------------------------------------------------------------------------------------------------------------------
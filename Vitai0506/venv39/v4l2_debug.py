@@ -1,20 +1,29 @@
 # ====================================================== 程序声明 ======================================================
 print("\n\033[93m【单相机控制调试工具：针对单摄像头的图形化调试工具，支持参数重置和实时显示】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
 import cv2
 import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
-from queue import Queue, Empty
 from threading import Thread, Event, Lock
+from v4l2_ctrl import V4L2Device, parse_ctrl_id
+from v4l2_events import ControlEventListener, V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from v4l2_capture import OpenCVCapture, throttle_interval
+from v4l2_modes import open_capture
+from frame_slot import FrameSlots
+from mosaic import display_mosaic
+from preprocess import Preprocessor
+from latency import get_latency, latency_report
 
 # 全局配置
 MAX_FPS = 30  # 最大帧率
+CAPTURE_MODE = {"format": "MJPG", "size": (640, 480), "fps": MAX_FPS}  # 采集需求，见 v4l2_modes.py
 
-# 定义队列用于传递帧数据
-frame_queue = Queue(maxsize=2)
+# 每台相机一个最新帧槽位，取代共享帧队列
+frame_slots = FrameSlots()
 
 # 参数定义结构
 BASE_CAMERA_PARAMS = [
@@ -237,51 +246,79 @@ class CameraController:
         self.exit_event = Event()
         self.lock = Lock()
         self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.name = f"{device_id} video{index}"  # 窗口名称，同型号多台相机时保持唯一
+        self.slot = frame_slots.slot(self.name)  # 最新帧槽位
+        self.latency = get_latency(self.name)  # 各阶段延迟统计
+        self.camera_params = BASE_CAMERA_PARAMS  # 摄像头参数
 
     def initialize(self):  # 初始化摄像头
         with self.lock:
-            self.cap = cv2.VideoCapture(self.index)  # 打开摄像头
+            # 协商满足预览尺寸与帧率的最小原生模式，优先 MJPEG；mmap 零拷贝采集，与参数控制共用设备
+            self.cap = open_capture(self.device, self.device_id, CAPTURE_MODE, self.name)
+            if self.cap is None:  # 原生采集不可用时回退 OpenCV
+                self.cap = OpenCVCapture(self.index)
             if not self.cap.isOpened():  # 检查是否打开成功
                 return False
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数值、范围与非激活标志同步到缓存和界面
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self):  # 初始化参数
-        for param in BASE_CAMERA_PARAMS:
-            value = param["value"]
-            self._set_v4l2_param(param, value)
+    def init_params(self):  # 初始化参数，由控制界面的参数命令线程执行
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items(): # 批量原子写入
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
 
-    def _set_v4l2_param(self, param, value):
-        device = f"/dev/video{self.index}"
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-        print(f"执行命令: {cmd}")
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"命令执行失败，错误信息: {result.stderr}")
+    def apply_values(self, values): # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        return self.device.apply_params(self.camera_params, values)  # 只写入与缓存值不同的参数
 
-    def run(self):  # 运行摄像头
+    def run(self):  # 运行摄像头：由设备可读事件驱动，仅在出队期间持锁
+        frame_interval = self.cap.frame_interval  # 驱动报告的帧间隔
+        min_interval = throttle_interval(frame_interval, MAX_FPS)  # 驱动帧率高于 MAX_FPS 时按时间戳丢帧
+        preprocessor = Preprocessor((640, 480))  # 预览只需 640x480，缩放结果写入预分配的轮换缓冲区
+        scale = preprocessor.decode_scale(self.cap)  # MJPEG 按缩小倍数解码
         while not self.exit_event.is_set():  # 循环读取摄像头
-            with self.lock:
-                if self.cap.isOpened():
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS:  # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read()
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full():  # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480))  # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
+            if not self.cap.wait(0.5):  # 阻塞等待新帧，空闲时不占用 CPU
+                continue
+            with self.lock:  # 出队
+                try:
+                    frame = self.cap.grab_frame(timeout=0) if self.cap.isOpened() else None
+                except OSError:  # 设备已拔出
+                    break
+            if frame is None:
+                continue
+            with frame:  # 处理完毕后缓冲区归还驱动
+                if frame.timestamp - self.last_frame_time < min_interval:  # 丢弃的帧不解码
+                    continue
+                self.last_frame_time = frame.timestamp
+                self.latency.record("dequeue", frame.dequeued - frame.timestamp)  # 驱动写入 → 出队
+                bgr = frame.to_bgr(scale=scale)
+                if bgr is None:  # MJPEG 数据损坏（如 USB 传输出错），丢弃该帧
+                    continue
+                decoded = time.monotonic()
+                self.latency.record("decode", decoded - frame.dequeued)
+                image = preprocessor.apply(bgr, scale)  # 缩放
+                self.latency.record("preprocess", time.monotonic() - decoded)
+            self.slot.put(image, frame.timestamp)  # 覆盖槽位中尚未显示的旧帧
         with self.lock:
             if self.cap.isOpened():
                 self.cap.release()
+        self.device.close()
+        print(f"{self.name}: 采集 {self.slot.seq} 帧，未显示即被覆盖 {self.slot.dropped} 帧")  # 丢帧统计
 
 
 class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller  # 摄像头控制器
+        self.applying = False  # 是否正在批量应用参数
+        camera_controller.on_ctrl_event = self.on_ctrl_event  # 接收驱动侧参数变化
+        self.closing = False  # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.name} 参数写入")  # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.name} 参数命令")  # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params)  # 多台相机各自的命令线程并行初始化
         self.title(camera_controller.device_id)  # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
         self.row = 0
@@ -294,6 +331,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
 
     def create_controls(self):  # 创建控件
         param_list = BASE_CAMERA_PARAMS # 参数列表
+        self.params_by_id = {parse_ctrl_id(param["hex_numbers"]): param for param in param_list}  # 参数 ID -> 参数
         for i in range(0, len(param_list), 3):
             for col in range(3):
                 if i + col < len(param_list):
@@ -310,6 +348,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         # 显示值范围
         range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
         range_label.pack(fill=tk.X)
+        param["range_label"] = range_label
         # 显示用户值
         user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
         user_value_label.pack(fill=tk.X)
@@ -326,6 +365,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             slider.pack(side=tk.LEFT, fill=tk.X, expand=True)
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
+            param["scale"] = slider
+            param["widgets"] = [slider, entry]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
         elif param["type"] == "menu": # 下拉菜单
@@ -337,12 +378,14 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
                 print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。")
             cb = ttk.Combobox(control_frame, textvariable=var, values=options)
             cb.pack(fill=tk.X, expand=True)
+            param["widgets"] = [cb]
             param["var"] = var
             cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param))
         elif param["type"] == "bool": # 布尔值
             var = tk.IntVar(value=param["value"])
             cb = ttk.Checkbutton(control_frame, variable=var)
             cb.pack(side=tk.LEFT)
+            param["widgets"] = [cb]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
 
@@ -351,6 +394,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         param["status_label"] = status_label
 
     def on_param_change(self, param): # 设置参数
+        if self.applying:  # 批量应用时由 _apply_values 统一写入
+            return
         try:
             value = None
             if param["type"] == "int":
@@ -363,14 +408,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             elif param["type"] == "bool":
                 value = param["var"].get()
 
-            device = f"/dev/video{self.camera_controller.index}" # 摄像头设备
-            cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-            result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-            if result.returncode == 0:
-                param["status_label"].config(text="设置状态: 成功", foreground="green")
-            else:
-                param["status_label"].config(text="设置状态: 失败", foreground="red")
-                print(f"\033[31m错误：{param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+            self.writer.submit(param["hex_numbers"], param, value)  # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
             print(f"\033[31m错误：{param['chinese_name']} 数值超出范围\033[0m")
@@ -378,6 +416,58 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             param["status_label"].config(text="设置状态: 出错", foreground="red")
             print(f"\033[31m错误：{param['chinese_name']} 设置出错\033[0m")
 
+    def _write_param(self, param, value):  # 在写入线程中执行，经命令线程写入，与批量写入保持顺序
+        return self.executor.set(param, value).result()
+
+    def _call_ui(self, func, *args):  # 从其他线程转到界面线程执行
+        if self.closing:  # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, error):  # 写入线程回调：转到界面线程显示结果
+        self._call_ui(self._show_write_result, *args, ok)
+
+    def _show_write_result(self, param, value, ok):  # 显示写入结果
+        if ok:
+            param["status_label"].config(text="设置状态: 成功", foreground="green")
+        else:
+            param["status_label"].config(text="设置状态: 失败", foreground="red")
+            print(f"\033[31m错误：{param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+
+    def on_ctrl_event(self, event):  # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event):  # 驱动侧参数变化同步到界面，不回写设备
+        param = self.params_by_id.get(event["id"])
+        if param is None or "var" not in param:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in param:
+            param["min"], param["max"] = event["min"], event["max"]
+            param["scale"].config(from_=event["min"], to=event["max"])
+            param["range_label"].config(text=f"范围: {event['min']} ~ {event['max']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in param["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                param["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            self.applying = True  # 只更新界面，不触发写入
+            try:
+                if param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if 0 <= event["value"] < len(options):
+                        param["var"].set(options[event["value"]])
+                else:
+                    param["var"].set(event["value"])
+            finally:
+                self.applying = False
+
     def add_buttons(self):  # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -386,70 +476,59 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         ttk.Button(button_frame, text="用户值", command=lambda: self.reset_params("setvalue")).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self, mode): # 重置参数
-        for param in BASE_CAMERA_PARAMS:
-            if mode == "default": # 默认值
-                val = param["default"]
-            elif mode == "value": # 厂商值
-                val = param["value"]
-            elif mode == "setvalue": # 用户值
-                val = param["setvalue"]
+    def reset_params(self, mode): # 重置参数：default默认值，value厂商值，setvalue用户值
+        if mode not in ("default", "value", "setvalue"):
+            return
+        params = self.camera_controller.camera_params
+        self._apply_values(params, [param[mode] for param in params])
+
+    def _apply_values(self, params, values): # 同步界面并提交批量原子写入，返回 Future
+        self.applying = True  # 同步界面期间不逐项触发写入
+        try:
+            for param, val in zip(params, values):
+                if param["type"] == "int":
+                    param["var"].set(val)
+                elif param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if val < len(options):
+                        param["var"].set(options[val])
+                elif param["type"] == "bool":
+                    param["var"].set(val)
+        finally:
+            self.applying = False
+        for param in params:
+            param["status_label"].config(text="设置状态: 应用中", foreground="gray")
+        future = self.executor.apply_profile(values)  # 只写入变化的参数，一次 TRY + 一次 S_EXT_CTRLS
+        future.add_done_callback(lambda future: self._call_ui(self._show_apply_result, params, values, future))
+        return future
+
+    def _show_apply_result(self, params, values, future):  # 显示批量写入结果
+        try:
+            errors = future.result()
+        except Exception as e:
+            errors = {param_idx: str(e) for param_idx in range(len(values))}
+        for param_idx, param in enumerate(params):
+            if param_idx in errors:
+                param["status_label"].config(text="设置状态: 失败", foreground="red")
+                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败（{errors[param_idx]}）\033[0m")
             else:
-                continue
-            if param["type"] == "int":
-                param["var"].set(val)
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                if val < len(options):
-                    param["var"].set(options[val])
-            elif param["type"] == "bool":
-                param["var"].set(val)
-            self.on_param_change(param)
+                param["status_label"].config(text="设置状态: 成功", foreground="green")
 
     def exit_app(self):   # 退出
+        self.closing = True
+        self.writer.close()  # 写完已登记的参数
+        self.executor.close()  # 执行完已提交的命令
         self.camera_controller.exit_event.set()
-        cv2.destroyAllWindows()
+        frame_slots.remove(self.camera_controller.name)  # 不再显示该相机，拼接画面随之重新排列
         self.destroy()
 
 
-def list_cameras():
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]  # 视频设备
-
-    for device in video_devices:  # 检测设备
-        try:
-            index = int(device.split('video')[1])
-            cmd = ["udevadm", "info", "-q", "property", device]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            vid, pid = "N/A", "N/A"
-            for line in result.stdout.splitlines(): # 获取设备信息
-                if line.startswith("ID_VENDOR_ID="):
-                    vid = line.split('=')[1].strip().upper() # 获取厂商ID
-                elif line.startswith("ID_MODEL_ID="):
-                    pid = line.split('=')[1].strip().upper() # 获取产品ID
-            device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-            available.append((index, device_id)) # 添加设备信息
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
+def list_cameras(): # 检测摄像头：读取 sysfs 与 VIDIOC_QUERYCAP，不启动子进程，过滤元数据节点
+    return [(node.index, node.device_id) for node in list_video_nodes()]
 
 
-def display_frames():  # 显示帧
-    windows = {} # 窗口字典
-    while True:
-        try:
-            device_id, frame = frame_queue.get(timeout=0.1)  # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL)  # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'): # 按下q键退出
-                break
-        except Empty:
-            pass
-        except Exception as e:
-            print(f"显示异常: {str(e)}")
-    cv2.destroyAllWindows() # 关闭窗口
+def display_frames():  # 显示帧：全部相机拼接到一个窗口，每个屏幕刷新周期只显示一次
+    display_mosaic(frame_slots)
 
 
 def main():
@@ -473,6 +552,7 @@ def main():
 
     root.mainloop() # 等待退出
     cv2.destroyAllWindows() # 关闭窗口
+    print(latency_report())  # 退出时输出各设备延迟统计
 
 if __name__ == "__main__":
     main()
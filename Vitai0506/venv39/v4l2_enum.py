@@ -0,0 +1,166 @@
+# ====================================================== 模块声明 ======================================================
+# 摄像头枚举：读取 /sys/class/video4linux 与 USB 设备属性（idVendor、idProduct、serial），配合 VIDIOC_QUERYCAP 判断节点能力
+# 不启动 udevadm / v4l2-ctl 子进程，也不打开视频流；属性在首次访问时读取并缓存
+# UVC 相机每个物理设备会注册视频节点与元数据节点，默认只返回可采集视频的节点
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import fcntl
+import ctypes
+from v4l2_ctrl import _IOR
+
+SYSFS_VIDEO = "/sys/class/video4linux"
+
+# 设备能力位
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_META_CAPTURE = 0x00800000
+V4L2_CAP_STREAMING = 0x04000000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [
+        ("driver", ctypes.c_char * 16),
+        ("card", ctypes.c_char * 32),
+        ("bus_info", ctypes.c_char * 32),
+        ("version", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("device_caps", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+VIDIOC_QUERYCAP = _IOR(0, v4l2_capability)
+
+_UNSET = object()
+
+
+def _read_attr(path):  # 读取 sysfs 属性，不存在时返回 None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def query_cap(path):
+    """VIDIOC_QUERYCAP：只打开设备节点查询能力，不启动采集；失败返回 None"""
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        cap = v4l2_capability()
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, cap)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    return {
+        "driver": cap.driver.decode(errors="replace"),
+        "card": cap.card.decode(errors="replace"),
+        "bus_info": cap.bus_info.decode(errors="replace"),
+        "version": "{}.{}.{}".format(cap.version >> 16, (cap.version >> 8) & 0xff, cap.version & 0xff),
+        "capabilities": cap.capabilities,
+        # 设置了 DEVICE_CAPS 时 device_caps 才是本节点的能力，否则只能使用整机能力
+        "device_caps": cap.device_caps if cap.capabilities & V4L2_CAP_DEVICE_CAPS else cap.capabilities,
+    }
+
+
+# 单个 /dev/videoN 节点
+class VideoNode:
+    def __init__(self, node):
+        self.node = node  # 节点名，如 video0
+        self.index = int(node[len("video"):])
+        self.path = f"/dev/{node}"
+        self.sysfs = os.path.join(SYSFS_VIDEO, node)
+        self._usb_dir = _UNSET
+        self._caps = _UNSET
+
+    @property
+    def name(self):  # 驱动注册的设备名称
+        return _read_attr(os.path.join(self.sysfs, "name")) or "N/A"
+
+    @property
+    def usb_dir(self):
+        """节点所属 USB 设备的 sysfs 目录（device 指向 USB 接口，其上一级为 USB 设备）；非 USB 设备为 None"""
+        if self._usb_dir is _UNSET:
+            self._usb_dir = None
+            path = os.path.realpath(os.path.join(self.sysfs, "device"))
+            for candidate in (path, os.path.dirname(path)):
+                if os.path.exists(os.path.join(candidate, "idVendor")):
+                    self._usb_dir = candidate
+                    break
+        return self._usb_dir
+
+    def usb_attr(self, attr):  # USB 设备属性
+        return _read_attr(os.path.join(self.usb_dir, attr)) if self.usb_dir else None
+
+    @property
+    def vid(self):
+        value = self.usb_attr("idVendor")
+        return value.upper() if value else "N/A"
+
+    @property
+    def pid(self):
+        value = self.usb_attr("idProduct")
+        return value.upper() if value else "N/A"
+
+    @property
+    def device_id(self):  # VID-PID 组合，与各工具的窗口标题一致
+        return f"{self.vid}-{self.pid}" if self.vid != "N/A" and self.pid != "N/A" else "UNKNOWN"
+
+    @property
+    def serial(self):
+        return self.usb_attr("serial") or "N/A"
+
+    @property
+    def manufacturer(self):
+        return self.usb_attr("manufacturer") or "N/A"
+
+    @property
+    def product(self):
+        return self.usb_attr("product") or "N/A"
+
+    @property
+    def port(self):  # USB 端口路径，如 1-1.2，物理位置不变时保持不变
+        return os.path.basename(self.usb_dir) if self.usb_dir else "N/A"
+
+    @property
+    def caps(self):  # VIDIOC_QUERYCAP 结果，首次访问时查询
+        if self._caps is _UNSET:
+            self._caps = query_cap(self.path)
+        return self._caps
+
+    @property
+    def driver(self):
+        return self.caps["driver"] if self.caps else "N/A"
+
+    @property
+    def is_capture(self):
+        """是否为视频采集节点；无法查询能力时按 sysfs index（0 为主节点）判断"""
+        if self.caps:
+            return bool(self.caps["device_caps"] & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE))
+        return _read_attr(os.path.join(self.sysfs, "index")) in ("0", None)
+
+    @property
+    def is_metadata(self):
+        return bool(self.caps and self.caps["device_caps"] & V4L2_CAP_META_CAPTURE)
+
+    def __repr__(self):
+        return f"VideoNode({self.path}, {self.device_id})"
+
+
+def list_video_nodes(capture_only=True, driver=None):
+    """按序号列出视频节点；capture_only 过滤元数据等非采集节点，driver 按驱动名称过滤（如 uvcvideo）"""
+    try:
+        names = [n for n in os.listdir(SYSFS_VIDEO) if n.startswith("video") and n[len("video"):].isdigit()]
+    except OSError:  # 未加载 videodev 模块
+        return []
+    nodes = [VideoNode(n) for n in sorted(names, key=lambda n: int(n[len("video"):]))]
+    if capture_only:
+        nodes = [node for node in nodes if node.is_capture]
+    if driver:
+        nodes = [node for node in nodes if node.driver == driver]
+    return nodes
+# ----------------------------------------------------------------------------------------------------------------------
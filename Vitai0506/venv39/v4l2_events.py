@@ -0,0 +1,168 @@
+# ====================================================== 模块声明 ======================================================
+# V4L2 参数事件：VIDIOC_SUBSCRIBE_EVENT 订阅 V4L2_EVENT_CTRL，监听线程在 POLLPRI 时 VIDIOC_DQEVENT 取出事件
+# 驱动自行修改参数值（如自动曝光调整曝光时间）、范围或非激活标志时，更新 V4L2Device 参数值缓存并回调调用方
+# 订阅在 V4L2Device 的同一个文件描述符上进行，本进程自己写入的参数不会产生事件，界面不会被旧值回写
+# ----------------------------------------------------------------------------------------------------------------------
+import select
+import ctypes
+from threading import Thread, current_thread
+from v4l2_ctrl import _IOR, _IOW
+
+V4L2_EVENT_ALL = 0
+V4L2_EVENT_CTRL = 3
+V4L2_EVENT_CTRL_CH_VALUE = 0x0001
+V4L2_EVENT_CTRL_CH_FLAGS = 0x0002
+V4L2_EVENT_CTRL_CH_RANGE = 0x0004
+V4L2_CTRL_FLAG_INACTIVE = 0x0010
+POLL_TIMEOUT = 500  # 监听线程检查退出标志的间隔（毫秒）
+
+
+class v4l2_event_subscription(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("id", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 5),
+    ]
+
+
+class v4l2_event_ctrl_value(ctypes.Union):
+    _fields_ = [
+        ("value", ctypes.c_int32),
+        ("value64", ctypes.c_int64),
+    ]
+
+
+class v4l2_event_ctrl(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("changes", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_event_ctrl_value),
+        ("flags", ctypes.c_uint32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+    ]
+
+
+class v4l2_event_union(ctypes.Union):
+    _fields_ = [
+        ("ctrl", v4l2_event_ctrl),
+        ("data", ctypes.c_uint8 * 64),
+        ("align", ctypes.c_int64),  # 与内核联合体的 8 字节对齐一致
+    ]
+
+
+class timespec(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_nsec", ctypes.c_long),
+    ]
+
+
+class v4l2_event(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_event_union),
+        ("pending", ctypes.c_uint32),
+        ("sequence", ctypes.c_uint32),
+        ("timestamp", timespec),
+        ("id", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 8),
+    ]
+
+
+VIDIOC_DQEVENT = _IOR(89, v4l2_event)
+VIDIOC_SUBSCRIBE_EVENT = _IOW(90, v4l2_event_subscription)
+VIDIOC_UNSUBSCRIBE_EVENT = _IOW(91, v4l2_event_subscription)
+
+
+# 参数事件监听器：每个 V4L2Device 一个监听线程
+class ControlEventListener:
+    def __init__(self, device, on_event=None):
+        self.device = device
+        self.on_event = on_event  # on_event(事件字典)，在监听线程中调用
+        self.running = False
+        self.thread = None
+        self.subscribed = []
+
+    def start(self, ctrl_ids=None):
+        """订阅参数事件并启动监听线程，默认订阅设备全部参数；设备不支持事件时返回 False"""
+        if not self.device.native:
+            return False
+        if ctrl_ids is None:
+            ctrl_ids = [ctrl["id"] for ctrl in self.device.list_ctrls()]
+        for ctrl_id in ctrl_ids:
+            sub = v4l2_event_subscription(type=V4L2_EVENT_CTRL, id=ctrl_id)
+            try:
+                self.device.ioctl(VIDIOC_SUBSCRIBE_EVENT, sub)
+                self.subscribed.append(ctrl_id)
+            except OSError:
+                continue
+        if not self.subscribed:
+            return False
+        self.running = True
+        self.device.listeners.append(self)  # 设备关闭前先停止监听
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self.device.fd, select.POLLPRI)
+        while self.running:
+            events = poller.poll(POLL_TIMEOUT)
+            if not events:
+                continue
+            if events[0][1] & (select.POLLERR | select.POLLHUP | select.POLLNVAL):  # 设备已拔出或已关闭
+                break
+            self._drain()
+
+    def _drain(self):  # 取出全部待处理事件
+        while self.running:
+            event = v4l2_event()
+            try:
+                self.device.ioctl(VIDIOC_DQEVENT, event)
+            except OSError:  # 没有待处理事件
+                return
+            if event.type == V4L2_EVENT_CTRL:
+                self._dispatch(event)
+            if not event.pending:
+                return
+
+    def _dispatch(self, event):
+        ctrl = event.u.ctrl
+        info = {
+            "id": event.id,
+            "changes": ctrl.changes,
+            "value": ctrl.value,
+            "flags": ctrl.flags,
+            "inactive": bool(ctrl.flags & V4L2_CTRL_FLAG_INACTIVE),
+            "min": ctrl.minimum,
+            "max": ctrl.maximum,
+            "step": ctrl.step,
+            "default": ctrl.default_value,
+        }
+        if ctrl.changes & V4L2_EVENT_CTRL_CH_VALUE:
+            self.device.update_cache(event.id, ctrl.value)
+        if self.on_event:
+            try:
+                self.on_event(info)
+            except Exception as e:  # 回调出错不影响后续事件
+                print(f"\033[31m错误：{self.device.path} 参数事件处理失败（{e}）\033[0m")
+
+    def stop(self):  # 停止监听并取消订阅，由 V4L2Device.close 在关闭文件描述符前调用
+        if not self.running:
+            return
+        self.running = False
+        if self.thread is not None and self.thread is not current_thread():
+            self.thread.join(POLL_TIMEOUT / 1000 * 2)
+        try:
+            self.device.ioctl(VIDIOC_UNSUBSCRIBE_EVENT, v4l2_event_subscription(type=V4L2_EVENT_ALL))
+        except OSError:
+            pass
+        if self in self.device.listeners:
+            self.device.listeners.remove(self)
+# ----------------------------------------------------------------------------------------------------------------------
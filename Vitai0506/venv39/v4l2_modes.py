@@ -0,0 +1,352 @@
+# ====================================================== 模块声明 ======================================================
+# 采集模式协商：用 VIDIOC_ENUM_FMT / ENUM_FRAMESIZES / ENUM_FRAMEINTERVALS 列出设备的 像素格式 × 分辨率 × 帧间隔
+# 采集需求为 {"format": "MJPG", "size": (宽, 高), "fps": 帧率}，各项可省略；选出满足需求且开销最小的原生模式，不再采集后缩放
+# 选择结果按 VID-PID 与需求缓存到文件，同型号相机下次启动直接使用，驱动不再接受缓存的模式时自动重新协商
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import ctypes
+from fractions import Fraction
+from threading import Lock
+from v4l2_ctrl import _IOWR
+from v4l2_capture import (V4L2Capture, v4l2_fract, fourcc, fourcc_to_str, V4L2_BUF_TYPE_VIDEO_CAPTURE,
+                          V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_GREY)
+
+MODE_CACHE = os.environ.get("VITAI_MODE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "vitai", "capture_modes.json"))
+PREFERRED_FORMATS = (V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_GREY)  # 未指定格式时的优先顺序，均为采集引擎支持的格式
+FPS_TOLERANCE = 0.99  # 29.97 fps（1001/30000）视为满足 30 fps
+MAX_ENUM = 64  # 每级枚举的最大项数，防止驱动异常时死循环
+
+# 帧尺寸 / 帧间隔类型
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+V4L2_FRMIVAL_TYPE_DISCRETE = 1
+
+
+class v4l2_fmtdesc(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("description", ctypes.c_char * 32),
+        ("pixelformat", ctypes.c_uint32),
+        ("mbus_code", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_frmsize_discrete(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+    ]
+
+
+class v4l2_frmsize_stepwise(ctypes.Structure):
+    _fields_ = [
+        ("min_width", ctypes.c_uint32),
+        ("max_width", ctypes.c_uint32),
+        ("step_width", ctypes.c_uint32),
+        ("min_height", ctypes.c_uint32),
+        ("max_height", ctypes.c_uint32),
+        ("step_height", ctypes.c_uint32),
+    ]
+
+
+class v4l2_frmsize_union(ctypes.Union):
+    _fields_ = [
+        ("discrete", v4l2_frmsize_discrete),
+        ("stepwise", v4l2_frmsize_stepwise),
+    ]
+
+
+class v4l2_frmsizeenum(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("pixel_format", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_frmsize_union),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_frmival_stepwise(ctypes.Structure):
+    _fields_ = [
+        ("min", v4l2_fract),
+        ("max", v4l2_fract),
+        ("step", v4l2_fract),
+    ]
+
+
+class v4l2_frmival_union(ctypes.Union):
+    _fields_ = [
+        ("discrete", v4l2_fract),
+        ("stepwise", v4l2_frmival_stepwise),
+    ]
+
+
+class v4l2_frmivalenum(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("pixel_format", ctypes.c_uint32),
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_frmival_union),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+VIDIOC_ENUM_FMT = _IOWR(2, v4l2_fmtdesc)
+VIDIOC_ENUM_FRAMESIZES = _IOWR(74, v4l2_frmsizeenum)
+VIDIOC_ENUM_FRAMEINTERVALS = _IOWR(75, v4l2_frmivalenum)
+
+
+# 一个原生采集模式
+class CaptureMode:
+    def __init__(self, pixelformat, width, height, interval=None):
+        self.pixelformat = pixelformat
+        self.width = width
+        self.height = height
+        self.interval = interval  # 帧间隔 (分子, 分母) 秒，驱动未报告时为 None
+
+    @property
+    def fps(self):  # 帧率，未知为 0
+        return self.interval[1] / self.interval[0] if self.interval and self.interval[0] else 0
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+    def capture_args(self):  # V4L2Capture 的构造参数
+        return {"width": self.width, "height": self.height, "pixelformat": self.pixelformat, "interval": self.interval}
+
+    def as_dict(self):
+        return {"format": fourcc_to_str(self.pixelformat), "width": self.width, "height": self.height,
+                "interval": list(self.interval) if self.interval else None}
+
+    @classmethod
+    def from_dict(cls, data):
+        interval = data.get("interval")
+        return cls(fourcc(data["format"]), int(data["width"]), int(data["height"]), tuple(interval) if interval else None)
+
+    def __str__(self):
+        fps = f"@{self.fps:.4g}" if self.interval else ""
+        return f"{fourcc_to_str(self.pixelformat)} {self.width}x{self.height}{fps}"
+
+    def __repr__(self):
+        return f"CaptureMode({self})"
+
+
+def enum_formats(device):
+    """VIDIOC_ENUM_FMT：返回 [(像素格式, 描述)]"""
+    formats = []
+    for index in range(MAX_ENUM):
+        desc = v4l2_fmtdesc(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        try:
+            device.ioctl(VIDIOC_ENUM_FMT, desc)
+        except OSError:  # EINVAL 表示枚举结束
+            break
+        formats.append((desc.pixelformat, desc.description.decode(errors="replace")))
+    return formats
+
+
+def _align(value, low, high, step):  # 把目标值向上对齐到步进范围内
+    step = step or 1
+    value = low + -(-(max(value, low) - low) // step) * step
+    return min(value, high)
+
+
+def enum_frame_sizes(device, pixelformat, target=None):
+    """VIDIOC_ENUM_FRAMESIZES：返回 [(宽, 高)]；连续或步进范围返回最小、最大尺寸与对齐后的目标尺寸"""
+    sizes = []
+    for index in range(MAX_ENUM):
+        fs = v4l2_frmsizeenum(index=index, pixel_format=pixelformat)
+        try:
+            device.ioctl(VIDIOC_ENUM_FRAMESIZES, fs)
+        except OSError:
+            break
+        if fs.type == V4L2_FRMSIZE_TYPE_DISCRETE:
+            sizes.append((fs.discrete.width, fs.discrete.height))
+            continue
+        sw = fs.stepwise  # 连续 / 步进范围只有一项
+        sizes += [(sw.min_width, sw.min_height), (sw.max_width, sw.max_height)]
+        if target:
+            sizes.append((_align(target[0], sw.min_width, sw.max_width, sw.step_width),
+                          _align(target[1], sw.min_height, sw.max_height, sw.step_height)))
+        break
+    return list(dict.fromkeys(sizes))
+
+
+def enum_frame_intervals(device, pixelformat, width, height, fps=None):
+    """VIDIOC_ENUM_FRAMEINTERVALS：返回 [(分子, 分母)]；连续或步进范围返回两端与目标帧率对应的间隔"""
+    intervals = []
+    for index in range(MAX_ENUM):
+        fi = v4l2_frmivalenum(index=index, pixel_format=pixelformat, width=width, height=height)
+        try:
+            device.ioctl(VIDIOC_ENUM_FRAMEINTERVALS, fi)
+        except OSError:
+            break
+        if fi.type == V4L2_FRMIVAL_TYPE_DISCRETE:
+            intervals.append((fi.discrete.numerator, fi.discrete.denominator))
+            continue
+        low, high = fi.stepwise.min, fi.stepwise.max  # 最短、最长帧间隔
+        intervals += [(low.numerator, low.denominator), (high.numerator, high.denominator)]
+        if fps and low.denominator and high.denominator and Fraction(low.numerator, low.denominator) <= 1 / Fraction(fps) <= Fraction(high.numerator, high.denominator):
+            target = (1 / Fraction(fps)).limit_denominator(100000)
+            intervals.append((target.numerator, target.denominator))
+        break
+    return [interval for interval in dict.fromkeys(intervals) if interval[0] and interval[1]]
+
+
+def enum_modes(device, request=None):
+    """列出设备支持、且采集引擎能转换的全部模式；request 中的尺寸与帧率用于连续 / 步进范围的取值"""
+    request = request or {}
+    modes = []
+    for pixelformat, _ in enum_formats(device):
+        if pixelformat not in PREFERRED_FORMATS:
+            continue
+        for width, height in enum_frame_sizes(device, pixelformat, request.get("size")):
+            intervals = enum_frame_intervals(device, pixelformat, width, height, request.get("fps"))
+            for interval in intervals or [None]:  # 驱动不报告帧间隔时帧率未知
+                modes.append(CaptureMode(pixelformat, width, height, interval))
+    return modes
+
+
+def format_rank(mode, request):  # 格式优先级：需求指定的格式最优先，其余按 PREFERRED_FORMATS
+    wanted = request.get("format")
+    if wanted and mode.pixelformat == fourcc(wanted):
+        return -1
+    return PREFERRED_FORMATS.index(mode.pixelformat)
+
+
+def choose_mode(modes, request):
+    """选出满足需求且开销最小的模式：像素最少（未指定尺寸时取最大尺寸）、格式优先、帧率最低；没有满足的模式时依次放宽帧率、尺寸"""
+    size, fps, wanted = request.get("size"), request.get("fps"), request.get("format")
+    if not modes:
+        return None
+    candidates = [m for m in modes if m.pixelformat == fourcc(wanted)] if wanted else modes
+    candidates = candidates or modes  # 设备不支持指定格式时使用其他格式
+    fits_size = [m for m in candidates if m.width >= size[0] and m.height >= size[1]] if size else candidates
+    fits = [m for m in fits_size if not m.interval or m.fps >= fps * FPS_TOLERANCE] if fps else fits_size
+    if fits:
+        return min(fits, key=lambda m: (m.pixels if size else -m.pixels, format_rank(m, request), not m.interval, m.fps))
+    if fits_size:  # 尺寸满足但帧率不足：取帧率最高的
+        return min(fits_size, key=lambda m: (-m.fps, m.pixels if size else -m.pixels, format_rank(m, request)))
+    return min(candidates, key=lambda m: (-m.pixels, -m.fps, format_rank(m, request)))  # 尺寸都不够：取最大尺寸
+
+
+def request_key(request):  # 需求的缓存键，如 "MJPG:640x480@30"、"*:max"
+    size, fps = request.get("size"), request.get("fps")
+    key = f"{request.get('format') or '*'}:{'%dx%d' % tuple(size) if size else 'max'}"
+    return f"{key}@{fps:g}" if fps else key
+
+
+def parse_mode_spec(spec):
+    """解析采集需求字符串 "[格式:]宽x高[@帧率]"，如 "MJPG:1280x720@30"、"640x480"、"max@60"；格式错误时抛出 ValueError"""
+    request = {}
+    fmt, _, rest = spec.strip().rpartition(":")
+    if fmt:
+        if len(fmt) != 4:
+            raise ValueError(f"像素格式应为四字符码：{fmt}")
+        request["format"] = fmt.upper()
+    size, _, fps = rest.partition("@")
+    if fps:
+        request["fps"] = float(fps)
+    if size.lower() != "max":
+        width, _, height = size.lower().partition("x")
+        if not (width.isdigit() and height.isdigit()):
+            raise ValueError(f"无效的采集需求 {spec}，应为 [格式:]宽x高[@帧率]")
+        request["size"] = (int(width), int(height))
+    return request
+
+
+# 按 VID-PID 缓存的协商结果：{"VID-PID 需求": 模式}
+_cache_lock = Lock()
+_cache = None
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(MODE_CACHE, encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):  # 首次运行或文件损坏
+            _cache = {}
+    return _cache
+
+
+def _save_cache():  # 先写临时文件再替换，多个进程同时写入时不会留下半个文件
+    try:
+        os.makedirs(os.path.dirname(MODE_CACHE), exist_ok=True)
+        temp = f"{MODE_CACHE}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(_cache, f, indent=2, ensure_ascii=False)
+        os.replace(temp, MODE_CACHE)
+    except OSError as e:
+        print(f"\033[33m警告：采集模式缓存写入失败（{e}）\033[0m")
+
+
+def _cacheable(device_id):  # 无法识别型号的设备不缓存
+    return device_id and device_id != "UNKNOWN"
+
+
+def cached_mode(device_id, request):
+    if not _cacheable(device_id):
+        return None
+    with _cache_lock:
+        data = _load_cache().get(f"{device_id} {request_key(request)}")
+    try:
+        return CaptureMode.from_dict(data) if data else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def store_mode(device_id, request, mode):
+    if not _cacheable(device_id):
+        return
+    with _cache_lock:
+        _load_cache()[f"{device_id} {request_key(request)}"] = mode.as_dict()
+        _save_cache()
+
+
+def forget_mode(device_id, request):  # 驱动不再接受缓存的模式（如固件升级）时清除
+    if not _cacheable(device_id):
+        return
+    with _cache_lock:
+        if _load_cache().pop(f"{device_id} {request_key(request)}", None) is not None:
+            _save_cache()
+
+
+def negotiate(device, device_id, request):
+    """返回 (模式, 是否来自缓存)；设备无法打开或不支持枚举时模式为 None"""
+    mode = cached_mode(device_id, request)
+    if mode is not None:
+        return mode, True
+    if not device.open():
+        return None, False
+    return choose_mode(enum_modes(device, request), request), False
+
+
+def open_capture(device, device_id, request, name=""):
+    """按需求协商模式并打开 mmap 采集，返回已开始采集的 V4L2Capture，失败返回 None（调用方回退 OpenCV）"""
+    for _ in range(2):  # 缓存的模式失效时重新协商一次
+        mode, cached = negotiate(device, device_id, request)
+        if mode is None:  # 不支持枚举：只指定格式，由驱动决定尺寸
+            cap = V4L2Capture(device, pixelformat=fourcc(request["format"]) if request.get("format") else None)
+            return cap if cap.open() else None
+        cap = V4L2Capture(device, **mode.capture_args())
+        opened = cap.open()
+        if opened and (cap.pixelformat, cap.width, cap.height) == (mode.pixelformat, mode.width, mode.height):
+            print(f"{name or device_id}: 采集模式 {mode}{'（缓存）' if cached else ''}")
+            if not cached:  # 驱动接受后才写入缓存
+                store_mode(device_id, request, mode)
+            return cap
+        if not cached:  # 刚枚举出的模式也被驱动调整：接受驱动的结果
+            return cap if opened else None
+        cap.release()
+        forget_mode(device_id, request)
+    return None
+# ----------------------------------------------------------------------------------------------------------------------
@@ -3,6 +3,7 @@ print("\n\033[93m【V4L2 快速参数设置程序：利用 V4L2 命令批量设
 # ----------------------------------------------------------------------------------------------------------------------
 import os
 import subprocess
+from v4l2_ctrl import V4L2Device
 
 # 程序配置3组参数，用户可以自定义，当前 default默认值，value厂商值，setvalue用户值
 SETTING_MODE = "setvalue"
@@ -253,24 +254,26 @@ def get_supported_controls(device): # 获取可用参数列表
     return supported_controls # 返回可用参数列表
 
 def set_camera_params(index, params, mode): # 设置摄像头参数
-    device = f"/dev/video{index}"
-    supported_controls = get_supported_controls(device) # 获取可用参数列表
-    for param in params:
-        if param["v4l2_param"] not in supported_controls:
-            print(f"设备 {device} 不支持参数 {param['chinese_name']}，跳过设置")
-            continue
-        if mode == "default": # 从默认值设置
-            val = param["default"]
-        elif mode == "value": # 从当前值设置
-            val = param["value"]
-        elif mode == "setvalue": # 从设置值设置
-            val = param["setvalue"]
+    with V4L2Device(index) as v4l2_device: # 打开一次设备并读取全部参数当前值
+        device = v4l2_device.path
+        if v4l2_device.native:
+            supported_controls = [ctrl["v4l2_param"] for ctrl in v4l2_device.list_ctrls()] # 原生枚举可用参数
         else:
-            continue
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={val}" # 设置参数
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0: # 检查设置是否成功
-            print(f"设置 {param['chinese_name']} 失败，设备: {device}，错误信息: {result.stderr}")
+            supported_controls = get_supported_controls(device) # 回退 v4l2-ctl 获取可用参数列表
+        if mode not in ("default", "value", "setvalue"): # default默认值，value当前值，setvalue设置值
+            return
+        selected = []
+        for param in params:
+            if param["v4l2_param"] not in supported_controls:
+                print(f"设备 {device} 不支持参数 {param['chinese_name']}，跳过设置")
+                continue
+            selected.append(param)
+        values = [param[mode] for param in selected]
+        changed = v4l2_device.changed_params(selected, values)
+        errors = v4l2_device.apply_params(selected, values) # 只写入与设备当前值不同的参数
+        for param_idx, error in errors.items(): # 检查设置是否成功
+            print(f"设置 {selected[param_idx]['chinese_name']} 失败，设备: {device}，错误信息: {error}")
+        print(f"设备 {device}：{len(selected)} 项参数中 {len(changed)} 项需要写入，{len(selected) - len(changed)} 项已是目标值")
 
 def main():
     camera_info = list_cameras() # 获取可用摄像头列表
@@ -2,260 +2,59 @@
 print("\n\033[93m【带画面的多方案适应多种类软体的相机调试工具】\033[0m")
 print("\033[91m【可以设定多种方案，当前初始化参数设定为 默认值 方案】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
 import cv2
-import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
-from queue import Queue, Empty
-from threading import Thread, Event, Lock
+from threading import Thread
+from v4l2_ctrl import parse_ctrl_id
+from v4l2_events import V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from hotplug import CameraRegistry
+from frame_slot import FrameSlots
+from mosaic import display_mosaic
+from latency import latency_report
+import scheme_camera
+from scheme_camera import SCHEMES, SCHEME_MODES, initialize_params_with_scheme
+from camera_worker import CameraWorker
+from usb_bandwidth import BandwidthPlanner
 
 # 全局配置
 MAX_FPS = 30  # 最大帧率
+SHARED_RING = False  # 是否把全分辨率帧发布到共享内存帧环，供其他进程读取
+WORKER_PROCESSES = False  # 是否每台相机使用独立采集进程（多台相机满帧率运行时并行解码）
+BANDWIDTH_PLAN = True  # 是否按 USB 总线带宽为每台相机规划采集模式（同一主控制器上接多台相机时避免启动失败）
+
+# 每台相机一个最新帧槽位，取代共享帧队列
+frame_slots = FrameSlots()
 
 # 选择方案初始化参数
 INITIAL_SCHEME_NAME = "默认值"
 
-# "方案"：[亮度,对比度,饱和度,色调,自动白平衡,伽马值,增益,电源频率,白平衡,清晰度,背光补偿,自动曝光,绝对曝光时间,动态帧率曝光,绝对对焦,连续自动对焦]
-# 下面提供4组方案仅参考，用户可以自行添加方案，也可以修改当前方案的数值
-SCHEMES = {
-    "默认值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 3, 20, 0, 68, 1],
-    "厂商值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 1, 20, 0, 68, 1],
-    "产品1": [-64, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
-    "产品2": [0, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
-}
-
-# 参数定义结构
-BASE_CAMERA_PARAMS = [
-    {
-        "chinese_name": "亮度",
-        "v4l2_param": "brightness",
-        "hex_numbers": "0x00980900",
-        "type": "int",
-        "min": -64,
-        "max": 64,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "对比度",
-        "v4l2_param": "contrast",
-        "hex_numbers": "0x00980901",
-        "type": "int",
-        "min": 0,
-        "max": 100,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "饱和度",
-        "v4l2_param": "saturation",
-        "hex_numbers": "0x00980902",
-        "type": "int",
-        "min": 0,
-        "max": 100,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "色调",
-        "v4l2_param": "hue",
-        "hex_numbers": "0x00980903",
-        "type": "int",
-        "min": -180,
-        "max": 180,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "自动白平衡",
-        "v4l2_param": "white_balance_automatic",
-        "hex_numbers": "0x0098090c",
-        "type": "bool",
-        "min": None,
-        "max": None,
-        "step": None,
-        "options": "0 表示关闭；1 表示开启",
-    },
-    {
-        "chinese_name": "伽马值",
-        "v4l2_param": "gamma",
-        "hex_numbers": "0x00980910",
-        "type": "int",
-        "min": 100,
-        "max": 500,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "增益",
-        "v4l2_param": "gain",
-        "hex_numbers": "0x00980913",
-        "type": "int",
-        "min": 1,
-        "max": 128,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "电源频率",
-        "v4l2_param": "power_line_frequency",
-        "hex_numbers": "0x00980918",
-        "type": "menu",
-        "min": 0,
-        "max": 2,
-        "step": None,
-        "options": "0 表示禁用；1 表示 50Hz；2 表示 60Hz",
-    },
-    {
-        "chinese_name": "白平衡温度",
-        "v4l2_param": "white_balance_temperature",
-        "hex_numbers": "0x0098091a",
-        "type": "int",
-        "min": 2800,
-        "max": 6500,
-        "step": 10,
-        "options": "",
-    },
-    {
-        "chinese_name": "清晰度",
-        "v4l2_param": "sharpness",
-        "hex_numbers": "0x0098091b",
-        "type": "int",
-        "min": 0,
-        "max": 100,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "背光补偿",
-        "v4l2_param": "backlight_compensation",
-        "hex_numbers": "0x0098091c",
-        "type": "int",
-        "min": 0,
-        "max": 2,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "自动曝光",
-        "v4l2_param": "auto_exposure",
-        "hex_numbers": "0x009a0901",
-        "type": "menu",
-        "min": 0,
-        "max": 3,
-        "step": None,
-        "options": "1 表示手动模式；3 表示光圈优先模式",
-    },
-    {
-        "chinese_name": "绝对曝光时间",
-        "v4l2_param": "exposure_time_absolute",
-        "hex_numbers": "0x009a0902",
-        "type": "int",
-        "min": 0,
-        "max": 10000,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "动态帧率曝光",
-        "v4l2_param": "exposure_dynamic_framerate",
-        "hex_numbers": "0x009a0903",
-        "type": "bool",
-        "min": None,
-        "max": None,
-        "step": None,
-        "options": "0 表示关闭；1 表示开启",
-    },
-    {
-        "chinese_name": "绝对对焦",
-        "v4l2_param": "focus_absolute",
-        "hex_numbers": "0x009a090a",
-        "type": "int",
-        "min": 0,
-        "max": 1023,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "连续自动对焦",
-        "v4l2_param": "focus_automatic_continuous",
-        "hex_numbers": "0x009a090c",
-        "type": "bool",
-        "min": None,
-        "max": None,
-        "step": None,
-        "options": "0 表示关闭；1 表示开启",
-    }
-]
-
-# 根据方案初始化参数
-def initialize_params_with_scheme(scheme):
-    for i, param in enumerate(BASE_CAMERA_PARAMS): # 初始化参数
-        param["default"] = scheme[i]
-        param["value"] = scheme[i]
-        param["setvalue"] = scheme[i]
-    return BASE_CAMERA_PARAMS
-
-# 初始化参数
-BASE_CAMERA_PARAMS = initialize_params_with_scheme(SCHEMES[INITIAL_SCHEME_NAME])
+# 方案定义与参数定义结构见 scheme_camera.py，用户可以在其中自行添加方案
+initialize_params_with_scheme(SCHEMES[INITIAL_SCHEME_NAME])
+
 
 # 摄像头控制器
-class CameraController: # 摄像头控制器
-    def __init__(self, index, device_id):
-        self.cap = None
-        self.index = index
-        self.device_id = device_id
-        self.exit_event = Event()
-        self.lock = Lock()
-        self.last_frame_time = 0
-        self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS] # 摄像头参数
-
-    def initialize(self):  # 初始化摄像头
-        with self.lock:
-            self.cap = cv2.VideoCapture(self.index)  # 打开摄像头
-            if not self.cap.isOpened():  # 检查是否打开成功
-                return False # 打开失败
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
-            return True
-
-    def _init_params(self):  # 初始化参数
-        for param in self.camera_params:
-            value = param["value"]
-            self._set_v4l2_param(param, value)
-
-    def _set_v4l2_param(self, param, value): # 设置摄像头参数
-        device = f"/dev/video{self.index}"
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}" # 设置摄像头参数
-        print(f"执行命令: {cmd}")
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"命令执行失败，错误信息: {result.stderr}")
-
-    def run(self):  # 运行摄像头
-        while not self.exit_event.is_set():  # 循环读取摄像头
-            with self.lock:  # 加锁
-                if self.cap.isOpened():  # 检查摄像头是否打开
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS:  # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read() # 读取摄像头
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full():  # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480))  # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
-        with self.lock:
-            if self.cap.isOpened():
-                self.cap.release()
+class CameraController(scheme_camera.CameraController): # 摄像头控制器
+    max_fps = MAX_FPS
+    shared_ring = SHARED_RING
+    frame_slots = frame_slots
+    capture_mode = SCHEME_MODES.get(INITIAL_SCHEME_NAME)  # 初始方案声明的采集需求
 
 
 class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller  # 摄像头控制器
+        self.applying = False  # 是否正在批量应用参数
+        camera_controller.on_ctrl_event = self.on_ctrl_event  # 接收驱动侧参数变化
+        self.closing = False  # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.name} 参数写入")  # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.name} 参数命令")  # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params)  # 多台相机各自的命令线程并行初始化
+        self.applied_values = [param["value"] for param in camera_controller.camera_params]  # 最近一次写入的参数值，重新接入时恢复
         self.scheme_values = SCHEMES
         self.title(camera_controller.device_id)  # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
@@ -269,6 +68,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
 
     def create_controls(self):  # 创建控件
         param_list = self.camera_controller.camera_params # 摄像头参数
+        self.params_by_id = {parse_ctrl_id(param["hex_numbers"]): param for param in param_list}  # 参数 ID -> 参数
         for i in range(0, len(param_list), 3):
             for col in range(3): # 3列
                 if i + col < len(param_list):
@@ -285,6 +85,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         # 显示值范围
         range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
         range_label.pack(fill=tk.X)
+        param["range_label"] = range_label
         # 显示用户值
         user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
         user_value_label.pack(fill=tk.X)
@@ -301,6 +102,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             slider.pack(side=tk.LEFT, fill=tk.X, expand=True) # 设置滑块
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
+            param["scale"] = slider
+            param["widgets"] = [slider, entry]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param)) # 监听变量变化
         elif param["type"] == "menu":
@@ -312,12 +115,14 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
                 print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。") # 终端红色输出警告
             cb = ttk.Combobox(control_frame, textvariable=var, values=options)
             cb.pack(fill=tk.X, expand=True)
+            param["widgets"] = [cb]
             param["var"] = var
             cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param)) # 监听变量变化
         elif param["type"] == "bool":
             var = tk.IntVar(value=param["value"])
             cb = ttk.Checkbutton(control_frame, variable=var)
             cb.pack(side=tk.LEFT)
+            param["widgets"] = [cb]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
 
@@ -326,6 +131,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         param["status_label"] = status_label
 
     def on_param_change(self, param): # 设置参数
+        if self.applying:  # 批量应用时由 _apply_values 统一写入
+            return
         try:
             value = None
             if param["type"] == "int":
@@ -338,14 +145,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             elif param["type"] == "bool":
                 value = param["var"].get()
 
-            device = f"/dev/video{self.camera_controller.index}" # 摄像头设备
-            cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-            result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True) # 设置摄像头参数
-            if result.returncode == 0:
-                param["status_label"].config(text="设置状态: 成功", foreground="green")
-            else:
-                param["status_label"].config(text="设置状态: 失败", foreground="red")
-                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+            self.writer.submit(param["hex_numbers"], param, value)  # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
             print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 数值超出范围\033[0m")
@@ -353,6 +153,61 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             param["status_label"].config(text="设置状态: 出错", foreground="red")
             print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置出错\033[0m")
 
+    def _write_param(self, param, value):  # 在写入线程中执行，经命令线程写入，与批量写入保持顺序
+        return self.executor.set(param, value).result()
+
+    def _call_ui(self, func, *args):  # 从其他线程转到界面线程执行
+        if self.closing:  # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, error):  # 写入线程回调：转到界面线程显示结果
+        self._call_ui(self._show_write_result, *args, ok)
+
+    def _show_write_result(self, param, value, ok):  # 显示写入结果
+        if ok:
+            for param_idx, item in enumerate(self.camera_controller.camera_params):
+                if item is param:
+                    self.applied_values[param_idx] = value
+            param["status_label"].config(text="设置状态: 成功", foreground="green")
+        else:
+            param["status_label"].config(text="设置状态: 失败", foreground="red")
+            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+
+    def on_ctrl_event(self, event):  # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event):  # 驱动侧参数变化同步到界面，不回写设备
+        param = self.params_by_id.get(event["id"])
+        if param is None or "var" not in param:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in param:
+            param["min"], param["max"] = event["min"], event["max"]
+            param["scale"].config(from_=event["min"], to=event["max"])
+            param["range_label"].config(text=f"范围: {event['min']} ~ {event['max']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in param["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                param["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            self.applying = True  # 只更新界面，不触发写入
+            try:
+                if param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if 0 <= event["value"] < len(options):
+                        param["var"].set(options[event["value"]])
+                else:
+                    param["var"].set(event["value"])
+            finally:
+                self.applying = False
+
     def add_buttons(self):  # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -360,98 +215,138 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             ttk.Button(button_frame, text=name, command=lambda name=name: self.reset_params(name)).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self, scheme_name):  # 修改参数重置逻辑
+    def reset_params(self, scheme_name):  # 按方案批量应用参数
         scheme = self.scheme_values[scheme_name]
-        for param_idx, param in enumerate(self.camera_controller.camera_params):
-            val = scheme[param_idx]
-            if param["type"] == "int":
-                param["var"].set(val)
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                if val < len(options):
-                    param["var"].set(options[val])
-            elif param["type"] == "bool":
-                param["var"].set(val)
-            self.on_param_change(param)
-
-    def exit_app(self):  # 退出
-        self.camera_controller.exit_event.set()
-        with self.camera_controller.lock:
-            if self.camera_controller.cap.isOpened():
-                self.camera_controller.cap.release()
-        cv2.destroyWindow(self.camera_controller.device_id)  # 关闭窗口
-        self.destroy()
+        self._apply_values(self.camera_controller.camera_params, scheme)
 
-
-def list_cameras(): # 检测摄像头
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]  # 视频设备
-
-    for device in video_devices:  # 检测设备
+    def _apply_values(self, params, values): # 同步界面并提交批量原子写入，返回 Future
+        self.applying = True  # 同步界面期间不逐项触发写入
         try:
-            index = int(device.split('video')[1])
-            cmd = ["udevadm", "info", "-q", "property", device] # 获取设备信息
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            vid, pid = "N/A", "N/A"
-            for line in result.stdout.splitlines():   # 解析设备信息
-                if line.startswith("ID_VENDOR_ID="):
-                    vid = line.split('=')[1].strip().upper()
-                elif line.startswith("ID_MODEL_ID="):
-                    pid = line.split('=')[1].strip().upper()
-            device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN" # 设备ID
-            available.append((index, device_id)) # 添加设备信息
+            for param, val in zip(params, values):
+                if param["type"] == "int":
+                    param["var"].set(val)
+                elif param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if val < len(options):
+                        param["var"].set(options[val])
+                elif param["type"] == "bool":
+                    param["var"].set(val)
+        finally:
+            self.applying = False
+        for param in params:
+            param["status_label"].config(text="设置状态: 应用中", foreground="gray")
+        future = self.executor.apply_profile(values)  # 只写入变化的参数，一次 TRY + 一次 S_EXT_CTRLS
+        future.add_done_callback(lambda future: self._call_ui(self._show_apply_result, params, values, future))
+        return future
+
+    def _show_apply_result(self, params, values, future):  # 显示批量写入结果
+        try:
+            errors = future.result()
         except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
+            errors = {param_idx: str(e) for param_idx in range(len(values))}
+        for param_idx, val in enumerate(values):
+            if param_idx not in errors:
+                self.applied_values[param_idx] = val
+        for param_idx, param in enumerate(params):
+            if param_idx in errors:
+                param["status_label"].config(text="设置状态: 失败", foreground="red")
+                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败（{errors[param_idx]}）\033[0m")
+            else:
+                param["status_label"].config(text="设置状态: 成功", foreground="green")
+
+    def exit_app(self):  # 退出
+        self.closing = True
+        self.writer.close()  # 写完已登记的参数
+        self.executor.close()  # 执行完已提交的命令
+        self.camera_controller.exit_event.set()  # 采集线程退出时释放摄像头
+        frame_slots.remove(self.camera_controller.name)  # 不再显示该相机，拼接画面随之重新排列
+        self.destroy()
 
 
-def display_frames():  # 显示帧
-    windows = {}
-    while True:
-        try:
-            device_id, frame = frame_queue.get(timeout=0.1)  # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL)  # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame) # 显示帧
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        except Empty:
-            pass
-        except Exception as e:
-            print(f"显示异常: {str(e)}")
-    cv2.destroyAllWindows()
+def display_frames():  # 显示帧：全部相机拼接到一个窗口，每个屏幕刷新周期只显示一次
+    display_mosaic(frame_slots)
 
 
 def main():
-    global frame_queue # 帧队列
-    frame_queue = Queue(maxsize=2) # 帧队列
-    camera_info = list_cameras() # 摄像头信息
-    if not camera_info:
-        print("未检测到摄像头设备")
-        return
     root = tk.Tk()  # 主窗口
     root.withdraw()  # 隐藏主窗口
     display_thread = Thread(target=display_frames, daemon=True)  # 显示线程
     display_thread.start()  # 启动显示线程
 
-    controllers = [] # 相机控制器
-    apps = []
-    for index, device_id in camera_info: # 创建相机控制器
-        camera_controller = CameraController(index, device_id)
+    cameras = {} # {设备序号: (相机控制器, 控制界面, USB 端口)}
+    last_values = {} # {USB 端口: 拔出前最近一次写入的参数值}
+    planner = BandwidthPlanner() if BANDWIDTH_PLAN else None
+    planned = {} # 启动时整体规划的结果 {设备序号: Assignment}，热插拔接入的相机单独规划
+
+    def start_camera(node): # 启动相机：启动时及热插拔接入时调用
+        if node.index in cameras:
+            return
+        camera_controller = CameraController(node.index, node.device_id)
+        if planner is not None:
+            assignment = planned.pop(node.index, None)  # 启动时的规划说明已整体输出
+            if assignment is None:
+                assignment = planner.add(node, camera_controller.base_request())
+                for step in assignment.steps if assignment is not None else []:
+                    print(f"\033[33m{camera_controller.name}: {step}\033[0m")
+            if assignment is not None:
+                if assignment.mode is None:  # 总线带宽不足：不打开相机，也不启动工作进程
+                    return
+                camera_controller.capture_mode = assignment.capture_request()
+        if WORKER_PROCESSES:  # 采集与参数写入转移到子进程，规划的采集需求随之传入
+            camera_controller = CameraWorker(camera_controller)
         if not camera_controller.initialize(): # 初始化相机
-            print(f"{device_id} 相机初始化失败，未开启")
-            continue
+            print(f"{node.device_id} 相机初始化失败，未开启")
+            if planner is not None:
+                planner.remove(node.index)
+            return
+        if planner is not None:
+            planner.observe(node.index)  # 以实际备用设置修正保留带宽，供之后接入的相机规划
         app = CameraControlPro(root, camera_controller)  # 创建窗口
+        if node.port in last_values:  # 重新接入：恢复拔出前的参数
+            app._apply_values(camera_controller.camera_params, last_values.pop(node.port))
         camera_thread = Thread(target=camera_controller.run, daemon=True)  # 相机线程
         camera_thread.start()  # 启动相机线程
-        controllers.append(camera_controller) # 添加相机控制器
-        apps.append(app)
+        cameras[node.index] = (camera_controller, app, node.port)
+
+    def stop_camera(index): # 相机拔出：记录当前参数并关闭窗口
+        if index not in cameras:
+            return
+        camera_controller, app, port = cameras.pop(index)
+        if planner is not None:
+            planner.remove(index)
+        last_values[port] = list(app.applied_values)
+        print(f"\033[33m{camera_controller.name} 已拔出，重新接入后恢复当前参数\033[0m")
+        if app.winfo_exists():
+            app.exit_app()
+
+    registry = CameraRegistry(  # 监听内核 uevent，回调转回 Tk 主线程执行
+        on_add=lambda node: root.after(0, start_camera, node),
+        on_remove=lambda index: root.after(0, stop_camera, index))
+    hotplug = registry.start()
+    nodes = list_video_nodes() # 摄像头信息
+    if not nodes:
+        if not hotplug:
+            print("未检测到摄像头设备")
+            root.destroy()
+            return
+        print("未检测到摄像头设备，等待相机接入")
+    if planner is not None and nodes:  # 同一总线上的相机一起规划，超出预算时逐台降级
+        planned.update(planner.plan(nodes, CameraController.base_request()))
+        for line in planner.explain():
+            print(line)
+    for node in nodes:
+        start_camera(node)
 
     root.mainloop()
+    registry.stop()
+    controllers = [entry[0] for entry in cameras.values()] # 相机控制器
     for controller in controllers: # 关闭相机
         controller.exit_event.set()
+    if WORKER_PROCESSES:  # 等待子进程释放摄像头
+        for controller in controllers:
+            controller.close()
     cv2.destroyAllWindows()  # 关闭窗口
+    print(latency_report())  # 退出时输出各设备延迟统计
 
 
 if __name__ == "__main__":
@@ -48,6 +48,7 @@ declare -A VERSIONS=(
 DEVICE_SN="device_sn.py" # 设备序列号 【硬编码路径】
 DEVICE_LIST="device_list.py" # 设备列表
 DEVICE_SN_LIST="device_sn_list.py" # 带序列号的设备列表 【硬编码路径】
+USB_PLAN="usb_plan.py" # USB 带宽规划，按总线列出每台相机的采集模式与原因
 
 # 相机功能相关
 CAMERA_PREVIEW="camera_preview.py" # 相机画面预览
@@ -62,6 +63,33 @@ V4L2_QUICK="v4l2_quick.py" # V4L2 通过预定方案快速设置
 V4L2_TEST_SLIDER="v4l2_test_slider.py" # V4L2 多摄像头画面调试工具，针对成品系列 白色9*9
 V4L2_TEST_SCHEME="v4l2_test_scheme.py" # V4L2 多摄像头画面调试工具，针对测试系列 灰色9*9 纯白 纯灰
 HD_WEBCAM_DEBUG="hd_webcam_debug.py" # HD WebCam 调试
+HEADLESS_RUNNER="headless_runner.py" # 无界面相机运行程序，可作为 systemd 服务
+
+# 公共模块相关
+V4L2_CTRL="v4l2_ctrl.py" # V4L2 原生参数控制模块，通过 ioctl 直接读写参数，v4l2-ctl 仅作回退
+V4L2_CAPTURE="v4l2_capture.py" # V4L2 mmap 零拷贝采集模块，可替代 cv2.VideoCapture 作为采集源
+FRAME_SLOT="frame_slot.py" # 多相机最新帧槽位模块
+FRAME_RING="frame_ring.py" # 共享内存帧环模块
+CAMERA_WORKER="camera_worker.py" # 多进程相机采集模块
+LATENCY="latency.py" # 帧延迟统计模块
+V4L2_ENUM="v4l2_enum.py" # V4L2 摄像头枚举模块
+HOTPLUG="hotplug.py" # 相机热插拔监听模块
+SN_DAEMON="sn_daemon.py" # 常驻 SN 解析进程
+SN_CLIENT="sn_client.py" # SN 解析进程客户端模块
+DEVICE_INDEX="device_index.py" # SN、USB 端口与视频节点索引模块
+DISCOVERY="discovery.py" # 并发设备探测模块
+JSON_OUTPUT="json_output.py" # NDJSON 结构化输出模块
+V4L2_EVENTS="v4l2_events.py" # V4L2 参数事件监听模块
+CTRL_WRITER="ctrl_writer.py" # 参数写入合并模块
+CTRL_EXECUTOR="ctrl_executor.py" # 参数命令执行模块
+SCHEME_CAMERA="scheme_camera.py" # 方案定义与相机控制器模块（无界面依赖）
+FRAME_SINKS="frame_sinks.py" # 无界面帧输出模块
+CONTROL_API="control_api.py" # 本地参数与状态接口模块（HTTP / Unix 套接字）
+SYNTHETIC_CAMERA="synthetic_camera.py" # 合成相机模块（测试用）
+V4L2_MODES="v4l2_modes.py" # 采集模式协商模块
+USB_BANDWIDTH="usb_bandwidth.py" # USB 带宽规划模块
+MOSAIC="mosaic.py" # 多相机拼接显示模块
+PREPROCESS="preprocess.py" # 帧预处理模块
 
 # 脚本路径定义 【硬编码路径】
 PATH_DEVICE_SN="${WORK_DIR}/venv312/${DEVICE_SN}" # 厂商SDK基于Python 3.12
@@ -75,6 +103,32 @@ PATH_V4L2_QUICK="${WORK_DIR}/venv39/${V4L2_QUICK}"
 PATH_V4L2_TEST_SLIDER="${WORK_DIR}/venv39/${V4L2_TEST_SLIDER}"
 PATH_V4L2_TEST_SCHEME="${WORK_DIR}/venv39/${V4L2_TEST_SCHEME}"
 PATH_HD_WEBCAM_DEBUG="${WORK_DIR}/venv39/${HD_WEBCAM_DEBUG}"
+PATH_V4L2_CTRL="${WORK_DIR}/venv39/${V4L2_CTRL}"
+PATH_V4L2_CAPTURE="${WORK_DIR}/venv39/${V4L2_CAPTURE}"
+PATH_FRAME_SLOT="${WORK_DIR}/venv39/${FRAME_SLOT}"
+PATH_FRAME_RING="${WORK_DIR}/venv39/${FRAME_RING}"
+PATH_CAMERA_WORKER="${WORK_DIR}/venv39/${CAMERA_WORKER}"
+PATH_LATENCY="${WORK_DIR}/venv39/${LATENCY}"
+PATH_V4L2_ENUM="${WORK_DIR}/venv39/${V4L2_ENUM}"
+PATH_HOTPLUG="${WORK_DIR}/venv39/${HOTPLUG}"
+PATH_SN_DAEMON="${WORK_DIR}/venv312/${SN_DAEMON}"
+PATH_SN_CLIENT="${WORK_DIR}/venv39/${SN_CLIENT}"
+PATH_DEVICE_INDEX="${WORK_DIR}/venv39/${DEVICE_INDEX}"
+PATH_DISCOVERY="${WORK_DIR}/venv39/${DISCOVERY}"
+PATH_JSON_OUTPUT="${WORK_DIR}/venv39/${JSON_OUTPUT}"
+PATH_V4L2_EVENTS="${WORK_DIR}/venv39/${V4L2_EVENTS}"
+PATH_CTRL_WRITER="${WORK_DIR}/venv39/${CTRL_WRITER}"
+PATH_CTRL_EXECUTOR="${WORK_DIR}/venv39/${CTRL_EXECUTOR}"
+PATH_SCHEME_CAMERA="${WORK_DIR}/venv39/${SCHEME_CAMERA}"
+PATH_FRAME_SINKS="${WORK_DIR}/venv39/${FRAME_SINKS}"
+PATH_HEADLESS_RUNNER="${WORK_DIR}/venv39/${HEADLESS_RUNNER}"
+PATH_CONTROL_API="${WORK_DIR}/venv39/${CONTROL_API}"
+PATH_SYNTHETIC_CAMERA="${WORK_DIR}/venv39/${SYNTHETIC_CAMERA}"
+PATH_V4L2_MODES="${WORK_DIR}/venv39/${V4L2_MODES}"
+PATH_USB_BANDWIDTH="${WORK_DIR}/venv39/${USB_BANDWIDTH}"
+PATH_USB_PLAN="${WORK_DIR}/venv39/${USB_PLAN}"
+PATH_MOSAIC="${WORK_DIR}/venv39/${MOSAIC}"
+PATH_PREPROCESS="${WORK_DIR}/venv39/${PREPROCESS}"
 
 # 脚本桌面快捷方式
 DESKTOP_DEVICE_SN_PREVIEW="${USER_DESKTOP}/${CAMERA_NAME}序列号画面预览.desktop"
@@ -617,11 +671,18 @@ echo -e "${COLOR_WARNING} 目标设备：ViTai F225-0001 ${COLOR_RESET}" # 警
 echo # 输出空行
 cat << 'EOF' > "${PATH_DEVICE_LIST}" # 程序路径
 # ====================================================== 程序声明 ======================================================
-print("\n\033[93m【检测系统中所有可用摄像头，获取设备索引、节点路径及 USB 设备详细信息】\033[0m")
-print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n")
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【检测系统中所有可用摄像头，获取设备索引、节点路径及 USB 设备详细信息】\033[0m", file=BANNER_OUT)
+print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n", file=BANNER_OUT)
 # ----------------------------------------------------------------------------------------------------------------------
-import cv2  # OpenCV
+import time  # 探测计时
 import subprocess  # 执行系统命令
+from v4l2_enum import list_video_nodes  # 摄像头枚举
+from device_index import DeviceIndex  # USB 端口与视频节点索引
+from contextlib import redirect_stdout
+from discovery import Probe, run_probes, print_probe_report, probe_summary, PROBE_TIMEOUT  # 并发探测
+from json_output import NDJSONWriter, json_mode  # NDJSON 输出
 
 # 目标设备关键词
 TARGET_DEVICE_NAME = "ViTai"
@@ -629,28 +690,15 @@ TARGET_DEVICE_NAME = "ViTai"
 TARGET_VID_PID_COMBINATIONS = ["F225-0001"]
 
 def list_cameras():
-    """获取可用摄像头索引"""
-    index = 0
-    camera_indices = []
-    while True:  # 遍历可用摄像头索引
-        cap = cv2.VideoCapture(index, cv2.CAP_V4L2)  # 打开摄像头
-        if cap.isOpened():  # 检查摄像头是否可用
-            camera_indices.append(index)  # 添加可用摄像头索引
-            cap.release()
-            index += 1
-            continue
-        cap.release()  # 释放摄像头资源
-        if index > 3:  # 防止无限循环，可根据实际情况调整
-            break
-        index += 1
-    return camera_indices  # 返回可用摄像头索引列表
+    """获取可用摄像头索引（sysfs + VIDIOC_QUERYCAP，不打开视频流）"""
+    return [node.index for node in list_video_nodes()]
 
 
 def get_camera_devices():
     """获取摄像头设备节点信息"""
     try:
         cmd = ["v4l2-ctl", "--list-devices"]  # 执行v4l2-ctl命令
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)
         devices = []  # 存储设备节点信息
         for block in result.stdout.strip().split('\n\n'):  # 遍历设备块
             lines = block.split('\n')
@@ -675,7 +723,7 @@ class USBDeviceInfo:  # USB 设备信息类
     def get_info(self):
         """获取 USB 设备信息并分类"""
         try:
-            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True)  # 执行 lsusb 命令
+            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)  # 执行 lsusb 命令
             output = result.stdout.splitlines()  # 获取 lsusb 命令输出
             for line in output:
                 parts = line.split()
@@ -752,24 +800,59 @@ class USBDeviceInfo:  # USB 设备信息类
         print("-" * 80)
 
 
+def get_usb_info():  # 在独立对象中获取 USB 设备信息，超时后仍在运行的探测不影响输出
+    usb_info = USBDeviceInfo()
+    usb_info.get_info()
+    return usb_info
+
+
 def main():
-    # 获取摄像头信息
-    camera_indices = list_cameras()
+    # 并发获取摄像头索引、设备节点与 USB 设备信息
+    start = time.monotonic()
+    probes = [
+        Probe("摄像头索引", list_cameras, default=[]),
+        Probe("设备节点", get_camera_devices, default=[]),
+        Probe("USB 设备", get_usb_info, default=USBDeviceInfo()),
+    ]
+    camera_indices, devices, usb_info = run_probes(probes).values()
     print("\n检测到的摄像头索引：", camera_indices)
-    # 获取设备节点信息
-    devices = get_camera_devices()
     print("\n摄像头设备节点信息：")
     for name, nodes in devices:
         print(f"设备名称：{name}")
         print(f"设备节点：{nodes}\n")
-    # 获取 USB 设备信息
-    usb_info = USBDeviceInfo()
-    usb_info.get_info()
     usb_info.print_info()
+    print_probe_report(probes, time.monotonic() - start)
+
+
+def main_json():
+    """--json：每台相机探测完成后立即输出一条 camera 记录，lsusb 完成后输出 usb 记录，最后输出 summary 记录"""
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):  # 提示与错误信息输出到标准错误
+        start = time.monotonic()
+        index = DeviceIndex.build()
+        usb_probe = Probe("USB 设备", get_usb_info, default=USBDeviceInfo())
+        probes = [Probe(record.port, record.describe) for record in index.records()] + [usb_probe]
+
+        def on_result(probe):
+            if probe is usb_probe:
+                for device in probe.result.target_devices:
+                    writer.emit("usb", target=True, **device)
+                for device in probe.result.non_target_devices:
+                    writer.emit("usb", target=False, **device)
+            elif probe.result is not None:
+                writer.emit("camera", **probe.result)
+            else:
+                writer.emit("error", port=probe.name, status=probe.status)
+
+        run_probes(probes, on_result=on_result)
+        writer.emit("summary", cameras=len(index), **probe_summary(probes, time.monotonic() - start))
 
 
 if __name__ == '__main__':
-    main()
+    if json_mode():
+        main_json()
+    else:
+        main()
 # ----------------------------------------------------------------------------------------------------------------------
 EOF
 # ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
@@ -782,11 +865,19 @@ echo -e "/home/ur/Vitai0506/venv312/device_sn.py" # 警告声明
 echo # 输出空行
 cat << 'EOF' > "${PATH_DEVICE_SN_LIST}" # 程序路径
 # ====================================================== 程序声明 ======================================================
-print("\n\033[93m【检测系统中所有可用摄像头，整合 VID、PID、SN 信息】\033[0m")
-print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n")
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【检测系统中所有可用摄像头，整合 VID、PID、SN 信息】\033[0m", file=BANNER_OUT)
+print("\033[31m\033[1m【目标设备：ViTai F225-0001】\033[0m\n", file=BANNER_OUT)
 # ----------------------------------------------------------------------------------------------------------------------
-import cv2  # OpenCV
+import time  # 探测计时
 import subprocess  # 执行系统命令
+from v4l2_enum import list_video_nodes  # 摄像头枚举
+from contextlib import redirect_stdout
+from discovery import Probe, run_probes, print_probe_report, probe_summary, PROBE_TIMEOUT  # 并发探测
+from json_output import NDJSONWriter, json_mode  # NDJSON 输出
+from sn_client import get_sns  # 常驻 SN 解析进程客户端
+from device_index import DeviceIndex  # SN、USB 端口与视频节点索引
 
 # 目标设备关键词
 TARGET_DEVICE_NAME = "ViTai"
@@ -798,8 +889,14 @@ PYTHON_VENV312 = "/home/ur/Vitai0506/venv312/bin/python"
 DEVICE_SN = "/home/ur/Vitai0506/venv312/device_sn.py"
 # SN码开头固定标识前缀
 SN_PREFIX='GF225'
-
-def get_sn_codes(): # 获取SN码
+# SN 查询超时（秒），首次查询需启动解析进程并加载厂商SDK
+SN_PROBE_TIMEOUT = 30
+
+def get_sn_codes(): # 获取SN码，返回 (SN 列表, {USB 端口路径: SN})：优先查询常驻 SN 解析进程，不可用时回退为单次启动 device_sn.py
+    result = get_sns()
+    if result is not None:
+        ports = {port: sn for port, sn in result["ports"].items() if sn.startswith(SN_PREFIX)}
+        return [sn for sn in result["sns"] if sn.startswith(SN_PREFIX)], ports
     try:
         python_312_path = PYTHON_VENV312 # Python解释器路径
         script_path = DEVICE_SN # 脚本路径
@@ -807,41 +904,29 @@ def get_sn_codes(): # 获取SN码
             [python_312_path, script_path],
             capture_output=True,
             text=True,
-            check=True
+            check=True,
+            timeout=SN_PROBE_TIMEOUT
         )
         sns = [line.strip() for line in result.stdout.split('\n') if line.startswith(SN_PREFIX)] # 提取SN码
-        return sns
+        return sns, {} # device_sn.py 只输出 SN 列表，按 USB 设备 serial 属性绑定
     except subprocess.CalledProcessError as e:
         print(f"调用 {DEVICE_SN} 失败，错误输出：{e.stderr}")
-        return []
+        return [], {}
     except Exception as e:
         print(f"获取SN码时发生未知错误：{e}")
-        return []
+        return [], {}
 
 
 def list_cameras():
-    """获取可用摄像头索引"""
-    index = 0
-    camera_indices = []
-    while True:  # 遍历可用摄像头索引
-        cap = cv2.VideoCapture(index, cv2.CAP_V4L2)  # 打开摄像头
-        if cap.isOpened():  # 检查摄像头是否可用
-            camera_indices.append(index)  # 添加可用摄像头索引
-            cap.release()
-            index += 1
-            continue
-        cap.release()  # 释放摄像头资源
-        if index > 3:  # 防止无限循环，可根据实际情况调整
-            break
-        index += 1
-    return camera_indices  # 返回可用摄像头索引列表
+    """获取可用摄像头索引（sysfs + VIDIOC_QUERYCAP，不打开视频流）"""
+    return [node.index for node in list_video_nodes()]
 
 
 def get_camera_devices():
     """获取摄像头设备节点信息"""
     try:
         cmd = ["v4l2-ctl", "--list-devices"]  # 执行v4l2-ctl命令
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)
         devices = []  # 存储设备节点信息
         for block in result.stdout.strip().split('\n\n'):  # 遍历设备块
             lines = block.split('\n')
@@ -866,7 +951,7 @@ class USBDeviceInfo:  # USB 设备信息类
     def get_info(self):
         """获取 USB 设备信息并分类"""
         try:
-            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True)  # 执行 lsusb 命令
+            result = subprocess.run(['lsusb'], capture_output=True, text=True, check=True, timeout=PROBE_TIMEOUT)  # 执行 lsusb 命令
             output = result.stdout.splitlines()  # 获取 lsusb 命令输出
             for line in output:
                 parts = line.split()
@@ -877,6 +962,9 @@ class USBDeviceInfo:  # USB 设备信息类
                 vid = vid_pid[0].upper()
                 pid = vid_pid[1].upper()
                 vid_pid_combination = f"{vid}-{pid}"
+                # 提取总线号与设备号，用于在设备索引中定位物理设备
+                bus = int(parts[1])
+                devnum = int(parts[3].rstrip(':'))
                 # 提取设备名称和制造商
                 device_name = ' '.join(parts[6:])
                 manufacturer = self._parse_manufacturer(device_name)
@@ -886,7 +974,9 @@ class USBDeviceInfo:  # USB 设备信息类
                     "vid": vid,
                     "pid": pid,
                     "manufacturer": manufacturer,
-                    "vid_pid_combination": vid_pid_combination
+                    "vid_pid_combination": vid_pid_combination,
+                    "bus": bus,
+                    "devnum": devnum
                 }
                 # 分类设备
                 if TARGET_DEVICE_NAME.lower() in device_name.lower():  # 目标设备
@@ -921,53 +1011,103 @@ class USBDeviceInfo:  # USB 设备信息类
         return "N/A"
 
 
-    def print_combined_info(self, sns): # 格式化输出设备信息
-        """格式化输出设备信息"""
+    def print_combined_info(self, index): # 格式化输出设备信息
+        """格式化输出设备信息，SN 码按设备索引中的 USB 物理设备绑定"""
         if not (self.target_devices or self.non_target_devices):
             print("未找到 USB 设备信息")
             return
-        # 添加 SN 码
-        for idx, device in enumerate(self.target_devices):
-            device["sn"] = sns[idx] if idx < len(sns) else "N/A"
+        # 添加 SN 码、USB 端口与视频节点
+        for device in self.target_devices:
+            record = index.lookup_usb(device["bus"], device["devnum"])
+            device["sn"] = record.sn if record and record.sn else "N/A"
+            device["port"] = record.port if record else "N/A"
+            device["nodes"] = ",".join(n.path for n in record.capture_nodes) if record else "N/A"
         print("\nUSB 设备信息：")
 
 
-        print("序号   | 设备名称                        | VID        | PID    | 制造商                 | SN")
-        print("-" * 100)
+        print("序号   | 设备名称                        | VID        | PID    | 制造商                 | SN               | 端口      | 视频节点")
+        print("-" * 130)
         # 打印非目标设备
         for idx, device in enumerate(self.non_target_devices, 1):
             print(
                 f"{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']:<20} | ")
         # 打印分隔线（如果有混合设备）
         if self.target_devices and self.non_target_devices:
-            print("-" * 100)
+            print("-" * 130)
         # 打印目标设备（绿色高亮）
         for idx, device in enumerate(self.target_devices, 1):
             print(
                 # f"\033[32m{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']}\033[0m")
-                f"\033[32m{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']:<20} | {device.get('sn', 'N/A')}\033[0m")
-        print("-" * 100)
+                f"\033[32m{idx:<6}| {device['device_name']:<30} | {device['vid']:<10} | {device['pid']:<6} | {device['manufacturer']:<20} | {device.get('sn', 'N/A'):<16} | {device.get('port', 'N/A'):<9} | {device.get('nodes', 'N/A')}\033[0m")
+        print("-" * 130)
+        # SDK 列出但没有对应 USB 设备的 SN 码
+        if index.unbound_sns:
+            print(f"\033[33m警告：以下 SN 码未匹配到 USB 设备：{', '.join(index.unbound_sns)}\033[0m")
+
+
+def get_usb_info():  # 在独立对象中获取 USB 设备信息，超时后仍在运行的探测不影响输出
+    usb_info = USBDeviceInfo()
+    usb_info.get_info()
+    return usb_info
 
 
 def main():
-    # 获取摄像头信息
-    camera_indices = list_cameras()
+    # 并发获取摄像头索引、设备节点、USB 设备信息、设备索引与 SN 码
+    start = time.monotonic()
+    probes = [
+        Probe("摄像头索引", list_cameras, default=[]),
+        Probe("设备节点", get_camera_devices, default=[]),
+        Probe("USB 设备", get_usb_info, default=USBDeviceInfo()),
+        Probe("设备索引", DeviceIndex.build, default=DeviceIndex()),
+        Probe("SN 码", get_sn_codes, timeout=SN_PROBE_TIMEOUT, default=([], {})),
+    ]
+    camera_indices, devices, usb_info, index, (sns, ports) = run_probes(probes).values()
     print("\n检测到的摄像头索引：", camera_indices)
-    # 获取设备节点信息
-    devices = get_camera_devices()
     print("\n摄像头设备节点信息：")
     for name, nodes in devices:
         print(f"设备名称：{name}")
         print(f"设备节点：{nodes}\n")
-    # 获取 USB 设备信息
-    usb_info = USBDeviceInfo()
-    usb_info.get_info()
-    sns = get_sn_codes()
-    usb_info.print_combined_info(sns) 
+    index.bind_sns(sns, ports)
+    usb_info.print_combined_info(index)
+    print_probe_report(probes, time.monotonic() - start)
+
+
+def main_json():
+    """--json：每台相机探测完成后立即输出一条 camera 记录，SN 查询完成后为每台已绑定相机输出 sn 记录，最后输出 summary 记录"""
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):  # 提示与错误信息输出到标准错误
+        start = time.monotonic()
+        index = DeviceIndex.build()
+        usb_probe = Probe("USB 设备", get_usb_info, default=USBDeviceInfo())
+        sn_probe = Probe("SN 码", get_sn_codes, timeout=SN_PROBE_TIMEOUT, default=([], {}))
+        probes = [Probe(record.port, record.describe) for record in index.records()] + [usb_probe, sn_probe]
+
+        def on_result(probe):
+            if probe is usb_probe:
+                for device in probe.result.target_devices:
+                    writer.emit("usb", target=True, **device)
+                for device in probe.result.non_target_devices:
+                    writer.emit("usb", target=False, **device)
+            elif probe is sn_probe:
+                index.bind_sns(*probe.result)
+                for record in index.records():
+                    if record.sn is not None:
+                        writer.emit("sn", sn=record.sn, port=record.port, video_index=record.video_index)
+            elif probe.result is not None:
+                writer.emit("camera", **probe.result)
+            else:
+                writer.emit("error", port=probe.name, status=probe.status)
+
+        run_probes(probes, on_result=on_result)
+        writer.emit("summary", cameras=len(index), unbound_sns=index.unbound_sns,
+                    **probe_summary(probes, time.monotonic() - start))
 
 
 if __name__ == '__main__':
-    main()
+    if json_mode():
+        main_json()
+    else:
+        main()
 # ----------------------------------------------------------------------------------------------------------------------
 EOF
 # ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
@@ -978,12 +1118,20 @@ echo -e "${COLOR_PY} 实时预览摄像头画面，显示驱动信息和参数
 echo # 输出空行
 cat << 'EOF' > "${PATH_CAMERA_PREVIEW}" # 程序路径
 # ====================================================== 程序声明 ======================================================
-print("\n\033[93m【相机预览与参数查看程序：实时预览摄像头画面，显示驱动信息和参数表格】\033[0m\n")
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【相机预览与参数查看程序：实时预览摄像头画面，显示驱动信息和参数表格】\033[0m\n", file=BANNER_OUT)
 # ----------------------------------------------------------------------------------------------------------------------
 import os
 import cv2
 import subprocess
 from prettytable import PrettyTable
+from queue import Queue, Empty
+from v4l2_enum import list_video_nodes, VideoNode
+from hotplug import CameraRegistry
+from contextlib import redirect_stdout
+from discovery import Probe, run_probes
+from json_output import NDJSONWriter, json_mode
 
 # 十六进制参数 ID 与中文名称的映射
 PARAM_MAP = {
@@ -1021,31 +1169,8 @@ MENU_OPTIONS_MAP = {
 }
 
 def get_available_cameras():
-    """自动发现所有物理摄像头设备"""
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]
-
-    for device in video_devices:
-        try:
-            # 检查设备是否为物理摄像头（基于驱动名称）
-            result = subprocess.run(
-                ["v4l2-ctl", "-d", device, "--all"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            output = result.stdout
-
-            if "Driver name      : uvcvideo" in output:
-                # 尝试用 OpenCV 打开设备
-                cap = cv2.VideoCapture(device)
-                if cap.isOpened():
-                    available.append(device)
-                    cap.release()
-        except Exception as e:
-            print(f"检测设备 {device} 时出错: {str(e)}")
-
-    return available
+    """自动发现所有物理摄像头设备：读取 sysfs 与 VIDIOC_QUERYCAP，只保留 uvcvideo 视频采集节点"""
+    return [node.path for node in list_video_nodes(driver="uvcvideo")]
 
 
 def get_driver_info(device_path):
@@ -1202,6 +1327,9 @@ def print_driver_info(driver_info, device_index): # 打印驱动信息
     print(f"帧率\t{driver_info.get('FrameRate', '未知')}")
     print()
 
+# 参数表格各列在 JSON 记录中的字段名
+CONTROL_FIELDS = ["name", "english_name", "id", "type", "min", "max", "step", "default", "value", "note"]
+
 def print_parameter_table(table, device_index): # 打印参数表格
     table_obj = PrettyTable()
     table_obj.field_names = ["中文名称", "英文名称", "参数 ID", "类型", "最小值", "最大值", "步长", "默认值", "当前值", "备注"]
@@ -1214,69 +1342,102 @@ def print_parameter_table(table, device_index): # 打印参数表格
 # 获取设备信息
 def get_device_id(device_path):
     """获取设备的 VID-PID 组合"""
-    try:
-        cmd = ["udevadm", "info", "-q", "property", device_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        vid = "N/A"
-        pid = "N/A"
-        # 获取设备信息
-        for line in result.stdout.splitlines():
-            if line.startswith("ID_VENDOR_ID="):
-                vid = line.split('=')[1].strip().upper()
-            elif line.startswith("ID_MODEL_ID="):
-                pid = line.split('=')[1].strip().upper()
-        return f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-    except Exception as e:
-        print(f"获取设备ID失败: {str(e)}")
-        return "UNKNOWN"
+    return VideoNode(os.path.basename(device_path)).device_id
+
+
+def describe_camera(device_path): # 驱动信息与参数，用于 --json 输出
+    return {
+        "device": device_path,
+        "device_index": int(device_path[len("/dev/video"):]),
+        "device_id": get_device_id(device_path),
+        "driver": get_driver_info(device_path),
+        "controls": [dict(zip(CONTROL_FIELDS, row)) for row in convert_to_table(parse_v4l2_controls(device_path))],
+    }
 
 
+# --json：并发查询各摄像头，每台查询完成后立即输出一条 camera 记录，不打开预览
+if json_mode():
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr): # 提示与错误信息输出到标准错误
+        run_probes([Probe(path, describe_camera, args=(path,)) for path in get_available_cameras()],
+                   on_result=lambda probe: writer.emit("camera", **probe.result) if probe.result is not None
+                   else writer.emit("error", device=probe.name, status=probe.status))
+    sys.exit(0)
+
 # 主程序
-available_devices = get_available_cameras() # 获取可用摄像头列表
-caps = [] # 保存摄像头对象
-device_ids = [] # 保存设备ID
+cameras = {} # {设备路径: (摄像头对象, 设备ID)}
+events = Queue() # 热插拔事件，在预览循环中处理
+failures = {} # {设备路径: 连续读取失败次数}
+READ_RETRIES = 30 # 设备仍存在时，连续读取失败多少次后重新打开
+
 
-# 打开摄像头
-for idx, device_path in enumerate(available_devices):
+def open_camera(device_path): # 打开摄像头并打印驱动信息与参数
     cap = cv2.VideoCapture(device_path)
     if not cap.isOpened():
         print(f"无法打开摄像头设备 {device_path}")
-        continue
-
-    # 获取设备ID
-    device_id = get_device_id(device_path)
-    device_ids.append(device_id)
-
-    # 获取驱动信息
-    driver_info = get_driver_info(device_path)
-    caps.append(cap)
-    driver_info = get_driver_info(device_path)
+        return
+    device_index = int(device_path[len("/dev/video"):])
+    device_id = get_device_id(device_path) # 获取设备ID
+    driver_info = get_driver_info(device_path) # 获取驱动信息
     all_controls = parse_v4l2_controls(device_path)
     parameter_table = convert_to_table(all_controls)
-
     # 打印参数信息
-    print_driver_info(driver_info, idx)
-    print_parameter_table(parameter_table, idx)
+    print_driver_info(driver_info, device_index)
+    print_parameter_table(parameter_table, device_index)
+    cameras[device_path] = (cap, device_id)
+
+
+def close_camera(device_path): # 关闭摄像头，其余摄像头继续预览
+    cap, device_id = cameras.pop(device_path)
+    failures.pop(device_path, None)
+    cap.release()
+    try:
+        cv2.destroyWindow(device_id)
+    except cv2.error:  # 尚未显示过画面，窗口不存在
+        pass
+
+
+registry = CameraRegistry( # 监听相机接入/拔出
+    on_add=lambda node: events.put(("add", node.path)) if node.driver == "uvcvideo" else None,
+    on_remove=lambda index: events.put(("remove", f"/dev/video{index}")))
+hotplug = registry.start()
+for device_path in get_available_cameras(): # 获取可用摄像头列表
+    open_camera(device_path)
 
 print("\n\033[93m【预览按下 Q 键退出】\033[0m\n")
-while True:
-    all_frames_read = True # 是否所有摄像头都读取到了画面
-    for i, cap in enumerate(caps): # 逐个读取摄像头画面
+while cameras or hotplug:
+    try:
+        action, device_path = events.get(block=not cameras, timeout=0.1) # 没有相机时等待接入，超时后照常处理按键
+        if action == "add" and device_path not in cameras:
+            open_camera(device_path)
+        elif action == "remove" and device_path in cameras:
+            print(f"摄像头 {device_path} 已拔出")
+            close_camera(device_path)
+    except Empty:
+        pass
+    for device_path, (cap, device_id) in list(cameras.items()): # 逐个读取摄像头画面
         ret, frame = cap.read()
         if not ret:
-            print(f"无法读取摄像头 {i} 画面")
-            all_frames_read = False
-            break
-        cv2.imshow(device_ids[i], frame) # 显示画面
-
-    if not all_frames_read:
-        break
+            if not hotplug or not os.path.exists(device_path): # 没有热插拔监听或设备已消失：关闭
+                print(f"无法读取摄像头 {device_id} 画面")
+                close_camera(device_path)
+                continue
+            failures[device_path] = failures.get(device_path, 0) + 1 # 设备仍存在：重试，拔出由 remove 事件处理
+            if failures[device_path] == 1:
+                print(f"\033[33m无法读取摄像头 {device_id} 画面，重试中\033[0m")
+            if failures[device_path] % READ_RETRIES == 0: # 连续失败：重新打开设备
+                cap.release()
+                cap.open(device_path)
+            continue
+        failures.pop(device_path, None)
+        cv2.imshow(device_id, frame) # 显示画面
 
     if cv2.waitKey(1) & 0xFF == ord('q'): # 按下 q 键退出
         break
 
 # 释放资源
-for cap in caps:
+registry.stop()
+for cap, _ in cameras.values():
     cap.release()
 cv2.destroyAllWindows()
 # ----------------------------------------------------------------------------------------------------------------------
@@ -1366,19 +1527,26 @@ cat << 'EOF' > "${PATH_OPENCV_DEBUG}" # 程序路径
 print("\n\033[93m【借助OpenCV调节摄像头参数，支持保存与重置，可实时预览】\033[0m")
 print("\033[91m【在采用OpenCV调试的过程中，存在部分参数无法设置，已放弃】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
 import cv2
 import json
 import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
 from queue import Queue, Empty
+from collections import deque
 from threading import Thread, Event, Lock
+from v4l2_ctrl import V4L2Device, parse_ctrl_id
+from v4l2_events import ControlEventListener, V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from mosaic import Mosaic
+from preprocess import Preprocessor
 
 # 全局配置
 MAX_FPS = 30 # 最大帧率
 CONFIG_FILE = "camera_params.json" # 配置文件路径，由于OpenCV支持有问题所以放弃，对此只是保留但是没有实际作用
+ECHO_LIMIT = 32 # 每个参数记录的待确认写入值上限
 
 # 定义队列用于传递帧数据
 frame_queue = Queue(maxsize=2)
@@ -1509,6 +1677,8 @@ class CameraController:
         self.exit_event = Event()
         self.lock = Lock()
         self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
 
     def initialize(self): # 初始化摄像头
         with self.lock:
@@ -1516,10 +1686,31 @@ class CameraController:
             if not self.cap.isOpened(): # 检查是否打开成功
                 return False
             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数（如自动曝光调整曝光时间）直接推送到界面，不再写后回读
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self): # 初始化参数
+    def cv_set(self, param_id, config, value): # 经 OpenCV 写入参数，返回 cap.set 的结果
+        # OpenCV 使用另一个文件描述符，写入会产生参数事件：只在值与缓存不同时登记回传，写入失败时撤销登记
+        # 值未变化或写入失败时驱动不发送事件，残留的登记会吞掉之后驱动自行调整到该值的事件
+        echoes = config.setdefault("echoes", deque(maxlen=ECHO_LIMIT))
+        expected = self.device.cached(param_id) != value
+        if expected:
+            echoes.append(value)
+        ret = False
+        try:
+            with self.lock: # 与采集线程的 cap.read() 互斥
+                ret = self.cap.set(config["cv_constant"], value)
+        finally:
+            if expected and not ret:
+                try:
+                    echoes.remove(value)
+                except ValueError:
+                    pass
+        return ret
+
+    def init_params(self): # 初始化参数，由控制界面的参数命令线程执行
         try:
             with open(CONFIG_FILE, 'r') as f: # 读取配置文件
                 saved_params = json.load(f).get(self.device_id, {})
@@ -1530,37 +1721,41 @@ class CameraController:
             value = saved_params.get(param_id, config["value"]) # 获取参数值
             if config["cv_constant"] is not None: # 使用 OpenCV 设置参数
                 try:
-                    ret = self.cap.set(config["cv_constant"], value) # 设置参数
+                    ret = self.cv_set(param_id, config, value) # 设置参数
                     if not ret:
                         print(f"{self.device_id} 参数 {config['chinese_name']} 初始化失败")
                 except Exception as e:
                     print(f"{self.device_id} 参数 {config['chinese_name']} 初始化错误: {str(e)}")
             elif param_id == "0x0098091a":  # 白平衡温度
-                try:
-                    device = f"/dev/video{self.index}"
-                    command = f"v4l2-ctl -d {device} --set-ctrl=white_balance_temperature={value}"
-                    subprocess.run(command, shell=True, check=True)
-                except subprocess.CalledProcessError as e:
-                    print(f"{self.device_id} 参数 {config['chinese_name']} 初始化错误: {e}")
+                ok, error = self.device.set_ctrl(param_id, value, "white_balance_temperature")
+                if not ok:
+                    print(f"{self.device_id} 参数 {config['chinese_name']} 初始化错误: {error}")
 
     def run(self): # 运行摄像头
+        preprocessor = Preprocessor((640, 480))  # 缩放结果写入预分配的轮换缓冲区，轮换深度大于帧队列长度
         while not self.exit_event.is_set(): # 循环读取摄像头
-            with self.lock:
-                if self.cap.isOpened():
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS: # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read()
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full(): # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480)) # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
+            remaining = 1 / MAX_FPS - (time.time() - self.last_frame_time)
+            if remaining > 0 and self.exit_event.wait(remaining): # 限制帧率，等待期间不持锁也不空转
+                break
+            with self.lock: # cap.read() 阻塞到驱动出帧，仅读取期间持锁
+                if not self.cap.isOpened():
+                    break
+                ret, frame = self.cap.read()
+            self.last_frame_time = time.time()
+            if ret and not frame_queue.full(): # 将帧放入队列
+                frame = preprocessor.apply(frame) # 缩放
+                frame_queue.put((self.device_id, frame), block=False)
 
 class CameraControlPro(tk.Toplevel): # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller # 摄像头控制器
+        self.applying = False # 是否正在按参数事件同步界面
+        camera_controller.on_ctrl_event = self.on_ctrl_event # 接收驱动侧参数变化
+        self.closing = False # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.device_id} 参数写入") # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.device_id} 参数命令") # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params) # 多台相机各自的命令线程并行初始化
         self.title(camera_controller.device_id) # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app) # 退出时关闭窗口
         self.row = 0
@@ -1575,6 +1770,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
 
     def create_controls(self): # 创建控件
         param_list = list(CameraConfig.PARAM_MAP.items()) # 参数列表
+        self.params_by_id = {parse_ctrl_id(param_id): config for param_id, config in param_list} # 参数 ID -> 参数配置
         for i in range(0, len(param_list), 3):
             for col in range(3):
                 if i + col < len(param_list):
@@ -1587,6 +1783,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
     def _create_control_widget(self, frame, config, param_id): # 创建控件
         range_default = ttk.Label(frame, text=f"范围: {config['range'][0]} ~ {config['range'][1]} | 默认: {config['value']}") # 范围
         range_default.pack(fill=tk.X)
+        config["range_label"] = range_default
 
         control_frame = ttk.Frame(frame) # 控件框架
         control_frame.pack(fill=tk.X, pady=2) # 控件框架
@@ -1597,6 +1794,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
             cb = ttk.Combobox(control_frame, textvariable=var, values=options) # 下拉框
             cb.pack(side=tk.LEFT, fill=tk.X, expand=True)
             config["var"] = var # 保存变量
+            config["widgets"] = [cb]
             cb.bind("<<ComboboxSelected>>", lambda e, c=config, pid=param_id: self.on_param_change(e, c, pid)) # 绑定下拉框事件
         else:
             var = tk.IntVar(value=config["value"]) # 滑块变量
@@ -1605,6 +1803,8 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
             config["var"] = var
+            config["scale"] = slider
+            config["widgets"] = [slider, entry]
             var.trace("w", lambda *args, c=config, pid=param_id: self.on_param_change(None, c, pid)) # 绑定滑块事件
 
         status_label = ttk.Label(frame, text="设置状态: 未设置", foreground="gray") # 设置状态
@@ -1612,6 +1812,8 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
         config["status_label"] = status_label
 
     def on_param_change(self, event, config, param_id): # 参数改变事件
+        if self.applying: # 按参数事件同步界面时不回写设备
+            return
         try:
             value = config["var"].get() # 获取参数值
             if config.get("options", ""):
@@ -1628,6 +1830,7 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
                 return
             config['old_value'] = value
 
+            auto_focus_on = False
             if param_id == "0x009a090a":  # 绝对焦点
                 auto_focus_config = CameraConfig.PARAM_MAP["0x009a090c"]  # 连续自动对焦参数
                 auto_focus_value = auto_focus_config["var"].get()
@@ -1635,49 +1838,8 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
                     auto_focus_val = auto_focus_config["options"].split("；").index(auto_focus_value)
                 else:
                     auto_focus_val = auto_focus_value
-                if auto_focus_val == 1:  # 若连续自动对焦开启
-                    device = f"/dev/video{self.camera_controller.index}"
-                    try:
-                        command = f"v4l2-ctl -d {device} --set-ctrl=focus_automatic_continuous=0"
-                        subprocess.run(command, shell=True, check=True)
-                        auto_focus_config["var"].set("关闭")
-                        print(f"{self.device_id} 已关闭连续自动对焦")
-                    except subprocess.CalledProcessError as e:
-                        print(f"{self.device_id} 关闭连续自动对焦失败，无法设置手动焦点")
-                        return
-
-            color = None  # 初始化 color 变量
-            if param_id == "0x0098091a":  # 白平衡温度
-                try:
-                    device = f"/dev/video{self.camera_controller.index}"
-                    command = f"v4l2-ctl -d {device} --set-ctrl=white_balance_temperature={value}"
-                    subprocess.run(command, shell=True, check=True)
-                    color = "green"
-                    status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 成功"
-                except subprocess.CalledProcessError as e:
-                    color = "red"
-                    status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，错误信息: {e}"
-            elif config["cv_constant"] is not None:
-                with self.camera_controller.lock:
-                    ret = self.camera_controller.cap.set(config["cv_constant"], value)
-                    current_value = self.camera_controller.cap.get(config["cv_constant"])
-                    ret = ret and (current_value == value)
-
-                color = "green" if ret else "red"
-                status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: {'成功' if ret else '失败'}"
-            else:
-                color = "red"
-                status_msg = f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，不支持该参数设置"
-
-            print(f"\033[{32 if color == 'green' else 31}m{status_msg}\033[0m")
-            config["status_label"].config(text=f"设置状态: {'成功' if color == 'green' else '失败'}", foreground=color)
-            if color == "green":
-                if param_id != "0x0098091a":
-                    with self.camera_controller.lock:
-                        current_value = self.camera_controller.cap.get(config["cv_constant"])
-                    if current_value != value:
-                        print(
-                            f"{self.device_id} 参数 {config['chinese_name']} 设置后自动恢复，期望 {value}，实际 {current_value}")
+                auto_focus_on = auto_focus_val == 1
+            self.writer.submit(param_id, config, param_id, value, auto_focus_on) # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             color = "red"
             status_msg = f"{self.device_id} 参数错误: {str(ve)}"
@@ -1689,6 +1851,81 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
             print(f"\033[31m{status_msg}\033[0m")
             config["status_label"].config(text="设置状态: 出错", foreground=color)
 
+    def _write_param(self, config, param_id, value, auto_focus_on): # 在写入线程中执行，经命令线程写入，与重置保持顺序
+        return self.executor.submit(self._write_device, config, param_id, value, auto_focus_on).result()
+
+    def _write_device(self, config, param_id, value, auto_focus_on): # 在命令线程中执行，返回 (成功与否, 状态信息)
+        if auto_focus_on:  # 若连续自动对焦开启，先关闭
+            ok, _ = self.camera_controller.device.set_ctrl("0x009a090c", 0, "focus_automatic_continuous")
+            if not ok:
+                return False, f"{self.device_id} 关闭连续自动对焦失败，无法设置手动焦点"
+            self._call_ui(CameraConfig.PARAM_MAP["0x009a090c"]["var"].set, "关闭")
+            print(f"{self.device_id} 已关闭连续自动对焦")
+        if param_id == "0x0098091a":  # 白平衡温度
+            ok, error = self.camera_controller.device.set_ctrl(param_id, value, "white_balance_temperature")
+            if ok:
+                return True, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 成功"
+            return False, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，错误信息: {error}"
+        if config["cv_constant"] is not None:
+            ret = self.camera_controller.cv_set(param_id, config, value) # 只阻塞写入线程
+            return ret, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: {'成功' if ret else '失败'}"
+        return False, f"{self.device_id} 修改 {config['chinese_name']} 为 {value}，状态: 失败，不支持该参数设置"
+
+    def _call_ui(self, func, *args): # 从其他线程转到界面线程执行
+        if self.closing: # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError): # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, status_msg): # 写入线程回调
+        self._call_ui(self._show_write_result, args[0], ok, status_msg)
+
+    def _show_write_result(self, config, ok, status_msg): # 显示写入结果
+        print(f"\033[{32 if ok else 31}m{status_msg}\033[0m")
+        config["status_label"].config(text=f"设置状态: {'成功' if ok else '失败'}", foreground="green" if ok else "red")
+
+    def on_ctrl_event(self, event): # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError): # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event): # 驱动侧参数变化同步到界面
+        config = self.params_by_id.get(event["id"])
+        if config is None or "var" not in config:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in config:
+            config["range"] = (event["min"], event["max"])
+            config["scale"].config(from_=event["min"], to=event["max"])
+            config["range_label"].config(text=f"范围: {event['min']} ~ {event['max']} | 默认: {config['value']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in config["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                config["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if not event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            return
+        value = event["value"]
+        echoes = config.get("echoes")
+        if echoes and value in echoes: # 本程序经 OpenCV 写入产生的事件
+            while echoes.popleft() != value:
+                pass
+            return
+        print(f"\033[33m{self.device_id} 参数 {config['chinese_name']} 被驱动调整为 {value}\033[0m")
+        config["old_value"] = value
+        self.applying = True
+        try:
+            if config.get("options", ""):
+                options = config["options"].split("；")
+                if 0 <= value < len(options):
+                    config["var"].set(options[value])
+            else:
+                config["var"].set(value)
+        finally:
+            self.applying = False
+
     def add_buttons(self): # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -1696,40 +1933,53 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
         ttk.Button(button_frame, text="保存(S)", command=self.save_params).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self): # 重置参数
-        for param_id, config in CameraConfig.PARAM_MAP.items():
-            if config["cv_constant"] is not None:
-                try:
-                    default_val = config["value"] # 默认值
+    def reset_params(self): # 重置参数：界面立即更新，写入由命令线程执行
+        items = [] # (参数配置, 参数 ID, 默认值)
+        self.applying = True # 同步界面期间不逐项触发写入
+        try:
+            for param_id, config in CameraConfig.PARAM_MAP.items():
+                if config["cv_constant"] is None and param_id != "0x0098091a":
+                    continue
+                default_val = config["value"] # 默认值
+                if config["cv_constant"] is not None:
                     if config.get("options", ""):
                         options = config["options"].split("；")
                         config["var"].set(options[default_val])
                     else:
                         config["var"].set(default_val) # 设置默认值
-                    with self.camera_controller.lock:
-                        ret = self.camera_controller.cap.set(config["cv_constant"], default_val) # 设置参数
-                        current_value = self.camera_controller.cap.get(config["cv_constant"]) # 验证设置是否成功
-                        ret = ret and (current_value == default_val)
-
-                    color = "green" if ret else "red"
-                    status_msg = f"{self.device_id} 重置 {config['chinese_name']} 成功"
-                    print(f"\033[{32 if color == 'green' else 31}m{status_msg}\033[0m")
-                    config["status_label"].config(text="设置状态: 成功", foreground=color)
-                except Exception as e:
-                    print(f"\033[31m{self.device_id} 重置出错: {str(e)}\033[0m")
-            elif param_id == "0x0098091a":  # 白平衡温度
-                try:
-                    device = f"/dev/video{self.camera_controller.index}"
-                    default_val = config["value"]
-                    command = f"v4l2-ctl -d {device} --set-ctrl=white_balance_temperature={default_val}"
-                    subprocess.run(command, shell=True, check=True)
-                    color = "green"
-                    status_msg = f"{self.device_id} 重置 {config['chinese_name']} 成功"
-                except subprocess.CalledProcessError as e:
-                    color = "red"
-                    status_msg = f"{self.device_id} 重置 {config['chinese_name']} 失败，错误信息: {e}"
-                print(f"\033[{32 if color == 'green' else 31}m{status_msg}\033[0m")
-                config["status_label"].config(text=f"设置状态: {'成功' if color == 'green' else '失败'}", foreground=color)
+                config["status_label"].config(text="设置状态: 应用中", foreground="gray")
+                items.append((config, param_id, default_val))
+        finally:
+            self.applying = False
+        future = self.executor.submit(self._reset_device, items)
+        future.add_done_callback(lambda future: self._call_ui(self._show_reset_result, future))
+        return future
+
+    def _reset_device(self, items): # 在命令线程中执行，返回 [(参数配置, 成功与否, 状态信息)]
+        results = []
+        for config, param_id, default_val in items:
+            if param_id == "0x0098091a":  # 白平衡温度
+                ok, error = self.camera_controller.device.set_ctrl(param_id, default_val, "white_balance_temperature")
+                if ok:
+                    results.append((config, True, f"{self.device_id} 重置 {config['chinese_name']} 成功"))
+                else:
+                    results.append((config, False, f"{self.device_id} 重置 {config['chinese_name']} 失败，错误信息: {error}"))
+                continue
+            try:
+                ret = self.camera_controller.cv_set(param_id, config, default_val) # 设置参数，实际值由参数事件推送
+                results.append((config, ret, f"{self.device_id} 重置 {config['chinese_name']} {'成功' if ret else '失败'}"))
+            except Exception as e:
+                results.append((config, False, f"{self.device_id} 重置出错: {str(e)}"))
+        return results
+
+    def _show_reset_result(self, future): # 显示重置结果
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"\033[31m{self.device_id} 重置出错: {str(e)}\033[0m")
+            return
+        for config, ok, status_msg in results:
+            self._show_write_result(config, ok, status_msg)
 
     def save_params(self): # 保存参数
         params_to_save = {}
@@ -1750,54 +2000,32 @@ class CameraControlPro(tk.Toplevel): # 摄像头控制界面
         print(f"{self.device_id} 参数已保存至 {CONFIG_FILE}")
 
     def exit_app(self):
+        self.closing = True
+        self.writer.close() # 写完已登记的参数
+        self.executor.close() # 执行完已提交的命令
         self.camera_controller.exit_event.set()
+        self.camera_controller.device.close()
         self.destroy()
 
-def list_cameras(): # 检测摄像头
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")] # 视频设备
-
-    for device in video_devices: # 检测设备
-        try:
-            result = subprocess.run(
-                ["v4l2-ctl", "-d", device, "--all"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            output = result.stdout # 获取输出
-
-            if "Driver name      : uvcvideo" in output:
-                cap = cv2.VideoCapture(device)
-                if cap.isOpened():
-                    index = int(device.split('video')[1])
-                    try:
-                        cmd = ["udevadm", "info", "-q", "property", device]
-                        result = subprocess.run(cmd, capture_output=True, text=True)
-                        vid, pid = "N/A", "N/A"
-                        for line in result.stdout.splitlines():
-                            if line.startswith("ID_VENDOR_ID="):
-                                vid = line.split('=')[1].strip().upper()
-                            elif line.startswith("ID_MODEL_ID="):
-                                pid = line.split('=')[1].strip().upper()
-                        device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-                        available.append((index, device_id))
-                    except:
-                        available.append((index, "UNKNOWN"))
-                    cap.release()
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
+def list_cameras(): # 检测摄像头：读取 sysfs 与 VIDIOC_QUERYCAP，不启动子进程，过滤元数据节点
+    return [(node.index, node.device_id) for node in list_video_nodes(driver="uvcvideo")]
 
-def display_frames():  # 显示帧
-    windows = {}
+def display_frames():  # 显示帧：全部相机拼接到一个窗口
+    mosaic = Mosaic()
+    names = []
     while True:
         try:
             device_id, frame = frame_queue.get(timeout=0.1) # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL) # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame)
+            while True:
+                if device_id not in names:  # 新相机：重新分配画布
+                    names.append(device_id)
+                    mosaic.sync(names)
+                mosaic.draw(device_id, frame)
+                try:
+                    device_id, frame = frame_queue.get_nowait()  # 队列中已有的帧一起显示
+                except Empty:
+                    break
+            mosaic.show()
             cv2.waitKey(1)
         except Empty:
             pass
@@ -1838,20 +2066,29 @@ cat << 'EOF' > "${PATH_V4L2_DEBUG}" # 程序路径
 # ====================================================== 程序声明 ======================================================
 print("\n\033[93m【单相机控制调试工具：针对单摄像头的图形化调试工具，支持参数重置和实时显示】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
 import cv2
 import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
-from queue import Queue, Empty
 from threading import Thread, Event, Lock
+from v4l2_ctrl import V4L2Device, parse_ctrl_id
+from v4l2_events import ControlEventListener, V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from v4l2_capture import OpenCVCapture, throttle_interval
+from v4l2_modes import open_capture
+from frame_slot import FrameSlots
+from mosaic import display_mosaic
+from preprocess import Preprocessor
+from latency import get_latency, latency_report
 
 # 全局配置
 MAX_FPS = 30  # 最大帧率
+CAPTURE_MODE = {"format": "MJPG", "size": (640, 480), "fps": MAX_FPS}  # 采集需求，见 v4l2_modes.py
 
-# 定义队列用于传递帧数据
-frame_queue = Queue(maxsize=2)
+# 每台相机一个最新帧槽位，取代共享帧队列
+frame_slots = FrameSlots()
 
 # 参数定义结构
 BASE_CAMERA_PARAMS = [
@@ -2074,51 +2311,79 @@ class CameraController:
         self.exit_event = Event()
         self.lock = Lock()
         self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.name = f"{device_id} video{index}"  # 窗口名称，同型号多台相机时保持唯一
+        self.slot = frame_slots.slot(self.name)  # 最新帧槽位
+        self.latency = get_latency(self.name)  # 各阶段延迟统计
+        self.camera_params = BASE_CAMERA_PARAMS  # 摄像头参数
 
     def initialize(self):  # 初始化摄像头
         with self.lock:
-            self.cap = cv2.VideoCapture(self.index)  # 打开摄像头
+            # 协商满足预览尺寸与帧率的最小原生模式，优先 MJPEG；mmap 零拷贝采集，与参数控制共用设备
+            self.cap = open_capture(self.device, self.device_id, CAPTURE_MODE, self.name)
+            if self.cap is None:  # 原生采集不可用时回退 OpenCV
+                self.cap = OpenCVCapture(self.index)
             if not self.cap.isOpened():  # 检查是否打开成功
                 return False
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数值、范围与非激活标志同步到缓存和界面
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self):  # 初始化参数
-        for param in BASE_CAMERA_PARAMS:
-            value = param["value"]
-            self._set_v4l2_param(param, value)
+    def init_params(self):  # 初始化参数，由控制界面的参数命令线程执行
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items(): # 批量原子写入
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
 
-    def _set_v4l2_param(self, param, value):
-        device = f"/dev/video{self.index}"
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-        print(f"执行命令: {cmd}")
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"命令执行失败，错误信息: {result.stderr}")
+    def apply_values(self, values): # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        return self.device.apply_params(self.camera_params, values)  # 只写入与缓存值不同的参数
 
-    def run(self):  # 运行摄像头
+    def run(self):  # 运行摄像头：由设备可读事件驱动，仅在出队期间持锁
+        frame_interval = self.cap.frame_interval  # 驱动报告的帧间隔
+        min_interval = throttle_interval(frame_interval, MAX_FPS)  # 驱动帧率高于 MAX_FPS 时按时间戳丢帧
+        preprocessor = Preprocessor((640, 480))  # 预览只需 640x480，缩放结果写入预分配的轮换缓冲区
+        scale = preprocessor.decode_scale(self.cap)  # MJPEG 按缩小倍数解码
         while not self.exit_event.is_set():  # 循环读取摄像头
-            with self.lock:
-                if self.cap.isOpened():
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS:  # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read()
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full():  # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480))  # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
+            if not self.cap.wait(0.5):  # 阻塞等待新帧，空闲时不占用 CPU
+                continue
+            with self.lock:  # 出队
+                try:
+                    frame = self.cap.grab_frame(timeout=0) if self.cap.isOpened() else None
+                except OSError:  # 设备已拔出
+                    break
+            if frame is None:
+                continue
+            with frame:  # 处理完毕后缓冲区归还驱动
+                if frame.timestamp - self.last_frame_time < min_interval:  # 丢弃的帧不解码
+                    continue
+                self.last_frame_time = frame.timestamp
+                self.latency.record("dequeue", frame.dequeued - frame.timestamp)  # 驱动写入 → 出队
+                bgr = frame.to_bgr(scale=scale)
+                if bgr is None:  # MJPEG 数据损坏（如 USB 传输出错），丢弃该帧
+                    continue
+                decoded = time.monotonic()
+                self.latency.record("decode", decoded - frame.dequeued)
+                image = preprocessor.apply(bgr, scale)  # 缩放
+                self.latency.record("preprocess", time.monotonic() - decoded)
+            self.slot.put(image, frame.timestamp)  # 覆盖槽位中尚未显示的旧帧
         with self.lock:
             if self.cap.isOpened():
                 self.cap.release()
+        self.device.close()
+        print(f"{self.name}: 采集 {self.slot.seq} 帧，未显示即被覆盖 {self.slot.dropped} 帧")  # 丢帧统计
 
 
 class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller  # 摄像头控制器
+        self.applying = False  # 是否正在批量应用参数
+        camera_controller.on_ctrl_event = self.on_ctrl_event  # 接收驱动侧参数变化
+        self.closing = False  # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.name} 参数写入")  # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.name} 参数命令")  # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params)  # 多台相机各自的命令线程并行初始化
         self.title(camera_controller.device_id)  # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
         self.row = 0
@@ -2131,6 +2396,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
 
     def create_controls(self):  # 创建控件
         param_list = BASE_CAMERA_PARAMS # 参数列表
+        self.params_by_id = {parse_ctrl_id(param["hex_numbers"]): param for param in param_list}  # 参数 ID -> 参数
         for i in range(0, len(param_list), 3):
             for col in range(3):
                 if i + col < len(param_list):
@@ -2147,6 +2413,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         # 显示值范围
         range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
         range_label.pack(fill=tk.X)
+        param["range_label"] = range_label
         # 显示用户值
         user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
         user_value_label.pack(fill=tk.X)
@@ -2163,6 +2430,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             slider.pack(side=tk.LEFT, fill=tk.X, expand=True)
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
+            param["scale"] = slider
+            param["widgets"] = [slider, entry]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
         elif param["type"] == "menu": # 下拉菜单
@@ -2174,12 +2443,14 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
                 print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。")
             cb = ttk.Combobox(control_frame, textvariable=var, values=options)
             cb.pack(fill=tk.X, expand=True)
+            param["widgets"] = [cb]
             param["var"] = var
             cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param))
         elif param["type"] == "bool": # 布尔值
             var = tk.IntVar(value=param["value"])
             cb = ttk.Checkbutton(control_frame, variable=var)
             cb.pack(side=tk.LEFT)
+            param["widgets"] = [cb]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
 
@@ -2188,6 +2459,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         param["status_label"] = status_label
 
     def on_param_change(self, param): # 设置参数
+        if self.applying:  # 批量应用时由 _apply_values 统一写入
+            return
         try:
             value = None
             if param["type"] == "int":
@@ -2200,14 +2473,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             elif param["type"] == "bool":
                 value = param["var"].get()
 
-            device = f"/dev/video{self.camera_controller.index}" # 摄像头设备
-            cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-            result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-            if result.returncode == 0:
-                param["status_label"].config(text="设置状态: 成功", foreground="green")
-            else:
-                param["status_label"].config(text="设置状态: 失败", foreground="red")
-                print(f"\033[31m错误：{param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+            self.writer.submit(param["hex_numbers"], param, value)  # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
             print(f"\033[31m错误：{param['chinese_name']} 数值超出范围\033[0m")
@@ -2215,6 +2481,58 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             param["status_label"].config(text="设置状态: 出错", foreground="red")
             print(f"\033[31m错误：{param['chinese_name']} 设置出错\033[0m")
 
+    def _write_param(self, param, value):  # 在写入线程中执行，经命令线程写入，与批量写入保持顺序
+        return self.executor.set(param, value).result()
+
+    def _call_ui(self, func, *args):  # 从其他线程转到界面线程执行
+        if self.closing:  # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, error):  # 写入线程回调：转到界面线程显示结果
+        self._call_ui(self._show_write_result, *args, ok)
+
+    def _show_write_result(self, param, value, ok):  # 显示写入结果
+        if ok:
+            param["status_label"].config(text="设置状态: 成功", foreground="green")
+        else:
+            param["status_label"].config(text="设置状态: 失败", foreground="red")
+            print(f"\033[31m错误：{param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+
+    def on_ctrl_event(self, event):  # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event):  # 驱动侧参数变化同步到界面，不回写设备
+        param = self.params_by_id.get(event["id"])
+        if param is None or "var" not in param:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in param:
+            param["min"], param["max"] = event["min"], event["max"]
+            param["scale"].config(from_=event["min"], to=event["max"])
+            param["range_label"].config(text=f"范围: {event['min']} ~ {event['max']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in param["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                param["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            self.applying = True  # 只更新界面，不触发写入
+            try:
+                if param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if 0 <= event["value"] < len(options):
+                        param["var"].set(options[event["value"]])
+                else:
+                    param["var"].set(event["value"])
+            finally:
+                self.applying = False
+
     def add_buttons(self):  # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -2223,70 +2541,59 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         ttk.Button(button_frame, text="用户值", command=lambda: self.reset_params("setvalue")).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self, mode): # 重置参数
-        for param in BASE_CAMERA_PARAMS:
-            if mode == "default": # 默认值
-                val = param["default"]
-            elif mode == "value": # 厂商值
-                val = param["value"]
-            elif mode == "setvalue": # 用户值
-                val = param["setvalue"]
+    def reset_params(self, mode): # 重置参数：default默认值，value厂商值，setvalue用户值
+        if mode not in ("default", "value", "setvalue"):
+            return
+        params = self.camera_controller.camera_params
+        self._apply_values(params, [param[mode] for param in params])
+
+    def _apply_values(self, params, values): # 同步界面并提交批量原子写入，返回 Future
+        self.applying = True  # 同步界面期间不逐项触发写入
+        try:
+            for param, val in zip(params, values):
+                if param["type"] == "int":
+                    param["var"].set(val)
+                elif param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if val < len(options):
+                        param["var"].set(options[val])
+                elif param["type"] == "bool":
+                    param["var"].set(val)
+        finally:
+            self.applying = False
+        for param in params:
+            param["status_label"].config(text="设置状态: 应用中", foreground="gray")
+        future = self.executor.apply_profile(values)  # 只写入变化的参数，一次 TRY + 一次 S_EXT_CTRLS
+        future.add_done_callback(lambda future: self._call_ui(self._show_apply_result, params, values, future))
+        return future
+
+    def _show_apply_result(self, params, values, future):  # 显示批量写入结果
+        try:
+            errors = future.result()
+        except Exception as e:
+            errors = {param_idx: str(e) for param_idx in range(len(values))}
+        for param_idx, param in enumerate(params):
+            if param_idx in errors:
+                param["status_label"].config(text="设置状态: 失败", foreground="red")
+                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败（{errors[param_idx]}）\033[0m")
             else:
-                continue
-            if param["type"] == "int":
-                param["var"].set(val)
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                if val < len(options):
-                    param["var"].set(options[val])
-            elif param["type"] == "bool":
-                param["var"].set(val)
-            self.on_param_change(param)
+                param["status_label"].config(text="设置状态: 成功", foreground="green")
 
     def exit_app(self):   # 退出
+        self.closing = True
+        self.writer.close()  # 写完已登记的参数
+        self.executor.close()  # 执行完已提交的命令
         self.camera_controller.exit_event.set()
-        cv2.destroyAllWindows()
+        frame_slots.remove(self.camera_controller.name)  # 不再显示该相机，拼接画面随之重新排列
         self.destroy()
 
 
-def list_cameras():
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]  # 视频设备
-
-    for device in video_devices:  # 检测设备
-        try:
-            index = int(device.split('video')[1])
-            cmd = ["udevadm", "info", "-q", "property", device]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            vid, pid = "N/A", "N/A"
-            for line in result.stdout.splitlines(): # 获取设备信息
-                if line.startswith("ID_VENDOR_ID="):
-                    vid = line.split('=')[1].strip().upper() # 获取厂商ID
-                elif line.startswith("ID_MODEL_ID="):
-                    pid = line.split('=')[1].strip().upper() # 获取产品ID
-            device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-            available.append((index, device_id)) # 添加设备信息
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
+def list_cameras(): # 检测摄像头：读取 sysfs 与 VIDIOC_QUERYCAP，不启动子进程，过滤元数据节点
+    return [(node.index, node.device_id) for node in list_video_nodes()]
 
 
-def display_frames():  # 显示帧
-    windows = {} # 窗口字典
-    while True:
-        try:
-            device_id, frame = frame_queue.get(timeout=0.1)  # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL)  # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'): # 按下q键退出
-                break
-        except Empty:
-            pass
-        except Exception as e:
-            print(f"显示异常: {str(e)}")
-    cv2.destroyAllWindows() # 关闭窗口
+def display_frames():  # 显示帧：全部相机拼接到一个窗口，每个屏幕刷新周期只显示一次
+    display_mosaic(frame_slots)
 
 
 def main():
@@ -2310,6 +2617,7 @@ def main():
 
     root.mainloop() # 等待退出
     cv2.destroyAllWindows() # 关闭窗口
+    print(latency_report())  # 退出时输出各设备延迟统计
 
 if __name__ == "__main__":
     main()
@@ -2327,6 +2635,7 @@ print("\n\033[93m【V4L2 快速参数设置程序：利用 V4L2 命令批量设
 # ----------------------------------------------------------------------------------------------------------------------
 import os
 import subprocess
+from v4l2_ctrl import V4L2Device
 
 # 程序配置3组参数，用户可以自定义，当前 default默认值，value厂商值，setvalue用户值
 SETTING_MODE = "setvalue"
@@ -2577,24 +2886,26 @@ def get_supported_controls(device): # 获取可用参数列表
     return supported_controls # 返回可用参数列表
 
 def set_camera_params(index, params, mode): # 设置摄像头参数
-    device = f"/dev/video{index}"
-    supported_controls = get_supported_controls(device) # 获取可用参数列表
-    for param in params:
-        if param["v4l2_param"] not in supported_controls:
-            print(f"设备 {device} 不支持参数 {param['chinese_name']}，跳过设置")
-            continue
-        if mode == "default": # 从默认值设置
-            val = param["default"]
-        elif mode == "value": # 从当前值设置
-            val = param["value"]
-        elif mode == "setvalue": # 从设置值设置
-            val = param["setvalue"]
+    with V4L2Device(index) as v4l2_device: # 打开一次设备并读取全部参数当前值
+        device = v4l2_device.path
+        if v4l2_device.native:
+            supported_controls = [ctrl["v4l2_param"] for ctrl in v4l2_device.list_ctrls()] # 原生枚举可用参数
         else:
-            continue
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={val}" # 设置参数
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0: # 检查设置是否成功
-            print(f"设置 {param['chinese_name']} 失败，设备: {device}，错误信息: {result.stderr}")
+            supported_controls = get_supported_controls(device) # 回退 v4l2-ctl 获取可用参数列表
+        if mode not in ("default", "value", "setvalue"): # default默认值，value当前值，setvalue设置值
+            return
+        selected = []
+        for param in params:
+            if param["v4l2_param"] not in supported_controls:
+                print(f"设备 {device} 不支持参数 {param['chinese_name']}，跳过设置")
+                continue
+            selected.append(param)
+        values = [param[mode] for param in selected]
+        changed = v4l2_device.changed_params(selected, values)
+        errors = v4l2_device.apply_params(selected, values) # 只写入与设备当前值不同的参数
+        for param_idx, error in errors.items(): # 检查设置是否成功
+            print(f"设置 {selected[param_idx]['chinese_name']} 失败，设备: {device}，错误信息: {error}")
+        print(f"设备 {device}：{len(selected)} 项参数中 {len(changed)} 项需要写入，{len(selected) - len(changed)} 项已是目标值")
 
 def main():
     camera_info = list_cameras() # 获取可用摄像头列表
@@ -2618,20 +2929,34 @@ cat << 'EOF' > "${PATH_V4L2_TEST_SLIDER}" # 程序路径
 # ====================================================== 程序声明 ======================================================
 print("\n\033[93m【多相机UI画面调试工具：针对成品系列参数设置】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
 import cv2
 import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
-from queue import Queue, Empty
 from threading import Thread, Event, Lock
+from v4l2_ctrl import V4L2Device, parse_ctrl_id
+from v4l2_events import ControlEventListener, V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from hotplug import CameraRegistry
+from v4l2_capture import OpenCVCapture, throttle_interval
+from v4l2_modes import open_capture
+from frame_slot import FrameSlots
+from mosaic import display_mosaic
+from preprocess import Preprocessor
+from latency import get_latency, latency_report
+from frame_ring import FrameRingWriter
+from camera_worker import CameraWorker
 
 # 全局配置
 MAX_FPS = 30  # 最大帧率
+SHARED_RING = False  # 是否把全分辨率帧发布到共享内存帧环，供其他进程读取
+CAPTURE_MODE = {"format": "MJPG", "size": None if SHARED_RING else (640, 480), "fps": MAX_FPS}  # 采集需求，见 v4l2_modes.py；帧环需要最大分辨率
+WORKER_PROCESSES = False  # 是否每台相机使用独立采集进程（多台相机满帧率运行时并行解码）
 
-# 定义队列用于传递帧数据
-frame_queue = Queue(maxsize=2)
+# 每台相机一个最新帧槽位，取代共享帧队列
+frame_slots = FrameSlots()
 
 # 参数定义结构
 BASE_CAMERA_PARAMS = [
@@ -2854,52 +3179,85 @@ class CameraController: # 摄像头控制器
         self.exit_event = Event()
         self.lock = Lock()
         self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.name = f"{device_id} video{index}"  # 窗口名称，同型号多台相机时保持唯一
+        self.slot = frame_slots.slot(self.name)  # 最新帧槽位
+        self.latency = get_latency(self.name)  # 各阶段延迟统计
         self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS] # 摄像头参数
 
     def initialize(self):  # 初始化摄像头
         with self.lock:
-            self.cap = cv2.VideoCapture(self.index)  # 打开摄像头
+            # 协商满足预览尺寸与帧率的最小原生模式，优先 MJPEG；mmap 零拷贝采集，与参数控制共用设备
+            self.cap = open_capture(self.device, self.device_id, CAPTURE_MODE, self.name)
+            if self.cap is None:  # 原生采集不可用时回退 OpenCV
+                self.cap = OpenCVCapture(self.index)
             if not self.cap.isOpened():  # 检查是否打开成功
                 return False
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数值、范围与非激活标志同步到缓存和界面
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self):  # 初始化参数
-        for param in self.camera_params:
-            value = param["value"]
-            self._set_v4l2_param(param, value)
+    def init_params(self):  # 初始化参数，由控制界面的参数命令线程执行
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items(): # 批量原子写入
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
 
-    def _set_v4l2_param(self, param, value): # 设置摄像头参数
-        device = f"/dev/video{self.index}"
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}" # 设置摄像头参数
-        print(f"执行命令: {cmd}")
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"命令执行失败，错误信息: {result.stderr}")
+    def apply_values(self, values): # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        return self.device.apply_params(self.camera_params, values)  # 只写入与缓存值不同的参数
 
-    def run(self):  # 运行摄像头
+    def run(self):  # 运行摄像头：由设备可读事件驱动，仅在出队期间持锁
+        frame_interval = self.cap.frame_interval  # 驱动报告的帧间隔
+        ring = FrameRingWriter(self.name, self.device_id, frame_interval=frame_interval) if SHARED_RING else None
+        min_interval = throttle_interval(frame_interval, MAX_FPS)  # 驱动帧率高于 MAX_FPS 时按时间戳丢帧
+        preprocessor = Preprocessor((640, 480))  # 预览只需 640x480，缩放结果写入预分配的轮换缓冲区
+        scale = preprocessor.decode_scale(self.cap) if ring is None else 1  # 帧环需要全分辨率帧
         while not self.exit_event.is_set():  # 循环读取摄像头
-            with self.lock:
-                if self.cap.isOpened():  # 检查摄像头是否打开
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS:  # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read() # 读取摄像头
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full():  # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480))  # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
+            if not self.cap.wait(0.5):  # 阻塞等待新帧，空闲时不占用 CPU
+                continue
+            with self.lock:  # 出队
+                try:
+                    frame = self.cap.grab_frame(timeout=0) if self.cap.isOpened() else None
+                except OSError:  # 设备已拔出
+                    break
+            if frame is None:
+                continue
+            with frame:  # 处理完毕后缓冲区归还驱动
+                if frame.timestamp - self.last_frame_time < min_interval:  # 丢弃的帧不解码
+                    continue
+                self.last_frame_time = frame.timestamp
+                self.latency.record("dequeue", frame.dequeued - frame.timestamp)  # 驱动写入 → 出队
+                bgr = frame.to_bgr(scale=scale)
+                if bgr is None:  # MJPEG 数据损坏（如 USB 传输出错），丢弃该帧
+                    continue
+                decoded = time.monotonic()
+                self.latency.record("decode", decoded - frame.dequeued)
+                image = preprocessor.apply(bgr, scale)  # 缩放
+                self.latency.record("preprocess", time.monotonic() - decoded)
+                if ring is not None:  # 发布到共享内存帧环
+                    ring.publish(bgr, frame.sequence, frame.timestamp)
+            self.slot.put(image, frame.timestamp)  # 覆盖槽位中尚未显示的旧帧
         with self.lock:
             if self.cap.isOpened():
                 self.cap.release()
+        self.device.close()
+        if ring is not None:
+            ring.close()
+        print(f"{self.name}: 采集 {self.slot.seq} 帧，未显示即被覆盖 {self.slot.dropped} 帧")  # 丢帧统计
 
 
 class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller  # 摄像头控制器
+        self.applying = False  # 是否正在批量应用参数
+        camera_controller.on_ctrl_event = self.on_ctrl_event  # 接收驱动侧参数变化
+        self.closing = False  # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.name} 参数写入")  # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.name} 参数命令")  # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params)  # 多台相机各自的命令线程并行初始化
+        self.applied_values = [param["value"] for param in camera_controller.camera_params]  # 最近一次写入的参数值，重新接入时恢复
         self.title(camera_controller.device_id)  # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
         self.row = 0
@@ -2912,6 +3270,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
 
     def create_controls(self):  # 创建控件
         param_list = self.camera_controller.camera_params # 摄像头参数
+        self.params_by_id = {parse_ctrl_id(param["hex_numbers"]): param for param in param_list}  # 参数 ID -> 参数
         for i in range(0, len(param_list), 3):
             for col in range(3): # 3列
                 if i + col < len(param_list):
@@ -2928,6 +3287,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         # 显示值范围
         range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
         range_label.pack(fill=tk.X)
+        param["range_label"] = range_label
         # 显示用户值
         user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
         user_value_label.pack(fill=tk.X)
@@ -2944,6 +3304,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             slider.pack(side=tk.LEFT, fill=tk.X, expand=True) # 设置滑块
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
+            param["scale"] = slider
+            param["widgets"] = [slider, entry]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param)) # 监听变量变化
         elif param["type"] == "menu":
@@ -2955,12 +3317,14 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
                 print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。") # 终端红色输出警告
             cb = ttk.Combobox(control_frame, textvariable=var, values=options)
             cb.pack(fill=tk.X, expand=True)
+            param["widgets"] = [cb]
             param["var"] = var
             cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param)) # 监听变量变化
         elif param["type"] == "bool":
             var = tk.IntVar(value=param["value"])
             cb = ttk.Checkbutton(control_frame, variable=var)
             cb.pack(side=tk.LEFT)
+            param["widgets"] = [cb]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
 
@@ -2969,6 +3333,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         param["status_label"] = status_label
 
     def on_param_change(self, param): # 设置参数
+        if self.applying:  # 批量应用时由 _apply_values 统一写入
+            return
         try:
             value = None
             if param["type"] == "int":
@@ -2981,14 +3347,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             elif param["type"] == "bool":
                 value = param["var"].get()
 
-            device = f"/dev/video{self.camera_controller.index}" # 摄像头设备
-            cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-            result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True) # 设置摄像头参数
-            if result.returncode == 0:
-                param["status_label"].config(text="设置状态: 成功", foreground="green")
-            else:
-                param["status_label"].config(text="设置状态: 失败", foreground="red")
-                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+            self.writer.submit(param["hex_numbers"], param, value)  # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
             print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 数值超出范围\033[0m")
@@ -2996,6 +3355,61 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             param["status_label"].config(text="设置状态: 出错", foreground="red")
             print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置出错\033[0m")
 
+    def _write_param(self, param, value):  # 在写入线程中执行，经命令线程写入，与批量写入保持顺序
+        return self.executor.set(param, value).result()
+
+    def _call_ui(self, func, *args):  # 从其他线程转到界面线程执行
+        if self.closing:  # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, error):  # 写入线程回调：转到界面线程显示结果
+        self._call_ui(self._show_write_result, *args, ok)
+
+    def _show_write_result(self, param, value, ok):  # 显示写入结果
+        if ok:
+            for param_idx, item in enumerate(self.camera_controller.camera_params):
+                if item is param:
+                    self.applied_values[param_idx] = value
+            param["status_label"].config(text="设置状态: 成功", foreground="green")
+        else:
+            param["status_label"].config(text="设置状态: 失败", foreground="red")
+            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+
+    def on_ctrl_event(self, event):  # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event):  # 驱动侧参数变化同步到界面，不回写设备
+        param = self.params_by_id.get(event["id"])
+        if param is None or "var" not in param:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in param:
+            param["min"], param["max"] = event["min"], event["max"]
+            param["scale"].config(from_=event["min"], to=event["max"])
+            param["range_label"].config(text=f"范围: {event['min']} ~ {event['max']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in param["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                param["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            self.applying = True  # 只更新界面，不触发写入
+            try:
+                if param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if 0 <= event["value"] < len(options):
+                        param["var"].set(options[event["value"]])
+                else:
+                    param["var"].set(event["value"])
+            finally:
+                self.applying = False
+
     def add_buttons(self):  # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -3004,102 +3418,118 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         ttk.Button(button_frame, text="用户值", command=lambda: self.reset_params("setvalue")).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self, mode): # 重置参数
-        for param in self.camera_controller.camera_params:
-            if mode == "default":
-                val = param["default"]
-            elif mode == "value":
-                val = param["value"]
-            elif mode == "setvalue":
-                val = param["setvalue"]
+    def reset_params(self, mode): # 重置参数：default默认值，value厂商值，setvalue用户值
+        if mode not in ("default", "value", "setvalue"):
+            return
+        params = self.camera_controller.camera_params
+        self._apply_values(params, [param[mode] for param in params])
+
+    def _apply_values(self, params, values): # 同步界面并提交批量原子写入，返回 Future
+        self.applying = True  # 同步界面期间不逐项触发写入
+        try:
+            for param, val in zip(params, values):
+                if param["type"] == "int":
+                    param["var"].set(val)
+                elif param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if val < len(options):
+                        param["var"].set(options[val])
+                elif param["type"] == "bool":
+                    param["var"].set(val)
+        finally:
+            self.applying = False
+        for param in params:
+            param["status_label"].config(text="设置状态: 应用中", foreground="gray")
+        future = self.executor.apply_profile(values)  # 只写入变化的参数，一次 TRY + 一次 S_EXT_CTRLS
+        future.add_done_callback(lambda future: self._call_ui(self._show_apply_result, params, values, future))
+        return future
+
+    def _show_apply_result(self, params, values, future):  # 显示批量写入结果
+        try:
+            errors = future.result()
+        except Exception as e:
+            errors = {param_idx: str(e) for param_idx in range(len(values))}
+        for param_idx, val in enumerate(values):
+            if param_idx not in errors:
+                self.applied_values[param_idx] = val
+        for param_idx, param in enumerate(params):
+            if param_idx in errors:
+                param["status_label"].config(text="设置状态: 失败", foreground="red")
+                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败（{errors[param_idx]}）\033[0m")
             else:
-                continue
-            if param["type"] == "int":
-                param["var"].set(val)
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                if val < len(options):
-                    param["var"].set(options[val])
-            elif param["type"] == "bool":
-                param["var"].set(val)
-            self.on_param_change(param)
+                param["status_label"].config(text="设置状态: 成功", foreground="green")
 
     def exit_app(self):  # 退出
-        self.camera_controller.exit_event.set()
-        with self.camera_controller.lock:
-            if self.camera_controller.cap.isOpened():
-                self.camera_controller.cap.release()
-        cv2.destroyWindow(self.camera_controller.device_id) # 关闭窗口
+        self.closing = True
+        self.writer.close()  # 写完已登记的参数
+        self.executor.close()  # 执行完已提交的命令
+        self.camera_controller.exit_event.set()  # 采集线程退出时释放摄像头
+        frame_slots.remove(self.camera_controller.name)  # 不再显示该相机，拼接画面随之重新排列
         self.destroy()
 
 
-def list_cameras():
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]  # 视频设备
-
-    for device in video_devices:  # 检测设备
-        try:
-            index = int(device.split('video')[1])
-            cmd = ["udevadm", "info", "-q", "property", device]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            vid, pid = "N/A", "N/A"
-            for line in result.stdout.splitlines():
-                if line.startswith("ID_VENDOR_ID="):
-                    vid = line.split('=')[1].strip().upper()
-                elif line.startswith("ID_MODEL_ID="):
-                    pid = line.split('=')[1].strip().upper()
-            device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN"
-            available.append((index, device_id))
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
-
-
-def display_frames():
-    windows = {}
-    while True:
-        try:
-            device_id, frame = frame_queue.get(timeout=0.1)  # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL)  # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        except Empty:
-            pass
-        except Exception as e:
-            print(f"显示异常: {str(e)}")
-    cv2.destroyAllWindows()
+def display_frames():  # 显示帧：全部相机拼接到一个窗口，每个屏幕刷新周期只显示一次
+    display_mosaic(frame_slots)
 
 
 def main():
-    camera_info = list_cameras() # 摄像头信息
-    if not camera_info:
-        print("未检测到摄像头设备")
-        return
     root = tk.Tk()  # 主窗口
     root.withdraw()  # 隐藏主窗口
     display_thread = Thread(target=display_frames, daemon=True)  # 显示线程
     display_thread.start()  # 启动显示线程
 
-    controllers = [] # 相机控制器
-    apps = []
-    for index, device_id in camera_info:
-        camera_controller = CameraController(index, device_id)
-        if not camera_controller.initialize():
-            print(f"{device_id} 相机初始化失败，未开启")
-            continue
+    cameras = {} # {设备序号: (相机控制器, 控制界面, USB 端口)}
+    last_values = {} # {USB 端口: 拔出前最近一次写入的参数值}
+
+    def start_camera(node): # 启动相机：启动时及热插拔接入时调用
+        if node.index in cameras:
+            return
+        camera_controller = CameraController(node.index, node.device_id)
+        if WORKER_PROCESSES:  # 采集与参数写入转移到子进程
+            camera_controller = CameraWorker(camera_controller)
+        if not camera_controller.initialize(): # 初始化相机
+            print(f"{node.device_id} 相机初始化失败，未开启")
+            return
         app = CameraControlPro(root, camera_controller)  # 创建窗口
+        if node.port in last_values:  # 重新接入：恢复拔出前的参数
+            app._apply_values(camera_controller.camera_params, last_values.pop(node.port))
         camera_thread = Thread(target=camera_controller.run, daemon=True)  # 相机线程
-        camera_thread.start()
-        controllers.append(camera_controller) # 添加相机控制器
-        apps.append(app)
+        camera_thread.start()  # 启动相机线程
+        cameras[node.index] = (camera_controller, app, node.port)
+
+    def stop_camera(index): # 相机拔出：记录当前参数并关闭窗口
+        if index not in cameras:
+            return
+        camera_controller, app, port = cameras.pop(index)
+        last_values[port] = list(app.applied_values)
+        print(f"\033[33m{camera_controller.name} 已拔出，重新接入后恢复当前参数\033[0m")
+        if app.winfo_exists():
+            app.exit_app()
+
+    registry = CameraRegistry(  # 监听内核 uevent，回调转回 Tk 主线程执行
+        on_add=lambda node: root.after(0, start_camera, node),
+        on_remove=lambda index: root.after(0, stop_camera, index))
+    hotplug = registry.start()
+    nodes = list_video_nodes() # 摄像头信息
+    if not nodes:
+        if not hotplug:
+            print("未检测到摄像头设备")
+            root.destroy()
+            return
+        print("未检测到摄像头设备，等待相机接入")
+    for node in nodes:
+        start_camera(node)
 
     root.mainloop()
+    registry.stop()
+    controllers = [entry[0] for entry in cameras.values()] # 相机控制器
     for controller in controllers: # 关闭相机
         controller.exit_event.set()
+    if WORKER_PROCESSES:  # 等待子进程释放摄像头
+        for controller in controllers:
+            controller.close()
     cv2.destroyAllWindows() # 关闭窗口
+    print(latency_report())  # 退出时输出各设备延迟统计
 
 if __name__ == "__main__":
     main()
@@ -3116,28 +3546,399 @@ cat << 'EOF' > "${PATH_V4L2_TEST_SCHEME}" # 程序路径
 print("\n\033[93m【带画面的多方案适应多种类软体的相机调试工具】\033[0m")
 print("\033[91m【可以设定多种方案，当前初始化参数设定为 默认值 方案】\033[0m\n")
 # ----------------------------------------------------------------------------------------------------------------------
-import os
+import cv2
+import tkinter as tk
+from tkinter import ttk
+from threading import Thread
+from v4l2_ctrl import parse_ctrl_id
+from v4l2_events import V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from hotplug import CameraRegistry
+from frame_slot import FrameSlots
+from mosaic import display_mosaic
+from latency import latency_report
+import scheme_camera
+from scheme_camera import SCHEMES, SCHEME_MODES, initialize_params_with_scheme
+from camera_worker import CameraWorker
+from usb_bandwidth import BandwidthPlanner
+
+# 全局配置
+MAX_FPS = 30  # 最大帧率
+SHARED_RING = False  # 是否把全分辨率帧发布到共享内存帧环，供其他进程读取
+WORKER_PROCESSES = False  # 是否每台相机使用独立采集进程（多台相机满帧率运行时并行解码）
+BANDWIDTH_PLAN = True  # 是否按 USB 总线带宽为每台相机规划采集模式（同一主控制器上接多台相机时避免启动失败）
+
+# 每台相机一个最新帧槽位，取代共享帧队列
+frame_slots = FrameSlots()
+
+# 选择方案初始化参数
+INITIAL_SCHEME_NAME = "默认值"
+
+# 方案定义与参数定义结构见 scheme_camera.py，用户可以在其中自行添加方案
+initialize_params_with_scheme(SCHEMES[INITIAL_SCHEME_NAME])
+
+
+# 摄像头控制器
+class CameraController(scheme_camera.CameraController): # 摄像头控制器
+    max_fps = MAX_FPS
+    shared_ring = SHARED_RING
+    frame_slots = frame_slots
+    capture_mode = SCHEME_MODES.get(INITIAL_SCHEME_NAME)  # 初始方案声明的采集需求
+
+
+class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
+    def __init__(self, master, camera_controller):
+        super().__init__(master)
+        self.camera_controller = camera_controller  # 摄像头控制器
+        self.applying = False  # 是否正在批量应用参数
+        camera_controller.on_ctrl_event = self.on_ctrl_event  # 接收驱动侧参数变化
+        self.closing = False  # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.name} 参数写入")  # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.name} 参数命令")  # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params)  # 多台相机各自的命令线程并行初始化
+        self.applied_values = [param["value"] for param in camera_controller.camera_params]  # 最近一次写入的参数值，重新接入时恢复
+        self.scheme_values = SCHEMES
+        self.title(camera_controller.device_id)  # 设置标题
+        self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
+        self.row = 0
+        self.main_frame = ttk.Frame(self, padding=20)  # 主框架
+        self.main_frame.pack(fill=tk.BOTH, expand=True)  # 设置主框架
+        self.create_controls()  # 创建控件
+        self.add_buttons()  # 添加按钮
+        self.bind('<KeyPress-q>', lambda e: self.exit_app())  # 退出
+        self.device_id = camera_controller.device_id  # 设备ID
+
+    def create_controls(self):  # 创建控件
+        param_list = self.camera_controller.camera_params # 摄像头参数
+        self.params_by_id = {parse_ctrl_id(param["hex_numbers"]): param for param in param_list}  # 参数 ID -> 参数
+        for i in range(0, len(param_list), 3):
+            for col in range(3): # 3列
+                if i + col < len(param_list):
+                    param = param_list[i + col]
+                    frame = ttk.LabelFrame(self.main_frame, text=param["chinese_name"])
+                    frame.grid(row=self.row, column=col, padx=5, pady=5, sticky="nsew")
+                    self._create_control_widget(frame, param)
+            self.row += 1
+
+    def _create_control_widget(self, frame, param): # 创建控件
+        control_frame = ttk.Frame(frame)
+        control_frame.pack(fill=tk.X, pady=2)
+
+        # 显示值范围
+        range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
+        range_label.pack(fill=tk.X)
+        param["range_label"] = range_label
+        # 显示用户值
+        user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
+        user_value_label.pack(fill=tk.X)
+
+        if param["type"] == "int": # 整数
+            var = tk.IntVar(value=param["value"]) # 整数变量
+            slider = ttk.Scale(
+                control_frame,
+                from_=param["min"],
+                to=param["max"],
+                variable=var,
+                orient=tk.HORIZONTAL
+            )
+            slider.pack(side=tk.LEFT, fill=tk.X, expand=True) # 设置滑块
+            entry = ttk.Entry(control_frame, textvariable=var, width=8)
+            entry.pack(side=tk.LEFT)
+            param["scale"] = slider
+            param["widgets"] = [slider, entry]
+            param["var"] = var
+            var.trace("w", lambda *args: self.on_param_change(param)) # 监听变量变化
+        elif param["type"] == "menu":
+            options = param["options"].split("；")
+            if 0 <= param["value"] < len(options):
+                var = tk.StringVar(value=options[param["value"]]) # 字符串变量
+            else:
+                var = tk.StringVar(value=options[0])
+                print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。") # 终端红色输出警告
+            cb = ttk.Combobox(control_frame, textvariable=var, values=options)
+            cb.pack(fill=tk.X, expand=True)
+            param["widgets"] = [cb]
+            param["var"] = var
+            cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param)) # 监听变量变化
+        elif param["type"] == "bool":
+            var = tk.IntVar(value=param["value"])
+            cb = ttk.Checkbutton(control_frame, variable=var)
+            cb.pack(side=tk.LEFT)
+            param["widgets"] = [cb]
+            param["var"] = var
+            var.trace("w", lambda *args: self.on_param_change(param))
+
+        status_label = ttk.Label(frame, text="设置状态: 未设置", foreground="gray") # 设置状态
+        status_label.pack(fill=tk.X)
+        param["status_label"] = status_label
+
+    def on_param_change(self, param): # 设置参数
+        if self.applying:  # 批量应用时由 _apply_values 统一写入
+            return
+        try:
+            value = None
+            if param["type"] == "int":
+                value = param["var"].get()
+                if not (param["min"] <= value <= param["max"]):
+                    raise ValueError(f"数值超出范围 {param['min']}~{param['max']}")
+            elif param["type"] == "menu":
+                options = param["options"].split("；")
+                value = options.index(param["var"].get())
+            elif param["type"] == "bool":
+                value = param["var"].get()
+
+            self.writer.submit(param["hex_numbers"], param, value)  # 登记最新值，由写入线程合并后写入
+        except ValueError as ve:
+            param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
+            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 数值超出范围\033[0m")
+        except Exception:
+            param["status_label"].config(text="设置状态: 出错", foreground="red")
+            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置出错\033[0m")
+
+    def _write_param(self, param, value):  # 在写入线程中执行，经命令线程写入，与批量写入保持顺序
+        return self.executor.set(param, value).result()
+
+    def _call_ui(self, func, *args):  # 从其他线程转到界面线程执行
+        if self.closing:  # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, error):  # 写入线程回调：转到界面线程显示结果
+        self._call_ui(self._show_write_result, *args, ok)
+
+    def _show_write_result(self, param, value, ok):  # 显示写入结果
+        if ok:
+            for param_idx, item in enumerate(self.camera_controller.camera_params):
+                if item is param:
+                    self.applied_values[param_idx] = value
+            param["status_label"].config(text="设置状态: 成功", foreground="green")
+        else:
+            param["status_label"].config(text="设置状态: 失败", foreground="red")
+            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+
+    def on_ctrl_event(self, event):  # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event):  # 驱动侧参数变化同步到界面，不回写设备
+        param = self.params_by_id.get(event["id"])
+        if param is None or "var" not in param:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in param:
+            param["min"], param["max"] = event["min"], event["max"]
+            param["scale"].config(from_=event["min"], to=event["max"])
+            param["range_label"].config(text=f"范围: {event['min']} ~ {event['max']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in param["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                param["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            self.applying = True  # 只更新界面，不触发写入
+            try:
+                if param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if 0 <= event["value"] < len(options):
+                        param["var"].set(options[event["value"]])
+                else:
+                    param["var"].set(event["value"])
+            finally:
+                self.applying = False
+
+    def add_buttons(self):  # 添加按钮
+        button_frame = ttk.Frame(self.main_frame)
+        button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
+        for name in self.scheme_values.keys():
+            ttk.Button(button_frame, text=name, command=lambda name=name: self.reset_params(name)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
+
+    def reset_params(self, scheme_name):  # 按方案批量应用参数
+        scheme = self.scheme_values[scheme_name]
+        self._apply_values(self.camera_controller.camera_params, scheme)
+
+    def _apply_values(self, params, values): # 同步界面并提交批量原子写入，返回 Future
+        self.applying = True  # 同步界面期间不逐项触发写入
+        try:
+            for param, val in zip(params, values):
+                if param["type"] == "int":
+                    param["var"].set(val)
+                elif param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if val < len(options):
+                        param["var"].set(options[val])
+                elif param["type"] == "bool":
+                    param["var"].set(val)
+        finally:
+            self.applying = False
+        for param in params:
+            param["status_label"].config(text="设置状态: 应用中", foreground="gray")
+        future = self.executor.apply_profile(values)  # 只写入变化的参数，一次 TRY + 一次 S_EXT_CTRLS
+        future.add_done_callback(lambda future: self._call_ui(self._show_apply_result, params, values, future))
+        return future
+
+    def _show_apply_result(self, params, values, future):  # 显示批量写入结果
+        try:
+            errors = future.result()
+        except Exception as e:
+            errors = {param_idx: str(e) for param_idx in range(len(values))}
+        for param_idx, val in enumerate(values):
+            if param_idx not in errors:
+                self.applied_values[param_idx] = val
+        for param_idx, param in enumerate(params):
+            if param_idx in errors:
+                param["status_label"].config(text="设置状态: 失败", foreground="red")
+                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败（{errors[param_idx]}）\033[0m")
+            else:
+                param["status_label"].config(text="设置状态: 成功", foreground="green")
+
+    def exit_app(self):  # 退出
+        self.closing = True
+        self.writer.close()  # 写完已登记的参数
+        self.executor.close()  # 执行完已提交的命令
+        self.camera_controller.exit_event.set()  # 采集线程退出时释放摄像头
+        frame_slots.remove(self.camera_controller.name)  # 不再显示该相机，拼接画面随之重新排列
+        self.destroy()
+
+
+def display_frames():  # 显示帧：全部相机拼接到一个窗口，每个屏幕刷新周期只显示一次
+    display_mosaic(frame_slots)
+
+
+def main():
+    root = tk.Tk()  # 主窗口
+    root.withdraw()  # 隐藏主窗口
+    display_thread = Thread(target=display_frames, daemon=True)  # 显示线程
+    display_thread.start()  # 启动显示线程
+
+    cameras = {} # {设备序号: (相机控制器, 控制界面, USB 端口)}
+    last_values = {} # {USB 端口: 拔出前最近一次写入的参数值}
+    planner = BandwidthPlanner() if BANDWIDTH_PLAN else None
+    planned = {} # 启动时整体规划的结果 {设备序号: Assignment}，热插拔接入的相机单独规划
+
+    def start_camera(node): # 启动相机：启动时及热插拔接入时调用
+        if node.index in cameras:
+            return
+        camera_controller = CameraController(node.index, node.device_id)
+        if planner is not None:
+            assignment = planned.pop(node.index, None)  # 启动时的规划说明已整体输出
+            if assignment is None:
+                assignment = planner.add(node, camera_controller.base_request())
+                for step in assignment.steps if assignment is not None else []:
+                    print(f"\033[33m{camera_controller.name}: {step}\033[0m")
+            if assignment is not None:
+                if assignment.mode is None:  # 总线带宽不足：不打开相机，也不启动工作进程
+                    return
+                camera_controller.capture_mode = assignment.capture_request()
+        if WORKER_PROCESSES:  # 采集与参数写入转移到子进程，规划的采集需求随之传入
+            camera_controller = CameraWorker(camera_controller)
+        if not camera_controller.initialize(): # 初始化相机
+            print(f"{node.device_id} 相机初始化失败，未开启")
+            if planner is not None:
+                planner.remove(node.index)
+            return
+        if planner is not None:
+            planner.observe(node.index)  # 以实际备用设置修正保留带宽，供之后接入的相机规划
+        app = CameraControlPro(root, camera_controller)  # 创建窗口
+        if node.port in last_values:  # 重新接入：恢复拔出前的参数
+            app._apply_values(camera_controller.camera_params, last_values.pop(node.port))
+        camera_thread = Thread(target=camera_controller.run, daemon=True)  # 相机线程
+        camera_thread.start()  # 启动相机线程
+        cameras[node.index] = (camera_controller, app, node.port)
+
+    def stop_camera(index): # 相机拔出：记录当前参数并关闭窗口
+        if index not in cameras:
+            return
+        camera_controller, app, port = cameras.pop(index)
+        if planner is not None:
+            planner.remove(index)
+        last_values[port] = list(app.applied_values)
+        print(f"\033[33m{camera_controller.name} 已拔出，重新接入后恢复当前参数\033[0m")
+        if app.winfo_exists():
+            app.exit_app()
+
+    registry = CameraRegistry(  # 监听内核 uevent，回调转回 Tk 主线程执行
+        on_add=lambda node: root.after(0, start_camera, node),
+        on_remove=lambda index: root.after(0, stop_camera, index))
+    hotplug = registry.start()
+    nodes = list_video_nodes() # 摄像头信息
+    if not nodes:
+        if not hotplug:
+            print("未检测到摄像头设备")
+            root.destroy()
+            return
+        print("未检测到摄像头设备，等待相机接入")
+    if planner is not None and nodes:  # 同一总线上的相机一起规划，超出预算时逐台降级
+        planned.update(planner.plan(nodes, CameraController.base_request()))
+        for line in planner.explain():
+            print(line)
+    for node in nodes:
+        start_camera(node)
+
+    root.mainloop()
+    registry.stop()
+    controllers = [entry[0] for entry in cameras.values()] # 相机控制器
+    for controller in controllers: # 关闭相机
+        controller.exit_event.set()
+    if WORKER_PROCESSES:  # 等待子进程释放摄像头
+        for controller in controllers:
+            controller.close()
+    cv2.destroyAllWindows()  # 关闭窗口
+    print(latency_report())  # 退出时输出各设备延迟统计
+
+
+if __name__ == "__main__":
+    main()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${HD_WEBCAM_DEBUG} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 带UI界面的 HD_WebCam 相机专用调试工具 ${COLOR_RESET}" # 程序声明
+echo -e "${COLOR_WARNING} 可以设定多种方案，当前初始化参数设定为"默认值"方案 ${COLOR_RESET}" # 警告声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_HD_WEBCAM_DEBUG}" # 程序路径
+# ====================================================== 程序声明 ======================================================
+print("\n\033[93m【带UI界面的 HD_WebCam 相机专用调试工具】\033[0m\n")
+# ----------------------------------------------------------------------------------------------------------------------
 import cv2
 import time
-import subprocess
 import tkinter as tk
 from tkinter import ttk
-from queue import Queue, Empty
 from threading import Thread, Event, Lock
+from v4l2_ctrl import V4L2Device, parse_ctrl_id
+from v4l2_events import ControlEventListener, V4L2_EVENT_CTRL_CH_VALUE, V4L2_EVENT_CTRL_CH_FLAGS, V4L2_EVENT_CTRL_CH_RANGE
+from ctrl_writer import ControlWriter
+from ctrl_executor import ControlExecutor
+from v4l2_enum import list_video_nodes
+from v4l2_capture import OpenCVCapture, throttle_interval
+from v4l2_modes import open_capture
+from frame_slot import FrameSlots
+from mosaic import display_mosaic
+from latency import get_latency, latency_report
 
 # 全局配置
 MAX_FPS = 30  # 最大帧率
+CAPTURE_MODE = {"format": "MJPG", "size": (1920, 1080), "fps": MAX_FPS}  # 采集需求，见 v4l2_modes.py
+
+# 每台相机一个最新帧槽位，取代共享帧队列
+frame_slots = FrameSlots()
 
 # 选择方案初始化参数
 INITIAL_SCHEME_NAME = "默认值"
 
-# "方案"：[亮度,对比度,饱和度,色调,自动白平衡,伽马值,增益,电源频率,白平衡,清晰度,背光补偿,自动曝光,绝对曝光时间,动态帧率曝光,绝对对焦,连续自动对焦]
-# 下面提供4组方案仅参考，用户可以自行添加方案，也可以修改当前方案的数值
+# "方案"：[亮度,对比度,饱和度,色调,自动白平衡,伽马值,电源频率,白平衡,温度,清晰度,背光补偿,自动曝光,绝对曝光时间,隐私模式]
+# 下面提供3组方案仅参考，用户可以自行添加方案，也可以修改当前方案的数值
 SCHEMES = {
-    "默认值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 3, 20, 0, 68, 1],
-    "厂商值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 1, 20, 0, 68, 1],
-    "产品1": [-64, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
-    "产品2": [0, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
+    "默认值": [128, 34, 58, 0, 1, 120, 1, 4000, 2, 0, 3, 156, 0],
+    "方案1":  [128, 34, 58, 0, 0, 120, 1, 6000, 2, 0, 3, 156, 0],
+    "方案2":  [128, 34, 58, 0, 0, 120, 1, 5000, 2, 0, 3, 156, 0],
 }
 
 # 参数定义结构
@@ -3147,8 +3948,8 @@ BASE_CAMERA_PARAMS = [
         "v4l2_param": "brightness",
         "hex_numbers": "0x00980900",
         "type": "int",
-        "min": -64,
-        "max": 64,
+        "min": 0,
+        "max": 255,
         "step": 1,
         "options": "",
     },
@@ -3158,7 +3959,7 @@ BASE_CAMERA_PARAMS = [
         "hex_numbers": "0x00980901",
         "type": "int",
         "min": 0,
-        "max": 100,
+        "max": 255,
         "step": 1,
         "options": "",
     },
@@ -3197,18 +3998,8 @@ BASE_CAMERA_PARAMS = [
         "v4l2_param": "gamma",
         "hex_numbers": "0x00980910",
         "type": "int",
-        "min": 100,
-        "max": 500,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "增益",
-        "v4l2_param": "gain",
-        "hex_numbers": "0x00980913",
-        "type": "int",
-        "min": 1,
-        "max": 128,
+        "min": 90,
+        "max": 150,
         "step": 1,
         "options": "",
     },
@@ -3229,7 +4020,7 @@ BASE_CAMERA_PARAMS = [
         "type": "int",
         "min": 2800,
         "max": 6500,
-        "step": 10,
+        "step": 1,
         "options": "",
     },
     {
@@ -3238,7 +4029,7 @@ BASE_CAMERA_PARAMS = [
         "hex_numbers": "0x0098091b",
         "type": "int",
         "min": 0,
-        "max": 100,
+        "max": 7,
         "step": 1,
         "options": "",
     },
@@ -3267,35 +4058,15 @@ BASE_CAMERA_PARAMS = [
         "v4l2_param": "exposure_time_absolute",
         "hex_numbers": "0x009a0902",
         "type": "int",
-        "min": 0,
-        "max": 10000,
+        "min": 10,
+        "max": 2500,
         "step": 1,
         "options": "",
     },
     {
-        "chinese_name": "动态帧率曝光",
-        "v4l2_param": "exposure_dynamic_framerate",
-        "hex_numbers": "0x009a0903",
-        "type": "bool",
-        "min": None,
-        "max": None,
-        "step": None,
-        "options": "0 表示关闭；1 表示开启",
-    },
-    {
-        "chinese_name": "绝对对焦",
-        "v4l2_param": "focus_absolute",
-        "hex_numbers": "0x009a090a",
-        "type": "int",
-        "min": 0,
-        "max": 1023,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "连续自动对焦",
-        "v4l2_param": "focus_automatic_continuous",
-        "hex_numbers": "0x009a090c",
+        "chinese_name": "隐私模式",
+        "v4l2_param": "privacy",
+        "hex_numbers": "0x009a0910",
         "type": "bool",
         "min": None,
         "max": None,
@@ -3304,6 +4075,7 @@ BASE_CAMERA_PARAMS = [
     }
 ]
 
+
 # 根据方案初始化参数
 def initialize_params_with_scheme(scheme):
     for i, param in enumerate(BASE_CAMERA_PARAMS): # 初始化参数
@@ -3324,52 +4096,74 @@ class CameraController: # 摄像头控制器
         self.exit_event = Event()
         self.lock = Lock()
         self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.name = f"{device_id} video{index}"  # 窗口名称，同型号多台相机时保持唯一
+        self.slot = frame_slots.slot(self.name)  # 最新帧槽位
+        self.latency = get_latency(self.name)  # 各阶段延迟统计
         self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS] # 摄像头参数
 
     def initialize(self):  # 初始化摄像头
         with self.lock:
-            self.cap = cv2.VideoCapture(self.index)  # 打开摄像头
+            # 由于相机 HD WebCam 的分辨率是 1920x1080，所以特此修改；1080p 下 YUYV 受 USB 带宽限制帧率，优先协商 MJPEG
+            self.cap = open_capture(self.device, self.device_id, CAPTURE_MODE, self.name)  # mmap 零拷贝采集
+            if self.cap is None:  # 原生采集不可用时回退 OpenCV
+                self.cap = OpenCVCapture(self.index, width=1920, height=1080)
             if not self.cap.isOpened():  # 检查是否打开成功
                 return False # 打开失败
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数值、范围与非激活标志同步到缓存和界面
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self):  # 初始化参数
-        for param in self.camera_params:
-            value = param["value"]
-            self._set_v4l2_param(param, value)
+    def init_params(self):  # 初始化参数，由控制界面的参数命令线程执行
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items(): # 批量原子写入
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
 
-    def _set_v4l2_param(self, param, value): # 设置摄像头参数
-        device = f"/dev/video{self.index}"
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}" # 设置摄像头参数
-        print(f"执行命令: {cmd}")
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"命令执行失败，错误信息: {result.stderr}")
+    def apply_values(self, values): # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        return self.device.apply_params(self.camera_params, values)  # 只写入与缓存值不同的参数
 
-    def run(self):  # 运行摄像头
+    def run(self):  # 运行摄像头：由设备可读事件驱动，仅在出队期间持锁
+        frame_interval = self.cap.frame_interval  # 驱动报告的帧间隔
+        min_interval = throttle_interval(frame_interval, MAX_FPS)  # 驱动帧率高于 MAX_FPS 时按时间戳丢帧
         while not self.exit_event.is_set():  # 循环读取摄像头
-            with self.lock:  # 加锁
-                if self.cap.isOpened():  # 检查摄像头是否打开
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS:  # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read() # 读取摄像头
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full():  # 将帧放入队列
-                        frame = cv2.resize(frame, (640, 480))  # 缩放
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
+            if not self.cap.wait(0.5):  # 阻塞等待新帧，空闲时不占用 CPU
+                continue
+            with self.lock:  # 出队
+                try:
+                    frame = self.cap.grab_frame(timeout=0) if self.cap.isOpened() else None
+                except OSError:  # 设备已拔出
+                    break
+            if frame is None:
+                continue
+            with frame:  # 处理完毕后缓冲区归还驱动
+                if frame.timestamp - self.last_frame_time < min_interval:  # 丢弃的帧不解码
+                    continue
+                self.last_frame_time = frame.timestamp
+                self.latency.record("dequeue", frame.dequeued - frame.timestamp)  # 驱动写入 → 出队
+                image = frame.to_bgr()  # 由于相机 HD WebCam 的分辨率是 1920x1080，不再缩放
+                if image is None:  # MJPEG 数据损坏（如 USB 传输出错），丢弃该帧
+                    continue
+                self.latency.record("decode", time.monotonic() - frame.dequeued)
+            self.slot.put(image, frame.timestamp)  # 覆盖槽位中尚未显示的旧帧
         with self.lock:
             if self.cap.isOpened():
                 self.cap.release()
+        self.device.close()
+        print(f"{self.name}: 采集 {self.slot.seq} 帧，未显示即被覆盖 {self.slot.dropped} 帧")  # 丢帧统计
 
 
 class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
     def __init__(self, master, camera_controller):
         super().__init__(master)
         self.camera_controller = camera_controller  # 摄像头控制器
+        self.applying = False  # 是否正在批量应用参数
+        camera_controller.on_ctrl_event = self.on_ctrl_event  # 接收驱动侧参数变化
+        self.closing = False  # 关闭后不再回调界面
+        self.writer = ControlWriter(self._write_param, self._on_written, name=f"{camera_controller.name} 参数写入")  # 滑块写入合并
+        self.executor = ControlExecutor(camera_controller, name=f"{camera_controller.name} 参数命令")  # 参数读写不阻塞界面
+        self.executor.submit(camera_controller.init_params)  # 多台相机各自的命令线程并行初始化
         self.scheme_values = SCHEMES
         self.title(camera_controller.device_id)  # 设置标题
         self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
@@ -3383,6 +4177,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
 
     def create_controls(self):  # 创建控件
         param_list = self.camera_controller.camera_params # 摄像头参数
+        self.params_by_id = {parse_ctrl_id(param["hex_numbers"]): param for param in param_list}  # 参数 ID -> 参数
         for i in range(0, len(param_list), 3):
             for col in range(3): # 3列
                 if i + col < len(param_list):
@@ -3399,6 +4194,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         # 显示值范围
         range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
         range_label.pack(fill=tk.X)
+        param["range_label"] = range_label
         # 显示用户值
         user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
         user_value_label.pack(fill=tk.X)
@@ -3415,6 +4211,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             slider.pack(side=tk.LEFT, fill=tk.X, expand=True) # 设置滑块
             entry = ttk.Entry(control_frame, textvariable=var, width=8)
             entry.pack(side=tk.LEFT)
+            param["scale"] = slider
+            param["widgets"] = [slider, entry]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param)) # 监听变量变化
         elif param["type"] == "menu":
@@ -3426,12 +4224,14 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
                 print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。") # 终端红色输出警告
             cb = ttk.Combobox(control_frame, textvariable=var, values=options)
             cb.pack(fill=tk.X, expand=True)
+            param["widgets"] = [cb]
             param["var"] = var
             cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param)) # 监听变量变化
         elif param["type"] == "bool":
             var = tk.IntVar(value=param["value"])
             cb = ttk.Checkbutton(control_frame, variable=var)
             cb.pack(side=tk.LEFT)
+            param["widgets"] = [cb]
             param["var"] = var
             var.trace("w", lambda *args: self.on_param_change(param))
 
@@ -3440,6 +4240,8 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
         param["status_label"] = status_label
 
     def on_param_change(self, param): # 设置参数
+        if self.applying:  # 批量应用时由 _apply_values 统一写入
+            return
         try:
             value = None
             if param["type"] == "int":
@@ -3452,14 +4254,7 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             elif param["type"] == "bool":
                 value = param["var"].get()
 
-            device = f"/dev/video{self.camera_controller.index}" # 摄像头设备
-            cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-            result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True) # 设置摄像头参数
-            if result.returncode == 0:
-                param["status_label"].config(text="设置状态: 成功", foreground="green")
-            else:
-                param["status_label"].config(text="设置状态: 失败", foreground="red")
-                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+            self.writer.submit(param["hex_numbers"], param, value)  # 登记最新值，由写入线程合并后写入
         except ValueError as ve:
             param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
             print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 数值超出范围\033[0m")
@@ -3467,6 +4262,58 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             param["status_label"].config(text="设置状态: 出错", foreground="red")
             print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置出错\033[0m")
 
+    def _write_param(self, param, value):  # 在写入线程中执行，经命令线程写入，与批量写入保持顺序
+        return self.executor.set(param, value).result()
+
+    def _call_ui(self, func, *args):  # 从其他线程转到界面线程执行
+        if self.closing:  # 界面线程正在等待写入线程与命令线程结束
+            return
+        try:
+            self.after(0, func, *args)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _on_written(self, key, args, ok, error):  # 写入线程回调：转到界面线程显示结果
+        self._call_ui(self._show_write_result, *args, ok)
+
+    def _show_write_result(self, param, value, ok):  # 显示写入结果
+        if ok:
+            param["status_label"].config(text="设置状态: 成功", foreground="green")
+        else:
+            param["status_label"].config(text="设置状态: 失败", foreground="red")
+            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
+
+    def on_ctrl_event(self, event):  # 参数事件回调（监听线程）：转到界面线程处理
+        try:
+            self.after(0, self._sync_ctrl_event, event)
+        except (tk.TclError, RuntimeError):  # 窗口已关闭
+            pass
+
+    def _sync_ctrl_event(self, event):  # 驱动侧参数变化同步到界面，不回写设备
+        param = self.params_by_id.get(event["id"])
+        if param is None or "var" not in param:
+            return
+        if event["changes"] & V4L2_EVENT_CTRL_CH_RANGE and "scale" in param:
+            param["min"], param["max"] = event["min"], event["max"]
+            param["scale"].config(from_=event["min"], to=event["max"])
+            param["range_label"].config(text=f"范围: {event['min']} ~ {event['max']}")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_FLAGS:
+            for widget in param["widgets"]:
+                widget.state(["disabled"] if event["inactive"] else ["!disabled"])
+            if event["inactive"]:
+                param["status_label"].config(text="设置状态: 非激活（由自动模式控制）", foreground="gray")
+        if event["changes"] & V4L2_EVENT_CTRL_CH_VALUE:
+            self.applying = True  # 只更新界面，不触发写入
+            try:
+                if param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if 0 <= event["value"] < len(options):
+                        param["var"].set(options[event["value"]])
+                else:
+                    param["var"].set(event["value"])
+            finally:
+                self.applying = False
+
     def add_buttons(self):  # 添加按钮
         button_frame = ttk.Frame(self.main_frame)
         button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
@@ -3474,72 +4321,60 @@ class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
             ttk.Button(button_frame, text=name, command=lambda name=name: self.reset_params(name)).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
 
-    def reset_params(self, scheme_name):  # 修改参数重置逻辑
+    def reset_params(self, scheme_name):  # 按方案批量应用参数
         scheme = self.scheme_values[scheme_name]
-        for param_idx, param in enumerate(self.camera_controller.camera_params):
-            val = scheme[param_idx]
-            if param["type"] == "int":
-                param["var"].set(val)
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                if val < len(options):
-                    param["var"].set(options[val])
-            elif param["type"] == "bool":
-                param["var"].set(val)
-            self.on_param_change(param)
+        self._apply_values(self.camera_controller.camera_params, scheme)
+
+    def _apply_values(self, params, values): # 同步界面并提交批量原子写入，返回 Future
+        self.applying = True  # 同步界面期间不逐项触发写入
+        try:
+            for param, val in zip(params, values):
+                if param["type"] == "int":
+                    param["var"].set(val)
+                elif param["type"] == "menu":
+                    options = param["options"].split("；")
+                    if val < len(options):
+                        param["var"].set(options[val])
+                elif param["type"] == "bool":
+                    param["var"].set(val)
+        finally:
+            self.applying = False
+        for param in params:
+            param["status_label"].config(text="设置状态: 应用中", foreground="gray")
+        future = self.executor.apply_profile(values)  # 只写入变化的参数，一次 TRY + 一次 S_EXT_CTRLS
+        future.add_done_callback(lambda future: self._call_ui(self._show_apply_result, params, values, future))
+        return future
+
+    def _show_apply_result(self, params, values, future):  # 显示批量写入结果
+        try:
+            errors = future.result()
+        except Exception as e:
+            errors = {param_idx: str(e) for param_idx in range(len(values))}
+        for param_idx, param in enumerate(params):
+            if param_idx in errors:
+                param["status_label"].config(text="设置状态: 失败", foreground="red")
+                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败（{errors[param_idx]}）\033[0m")
+            else:
+                param["status_label"].config(text="设置状态: 成功", foreground="green")
 
     def exit_app(self):  # 退出
-        self.camera_controller.exit_event.set()
-        with self.camera_controller.lock:
-            if self.camera_controller.cap.isOpened():
-                self.camera_controller.cap.release()
-        cv2.destroyWindow(self.camera_controller.device_id)  # 关闭窗口
+        self.closing = True
+        self.writer.close()  # 写完已登记的参数
+        self.executor.close()  # 执行完已提交的命令
+        self.camera_controller.exit_event.set()  # 采集线程退出时释放摄像头
+        frame_slots.remove(self.camera_controller.name)  # 不再显示该相机，拼接画面随之重新排列
         self.destroy()
 
 
-def list_cameras(): # 检测摄像头
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]  # 视频设备
-
-    for device in video_devices:  # 检测设备
-        try:
-            index = int(device.split('video')[1])
-            cmd = ["udevadm", "info", "-q", "property", device] # 获取设备信息
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            vid, pid = "N/A", "N/A"
-            for line in result.stdout.splitlines():   # 解析设备信息
-                if line.startswith("ID_VENDOR_ID="):
-                    vid = line.split('=')[1].strip().upper()
-                elif line.startswith("ID_MODEL_ID="):
-                    pid = line.split('=')[1].strip().upper()
-            device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN" # 设备ID
-            available.append((index, device_id)) # 添加设备信息
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
+def list_cameras(): # 检测摄像头：读取 sysfs 与 VIDIOC_QUERYCAP，不启动子进程，过滤元数据节点
+    return [(node.index, node.device_id) for node in list_video_nodes()]
 
 
-def display_frames():  # 显示帧
-    windows = {}
-    while True:
-        try:
-            device_id, frame = frame_queue.get(timeout=0.1)  # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL)  # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame) # 显示帧
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        except Empty:
-            pass
-        except Exception as e:
-            print(f"显示异常: {str(e)}")
-    cv2.destroyAllWindows()
+def display_frames():  # 显示帧：全部相机拼接到一个窗口，每个屏幕刷新周期只显示一次
+    display_mosaic(frame_slots)
 
 
 def main():
-    global frame_queue # 帧队列
-    frame_queue = Queue(maxsize=2) # 帧队列
     camera_info = list_cameras() # 摄像头信息
     if not camera_info:
         print("未检测到摄像头设备")
@@ -3566,6 +4401,7 @@ def main():
     for controller in controllers: # 关闭相机
         controller.exit_event.set()
     cv2.destroyAllWindows()  # 关闭窗口
+    print(latency_report())  # 退出时输出各设备延迟统计
 
 
 if __name__ == "__main__":
@@ -3574,440 +4410,4794 @@ if __name__ == "__main__":
 EOF
 # ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
 # ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
-echo -e "${COLOR_PY} ${HD_WEBCAM_DEBUG} ${COLOR_RESET}" # 程序名称
-echo -e "${COLOR_PY} 带UI界面的 HD_WebCam 相机专用调试工具 ${COLOR_RESET}" # 程序声明
-echo -e "${COLOR_WARNING} 可以设定多种方案，当前初始化参数设定为"默认值"方案 ${COLOR_RESET}" # 警告声明
+echo -e "${COLOR_PY} ${V4L2_CTRL} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} V4L2 原生参数控制模块，通过 ioctl 直接读写参数，v4l2-ctl 仅作回退 ${COLOR_RESET}" # 程序声明
 echo # 输出空行
-cat << 'EOF' > "${PATH_HD_WEBCAM_DEBUG}" # 程序路径
-# ====================================================== 程序声明 ======================================================
-print("\n\033[93m【带UI界面的 HD_WebCam 相机专用调试工具】\033[0m\n")
+cat << 'EOF' > "${PATH_V4L2_CTRL}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# V4L2 原生控制模块：打开一次 /dev/videoN，通过 fcntl.ioctl 直接下发 VIDIOC_S_CTRL/G_CTRL/QUERYCTRL
+# 批量参数通过 VIDIOC_TRY_EXT_CTRLS + VIDIOC_S_EXT_CTRLS 一次性原子写入
+# 打开设备时用一次 VIDIOC_G_EXT_CTRLS 读取全部参数作为缓存，按方案写入时只下发与缓存值不同的参数
+# 仅在设备无法以原生方式访问时，回退到 v4l2-ctl 子进程
 # ----------------------------------------------------------------------------------------------------------------------
 import os
-import cv2
-import time
+import errno
+import ctypes
 import subprocess
-import tkinter as tk
-from tkinter import ttk
-from queue import Queue, Empty
-from threading import Thread, Event, Lock
+from threading import Lock
 
-# 全局配置
-MAX_FPS = 30  # 最大帧率
+try:
+    import fcntl  # 仅 Linux 可用
+except ImportError:
+    fcntl = None
 
-# 选择方案初始化参数
-INITIAL_SCHEME_NAME = "默认值"
+# ioctl 编号计算（对应内核 asm-generic/ioctl.h）
+_IOC_NONE = 0
+_IOC_WRITE = 1
+_IOC_READ = 2
 
-# "方案"：[亮度,对比度,饱和度,色调,自动白平衡,伽马值,电源频率,白平衡,温度,清晰度,背光补偿,自动曝光,绝对曝光时间,隐私模式]
-# 下面提供3组方案仅参考，用户可以自行添加方案，也可以修改当前方案的数值
-SCHEMES = {
-    "默认值": [128, 34, 58, 0, 1, 120, 1, 4000, 2, 0, 3, 156, 0],
-    "方案1":  [128, 34, 58, 0, 0, 120, 1, 6000, 2, 0, 3, 156, 0],
-    "方案2":  [128, 34, 58, 0, 0, 120, 1, 5000, 2, 0, 3, 156, 0],
-}
 
-# 参数定义结构
-BASE_CAMERA_PARAMS = [
-    {
-        "chinese_name": "亮度",
-        "v4l2_param": "brightness",
-        "hex_numbers": "0x00980900",
-        "type": "int",
-        "min": 0,
-        "max": 255,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "对比度",
-        "v4l2_param": "contrast",
-        "hex_numbers": "0x00980901",
-        "type": "int",
-        "min": 0,
-        "max": 255,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "饱和度",
-        "v4l2_param": "saturation",
-        "hex_numbers": "0x00980902",
-        "type": "int",
-        "min": 0,
-        "max": 100,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "色调",
-        "v4l2_param": "hue",
-        "hex_numbers": "0x00980903",
-        "type": "int",
-        "min": -180,
-        "max": 180,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "自动白平衡",
-        "v4l2_param": "white_balance_automatic",
-        "hex_numbers": "0x0098090c",
-        "type": "bool",
-        "min": None,
-        "max": None,
-        "step": None,
-        "options": "0 表示关闭；1 表示开启",
-    },
-    {
-        "chinese_name": "伽马值",
-        "v4l2_param": "gamma",
-        "hex_numbers": "0x00980910",
-        "type": "int",
-        "min": 90,
-        "max": 150,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "电源频率",
-        "v4l2_param": "power_line_frequency",
-        "hex_numbers": "0x00980918",
-        "type": "menu",
-        "min": 0,
-        "max": 2,
-        "step": None,
-        "options": "0 表示禁用；1 表示 50Hz；2 表示 60Hz",
-    },
-    {
-        "chinese_name": "白平衡温度",
-        "v4l2_param": "white_balance_temperature",
-        "hex_numbers": "0x0098091a",
-        "type": "int",
-        "min": 2800,
-        "max": 6500,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "清晰度",
-        "v4l2_param": "sharpness",
-        "hex_numbers": "0x0098091b",
-        "type": "int",
-        "min": 0,
-        "max": 7,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "背光补偿",
-        "v4l2_param": "backlight_compensation",
-        "hex_numbers": "0x0098091c",
-        "type": "int",
-        "min": 0,
-        "max": 2,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "自动曝光",
-        "v4l2_param": "auto_exposure",
-        "hex_numbers": "0x009a0901",
-        "type": "menu",
-        "min": 0,
-        "max": 3,
-        "step": None,
-        "options": "1 表示手动模式；3 表示光圈优先模式",
-    },
-    {
-        "chinese_name": "绝对曝光时间",
-        "v4l2_param": "exposure_time_absolute",
-        "hex_numbers": "0x009a0902",
-        "type": "int",
-        "min": 10,
-        "max": 2500,
-        "step": 1,
-        "options": "",
-    },
-    {
-        "chinese_name": "隐私模式",
-        "v4l2_param": "privacy",
-        "hex_numbers": "0x009a0910",
-        "type": "bool",
-        "min": None,
-        "max": None,
-        "step": None,
-        "options": "0 表示关闭；1 表示开启",
-    }
-]
+def _IOC(direction, nr, size):
+    return (direction << 30) | (size << 16) | (ord('V') << 8) | nr
 
 
-# 根据方案初始化参数
-def initialize_params_with_scheme(scheme):
-    for i, param in enumerate(BASE_CAMERA_PARAMS): # 初始化参数
-        param["default"] = scheme[i]
-        param["value"] = scheme[i]
-        param["setvalue"] = scheme[i]
-    return BASE_CAMERA_PARAMS
+def _IOR(nr, struct):
+    return _IOC(_IOC_READ, nr, ctypes.sizeof(struct))
 
-# 初始化参数
-BASE_CAMERA_PARAMS = initialize_params_with_scheme(SCHEMES[INITIAL_SCHEME_NAME])
 
-# 摄像头控制器
-class CameraController: # 摄像头控制器
-    def __init__(self, index, device_id):
-        self.cap = None
-        self.index = index
-        self.device_id = device_id
-        self.exit_event = Event()
-        self.lock = Lock()
-        self.last_frame_time = 0
-        self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS] # 摄像头参数
+def _IOW(nr, struct):
+    return _IOC(_IOC_WRITE, nr, ctypes.sizeof(struct))
 
-    def initialize(self):  # 初始化摄像头
-        with self.lock:
-            self.cap = cv2.VideoCapture(self.index)  # 打开摄像头
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)  #由于相机 HD WebCam 的分辨率是 1920x1080，所以特此修改
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)  #由于相机 HD WebCam 的分辨率是 1920x1080，所以特此修改
-            if not self.cap.isOpened():  # 检查是否打开成功
-                return False # 打开失败
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self._init_params()
+
+def _IOWR(nr, struct):
+    return _IOC(_IOC_READ | _IOC_WRITE, nr, ctypes.sizeof(struct))
+
+
+# 控制类型
+V4L2_CTRL_TYPE_INTEGER = 1
+V4L2_CTRL_TYPE_BOOLEAN = 2
+V4L2_CTRL_TYPE_MENU = 3
+V4L2_CTRL_TYPE_BUTTON = 4
+V4L2_CTRL_TYPE_INTEGER64 = 5
+V4L2_CTRL_TYPE_CTRL_CLASS = 6
+V4L2_CTRL_TYPE_INTEGER_MENU = 9
+
+CTRL_TYPE_NAMES = {
+    V4L2_CTRL_TYPE_INTEGER: "int",
+    V4L2_CTRL_TYPE_BOOLEAN: "bool",
+    V4L2_CTRL_TYPE_MENU: "menu",
+    V4L2_CTRL_TYPE_BUTTON: "button",
+    V4L2_CTRL_TYPE_INTEGER64: "int64",
+    V4L2_CTRL_TYPE_CTRL_CLASS: "class",
+    V4L2_CTRL_TYPE_INTEGER_MENU: "intmenu",
+}
+
+# 控制标志
+V4L2_CTRL_FLAG_DISABLED = 0x0001
+V4L2_CTRL_FLAG_GRABBED = 0x0002
+V4L2_CTRL_FLAG_READ_ONLY = 0x0004
+V4L2_CTRL_FLAG_INACTIVE = 0x0010
+V4L2_CTRL_FLAG_VOLATILE = 0x0080
+V4L2_CTRL_FLAG_WRITE_ONLY = 0x0040
+V4L2_CTRL_FLAG_NEXT_CTRL = 0x80000000
+
+V4L2_CTRL_WHICH_CUR_VAL = 0  # 允许一次调用混合多个参数类别
+
+
+class v4l2_control(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("value", ctypes.c_int32),
+    ]
+
+
+class v4l2_queryctrl(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_querymenu(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("index", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("reserved", ctypes.c_uint32),
+    ]
+
+
+class v4l2_ext_control_value(ctypes.Union):
+    _pack_ = 1
+    _fields_ = [
+        ("value", ctypes.c_int32),
+        ("value64", ctypes.c_int64),
+        ("ptr", ctypes.c_void_p),
+    ]
+
+
+class v4l2_ext_control(ctypes.Structure):
+    _pack_ = 1
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32 * 1),
+        ("u", v4l2_ext_control_value),
+    ]
+
+
+class v4l2_ext_controls(ctypes.Structure):
+    _fields_ = [
+        ("which", ctypes.c_uint32),
+        ("count", ctypes.c_uint32),
+        ("error_idx", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+        ("reserved", ctypes.c_uint32 * 1),
+        ("controls", ctypes.POINTER(v4l2_ext_control)),
+    ]
+
+
+VIDIOC_G_CTRL = _IOWR(27, v4l2_control)
+VIDIOC_S_CTRL = _IOWR(28, v4l2_control)
+VIDIOC_QUERYCTRL = _IOWR(36, v4l2_queryctrl)
+VIDIOC_QUERYMENU = _IOWR(37, v4l2_querymenu)
+VIDIOC_G_EXT_CTRLS = _IOWR(71, v4l2_ext_controls)
+VIDIOC_S_EXT_CTRLS = _IOWR(72, v4l2_ext_controls)
+VIDIOC_TRY_EXT_CTRLS = _IOWR(73, v4l2_ext_controls)
+
+
+def parse_ctrl_id(ctrl_id):
+    """参数 ID 支持整数或十六进制字符串（如 "0x00980900"）"""
+    if isinstance(ctrl_id, str):
+        return int(ctrl_id, 16)
+    return int(ctrl_id)
+
+
+def ctrl_name_to_v4l2(name):
+    """将驱动返回的控制名称转换为 v4l2-ctl 风格的名称（如 White Balance Temperature -> white_balance_temperature）"""
+    result = []
+    for ch in name.lower():
+        if ch.isalnum():
+            result.append(ch)
+        elif result and result[-1] != "_":
+            result.append("_")
+    return "".join(result).strip("_")
+
+
+# V4L2 设备
+class V4L2Device:
+    def __init__(self, index):
+        self.index = index
+        self.path = f"/dev/video{index}"
+        self.fd = None
+        self.lock = Lock()
+        self.ctrl_names = {}  # 参数 ID -> v4l2-ctl 名称，用于子进程回退
+        self.values = {}  # 参数值缓存：参数 ID -> 设备当前值，仅原生模式可用
+        self.volatile = set()  # 由驱动自行改变的参数（VOLATILE 标志），不缓存
+        self.listeners = []  # 参数事件监听器（v4l2_events.ControlEventListener）
+
+    def open(self):  # 打开设备，失败时保持回退模式
+        if self.fd is not None:
+            return True
+        if fcntl is None:
+            return False
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        except OSError as e:
+            print(f"\033[33m警告：无法以原生方式打开 {self.path}（{e.strerror}），将使用 v4l2-ctl 回退\033[0m")
+            self.fd = None
+            return False
+        self.load_values()
+        return True
+
+    def close(self):  # 关闭设备
+        for listener in list(self.listeners):  # 先停止监听线程，再关闭文件描述符
+            listener.stop()
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            self.values = {}
+
+    @property
+    def native(self):  # 是否可用原生 ioctl
+        return self.fd is not None
+
+    def ioctl(self, request, arg):  # 执行 ioctl
+        return fcntl.ioctl(self.fd, request, arg)
+
+    def query_ctrl(self, ctrl_id):
+        """查询参数信息，返回字典；设备不支持时返回 None"""
+        if not self.native:
+            return None
+        qc = v4l2_queryctrl(id=parse_ctrl_id(ctrl_id))
+        try:
+            self.ioctl(VIDIOC_QUERYCTRL, qc)
+        except OSError:
+            return None
+        if qc.flags & V4L2_CTRL_FLAG_DISABLED:
+            return None
+        info = {
+            "id": qc.id,
+            "name": qc.name.decode(errors="replace"),
+            "v4l2_param": ctrl_name_to_v4l2(qc.name.decode(errors="replace")),
+            "type": CTRL_TYPE_NAMES.get(qc.type, str(qc.type)),
+            "min": qc.minimum,
+            "max": qc.maximum,
+            "step": qc.step,
+            "default": qc.default_value,
+            "flags": qc.flags,
+            "inactive": bool(qc.flags & V4L2_CTRL_FLAG_INACTIVE),
+        }
+        self.ctrl_names.setdefault(qc.id, info["v4l2_param"])
+        return info
+
+    def query_menu(self, ctrl_id, minimum, maximum):
+        """查询菜单参数的选项，返回 {索引: 名称}"""
+        options = {}
+        if not self.native:
+            return options
+        for index in range(minimum, maximum + 1):
+            qm = v4l2_querymenu(id=parse_ctrl_id(ctrl_id), index=index)
+            try:
+                self.ioctl(VIDIOC_QUERYMENU, qm)
+            except OSError:
+                continue  # 菜单索引可以不连续
+            options[index] = qm.name.decode(errors="replace")
+        return options
+
+    def list_ctrls(self):
+        """通过 V4L2_CTRL_FLAG_NEXT_CTRL 枚举设备全部参数"""
+        ctrls = []
+        if not self.native:
+            return ctrls
+        qc = v4l2_queryctrl(id=V4L2_CTRL_FLAG_NEXT_CTRL)
+        while True:
+            try:
+                self.ioctl(VIDIOC_QUERYCTRL, qc)
+            except OSError:
+                break
+            if qc.type != V4L2_CTRL_TYPE_CTRL_CLASS and not qc.flags & V4L2_CTRL_FLAG_DISABLED:
+                info = self.query_ctrl(qc.id)
+                if info:
+                    ctrls.append(info)
+            qc = v4l2_queryctrl(id=qc.id | V4L2_CTRL_FLAG_NEXT_CTRL)
+        return ctrls
+
+    def get_ctrls(self, ctrl_ids):
+        """一次 VIDIOC_G_EXT_CTRLS 批量读取，返回 {参数 ID: 值}；驱动不支持时逐项读取，非原生模式返回空字典"""
+        ids = [parse_ctrl_id(ctrl_id) for ctrl_id in ctrl_ids]
+        if not self.native or not ids:
+            return {}
+        controls = (v4l2_ext_control * len(ids))()
+        for slot, ctrl_id in enumerate(ids):
+            controls[slot].id = ctrl_id
+        ext = v4l2_ext_controls(which=V4L2_CTRL_WHICH_CUR_VAL, count=len(ids), controls=controls)
+        try:
+            self.ioctl(VIDIOC_G_EXT_CTRLS, ext)
+            return {ctrl_id: controls[slot].value for slot, ctrl_id in enumerate(ids)}
+        except OSError:
+            values = {}
+            for ctrl_id in ids:
+                value = self.get_ctrl(ctrl_id)
+                if value is not None:
+                    values[ctrl_id] = value
+            return values
+
+    def load_values(self):
+        """枚举全部参数并批量读取当前值，重建参数值缓存"""
+        ctrls = [ctrl for ctrl in self.list_ctrls()
+                 if ctrl["type"] in ("int", "bool", "menu", "intmenu") and not ctrl["flags"] & V4L2_CTRL_FLAG_WRITE_ONLY]
+        self.volatile = {ctrl["id"] for ctrl in ctrls if ctrl["flags"] & V4L2_CTRL_FLAG_VOLATILE}
+        self.values = self.get_ctrls(ctrl["id"] for ctrl in ctrls if ctrl["id"] not in self.volatile)
+        return self.values
+
+    def update_cache(self, ctrl_id, value):  # 参数值已知（写入成功或收到参数事件）时更新缓存
+        ctrl_id = parse_ctrl_id(ctrl_id)
+        if self.native and ctrl_id not in self.volatile:
+            self.values[ctrl_id] = int(value)
+
+    def cached(self, ctrl_id):  # 缓存中的当前值，未缓存时返回 None
+        return self.values.get(parse_ctrl_id(ctrl_id))
+
+    def get_ctrl(self, ctrl_id, name=None):
+        """读取参数当前值，失败返回 None"""
+        ctrl_id = parse_ctrl_id(ctrl_id)
+        if self.native:
+            ctrl = v4l2_control(id=ctrl_id)
+            try:
+                self.ioctl(VIDIOC_G_CTRL, ctrl)
+                self.update_cache(ctrl_id, ctrl.value)
+                return ctrl.value
+            except OSError as e:
+                if e.errno != errno.ENOTTY:
+                    return None
+        return self._get_ctrl_subprocess(ctrl_id, name)
+
+    def set_ctrl(self, ctrl_id, value, name=None):
+        """写入参数，成功返回 (True, "")，失败返回 (False, 错误信息)"""
+        ctrl_id = parse_ctrl_id(ctrl_id)
+        if self.native:
+            ctrl = v4l2_control(id=ctrl_id, value=int(value))
+            try:
+                self.ioctl(VIDIOC_S_CTRL, ctrl)
+                self.update_cache(ctrl_id, ctrl.value)  # 驱动可能把值调整到步长上
+                return True, ""
+            except OSError as e:
+                self.values.pop(ctrl_id, None)  # 写入失败后设备状态未知
+                if e.errno != errno.ENOTTY:
+                    return False, e.strerror
+        return self._set_ctrl_subprocess(ctrl_id, value, name)
+
+    def set_ctrls(self, items):
+        """批量写入 [(参数 ID, 值, 名称)]，返回 {索引: 错误信息}，空字典表示全部成功
+
+        先用 VIDIOC_TRY_EXT_CTRLS 校验，剔除驱动通过 error_idx 指出的无效参数，
+        再用一次 VIDIOC_S_EXT_CTRLS 原子写入其余参数，避免传感器输出半生效的画面
+        """
+        items = [(parse_ctrl_id(ctrl_id), value, name) for ctrl_id, value, name in items]
+        errors = {}
+        if not self.native:
+            return self._set_ctrls_each(items)
+        pending = list(range(len(items)))  # 仍待写入的参数索引
+        request = VIDIOC_TRY_EXT_CTRLS
+        while pending:
+            controls = (v4l2_ext_control * len(pending))()
+            for slot, idx in enumerate(pending):
+                controls[slot].id = items[idx][0]
+                controls[slot].value = int(items[idx][1])
+            ext = v4l2_ext_controls(which=V4L2_CTRL_WHICH_CUR_VAL, count=len(pending), controls=controls)
+            try:
+                self.ioctl(request, ext)
+            except OSError as e:
+                if request == VIDIOC_S_EXT_CTRLS:  # 写入失败时可能已部分生效，相关缓存作废
+                    for idx in pending:
+                        self.values.pop(items[idx][0], None)
+                if e.errno == errno.ENOTTY:  # 驱动不支持扩展参数接口
+                    errors.update(self._set_ctrls_each([items[idx] for idx in pending], pending))
+                    return errors
+                if ext.error_idx >= len(pending):  # 无法定位到具体参数，整批失败
+                    for idx in pending:
+                        errors[idx] = e.strerror
+                    return errors
+                errors[pending.pop(ext.error_idx)] = e.strerror
+                request = VIDIOC_TRY_EXT_CTRLS  # 剔除后重新校验
+                continue
+            if request == VIDIOC_S_EXT_CTRLS:
+                for slot, idx in enumerate(pending):
+                    self.update_cache(items[idx][0], controls[slot].value)
+                break
+            request = VIDIOC_S_EXT_CTRLS
+        return errors
+
+    def _set_ctrls_each(self, items, indices=None):  # 逐项写入（回退路径）
+        errors = {}
+        for pos, (ctrl_id, value, name) in enumerate(items):
+            ok, error = self.set_ctrl(ctrl_id, value, name)
+            if not ok:
+                errors[indices[pos] if indices else pos] = error
+        return errors
+
+    def get_param(self, param):  # 按参数定义结构读取
+        return self.get_ctrl(param["hex_numbers"], param["v4l2_param"])
+
+    def set_param(self, param, value):  # 按参数定义结构写入
+        return self.set_ctrl(param["hex_numbers"], value, param["v4l2_param"])
+
+    def set_params(self, params, values):  # 按参数定义结构批量原子写入，返回 {索引: 错误信息}
+        return self.set_ctrls([(param["hex_numbers"], value, param["v4l2_param"]) for param, value in zip(params, values)])
+
+    def changed_params(self, params, values):  # 与缓存值不同（或未缓存）的参数索引
+        return [idx for idx, (param, value) in enumerate(zip(params, values))
+                if self.cached(param["hex_numbers"]) != int(value)]
+
+    def apply_params(self, params, values):
+        """按参数定义结构写入，只下发与缓存值不同的参数；返回 {索引: 错误信息}，索引对应传入的参数顺序"""
+        changed = self.changed_params(params, values)
+        if not changed:
+            return {}
+        errors = self.set_params([params[idx] for idx in changed], [values[idx] for idx in changed])
+        return {changed[pos]: error for pos, error in errors.items()}
+
+    def _get_ctrl_subprocess(self, ctrl_id, name):  # v4l2-ctl 回退读取
+        name = name or self.ctrl_names.get(ctrl_id)
+        if not name:
+            return None
+        cmd = ["v4l2-ctl", "-d", self.path, f"--get-ctrl={name}"]
+        try:
+            result = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        except OSError:
+            return None
+        if result.returncode != 0 or ":" not in result.stdout:
+            return None
+        try:
+            return int(result.stdout.split(":", 1)[1].strip())
+        except ValueError:
+            return None
+
+    def _set_ctrl_subprocess(self, ctrl_id, value, name):  # v4l2-ctl 回退写入
+        name = name or self.ctrl_names.get(ctrl_id)
+        if not name:
+            return False, f"未知参数 {ctrl_id:#010x}"
+        cmd = ["v4l2-ctl", "-d", self.path, f"--set-ctrl={name}={value}"]
+        print(f"执行命令: {' '.join(cmd)}")
+        try:
+            result = subprocess.run(cmd, check=False, capture_output=True, text=True)
+        except OSError as e:
+            return False, str(e)
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, ""
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${V4L2_CAPTURE} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} V4L2 mmap 零拷贝采集模块，可替代 cv2.VideoCapture 作为采集源 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_V4L2_CAPTURE}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# V4L2 mmap 流式采集模块：基于 VIDIOC_REQBUFS/QBUF/DQBUF 的零拷贝采集引擎
+# 驱动缓冲区通过 mmap 映射后以 NumPy 视图交给调用方，只有调用方需要时才转换/拷贝
+# 提供与 cv2.VideoCapture 相同的 isOpened/read/release 接口，可直接替换控制器中的采集源
+# wait() 通过 select 等待设备可读，采集线程空闲时阻塞而不占用 CPU；帧间隔可通过 VIDIOC_S_PARM 指定，实际值取自 VIDIOC_G_PARM
+# MJPEG 帧以压缩数据在管线中传递（V4L2Frame.encoded），只有调用 to_bgr() 时才解码，预览可按 1/2、1/4、1/8 缩小解码
+# ----------------------------------------------------------------------------------------------------------------------
+import mmap
+import time
+import errno
+import select
+import ctypes
+import cv2
+import numpy as np
+from v4l2_ctrl import _IOW, _IOWR
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_MEMORY_MMAP = 1
+V4L2_FIELD_ANY = 0
+V4L2_BUF_FLAG_TIMESTAMP_MASK = 0xe000
+V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC = 0x2000
+
+
+def fourcc(code):  # 像素格式四字符码
+    return ord(code[0]) | (ord(code[1]) << 8) | (ord(code[2]) << 16) | (ord(code[3]) << 24)
+
+
+def fourcc_to_str(value):
+    return "".join(chr((value >> shift) & 0xFF) for shift in (0, 8, 16, 24))
+
+
+V4L2_PIX_FMT_YUYV = fourcc("YUYV")
+V4L2_PIX_FMT_MJPEG = fourcc("MJPG")
+V4L2_PIX_FMT_GREY = fourcc("GREY")
+
+SUPPORTED_PIX_FMTS = (V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_GREY)
+REDUCED_SCALES = (8, 4, 2)  # libjpeg DCT 缩放解码支持的缩小倍数
+JPEG_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def reduced_scale(width, height, size):
+    """解码后仍不小于目标尺寸 size=(宽, 高) 的最大缩小倍数（1、2、4、8）"""
+    if not size or not width or not height:
+        return 1
+    for scale in REDUCED_SCALES:
+        if width // scale >= size[0] and height // scale >= size[1]:
+            return scale
+    return 1
+
+
+def decode_jpeg(data, scale=1):  # 解码 JPEG，scale 为 2/4/8 时由 libjpeg 在 DCT 阶段直接缩小，解码耗时随之下降
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), JPEG_DECODE_FLAGS.get(scale, cv2.IMREAD_COLOR))
+
+
+def throttle_interval(frame_interval, max_fps):
+    """按时间戳丢帧的最小间隔：驱动帧间隔已知且短于 1/max_fps 时丢帧，留半个帧间隔的余量吸收时间戳抖动；
+    帧间隔未知（0，如 OpenCV 回退）时不丢帧，避免正常抖动的帧被当作过早而丢弃"""
+    if 0 < frame_interval < 1 / max_fps:
+        return 1 / max_fps - frame_interval / 2
+    return 0
+
+
+class v4l2_pix_format(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("pixelformat", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("bytesperline", ctypes.c_uint32),
+        ("sizeimage", ctypes.c_uint32),
+        ("colorspace", ctypes.c_uint32),
+        ("priv", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("ycbcr_enc", ctypes.c_uint32),
+        ("quantization", ctypes.c_uint32),
+        ("xfer_func", ctypes.c_uint32),
+    ]
+
+
+class v4l2_format_fmt(ctypes.Union):
+    _fields_ = [
+        ("pix", v4l2_pix_format),
+        ("raw_data", ctypes.c_uint8 * 200),
+        ("_align", ctypes.c_void_p),  # 内核联合体含指针成员，按指针对齐
+    ]
+
+
+class v4l2_format(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("fmt", v4l2_format_fmt),
+    ]
+
+
+class v4l2_requestbuffers(ctypes.Structure):
+    _fields_ = [
+        ("count", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("flags", ctypes.c_uint8),
+        ("reserved", ctypes.c_uint8 * 3),
+    ]
+
+
+class timeval(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_usec", ctypes.c_long),
+    ]
+
+
+class v4l2_timecode(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("frames", ctypes.c_uint8),
+        ("seconds", ctypes.c_uint8),
+        ("minutes", ctypes.c_uint8),
+        ("hours", ctypes.c_uint8),
+        ("userbits", ctypes.c_uint8 * 4),
+    ]
+
+
+class v4l2_buffer_m(ctypes.Union):
+    _fields_ = [
+        ("offset", ctypes.c_uint32),
+        ("userptr", ctypes.c_ulong),
+        ("planes", ctypes.c_void_p),
+        ("fd", ctypes.c_int32),
+    ]
+
+
+class v4l2_buffer(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("bytesused", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("timestamp", timeval),
+        ("timecode", v4l2_timecode),
+        ("sequence", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("m", v4l2_buffer_m),
+        ("length", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+    ]
+
+
+class v4l2_fract(ctypes.Structure):
+    _fields_ = [
+        ("numerator", ctypes.c_uint32),
+        ("denominator", ctypes.c_uint32),
+    ]
+
+
+class v4l2_captureparm(ctypes.Structure):
+    _fields_ = [
+        ("capability", ctypes.c_uint32),
+        ("capturemode", ctypes.c_uint32),
+        ("timeperframe", v4l2_fract),
+        ("extendedmode", ctypes.c_uint32),
+        ("readbuffers", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 4),
+    ]
+
+
+class v4l2_streamparm_parm(ctypes.Union):
+    _fields_ = [
+        ("capture", v4l2_captureparm),
+        ("raw_data", ctypes.c_uint8 * 200),
+    ]
+
+
+class v4l2_streamparm(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("parm", v4l2_streamparm_parm),
+    ]
+
+
+VIDIOC_G_FMT = _IOWR(4, v4l2_format)
+VIDIOC_S_FMT = _IOWR(5, v4l2_format)
+VIDIOC_REQBUFS = _IOWR(8, v4l2_requestbuffers)
+VIDIOC_QUERYBUF = _IOWR(9, v4l2_buffer)
+VIDIOC_QBUF = _IOWR(15, v4l2_buffer)
+VIDIOC_DQBUF = _IOWR(17, v4l2_buffer)
+VIDIOC_STREAMON = _IOW(18, ctypes.c_int)
+VIDIOC_STREAMOFF = _IOW(19, ctypes.c_int)
+VIDIOC_G_PARM = _IOWR(21, v4l2_streamparm)
+VIDIOC_S_PARM = _IOWR(22, v4l2_streamparm)
+
+
+# 采集帧：驱动缓冲区的零拷贝视图
+class V4L2Frame:
+    def __init__(self, capture, index, bytesused, sequence, timestamp, dequeued):
+        self.capture = capture
+        self.index = index  # 驱动缓冲区序号
+        self.bytesused = bytesused
+        self.sequence = sequence  # 驱动帧序号
+        self.timestamp = timestamp  # 驱动写入缓冲区的时间（CLOCK_MONOTONIC 秒）
+        self.dequeued = dequeued  # 用户态出队时间（CLOCK_MONOTONIC 秒）
+        self.released = False
+
+    @property
+    def data(self):
+        """只读 NumPy 视图，直接指向 mmap 缓冲区；release() 之后内容会被驱动覆盖"""
+        return self.capture.view(self.index, self.bytesused)
+
+    @property
+    def encoded(self):
+        """MJPEG 帧的压缩数据（只读视图，不解码），其他像素格式为 None；release() 之后失效"""
+        return self.data if self.capture.pixelformat == V4L2_PIX_FMT_MJPEG else None
+
+    def to_bgr(self, dst=None, scale=1):  # 转换为 BGR，未传入 dst 时写入采集源的轮换缓冲区；scale 为缩小倍数
+        return self.capture.convert(self.index, self.bytesused, dst, scale)
+
+    def copy(self):  # 显式拷贝原始数据
+        return np.array(self.data)
+
+    def release(self):  # 将缓冲区归还驱动
+        if not self.released:
+            self.released = True
+            try:
+                self.capture.queue_buffer(self.index)
+            except OSError:  # 采集已停止，缓冲区无需归还
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# mmap 采集引擎
+class V4L2Capture:
+    def __init__(self, device, width=None, height=None, pixelformat=None, interval=None, buffer_count=4, output_buffers=4):
+        self.device = device  # 共享 V4L2Device 的文件描述符，参数控制与采集复用同一次打开
+        self.width = width
+        self.height = height
+        self.pixelformat = pixelformat
+        self.interval = interval  # 请求的帧间隔 (分子, 分母) 秒，None 时使用驱动当前值
+        self.bytesperline = 0
+        self.buffer_count = buffer_count
+        self.buffers = []  # mmap 缓冲区
+        self.streaming = False
+        self.frame_interval = 0  # 驱动报告的帧间隔（秒），未知为 0
+        self.output_buffers = output_buffers  # read() 轮换使用的 BGR 输出缓冲区数量
+        self._outputs = []
+        self._output_idx = 0
+
+    def open(self):
+        """设置格式、申请并映射缓冲区、开始采集；任一步失败返回 False"""
+        if not self.device.open():
+            return False
+        try:
+            self._set_format()
+            if self.interval:
+                self._set_frame_interval(*self.interval)
+            self._request_buffers()
+            for index in range(len(self.buffers)):
+                self.queue_buffer(index)
+            self.device.ioctl(VIDIOC_STREAMON, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+            self.streaming = True
+            self.frame_interval = self._get_frame_interval()
+            return True
+        except (OSError, ValueError) as e:
+            if getattr(e, "errno", None) == errno.ENOSPC:  # UVC 驱动无法保留所需的等时带宽
+                print(f"\033[33m警告：{self.device.path} 所在 USB 总线带宽不足，同一主控制器上的相机过多，可运行 usb_plan.py 查看带宽规划\033[0m")
+            else:
+                print(f"\033[33m警告：{self.device.path} mmap 采集初始化失败（{e}）\033[0m")
+            self.release()
+            return False
+
+    def _set_format(self):  # 协商像素格式与分辨率
+        fmt = v4l2_format(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        self.device.ioctl(VIDIOC_G_FMT, fmt)
+        pix = fmt.fmt.pix
+        changed = False
+        if self.pixelformat and pix.pixelformat != self.pixelformat:
+            pix.pixelformat = self.pixelformat
+            changed = True
+        elif pix.pixelformat not in SUPPORTED_PIX_FMTS:
+            pix.pixelformat = V4L2_PIX_FMT_YUYV
+            changed = True
+        if self.width and self.height and (pix.width, pix.height) != (self.width, self.height):
+            pix.width, pix.height = self.width, self.height
+            changed = True
+        if changed:
+            pix.field = V4L2_FIELD_ANY
+            self.device.ioctl(VIDIOC_S_FMT, fmt)  # 驱动可能调整为最接近的模式
+        if pix.pixelformat not in SUPPORTED_PIX_FMTS:
+            raise ValueError(f"不支持的像素格式 {fourcc_to_str(pix.pixelformat)}")
+        self.width, self.height = pix.width, pix.height
+        self.pixelformat = pix.pixelformat
+        self.bytesperline = pix.bytesperline
+
+    def _set_frame_interval(self, numerator, denominator):  # 通过 VIDIOC_S_PARM 设置帧间隔，驱动不支持时保持原帧率
+        parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        parm.parm.capture.timeperframe.numerator = numerator
+        parm.parm.capture.timeperframe.denominator = denominator
+        try:
+            self.device.ioctl(VIDIOC_S_PARM, parm)
+        except OSError:
+            pass
+
+    def _get_frame_interval(self):  # 通过 VIDIOC_G_PARM 读取驱动帧间隔
+        parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        try:
+            self.device.ioctl(VIDIOC_G_PARM, parm)
+        except OSError:
+            return 0
+        tpf = parm.parm.capture.timeperframe
+        return tpf.numerator / tpf.denominator if tpf.denominator else 0
+
+    def _request_buffers(self):  # 申请并映射驱动缓冲区
+        req = v4l2_requestbuffers(count=self.buffer_count, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self.device.ioctl(VIDIOC_REQBUFS, req)
+        if req.count < 2:
+            raise ValueError("驱动缓冲区不足")
+        for index in range(req.count):
+            buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+            self.device.ioctl(VIDIOC_QUERYBUF, buf)
+            self.buffers.append(mmap.mmap(self.device.fd, buf.length, mmap.MAP_SHARED, mmap.PROT_READ, offset=buf.m.offset))
+
+    def queue_buffer(self, index):  # 缓冲区入队
+        buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self.device.ioctl(VIDIOC_QBUF, buf)
+
+    def _dequeue_buffer(self):  # 缓冲区出队，无可用帧时返回 None
+        buf = v4l2_buffer(type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        try:
+            self.device.ioctl(VIDIOC_DQBUF, buf)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return None
+            raise
+        dequeued = time.monotonic()
+        if buf.flags & V4L2_BUF_FLAG_TIMESTAMP_MASK == V4L2_BUF_FLAG_TIMESTAMP_MONOTONIC:
+            timestamp = buf.timestamp.tv_sec + buf.timestamp.tv_usec / 1e6  # 与 time.monotonic() 同一时钟
+        else:  # 驱动时间戳无法与本机单调时钟比较时退化为出队时间
+            timestamp = dequeued
+        return V4L2Frame(self, buf.index, buf.bytesused, buf.sequence, timestamp, dequeued)
+
+    def fileno(self):
+        return self.device.fd
+
+    def wait(self, timeout):
+        """阻塞等待设备可读（有新帧），无需持锁；超时或已停止返回 False"""
+        if not self.streaming:
+            time.sleep(timeout)
+            return False
+        try:
+            readable, _, _ = select.select([self.device.fd], [], [], timeout)
+        except (OSError, ValueError, TypeError):  # 设备已在其他线程关闭
+            return False
+        return bool(readable)
+
+    def grab_frame(self, timeout=1.0):
+        """等待并取出最新一帧（较旧的已就绪帧直接归还驱动），超时返回 None"""
+        if not self.wait(timeout):
+            return None
+        frame = None
+        while True:  # 取尽已就绪的帧，只保留最新一帧，降低延迟
+            newer = self._dequeue_buffer()
+            if newer is None:
+                return frame
+            if frame is not None:
+                frame.release()
+            frame = newer
+
+    def view(self, index, bytesused):  # 缓冲区的只读 NumPy 视图
+        data = np.frombuffer(self.buffers[index], dtype=np.uint8, count=bytesused)
+        if self.pixelformat == V4L2_PIX_FMT_YUYV and self.bytesperline == self.width * 2:
+            return data.reshape(self.height, self.width, 2)
+        if self.pixelformat == V4L2_PIX_FMT_GREY and self.bytesperline == self.width:
+            return data.reshape(self.height, self.width)
+        return data
+
+    def decode_scale(self, size):  # 输出尺寸 size 对应的缩小解码倍数
+        return reduced_scale(self.width, self.height, size)
+
+    def convert(self, index, bytesused, dst=None, scale=1):  # 转换为 BGR，scale > 1 时输出缩小后的图像
+        data = self.view(index, bytesused)
+        if self.pixelformat == V4L2_PIX_FMT_MJPEG:
+            return decode_jpeg(data, scale)
+        if scale > 1 and data.ndim > 1:  # 未压缩格式按行抽取后转换，只转换 1/scale 的行
+            code = cv2.COLOR_GRAY2BGR if self.pixelformat == V4L2_PIX_FMT_GREY else cv2.COLOR_YUV2BGR_YUYV
+            return np.ascontiguousarray(cv2.cvtColor(data[::scale], code)[:, ::scale])
+        if dst is None:
+            dst = self._next_output()
+        if self.pixelformat == V4L2_PIX_FMT_GREY:
+            return cv2.cvtColor(data, cv2.COLOR_GRAY2BGR, dst=dst)
+        return cv2.cvtColor(data, cv2.COLOR_YUV2BGR_YUYV, dst=dst)
+
+    def _next_output(self):  # 轮换使用预分配的 BGR 缓冲区，避免每帧分配
+        if len(self._outputs) < self.output_buffers:
+            self._outputs.append(np.empty((self.height, self.width, 3), dtype=np.uint8))
+        dst = self._outputs[self._output_idx % len(self._outputs)]
+        self._output_idx += 1
+        return dst
+
+    # ---------------- cv2.VideoCapture 兼容接口 ----------------
+    def isOpened(self):
+        return self.streaming
+
+    def read(self):
+        """返回 (ret, BGR 图像)；图像位于轮换缓冲区中，output_buffers 次读取后会被覆盖"""
+        frame = self.grab_frame()
+        if frame is None:
+            return False, None
+        with frame:
+            return True, frame.to_bgr()
+
+    def set(self, prop_id, value):  # 采集参数在 open() 前通过构造参数指定
+        return False
+
+    def release(self):  # 停止采集并释放缓冲区
+        if self.streaming:
+            try:
+                self.device.ioctl(VIDIOC_STREAMOFF, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+            except OSError:
+                pass
+            self.streaming = False
+        for buf in self.buffers:
+            try:
+                buf.close()
+            except BufferError:  # 仍有视图引用，交由垃圾回收
+                pass
+        self.buffers = []
+        self._outputs = []
+        if self.device.native:  # 释放驱动侧缓冲区，便于重新开始采集
+            try:
+                self.device.ioctl(VIDIOC_REQBUFS, v4l2_requestbuffers(count=0, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP))
+            except OSError:
+                pass
+
+
+# 已解码帧：OpenCV 回退采集源的帧对象，接口与 V4L2Frame 一致
+class ImageFrame:
+    def __init__(self, image, sequence, timestamp):
+        self.data = image
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.dequeued = timestamp  # 回退采集源只能取得读取完成的时间
+
+    encoded = None  # 回退采集源的帧已由 OpenCV 解码
+
+    def to_bgr(self, dst=None, scale=1):
+        return self.data if scale == 1 else self.data[::scale, ::scale]
+
+    def copy(self):
+        return self.data.copy()
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+# OpenCV 回退采集源：设备无法以 mmap 方式采集时使用，接口与 V4L2Capture 一致
+class OpenCVCapture:
+    def __init__(self, index, width=None, height=None):
+        self.cap = cv2.VideoCapture(index)  # 打开摄像头
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        self.frame_interval = 1 / fps if fps > 0 else 0
+        self.grabbed = False
+        self.sequence = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def wait(self, timeout):  # cap.grab() 本身阻塞到驱动出帧，无需持锁
+        self.grabbed = self.cap.isOpened() and self.cap.grab()
+        if not self.grabbed:
+            time.sleep(timeout)  # 读取失败时按超时等待，避免空转
+        return self.grabbed
+
+    def grab_frame(self, timeout=1.0):
+        if not self.grabbed and not self.wait(timeout):
+            return None
+        self.grabbed = False
+        ret, image = self.cap.retrieve()
+        if not ret:
+            return None
+        self.sequence += 1
+        return ImageFrame(image, self.sequence, time.monotonic())
+
+    def read(self):
+        return self.cap.read()
+
+    def decode_scale(self, size):  # OpenCV 已解码全分辨率帧，不再缩小解码
+        return 1
+
+    def set(self, prop_id, value):
+        return self.cap.set(prop_id, value)
+
+    def release(self):
+        self.cap.release()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${FRAME_SLOT} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 多相机最新帧槽位模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_FRAME_SLOT}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 每台相机独立的“最新帧”信箱：采集线程只覆盖自己的槽位，显示线程按各自帧率取走最新帧
+# 槽位内容以 (序号, 帧, 发布时间, 采集时间戳) 元组整体替换，单生产者/单消费者下依赖引用赋值的原子性，无需加锁
+# 被覆盖而未取走的帧计入 dropped，便于统计每台设备的丢帧
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from threading import Event
+
+
+# 单台相机的最新帧槽位
+class FrameSlot:
+    def __init__(self, name, notify=None):
+        self.name = name
+        self.notify = notify  # 有新帧时通知消费者的 Event
+        self.latest = (0, None, 0.0, 0.0)  # (序号, 帧, 发布时间, 采集时间戳)
+        self.taken_seq = 0  # 消费者最近取走的序号
+        self.dropped = 0  # 未取走即被覆盖的帧数
+
+    @property
+    def seq(self):  # 已发布帧数
+        return self.latest[0]
+
+    def put(self, frame, timestamp=None):  # 发布新帧，覆盖尚未取走的旧帧；timestamp 为帧的采集时间
+        seq = self.latest[0]
+        if seq > self.taken_seq:
+            self.dropped += 1
+        published = time.monotonic()
+        self.latest = (seq + 1, frame, published, published if timestamp is None else timestamp)
+        if self.notify is not None:
+            self.notify.set()
+        return seq + 1
+
+    def take(self):
+        """取走比上次更新的帧，返回 (序号, 帧, 发布时间, 采集时间戳)；没有新帧时返回 None"""
+        latest = self.latest
+        if latest[0] <= self.taken_seq:
+            return None
+        self.taken_seq = latest[0]
+        return latest
+
+    def peek(self):  # 查看最新帧但不标记为已取走
+        seq, frame = self.latest[:2]
+        return (seq, frame) if seq else None
+
+
+# 多相机槽位集合
+class FrameSlots:
+    def __init__(self):
+        self.slots = {}
+        self.event = Event()  # 任一槽位有新帧
+
+    def slot(self, name):  # 获取或创建槽位
+        if name not in self.slots:
+            self.slots[name] = FrameSlot(name, self.event)
+        return self.slots[name]
+
+    def remove(self, name):
+        self.slots.pop(name, None)
+
+    def items(self):
+        return list(self.slots.items())
+
+    def wait(self, timeout):  # 等待任一槽位出现新帧
+        ready = self.event.wait(timeout)
+        self.event.clear()
+        return ready
+
+    def stats(self):
+        """每台设备的已发布帧数与丢帧数 {名称: (序号, 丢帧)}"""
+        return {name: (slot.seq, slot.dropped) for name, slot in self.items()}
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${FRAME_RING} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 共享内存帧环模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_FRAME_RING}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 共享内存帧环：采集进程把每帧写入 multiprocessing.shared_memory 环形缓冲区，其他分析进程直接映射读取
+# 内存布局：全局头（魔数、槽位数、槽位大小、最新序号、帧间隔、代数、关闭标志）+ N 个槽位（槽位头 + 图像数据）
+# 槽位头记录 device_id、序号、时间戳、形状与 dtype；写入期间序号置 0，读者据此丢弃被覆盖的帧
+# 帧尺寸变大时发布端先在旧共享内存中置关闭标志再按新尺寸重建（代数加 1，序号连续），读者发现关闭标志后重新映射
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import re
+import mmap
+import time
+import struct
+import numpy as np
+from multiprocessing import shared_memory
+
+RING_PREFIX = "vitai_"  # 共享内存名称前缀（/dev/shm 下）
+RING_MAGIC = b"VITAIRNG"
+RING_VERSION = 2
+
+# 全局头：魔数、版本、槽位数、槽位数据大小、最新序号、帧间隔、代数、关闭标志
+RING_HEADER = struct.Struct("<8sIIQQdQQ")
+RING_HEADER_SIZE = 64
+RING_SEQ_OFFSET = 24  # 最新序号在全局头中的偏移
+RING_CLOSED_OFFSET = 48  # 关闭标志在全局头中的偏移，非 0 表示该共享内存已被发布端废弃
+
+# 槽位头：序号、驱动帧序号、时间戳、高、宽、通道、dtype、device_id、数据字节数
+SLOT_HEADER = struct.Struct("<QQdIII8s32sQ")
+SLOT_HEADER_SIZE = 128
+
+
+def ring_name(name):  # 由窗口/设备名称生成共享内存名称
+    return RING_PREFIX + re.sub(r"\W", "_", name)
+
+
+def list_rings():  # 列出当前存在的帧环
+    try:
+        return sorted(n for n in os.listdir("/dev/shm") if n.startswith(RING_PREFIX))
+    except OSError:
+        return []
+
+
+# 环中的一帧；image 在 copy=False 时是共享内存上的只读视图
+class RingFrame:
+    def __init__(self, seq, sequence, timestamp, device_id, image):
+        self.seq = seq  # 帧环序号
+        self.sequence = sequence  # 驱动帧序号
+        self.timestamp = timestamp  # 采集时间戳（单调时钟）
+        self.device_id = device_id
+        self.image = image
+
+
+# 发布端：由采集线程调用，首帧到达时按帧尺寸创建共享内存
+class FrameRingWriter:
+    def __init__(self, name, device_id="", slots=4, frame_interval=0.0):
+        self.name = ring_name(name)
+        self.device_id = device_id
+        self.slots = slots
+        self.frame_interval = frame_interval
+        self.shm = None
+        self.slot_size = 0
+        self.seq = 0
+        self.generation = 0  # 本发布端创建共享内存的次数
+
+    def _create(self, nbytes):  # 创建（或按新尺寸重建）共享内存；序号不清零，读者重新映射后沿用原来的 last_seq
+        self.close()
+        try:  # 清理上次异常退出遗留的同名帧环，仍映射着它的读者据关闭标志重新映射
+            stale = shared_memory.SharedMemory(name=self.name)
+            struct.pack_into("<Q", stale.buf, RING_CLOSED_OFFSET, 1)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.slot_size = nbytes
+        self.generation += 1
+        size = RING_HEADER_SIZE + self.slots * (SLOT_HEADER_SIZE + nbytes)
+        self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        RING_HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, RING_VERSION, self.slots, nbytes, self.seq,
+                              self.frame_interval, self.generation, 0)
+
+    def publish(self, image, sequence=0, timestamp=None):
+        """写入一帧，返回帧环序号"""
+        if self.shm is None or image.nbytes > self.slot_size:
+            self._create(image.nbytes)
+        seq = self.seq + 1
+        offset = RING_HEADER_SIZE + (seq - 1) % self.slots * (SLOT_HEADER_SIZE + self.slot_size)
+        struct.pack_into("<Q", self.shm.buf, offset, 0)  # 写入期间标记槽位无效
+        dst = np.ndarray(image.shape, image.dtype, buffer=self.shm.buf, offset=offset + SLOT_HEADER_SIZE)
+        np.copyto(dst, image)
+        del dst
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim > 2 else 1
+        SLOT_HEADER.pack_into(self.shm.buf, offset, seq, sequence,
+                              time.monotonic() if timestamp is None else timestamp,
+                              height, width, channels, image.dtype.str.encode(),
+                              self.device_id.encode()[:32], image.nbytes)
+        struct.pack_into("<Q", self.shm.buf, RING_SEQ_OFFSET, seq)  # 最后更新最新序号
+        self.seq = seq
+        return seq
+
+    def close(self):  # 置关闭标志后关闭并删除共享内存
+        if self.shm is None:
+            return
+        struct.pack_into("<Q", self.shm.buf, RING_CLOSED_OFFSET, 1)
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+
+
+def _release(buf):  # 关闭读者的映射
+    try:
+        buf.close()
+    except BufferError:  # 仍有视图引用共享内存，交由视图释放或进程退出时回收
+        pass
+
+
+# 读取端：可在任意进程中创建，多个读者互不影响
+class FrameRingReader:
+    def __init__(self, name):
+        self.name = name if name.startswith(RING_PREFIX) else ring_name(name)
+        self._use(*self._map())
+
+    def _map(self):  # 只读映射当前的 /dev/shm 文件，返回 (映射, 全局头)
+        # 直接只读映射 /dev/shm 文件：读者不登记到 resource_tracker，退出时不会误删发布端的共享内存
+        fd = os.open(f"/dev/shm/{self.name}", os.O_RDONLY)
+        try:
+            buf = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        header = RING_HEADER.unpack_from(buf, 0)
+        if header[0] != RING_MAGIC or header[1] != RING_VERSION:
+            buf.close()
+            raise ValueError(f"{self.name} 不是有效的帧环")
+        return buf, header
+
+    def _use(self, buf, header):
+        _, _, self.slots, self.slot_size, _, self.frame_interval, self.generation, _ = header
+        self.buf = buf
+
+    def _reattach(self):  # 发布端已重建帧环：映射新的共享内存；尚未重建或已退出时保持原映射，返回 False
+        try:
+            buf, header = self._map()
+        except (OSError, ValueError):
+            return False
+        if header[7]:  # 仍是已废弃的共享内存
+            _release(buf)
+            return False
+        _release(self.buf)
+        self._use(buf, header)
+        return True
+
+    @property
+    def closed(self):  # 当前映射的共享内存是否已被发布端废弃
+        return struct.unpack_from("<Q", self.buf, RING_CLOSED_OFFSET)[0] != 0
+
+    @property
+    def seq(self):  # 最新帧环序号
+        return struct.unpack_from("<Q", self.buf, RING_SEQ_OFFSET)[0]
+
+    def _offset(self, seq):
+        return RING_HEADER_SIZE + (seq - 1) % self.slots * (SLOT_HEADER_SIZE + self.slot_size)
+
+    def read(self, last_seq=0, copy=True):
+        """读取比 last_seq 更新的最新帧，没有新帧或读取期间被覆盖时返回 None
+        copy=False 时返回共享内存上的只读视图，处理完毕后用 valid() 确认未被覆盖"""
+        if self.closed and not self._reattach():  # 发布端重建帧环后自动重新映射
+            return None
+        seq = self.seq
+        if seq <= last_seq:
+            return None
+        offset = self._offset(seq)
+        slot_seq, sequence, timestamp, height, width, channels, dtype, device_id, nbytes = \
+            SLOT_HEADER.unpack_from(self.buf, offset)
+        if slot_seq != seq:  # 正在被改写
+            return None
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        image = np.ndarray(shape, np.dtype(dtype.rstrip(b"\0").decode()), buffer=self.buf,
+                           offset=offset + SLOT_HEADER_SIZE)
+        if copy:
+            image = image.copy()
+            if not self.valid(seq):  # 复制期间被覆盖
+                return None
+        return RingFrame(seq, sequence, timestamp, device_id.rstrip(b"\0").decode(), image)
+
+    def valid(self, frame):  # 帧所在槽位是否仍未被覆盖
+        seq = frame.seq if isinstance(frame, RingFrame) else frame
+        return struct.unpack_from("<Q", self.buf, self._offset(seq))[0] == seq
+
+    def wait(self, last_seq=0, timeout=1.0, copy=True):  # 等待新帧，按发布端帧间隔轮询
+        deadline = time.monotonic() + timeout
+        interval = min(max(self.frame_interval / 4, 0.001), 0.01)
+        while True:
+            frame = self.read(last_seq, copy)
+            if frame is not None or time.monotonic() >= deadline:
+                return frame
+            time.sleep(interval)
+
+    def close(self):
+        _release(self.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${CAMERA_WORKER} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 多进程相机采集模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_CAMERA_WORKER}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 每台相机一个采集进程：解码、缩放在子进程中完成，多台相机可并行占用多个 CPU 核心
+# 子进程运行工具自身的 CameraController，预览帧写入共享内存帧环，只把帧序号（帧句柄）发回主进程
+# 主进程中的 CameraWorker 与 CameraController 接口一致，参数写入通过管道转发给子进程
+# 子进程订阅的驱动参数事件经帧句柄管道以 ("ctrl", 事件) 发回主进程，由 on_ctrl_event 同步到界面
+# 控制器实例上的采集需求（如带宽规划结果 capture_mode）随启动参数传给子进程，子进程按相同模式打开相机
+# ----------------------------------------------------------------------------------------------------------------------
+import signal
+import multiprocessing
+from threading import Thread, Lock
+from frame_ring import FrameRingWriter, FrameRingReader
+from latency import latency_report
+
+PREVIEW_SLOTS = 8  # 预览帧环槽位数
+START_TIMEOUT = 15  # 等待子进程初始化相机的超时（秒）
+STOP_TIMEOUT = 3  # 等待子进程释放相机的超时（秒）
+NO_RESPONSE = "工作进程无响应"
+
+
+def preview_name(name):  # 预览帧环名称，与 SHARED_RING 的全分辨率帧环区分
+    return f"{name} preview"
+
+
+# 子进程中替代 FrameSlot：帧写入帧环，帧序号发回主进程
+class RingSlot:
+    def __init__(self, name, device_id, conn):
+        self.ring = FrameRingWriter(preview_name(name), device_id, slots=PREVIEW_SLOTS)
+        self.conn = conn
+        self.lock = Lock()  # 采集线程与参数事件监听线程共用管道
+        self.dropped = 0
+
+    @property
+    def seq(self):
+        return self.ring.seq
+
+    def put(self, frame, timestamp=None):
+        seq = self.ring.publish(frame, timestamp=timestamp)
+        self.send(seq)
+        return seq
+
+    def send(self, message):  # 帧序号或 ("ctrl", 事件)
+        with self.lock:
+            try:
+                self.conn.send(message)
+            except OSError:  # 主进程已退出
+                pass
+
+
+def _worker_main(controller_cls, index, device_id, capture_mode, cmd_conn, frame_conn):  # 子进程入口
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程统一处理
+    controller = controller_cls(index, device_id)
+    if capture_mode is not None:  # 主进程为本台相机规划的采集需求，须在打开相机前设置
+        controller.capture_mode = capture_mode
+    controller.slot = RingSlot(controller.name, device_id, frame_conn)
+    controller.on_ctrl_event = lambda event: controller.slot.send(("ctrl", event))  # 参数事件转发给主进程
+    ok = controller.initialize()
+    cmd_conn.send(ok)
+    if not ok:
+        return
+    thread = Thread(target=controller.run, daemon=True)  # 采集线程
+    thread.start()
+    while True:  # 处理主进程的参数命令
+        try:
+            cmd, args = cmd_conn.recv()
+        except (EOFError, OSError):  # 主进程已退出
+            break
+        if cmd == "exit":
+            break
+        if cmd == "set_param":
+            param_idx, value = args
+            result = controller.device.set_param(controller.camera_params[param_idx], value)
+        elif cmd == "get_param":
+            result = controller.device.get_param(controller.camera_params[args[0]])
+        elif cmd == "apply_values":
+            result = controller.apply_values(args[0])
+        else:
+            result = None
+        cmd_conn.send(result)
+    controller.exit_event.set()
+    thread.join(STOP_TIMEOUT)
+    controller.slot.ring.close()
+    print(latency_report())  # 子进程内的采集阶段延迟
+
+
+# 主进程中的参数控制代理，接口与 V4L2Device.set_param / get_param 一致
+class WorkerDevice:
+    def __init__(self, worker):
+        self.worker = worker
+
+    def set_param(self, param, value):
+        result = self.worker.call("set_param", self.worker.param_index(param), value)
+        return result if result is not None else (False, NO_RESPONSE)
+
+    def get_param(self, param):  # 子进程无响应时与读取失败一样返回 None
+        return self.worker.call("get_param", self.worker.param_index(param))
+
+
+# 主进程中的相机代理：run() 只负责把帧句柄转换为共享内存视图放入显示槽位
+class CameraWorker:
+    def __init__(self, controller):
+        self.controller_cls = type(controller)
+        self.index = controller.index
+        self.device_id = controller.device_id
+        self.capture_mode = getattr(controller, "capture_mode", None)  # 采集需求字典，可序列化传给子进程
+        self.name = controller.name
+        self.camera_params = controller.camera_params
+        self.slot = controller.slot
+        self.exit_event = controller.exit_event
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.device = WorkerDevice(self)
+        self.lock = Lock()  # 命令请求/应答成对进行
+        self.process = None
+        self.cmd_conn = None
+        self.frame_conn = None
+        self.reader = None
+        self.closed = False
+
+    def initialize(self):  # 启动子进程并等待相机初始化结果
+        ctx = multiprocessing.get_context("spawn")  # 不继承 Tk 等主进程状态
+        self.cmd_conn, child_cmd = ctx.Pipe()
+        self.frame_conn, child_frame = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(target=_worker_main, name=self.name, daemon=True,
+                                   args=(self.controller_cls, self.index, self.device_id, self.capture_mode,
+                                         child_cmd, child_frame))
+        self.process.start()
+        child_cmd.close()  # 子进程退出后主进程读取端才能收到 EOF
+        child_frame.close()
+        ok = False
+        try:
+            if self.cmd_conn.poll(START_TIMEOUT):
+                ok = self.cmd_conn.recv()
+        except (EOFError, OSError):
+            pass
+        if not ok:
+            self.close()
+        return ok
+
+    def param_index(self, param):  # 参数在列表中的位置，子进程按位置查找自己的参数副本
+        for param_idx, item in enumerate(self.camera_params):
+            if item is param:
+                return param_idx
+        raise ValueError(f"未知参数: {param.get('v4l2_param')}")
+
+    def call(self, cmd, *args):  # 发送命令并等待结果，子进程不可用时返回 None
+        with self.lock:
+            if self.closed or not self.process.is_alive():
+                return None
+            try:
+                self.cmd_conn.send((cmd, args))
+                return self.cmd_conn.recv()
+            except (EOFError, OSError):
+                return None
+
+    def apply_values(self, values):  # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        result = self.call("apply_values", list(values))
+        return result if result is not None else {param_idx: NO_RESPONSE for param_idx in range(len(values))}
+
+    def init_params(self):  # 初始化参数：子进程中的控制器只打开相机，参数由主进程的命令线程下发
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items():
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
+
+    def run(self):  # 接收帧句柄与参数事件，按序号读取共享内存中的预览帧
+        last_seq = 0
+        while not self.exit_event.is_set():
+            try:
+                if not self.frame_conn.poll(0.5):
+                    continue
+                new_frame = False
+                while self.frame_conn.poll():  # 积压的帧句柄只保留最新一个，参数事件逐个转发
+                    message = self.frame_conn.recv()
+                    if isinstance(message, tuple):
+                        if self.on_ctrl_event is not None:
+                            self.on_ctrl_event(message[1])
+                    else:
+                        new_frame = True
+            except (EOFError, OSError):  # 子进程已退出
+                break
+            if not new_frame:
+                continue
+            if self.reader is None:
+                self.reader = FrameRingReader(preview_name(self.name))
+            # 拷贝出共享内存：子进程持续写入帧环，显示线程稍有停顿就会覆盖视图，画面出现撕裂
+            frame = self.reader.read(last_seq)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            self.slot.put(frame.image, frame.timestamp)
+        self.close()
+
+    def close(self):  # 通知子进程释放相机并退出
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.process is not None and self.process.is_alive():
+                try:
+                    self.cmd_conn.send(("exit", ()))
+                except OSError:
+                    pass
+                self.process.join(STOP_TIMEOUT)
+                if self.process.is_alive():
+                    self.process.terminate()
+            if self.reader is not None:
+                self.reader.close()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${LATENCY} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 帧延迟统计模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_LATENCY}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 逐帧延迟统计：按设备记录各阶段耗时（出队、解码、缩放、排队、拼接、显示）及传感器到显示的总延迟
+# 所有时间均为 CLOCK_MONOTONIC 秒，起点为 V4L2 缓冲区时间戳；直方图按固定边界分桶（毫秒，含 50 ms 目标边界），可随时打印
+# 每个阶段只由一个线程写入，计数在 GIL 下更新，无需加锁
+# ----------------------------------------------------------------------------------------------------------------------
+from threading import Lock
+
+STAGES = ("dequeue", "decode", "preprocess", "queue", "compose", "imshow", "total")
+STAGE_NAMES = {
+    "dequeue": "出队",  # 驱动写入缓冲区 → 用户态出队
+    "decode": "解码",  # 原始数据 → BGR
+    "preprocess": "预处理",  # 裁剪、缩放与颜色转换
+    "queue": "排队",  # 放入显示槽位 → 显示线程取走
+    "compose": "拼接",  # 帧缩放写入拼接画布并绘制叠加信息
+    "imshow": "显示",  # 拼接画布 cv2.imshow 调用耗时（不含窗口刷新），同一次显示的各相机相同
+    "total": "总延迟",  # 传感器时间戳 → 显示完成
+}
+BUCKET_BOUNDS = (1, 2, 3, 5, 8, 10, 15, 20, 30, 40, 50, 60, 80, 100, 150, 200, 300)  # 分桶上界（毫秒），最后一桶为溢出
+LATENCY_TARGET = 50  # 闭环抓取要求的总延迟上限（毫秒）
+
+_registry = {}
+_registry_lock = Lock()
+
+
+# 单个阶段的直方图
+class StageHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        idx = 0
+        while idx < len(BUCKET_BOUNDS) and ms > BUCKET_BOUNDS[idx]:
+            idx += 1
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):  # 按分桶上界估算百分位（毫秒）
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(BUCKET_BOUNDS[idx], self.max) if idx < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+# 单台设备的延迟统计
+class LatencyStats:
+    def __init__(self, name):
+        self.name = name
+        self.stages = {stage: StageHistogram() for stage in STAGES}
+
+    def record(self, stage, seconds):
+        self.stages[stage].record(seconds * 1000)
+
+    def as_dict(self):  # 各阶段统计（毫秒），用于 JSON 输出
+        return {stage: {"count": hist.count, "mean": round(hist.total / hist.count, 3), "p50": hist.percentile(50),
+                        "p95": hist.percentile(95), "p99": hist.percentile(99), "max": round(hist.max, 3)}
+                for stage, hist in self.stages.items() if hist.count}
+
+    def report(self, width=40):
+        """多行文本：每个阶段的平均值/百分位及直方图"""
+        lines = [f"===== {self.name} 延迟统计（毫秒）====="]
+        for stage in STAGES:
+            hist = self.stages[stage]
+            if not hist.count:
+                continue
+            p95 = hist.percentile(95)
+            line = (f"{STAGE_NAMES[stage]:<4} n={hist.count:<6} 平均 {hist.total / hist.count:7.2f}  "
+                    f"p50≤{hist.percentile(50):<6.4g} p95≤{p95:<6.4g} p99≤{hist.percentile(99):<6.4g} 最大 {hist.max:7.2f}")
+            if stage == "total" and p95 > LATENCY_TARGET:
+                line = f"\033[33m{line}  超过 {LATENCY_TARGET} ms\033[0m"
+            lines.append(line)
+            peak = max(hist.buckets)
+            lower = 0
+            for idx, n in enumerate(hist.buckets):
+                upper = f"{BUCKET_BOUNDS[idx]:g}" if idx < len(BUCKET_BOUNDS) else "∞"
+                if n:
+                    lines.append(f"    {lower:>5g} ~ {upper:<5} {'█' * max(1, n * width // peak)} {n}")
+                lower = BUCKET_BOUNDS[idx] if idx < len(BUCKET_BOUNDS) else lower
+        return "\n".join(lines)
+
+
+def get_latency(name):  # 获取（或创建）设备的延迟统计
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LatencyStats(name)
+        return _registry[name]
+
+
+def latency_report():  # 当前进程内所有设备的延迟报告
+    with _registry_lock:
+        stats = list(_registry.values())
+    return "\n".join(item.report() for item in stats)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${V4L2_ENUM} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} V4L2 摄像头枚举模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_V4L2_ENUM}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 摄像头枚举：读取 /sys/class/video4linux 与 USB 设备属性（idVendor、idProduct、serial），配合 VIDIOC_QUERYCAP 判断节点能力
+# 不启动 udevadm / v4l2-ctl 子进程，也不打开视频流；属性在首次访问时读取并缓存
+# UVC 相机每个物理设备会注册视频节点与元数据节点，默认只返回可采集视频的节点
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import fcntl
+import ctypes
+from v4l2_ctrl import _IOR
+
+SYSFS_VIDEO = "/sys/class/video4linux"
+
+# 设备能力位
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_META_CAPTURE = 0x00800000
+V4L2_CAP_STREAMING = 0x04000000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [
+        ("driver", ctypes.c_char * 16),
+        ("card", ctypes.c_char * 32),
+        ("bus_info", ctypes.c_char * 32),
+        ("version", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("device_caps", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+VIDIOC_QUERYCAP = _IOR(0, v4l2_capability)
+
+_UNSET = object()
+
+
+def _read_attr(path):  # 读取 sysfs 属性，不存在时返回 None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def query_cap(path):
+    """VIDIOC_QUERYCAP：只打开设备节点查询能力，不启动采集；失败返回 None"""
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        cap = v4l2_capability()
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, cap)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    return {
+        "driver": cap.driver.decode(errors="replace"),
+        "card": cap.card.decode(errors="replace"),
+        "bus_info": cap.bus_info.decode(errors="replace"),
+        "version": "{}.{}.{}".format(cap.version >> 16, (cap.version >> 8) & 0xff, cap.version & 0xff),
+        "capabilities": cap.capabilities,
+        # 设置了 DEVICE_CAPS 时 device_caps 才是本节点的能力，否则只能使用整机能力
+        "device_caps": cap.device_caps if cap.capabilities & V4L2_CAP_DEVICE_CAPS else cap.capabilities,
+    }
+
+
+# 单个 /dev/videoN 节点
+class VideoNode:
+    def __init__(self, node):
+        self.node = node  # 节点名，如 video0
+        self.index = int(node[len("video"):])
+        self.path = f"/dev/{node}"
+        self.sysfs = os.path.join(SYSFS_VIDEO, node)
+        self._usb_dir = _UNSET
+        self._caps = _UNSET
+
+    @property
+    def name(self):  # 驱动注册的设备名称
+        return _read_attr(os.path.join(self.sysfs, "name")) or "N/A"
+
+    @property
+    def usb_dir(self):
+        """节点所属 USB 设备的 sysfs 目录（device 指向 USB 接口，其上一级为 USB 设备）；非 USB 设备为 None"""
+        if self._usb_dir is _UNSET:
+            self._usb_dir = None
+            path = os.path.realpath(os.path.join(self.sysfs, "device"))
+            for candidate in (path, os.path.dirname(path)):
+                if os.path.exists(os.path.join(candidate, "idVendor")):
+                    self._usb_dir = candidate
+                    break
+        return self._usb_dir
+
+    def usb_attr(self, attr):  # USB 设备属性
+        return _read_attr(os.path.join(self.usb_dir, attr)) if self.usb_dir else None
+
+    @property
+    def vid(self):
+        value = self.usb_attr("idVendor")
+        return value.upper() if value else "N/A"
+
+    @property
+    def pid(self):
+        value = self.usb_attr("idProduct")
+        return value.upper() if value else "N/A"
+
+    @property
+    def device_id(self):  # VID-PID 组合，与各工具的窗口标题一致
+        return f"{self.vid}-{self.pid}" if self.vid != "N/A" and self.pid != "N/A" else "UNKNOWN"
+
+    @property
+    def serial(self):
+        return self.usb_attr("serial") or "N/A"
+
+    @property
+    def manufacturer(self):
+        return self.usb_attr("manufacturer") or "N/A"
+
+    @property
+    def product(self):
+        return self.usb_attr("product") or "N/A"
+
+    @property
+    def port(self):  # USB 端口路径，如 1-1.2，物理位置不变时保持不变
+        return os.path.basename(self.usb_dir) if self.usb_dir else "N/A"
+
+    @property
+    def caps(self):  # VIDIOC_QUERYCAP 结果，首次访问时查询
+        if self._caps is _UNSET:
+            self._caps = query_cap(self.path)
+        return self._caps
+
+    @property
+    def driver(self):
+        return self.caps["driver"] if self.caps else "N/A"
+
+    @property
+    def is_capture(self):
+        """是否为视频采集节点；无法查询能力时按 sysfs index（0 为主节点）判断"""
+        if self.caps:
+            return bool(self.caps["device_caps"] & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE))
+        return _read_attr(os.path.join(self.sysfs, "index")) in ("0", None)
+
+    @property
+    def is_metadata(self):
+        return bool(self.caps and self.caps["device_caps"] & V4L2_CAP_META_CAPTURE)
+
+    def __repr__(self):
+        return f"VideoNode({self.path}, {self.device_id})"
+
+
+def list_video_nodes(capture_only=True, driver=None):
+    """按序号列出视频节点；capture_only 过滤元数据等非采集节点，driver 按驱动名称过滤（如 uvcvideo）"""
+    try:
+        names = [n for n in os.listdir(SYSFS_VIDEO) if n.startswith("video") and n[len("video"):].isdigit()]
+    except OSError:  # 未加载 videodev 模块
+        return []
+    nodes = [VideoNode(n) for n in sorted(names, key=lambda n: int(n[len("video"):]))]
+    if capture_only:
+        nodes = [node for node in nodes if node.is_capture]
+    if driver:
+        nodes = [node for node in nodes if node.driver == driver]
+    return nodes
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${HOTPLUG} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 相机热插拔监听模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_HOTPLUG}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 相机热插拔：通过 NETLINK_KOBJECT_UEVENT 套接字接收内核 uevent，视频节点接入/拔出时回调，不做周期性重新扫描
+# 回调在监听线程中执行，涉及 Tk 界面时由调用方转回主线程（root.after）
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import time
+import socket
+from threading import Thread
+from v4l2_enum import VideoNode
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP_KERNEL = 1  # 内核广播组（udev 处理之前的原始事件）
+UEVENT_BUFFER_SIZE = 1 << 20  # 接收缓冲区，避免批量插拔时丢事件
+NODE_WAIT = 2.0  # 等待 udev 创建 /dev 节点并设置权限的上限（秒）
+
+
+def parse_uevent(data):
+    """解析内核 uevent 报文 'action@devpath\\0KEY=VALUE\\0...'，返回属性字典"""
+    event = {}
+    for field in data.split(b"\0")[1:]:
+        key, sep, value = field.partition(b"=")
+        if sep:
+            event[key.decode(errors="replace")] = value.decode(errors="replace")
+    return event
+
+
+# 内核 uevent 监听套接字
+class UeventMonitor:
+    def __init__(self, subsystem=None):
+        self.subsystem = subsystem  # 只关心的子系统，如 video4linux、usb
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER_SIZE)
+        self.sock.bind((0, UEVENT_GROUP_KERNEL))  # 端口号为 0 时由内核分配，多个监听者互不冲突
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+        """阻塞接收一个事件，返回属性字典；不属于关注子系统时返回 None"""
+        event = parse_uevent(self.sock.recv(UEVENT_BUFFER_SIZE))
+        if self.subsystem and event.get("SUBSYSTEM") != self.subsystem:
+            return None
+        return event
+
+    def close(self):
+        self.sock.close()
+
+
+# 相机注册表：视频采集节点接入时回调 on_add(VideoNode)，拔出时回调 on_remove(设备序号)
+class CameraRegistry:
+    def __init__(self, on_add, on_remove):
+        self.on_add = on_add
+        self.on_remove = on_remove
+        self.monitor = None
+        self.running = False
+
+    def start(self):  # 启动监听线程，系统不支持 netlink 时返回 False
+        try:
+            self.monitor = UeventMonitor("video4linux")
+        except OSError as e:
+            print(f"\033[33m警告：热插拔监听不可用（{e}），仅使用启动时检测到的相机\033[0m")
+            return False
+        self.running = True
+        Thread(target=self._run, daemon=True).start()
+        return True
+
+    def _run(self):
+        while self.running:
+            try:
+                event = self.monitor.receive()
+            except OSError:  # 监听已关闭
+                break
+            node = os.path.basename(event.get("DEVNAME", "")) if event else ""
+            if not node.startswith("video") or not node[len("video"):].isdigit():
+                continue
+            if event.get("ACTION") == "add":
+                self._handle_add(node)
+            elif event.get("ACTION") == "remove":
+                self.on_remove(int(node[len("video"):]))
+
+    def _handle_add(self, name):
+        node = VideoNode(name)
+        deadline = time.monotonic() + NODE_WAIT
+        while node.caps is None and time.monotonic() < deadline:  # 内核事件早于 udev 创建设备节点
+            time.sleep(0.05)
+            node = VideoNode(name)
+        if node.is_capture:  # 元数据节点不启动
+            self.on_add(node)
+
+    def stop(self):  # 阻塞中的 recv 在下一个事件到来时退出，线程为守护线程
+        self.running = False
+        if self.monitor is not None:
+            self.monitor.close()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${SN_DAEMON} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 常驻 SN 解析进程 ${COLOR_RESET}" # 程序声明
+echo -e "${COLOR_WARNING} 在程序中使用硬编码路径读取，在实际使用时需要检查路径问题 ${COLOR_RESET}" # 警告声明
+echo -e "/home/ur/Vitai0506/venv312/lib/python3.12/site-packages" # 警告声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_SN_DAEMON}" # 程序路径
+# ====================================================== 程序声明 ======================================================
+print("\n\033[93m【常驻 SN 解析进程：保持厂商 SDK 常驻，通过 Unix 套接字按需返回设备 SN 码】\033[0m")
+print("\033[91m【在程序中使用硬编码路径读取，在实际使用时需要检查路径问题】\033[0m\n")
+# ----------------------------------------------------------------------------------------------------------------------
+venv_site_packages = '/home/ur/Vitai0506/venv312/lib/python3.12/site-packages'
+# 调用路径，本程序运行环境是由厂商SDK决定，在使用时，需要手动修改路径
+
+import os
+import sys
+import json
+import signal
+import time
+import socket
+import socketserver
+from threading import Thread, Lock, Timer
+sys.path.insert(0, venv_site_packages)
+
+from pyvitaisdk import VTSDeviceFinder
+
+SN_SOCKET = "/tmp/vitai_sn_resolver.sock"  # 请求/应答套接字，每行一个 JSON
+USB_DEVICES = "/sys/bus/usb/devices"
+NETLINK_KOBJECT_UEVENT = 15
+REFRESH_DELAY = 1.0  # USB 设备变化后等待 SDK 可见再预取（秒）
+WATCH_RETRY = 1.0  # USB 热插拔监听出错后重新订阅的间隔（秒）
+
+
+def read_attr(path):  # 读取 sysfs 属性，不存在时返回 None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def bind_ports(sns):
+    """按 USB 设备的 serial 属性把 SN 绑定到 USB 总线路径（如 1-1.2），返回 {总线路径: SN}"""
+    ports = {}
+    try:
+        names = os.listdir(USB_DEVICES)
+    except OSError:
+        return ports
+    for name in names:
+        if ":" in name:  # 跳过 USB 接口，只看 USB 设备
+            continue
+        serial = read_attr(os.path.join(USB_DEVICES, name, "serial"))
+        if serial and serial in sns:
+            ports[name] = serial
+    return ports
+
+
+# SN 缓存：首次请求或 USB 设备变化后才调用 SDK
+class SNResolver:
+    def __init__(self):
+        self.lock = Lock()
+        self.cache = None  # {"sns": [...], "ports": {总线路径: SN}, "updated": 时间}
+        self.timer = None
+
+    def resolve(self):
+        with self.lock:
+            if self.cache is None:
+                sns = [str(sn) for sn in VTSDeviceFinder().get_sns()]
+                self.cache = {"sns": sns, "ports": bind_ports(sns), "updated": time.time()}
+            return self.cache
+
+    def invalidate(self):  # USB 设备变化：清空缓存并延迟预取，下一次请求无需等待 SDK
+        with self.lock:
+            self.cache = None
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = Timer(REFRESH_DELAY, self._prefetch)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _prefetch(self):
+        try:
+            self.resolve()
+        except Exception as e:
+            print(f"预取SN码时发生错误：{e}")
+
+
+def open_uevent_socket():  # 订阅内核 uevent 广播
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    try:
+        sock.bind((0, 1))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def watch_usb(resolver):  # 监听内核 USB 设备的 uevent，设备接入/拔出时使缓存失效
+    try:
+        sock = open_uevent_socket()
+    except OSError as e:
+        print(f"\033[33m警告：USB 热插拔监听不可用（{e}），缓存仅在 refresh 请求时更新\033[0m")
+        return
+    while True:
+        try:
+            data = sock.recv(1 << 16)
+            fields = dict(f.split(b"=", 1) for f in data.split(b"\0")[1:] if b"=" in f)
+            if fields.get(b"SUBSYSTEM") == b"usb" and fields.get(b"DEVTYPE") == b"usb_device" \
+                    and fields.get(b"ACTION") in (b"add", b"remove"):
+                resolver.invalidate()
+        except Exception as e:  # 如事件过多时接收缓冲区溢出（ENOBUFS）：可能漏掉事件，使缓存失效并重新订阅
+            print(f"\033[33m警告：USB 热插拔监听出错（{e}），重新订阅\033[0m")
+            resolver.invalidate()
+            sock.close()
+            while True:
+                time.sleep(WATCH_RETRY)
+                try:
+                    sock = open_uevent_socket()
+                    break
+                except OSError as e:
+                    print(f"\033[33m警告：重新订阅 USB 热插拔事件失败（{e}）\033[0m")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                cmd = request.get("cmd")
+                if cmd == "ping":
+                    response = {"ok": True, "pid": os.getpid()}
+                elif cmd == "sns":
+                    response = dict(self.server.resolver.resolve(), ok=True)
+                elif cmd == "lookup":  # 按 USB 总线路径查询 SN
+                    sn = self.server.resolver.resolve()["ports"].get(request.get("port"))
+                    response = {"ok": sn is not None, "sn": sn}
+                elif cmd == "refresh":
+                    self.server.resolver.invalidate()
+                    response = dict(self.server.resolver.resolve(), ok=True)
+                else:
+                    response = {"ok": False, "error": f"未知命令: {cmd}"}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+
+
+class SNServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:  # 已有解析进程在运行则直接退出
+        probe.connect(SN_SOCKET)
+        print("SN 解析进程已在运行")
+        return
+    except OSError:
+        pass
+    finally:
+        probe.close()
+    if os.path.exists(SN_SOCKET):  # 清理上次异常退出遗留的套接字文件
+        os.unlink(SN_SOCKET)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))  # 被终止时同样删除套接字文件
+    resolver = SNResolver()
+    Thread(target=watch_usb, args=(resolver,), daemon=True).start()
+    with SNServer(SN_SOCKET, RequestHandler) as server:
+        server.resolver = resolver
+        print(f"SN 解析进程已启动：{SN_SOCKET}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(SN_SOCKET)
+
+
+if __name__ == "__main__":
+    main()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${SN_CLIENT} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} SN 解析进程客户端模块 ${COLOR_RESET}" # 程序声明
+echo -e "${COLOR_WARNING} 由于需要启动常驻 SN 解析进程，所以在使用的时候，注意硬编码路径问题 ${COLOR_RESET}" # 警告声明
+echo -e "/home/ur/Vitai0506/venv312/bin/python" # 警告声明
+echo -e "/home/ur/Vitai0506/venv312/sn_daemon.py" # 警告声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_SN_CLIENT}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 常驻 SN 解析进程（venv312/sn_daemon.py）的客户端：通过 Unix 套接字按行收发 JSON
+# 解析进程未运行时自动以 Python 3.12 启动并等待就绪，之后每次查询只需毫秒级
+# ----------------------------------------------------------------------------------------------------------------------
+import json
+import time
+import socket
+import subprocess
+
+SN_SOCKET = "/tmp/vitai_sn_resolver.sock"  # 与 sn_daemon.py 一致
+# venv312环境的Python解释器路径
+PYTHON_VENV312 = "/home/ur/Vitai0506/venv312/bin/python"
+# 常驻 SN 解析进程脚本路径
+SN_DAEMON = "/home/ur/Vitai0506/venv312/sn_daemon.py"
+START_TIMEOUT = 15  # 等待解析进程加载 SDK 的超时（秒）
+REQUEST_TIMEOUT = 10  # 单次请求超时，缓存失效时需等待 SDK 枚举设备（秒）
+
+
+def request(cmd, timeout=REQUEST_TIMEOUT, **args):
+    """发送一条命令并返回应答字典；连接失败时抛出 OSError"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(SN_SOCKET)
+        sock.sendall((json.dumps(dict(args, cmd=cmd)) + "\n").encode())
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("SN 解析进程关闭了连接")
+            data += chunk
+    return json.loads(data)
+
+
+def start_daemon():  # 后台启动解析进程并等待就绪；解析进程提前退出（如 SDK 导入失败）时立即返回
+    try:
+        proc = subprocess.Popen([PYTHON_VENV312, SN_DAEMON], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                start_new_session=True)  # 脱离当前终端，调用方退出后继续常驻
+    except OSError as e:
+        print(f"启动 {SN_DAEMON} 失败：{e}")
+        return False
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            return request("ping", timeout=1).get("ok", False)
+        except (OSError, ValueError):
+            if proc.poll() is not None:  # 解析进程已退出，不再等待
+                print(f"{SN_DAEMON} 启动后退出（返回码 {proc.returncode}），请检查 venv312 环境与 SDK 路径")
+                return False
+            time.sleep(0.1)
+    return False
+
+
+def query(cmd, **args):
+    """查询解析进程，必要时先启动；不可用时返回 None"""
+    try:
+        return request(cmd, **args)
+    except (OSError, ValueError):
+        pass
+    if not start_daemon():
+        return None
+    try:
+        return request(cmd, **args)
+    except (OSError, ValueError) as e:
+        print(f"查询 SN 解析进程失败：{e}")
+        return None
+
+
+def get_sns():
+    """返回 {"sns": [SN...], "ports": {USB 总线路径: SN}}，解析进程不可用时返回 None"""
+    response = query("sns")
+    if not response or not response.get("ok"):
+        return None
+    return {"sns": response.get("sns", []), "ports": response.get("ports", {})}
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${DEVICE_INDEX} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} SN、USB 端口与视频节点索引模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_DEVICE_INDEX}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 设备索引：以 USB 物理设备为单位，把 SDK SN 码、sysfs serial、USB 端口路径与 /dev/videoN 节点合并为一条记录
+# SN 码按 USB 设备 serial 属性绑定，不依赖 lsusb 与 SDK 的列举顺序；按 SN、端口、节点、总线号/设备号查询均为字典查找
+# 热插拔时可用 add_node / remove_node 增量更新，无需重新扫描全部设备
+# ----------------------------------------------------------------------------------------------------------------------
+from v4l2_enum import VideoNode, list_video_nodes
+
+
+def _node_index(node):  # 接受 0、"video0"、"/dev/video0"，返回设备序号
+    if isinstance(node, int):
+        return node
+    name = str(node).rsplit("/", 1)[-1]
+    return int(name[len("video"):]) if name.startswith("video") and name[len("video"):].isdigit() else None
+
+
+# 单个物理传感器
+class SensorRecord:
+    def __init__(self, port, node):
+        self.port = port  # USB 端口路径，如 1-1.2
+        self.vid = node.vid
+        self.pid = node.pid
+        self.device_id = node.device_id
+        self.serial = node.serial  # USB 描述符中的序列号
+        self.product = node.product
+        self.manufacturer = node.manufacturer
+        self.busnum = node.usb_attr("busnum")  # 与 lsusb 的 Bus 对应
+        self.devnum = node.usb_attr("devnum")  # 与 lsusb 的 Device 对应
+        self.nodes = {}  # 设备序号 -> VideoNode（视频节点与元数据节点）
+        self.sn = None  # 与 SDK 列出的 SN 码匹配后填入
+
+    @property
+    def capture_nodes(self):  # 可采集视频的节点，按序号排列
+        return [self.nodes[i] for i in sorted(self.nodes) if self.nodes[i].is_capture]
+
+    @property
+    def video_index(self):  # 主视频节点序号，没有采集节点时为 None
+        nodes = self.capture_nodes
+        return nodes[0].index if nodes else None
+
+    def as_dict(self):
+        return {
+            "sn": self.sn,
+            "port": self.port,
+            "device_id": self.device_id,
+            "vid": self.vid,
+            "pid": self.pid,
+            "serial": self.serial,
+            "product": self.product,
+            "manufacturer": self.manufacturer,
+            "busnum": self.busnum,
+            "devnum": self.devnum,
+            "nodes": [self.nodes[i].path for i in sorted(self.nodes)],
+            "video_index": self.video_index,
+        }
+
+    def describe(self):  # as_dict 加上各采集节点的 VIDIOC_QUERYCAP 结果
+        info = self.as_dict()
+        info["caps"] = {node.path: node.caps for node in self.capture_nodes}
+        return info
+
+    def __repr__(self):
+        return f"SensorRecord({self.sn or self.serial}, {self.port}, {[self.nodes[i].path for i in sorted(self.nodes)]})"
+
+
+class DeviceIndex:
+    def __init__(self):
+        self.by_port = {}  # USB 端口路径 -> SensorRecord
+        self.by_node = {}  # 设备序号 -> SensorRecord
+        self.by_sn = {}  # SN 码 -> SensorRecord
+        self.by_busdev = {}  # (总线号, 设备号) -> SensorRecord
+        self.sns = set()  # SDK 列出的全部 SN 码
+        self.unbound_sns = []  # 没有找到对应 USB 设备的 SN 码
+
+    @classmethod
+    def build(cls, sns=(), ports=None):
+        """扫描全部视频节点并绑定 SN 码；ports 为 SN 解析进程返回的 {USB 端口路径: SN}，可选"""
+        index = cls()
+        for node in list_video_nodes(capture_only=False):
+            index.add_node(node)
+        index.bind_sns(sns, ports)
+        return index
+
+    def add_node(self, node):
+        """加入一个视频节点（VideoNode、序号或节点名），返回所属记录；非 USB 设备返回 None"""
+        if not isinstance(node, VideoNode):
+            node = VideoNode(f"video{_node_index(node)}")
+        if node.usb_dir is None:
+            return None
+        record = self.by_port.get(node.port)
+        if record is None:
+            record = SensorRecord(node.port, node)
+            self.by_port[record.port] = record
+            if record.busnum and record.devnum:
+                self.by_busdev[(int(record.busnum), int(record.devnum))] = record
+            self._bind(record)
+        record.nodes[node.index] = node
+        self.by_node[node.index] = record
+        return record
+
+    def remove_node(self, node):
+        """移除一个视频节点；物理设备的所有节点都已移除时删除整条记录"""
+        record = self.by_node.pop(_node_index(node), None)
+        if record is None:
+            return None
+        record.nodes.pop(_node_index(node), None)
+        if not record.nodes:
+            self.by_port.pop(record.port, None)
+            if record.busnum and record.devnum:
+                self.by_busdev.pop((int(record.busnum), int(record.devnum)), None)
+            if record.sn is not None:
+                self.by_sn.pop(record.sn, None)
+        return record
+
+    def bind_sns(self, sns, ports=None):
+        """按 USB 设备 serial 属性（或 SN 解析进程给出的端口）绑定 SN 码"""
+        self.sns = set(str(sn) for sn in sns)
+        self.by_sn = {}
+        for record in self.by_port.values():
+            record.sn = None
+        for port, sn in (ports or {}).items():
+            record = self.by_port.get(port)
+            if record is not None and sn in self.sns:
+                record.sn = sn
+                self.by_sn[sn] = record
+        for record in self.by_port.values():
+            self._bind(record)
+        self.unbound_sns = [sn for sn in sns if str(sn) not in self.by_sn]
+
+    def _bind(self, record):
+        if record.sn is None and record.serial in self.sns:
+            record.sn = record.serial
+            self.by_sn[record.sn] = record
+            if record.sn in self.unbound_sns:
+                self.unbound_sns.remove(record.sn)
+
+    def get(self, key):
+        """按 SN 码、USB 端口路径或视频节点（序号 / videoN / /dev/videoN）查询记录，不存在时返回 None"""
+        if isinstance(key, int):
+            return self.by_node.get(key)
+        record = self.by_sn.get(key) or self.by_port.get(key)
+        if record is None and _node_index(key) is not None:
+            record = self.by_node.get(_node_index(key))
+        return record
+
+    def lookup_usb(self, busnum, devnum):  # 按 lsusb 的 Bus / Device 编号查询
+        return self.by_busdev.get((int(busnum), int(devnum)))
+
+    def records(self):  # 按 USB 端口路径排序，输出顺序与物理位置一致
+        return [self.by_port[port] for port in sorted(self.by_port)]
+
+    def __len__(self):
+        return len(self.by_port)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${DISCOVERY} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 并发设备探测模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_DISCOVERY}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 并发设备探测：lsusb、v4l2-ctl、SN 查询等探测项在有界线程池中同时运行，每项独立超时，总耗时约等于最慢的一项
+# 超时的探测项返回默认值并由新线程补位，工作线程为守护线程，卡住的探测不会阻止程序退出
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from queue import Queue, Empty
+from threading import Thread
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+MAX_WORKERS = 8  # 同时运行的探测项上限
+PROBE_TIMEOUT = 5.0  # 默认单项超时（秒），从该项开始运行时计时
+POLL_INTERVAL = 0.05  # 有探测项尚未开始时的检查间隔（秒）
+
+
+# 单个探测项
+class Probe:
+    def __init__(self, name, func, args=(), timeout=PROBE_TIMEOUT, default=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+        self.default = default  # 超时或出错时的结果
+        self.future = Future()
+        self.started = None
+        self.elapsed = None
+        self.status = "等待"  # 完成 / 超时 / 错误：...
+        self.result = default
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        self.started = time.monotonic()
+        try:
+            self.future.set_result(self.func(*self.args))
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def finish(self, result, status):
+        self.result = result
+        self.status = status
+        self.elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+
+
+def _worker(tasks):
+    while True:
+        try:
+            probe = tasks.get_nowait()
+        except Empty:
+            return
+        probe.run()
+
+
+def run_probes(probes, workers=MAX_WORKERS, on_result=None):
+    """并发运行探测项，返回 {名称: 结果}；on_result(probe) 在每项完成或超时时于调用线程中回调"""
+    tasks = Queue()
+    for probe in probes:
+        tasks.put(probe)
+    for _ in range(min(workers, len(probes))):
+        Thread(target=_worker, args=(tasks,), daemon=True).start()
+    pending = {probe.future: probe for probe in probes}
+    while pending:
+        now = time.monotonic()
+        deadlines = [p.started + p.timeout for p in pending.values() if p.started is not None]
+        idle = any(p.started is None for p in pending.values())
+        timeout = max(0.0, min(deadlines) - now) if deadlines else None
+        if idle:
+            timeout = POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            probe = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                probe.finish(future.result(), "完成")
+            else:
+                probe.finish(probe.default, f"错误：{error}")
+            if on_result:
+                on_result(probe)
+        now = time.monotonic()
+        for future, probe in list(pending.items()):
+            if probe.started is not None and now - probe.started >= probe.timeout:
+                del pending[future]
+                probe.finish(probe.default, "超时")
+                Thread(target=_worker, args=(tasks,), daemon=True).start()  # 补位卡住的工作线程
+                if on_result:
+                    on_result(probe)
+    return {probe.name: probe.result for probe in probes}
+
+
+def probe_summary(probes, wall_time):  # 各探测项耗时，用于 JSON 输出
+    return {
+        "wall_time": round(wall_time, 3),
+        "probes": [{"name": p.name, "status": p.status,
+                    "elapsed": round(p.elapsed, 3) if p.elapsed is not None else None} for p in probes],
+    }
+
+
+def print_probe_report(probes, wall_time):  # 输出各探测项耗时
+    print(f"\n探测耗时（总计 {wall_time:.2f} s）：")
+    for probe in probes:
+        elapsed = f"{probe.elapsed:.2f} s" if probe.elapsed is not None else "N/A"
+        line = f"  {probe.name:<12} {elapsed:>8}  {probe.status}"
+        print(line if probe.status == "完成" else f"\033[33m{line}\033[0m")
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${JSON_OUTPUT} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} NDJSON 结构化输出模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_JSON_OUTPUT}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 结构化输出：以 --json 运行时，标准输出每行一个 JSON 记录（NDJSON），每条记录带 type 字段区分种类
+# 记录在对应探测完成后立即写出并刷新，调用方可在其余设备探测完成前开始处理；提示与错误信息改为输出到标准错误
+# ----------------------------------------------------------------------------------------------------------------------
+import sys
+import json
+import time
+from threading import Lock
+
+JSON_FLAG = "--json"  # 命令行参数
+
+
+def json_mode():  # 是否以 --json 运行
+    return JSON_FLAG in sys.argv[1:]
+
+
+# NDJSON 写出器，可在多个线程中调用
+class NDJSONWriter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout  # 在重定向标准输出之前创建，保留原标准输出
+        self.lock = Lock()
+
+    def emit(self, record_type, **fields):
+        record = dict(type=record_type, time=round(time.time(), 3), **fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${V4L2_EVENTS} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} V4L2 参数事件监听模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_V4L2_EVENTS}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# V4L2 参数事件：VIDIOC_SUBSCRIBE_EVENT 订阅 V4L2_EVENT_CTRL，监听线程在 POLLPRI 时 VIDIOC_DQEVENT 取出事件
+# 驱动自行修改参数值（如自动曝光调整曝光时间）、范围或非激活标志时，更新 V4L2Device 参数值缓存并回调调用方
+# 订阅在 V4L2Device 的同一个文件描述符上进行，本进程自己写入的参数不会产生事件，界面不会被旧值回写
+# ----------------------------------------------------------------------------------------------------------------------
+import select
+import ctypes
+from threading import Thread, current_thread
+from v4l2_ctrl import _IOR, _IOW
+
+V4L2_EVENT_ALL = 0
+V4L2_EVENT_CTRL = 3
+V4L2_EVENT_CTRL_CH_VALUE = 0x0001
+V4L2_EVENT_CTRL_CH_FLAGS = 0x0002
+V4L2_EVENT_CTRL_CH_RANGE = 0x0004
+V4L2_CTRL_FLAG_INACTIVE = 0x0010
+POLL_TIMEOUT = 500  # 监听线程检查退出标志的间隔（毫秒）
+
+
+class v4l2_event_subscription(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("id", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 5),
+    ]
+
+
+class v4l2_event_ctrl_value(ctypes.Union):
+    _fields_ = [
+        ("value", ctypes.c_int32),
+        ("value64", ctypes.c_int64),
+    ]
+
+
+class v4l2_event_ctrl(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("changes", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_event_ctrl_value),
+        ("flags", ctypes.c_uint32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+    ]
+
+
+class v4l2_event_union(ctypes.Union):
+    _fields_ = [
+        ("ctrl", v4l2_event_ctrl),
+        ("data", ctypes.c_uint8 * 64),
+        ("align", ctypes.c_int64),  # 与内核联合体的 8 字节对齐一致
+    ]
+
+
+class timespec(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_nsec", ctypes.c_long),
+    ]
+
+
+class v4l2_event(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_event_union),
+        ("pending", ctypes.c_uint32),
+        ("sequence", ctypes.c_uint32),
+        ("timestamp", timespec),
+        ("id", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 8),
+    ]
+
+
+VIDIOC_DQEVENT = _IOR(89, v4l2_event)
+VIDIOC_SUBSCRIBE_EVENT = _IOW(90, v4l2_event_subscription)
+VIDIOC_UNSUBSCRIBE_EVENT = _IOW(91, v4l2_event_subscription)
+
+
+# 参数事件监听器：每个 V4L2Device 一个监听线程
+class ControlEventListener:
+    def __init__(self, device, on_event=None):
+        self.device = device
+        self.on_event = on_event  # on_event(事件字典)，在监听线程中调用
+        self.running = False
+        self.thread = None
+        self.subscribed = []
+
+    def start(self, ctrl_ids=None):
+        """订阅参数事件并启动监听线程，默认订阅设备全部参数；设备不支持事件时返回 False"""
+        if not self.device.native:
+            return False
+        if ctrl_ids is None:
+            ctrl_ids = [ctrl["id"] for ctrl in self.device.list_ctrls()]
+        for ctrl_id in ctrl_ids:
+            sub = v4l2_event_subscription(type=V4L2_EVENT_CTRL, id=ctrl_id)
+            try:
+                self.device.ioctl(VIDIOC_SUBSCRIBE_EVENT, sub)
+                self.subscribed.append(ctrl_id)
+            except OSError:
+                continue
+        if not self.subscribed:
+            return False
+        self.running = True
+        self.device.listeners.append(self)  # 设备关闭前先停止监听
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self.device.fd, select.POLLPRI)
+        while self.running:
+            events = poller.poll(POLL_TIMEOUT)
+            if not events:
+                continue
+            if events[0][1] & (select.POLLERR | select.POLLHUP | select.POLLNVAL):  # 设备已拔出或已关闭
+                break
+            self._drain()
+
+    def _drain(self):  # 取出全部待处理事件
+        while self.running:
+            event = v4l2_event()
+            try:
+                self.device.ioctl(VIDIOC_DQEVENT, event)
+            except OSError:  # 没有待处理事件
+                return
+            if event.type == V4L2_EVENT_CTRL:
+                self._dispatch(event)
+            if not event.pending:
+                return
+
+    def _dispatch(self, event):
+        ctrl = event.u.ctrl
+        info = {
+            "id": event.id,
+            "changes": ctrl.changes,
+            "value": ctrl.value,
+            "flags": ctrl.flags,
+            "inactive": bool(ctrl.flags & V4L2_CTRL_FLAG_INACTIVE),
+            "min": ctrl.minimum,
+            "max": ctrl.maximum,
+            "step": ctrl.step,
+            "default": ctrl.default_value,
+        }
+        if ctrl.changes & V4L2_EVENT_CTRL_CH_VALUE:
+            self.device.update_cache(event.id, ctrl.value)
+        if self.on_event:
+            try:
+                self.on_event(info)
+            except Exception as e:  # 回调出错不影响后续事件
+                print(f"\033[31m错误：{self.device.path} 参数事件处理失败（{e}）\033[0m")
+
+    def stop(self):  # 停止监听并取消订阅，由 V4L2Device.close 在关闭文件描述符前调用
+        if not self.running:
+            return
+        self.running = False
+        if self.thread is not None and self.thread is not current_thread():
+            self.thread.join(POLL_TIMEOUT / 1000 * 2)
+        try:
+            self.device.ioctl(VIDIOC_UNSUBSCRIBE_EVENT, v4l2_event_subscription(type=V4L2_EVENT_ALL))
+        except OSError:
+            pass
+        if self in self.device.listeners:
+            self.device.listeners.remove(self)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${CTRL_WRITER} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 参数写入合并模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_CTRL_WRITER}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 参数写入合并：拖动滑块时界面线程只登记每个参数的最新值，由每台设备一个写入线程按固定间隔写入
+# 尚未写入就被新值覆盖的旧值直接丢弃，界面线程不等待 ioctl / v4l2-ctl，写入结果通过回调异步返回
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from threading import Thread, Condition
+
+WRITE_INTERVAL = 0.05  # 同一台设备两轮写入的最小间隔（秒），即每个参数最多每秒写入 20 次
+
+
+class ControlWriter:
+    def __init__(self, write, on_done=None, min_interval=WRITE_INTERVAL, name="ControlWriter"):
+        self.write = write  # write(*args) -> (成功与否, 错误信息)，在写入线程中调用
+        self.on_done = on_done  # on_done(key, args, 成功与否, 错误信息)，在写入线程中调用
+        self.min_interval = min_interval
+        self.pending = {}  # 参数键 -> 最新的写入参数，保持登记顺序
+        self.cond = Condition()
+        self.running = True
+        self.submitted = 0  # 登记次数
+        self.written = 0  # 实际写入次数
+        self.thread = Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    @property
+    def coalesced(self):  # 被新值覆盖而未写入的次数
+        with self.cond:
+            return self.submitted - self.written - len(self.pending)
+
+    def submit(self, key, *args):  # 登记写入，覆盖同一参数尚未写入的旧值，立即返回
+        with self.cond:
+            if not self.running:
+                return False
+            self.pending.pop(key, None)  # 重新登记到末尾，保持各参数的修改顺序
+            self.pending[key] = args
+            self.submitted += 1
+            self.cond.notify()
+            return True
+
+    def _run(self):
+        last_batch = 0.0
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.pending:  # 已关闭且没有待写入的值
+                    return
+                delay = last_batch + self.min_interval - time.monotonic()
+                if delay > 0 and self.running:  # 限速期间继续合并新值
+                    self.cond.wait(delay)
+                    continue
+                batch, self.pending = self.pending, {}
+            last_batch = time.monotonic()
+            for key, args in batch.items():
+                try:
+                    ok, error = self.write(*args)
+                except Exception as e:
+                    ok, error = False, str(e)
+                with self.cond:
+                    self.written += 1
+                if self.on_done:
+                    self.on_done(key, args, ok, error)
+
+    def close(self, timeout=1.0):  # 写完已登记的值后停止写入线程
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${CTRL_EXECUTOR} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 参数命令执行模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_CTRL_EXECUTOR}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 参数命令执行：每台设备一个命令线程，按提交顺序执行 set / get / apply_profile，调用方立即拿到 Future
+# 界面线程不再等待 ioctl / v4l2-ctl，结果由 Future 完成回调返回；多台相机各自一个线程，批量写入互不等待
+# 同一台设备的全部写入（包括 ctrl_writer 合并后的滑块写入）都经由该线程，写入顺序与提交顺序一致
+# ----------------------------------------------------------------------------------------------------------------------
+from collections import deque
+from threading import Thread, Condition
+from concurrent.futures import Future
+
+STOP_TIMEOUT = 3.0  # 关闭时等待已提交命令执行完毕的超时（秒）
+
+
+class ControlExecutor:
+    def __init__(self, controller, name="ControlExecutor"):
+        self.controller = controller  # CameraController 或 CameraWorker，提供 device 与 apply_values
+        self.commands = deque()  # (Future, 函数, 参数)
+        self.cond = Condition()
+        self.running = True
+        self.thread = Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args):  # 提交命令，立即返回 Future
+        future = Future()
+        with self.cond:
+            if not self.running:
+                future.set_exception(RuntimeError("参数命令线程已关闭"))
+                return future
+            self.commands.append((future, func, args))
+            self.cond.notify()
+        return future
+
+    def set(self, param, value):  # 写入单个参数，结果为 (成功与否, 错误信息)
+        return self.submit(self.controller.device.set_param, param, value)
+
+    def get(self, param):  # 读取单个参数，结果为当前值，失败为 None
+        return self.submit(self.controller.device.get_param, param)
+
+    def apply_profile(self, values):  # 按参数顺序批量写入（只写入变化的参数），结果为 {参数索引: 错误信息}
+        return self.submit(self.controller.apply_values, list(values))
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.commands:
+                    self.cond.wait()
+                if not self.commands:  # 已关闭且没有待执行的命令
+                    return
+                future, func, args = self.commands.popleft()
+            if not future.set_running_or_notify_cancel():  # 已被调用方取消
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self, timeout=STOP_TIMEOUT):  # 执行完已提交的命令后停止命令线程
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${SCHEME_CAMERA} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 方案定义与相机控制器模块（无界面依赖） ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_SCHEME_CAMERA}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 方案相机控制器：方案定义、参数定义结构与 CameraController，供 v4l2_test_scheme.py 与 headless_runner.py 共用
+# 只依赖 V4L2 采集与参数模块，不导入 Tk，也不调用 HighGUI；帧输出到 slot.put(帧, 时间戳)，槽位或帧输出由调用方提供
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+from threading import Event, Lock
+from v4l2_ctrl import V4L2Device
+from v4l2_events import ControlEventListener
+from v4l2_capture import OpenCVCapture, V4L2_PIX_FMT_MJPEG, fourcc_to_str, throttle_interval
+from v4l2_modes import open_capture
+from latency import get_latency
+from preprocess import Preprocessor
+from frame_ring import FrameRingWriter
+
+MAX_FPS = 30  # 默认最大帧率
+PREVIEW_SIZE = (640, 480)  # 默认帧缩放尺寸
+PREPROCESS = {}  # 缩放之外的默认预处理：{"roi": (x, y, 宽, 高), "color": "rgb" / "gray"}，见 preprocess.py
+DEFAULT_SCHEME = "默认值"  # 导入时使用的初始方案
+
+# "方案"：[亮度,对比度,饱和度,色调,自动白平衡,伽马值,增益,电源频率,白平衡,清晰度,背光补偿,自动曝光,绝对曝光时间,动态帧率曝光,绝对对焦,连续自动对焦]
+# 下面提供4组方案仅参考，用户可以自行添加方案，也可以修改当前方案的数值
+SCHEMES = {
+    "默认值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 3, 20, 0, 68, 1],
+    "厂商值": [-39, 39, 72, 0, 1, 300, 64, 1, 6500, 75, 0, 1, 20, 0, 68, 1],
+    "产品1": [-64, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
+    "产品2": [0, 39, 72, 0, 0, 300, 64, 1, 6000, 75, 0, 1, 20, 1, 68, 1],
+}
+
+# 方案的采集需求：{"format": 像素格式, "size": (宽, 高), "fps": 帧率}，各项可省略；未列出的方案按帧缩放尺寸与最大帧率协商
+# 启动时选出满足需求且开销最小的原生模式（见 v4l2_modes.py），运行中切换方案只写入参数，不重新协商
+SCHEME_MODES = {
+    # "产品1": {"format": "MJPG", "size": (1280, 720), "fps": 30},
+}
+
+# 参数定义结构
+BASE_CAMERA_PARAMS = [
+    {
+        "chinese_name": "亮度",
+        "v4l2_param": "brightness",
+        "hex_numbers": "0x00980900",
+        "type": "int",
+        "min": -64,
+        "max": 64,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "对比度",
+        "v4l2_param": "contrast",
+        "hex_numbers": "0x00980901",
+        "type": "int",
+        "min": 0,
+        "max": 100,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "饱和度",
+        "v4l2_param": "saturation",
+        "hex_numbers": "0x00980902",
+        "type": "int",
+        "min": 0,
+        "max": 100,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "色调",
+        "v4l2_param": "hue",
+        "hex_numbers": "0x00980903",
+        "type": "int",
+        "min": -180,
+        "max": 180,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "自动白平衡",
+        "v4l2_param": "white_balance_automatic",
+        "hex_numbers": "0x0098090c",
+        "type": "bool",
+        "min": None,
+        "max": None,
+        "step": None,
+        "options": "0 表示关闭；1 表示开启",
+    },
+    {
+        "chinese_name": "伽马值",
+        "v4l2_param": "gamma",
+        "hex_numbers": "0x00980910",
+        "type": "int",
+        "min": 100,
+        "max": 500,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "增益",
+        "v4l2_param": "gain",
+        "hex_numbers": "0x00980913",
+        "type": "int",
+        "min": 1,
+        "max": 128,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "电源频率",
+        "v4l2_param": "power_line_frequency",
+        "hex_numbers": "0x00980918",
+        "type": "menu",
+        "min": 0,
+        "max": 2,
+        "step": None,
+        "options": "0 表示禁用；1 表示 50Hz；2 表示 60Hz",
+    },
+    {
+        "chinese_name": "白平衡温度",
+        "v4l2_param": "white_balance_temperature",
+        "hex_numbers": "0x0098091a",
+        "type": "int",
+        "min": 2800,
+        "max": 6500,
+        "step": 10,
+        "options": "",
+    },
+    {
+        "chinese_name": "清晰度",
+        "v4l2_param": "sharpness",
+        "hex_numbers": "0x0098091b",
+        "type": "int",
+        "min": 0,
+        "max": 100,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "背光补偿",
+        "v4l2_param": "backlight_compensation",
+        "hex_numbers": "0x0098091c",
+        "type": "int",
+        "min": 0,
+        "max": 2,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "自动曝光",
+        "v4l2_param": "auto_exposure",
+        "hex_numbers": "0x009a0901",
+        "type": "menu",
+        "min": 0,
+        "max": 3,
+        "step": None,
+        "options": "1 表示手动模式；3 表示光圈优先模式",
+    },
+    {
+        "chinese_name": "绝对曝光时间",
+        "v4l2_param": "exposure_time_absolute",
+        "hex_numbers": "0x009a0902",
+        "type": "int",
+        "min": 0,
+        "max": 10000,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "动态帧率曝光",
+        "v4l2_param": "exposure_dynamic_framerate",
+        "hex_numbers": "0x009a0903",
+        "type": "bool",
+        "min": None,
+        "max": None,
+        "step": None,
+        "options": "0 表示关闭；1 表示开启",
+    },
+    {
+        "chinese_name": "绝对对焦",
+        "v4l2_param": "focus_absolute",
+        "hex_numbers": "0x009a090a",
+        "type": "int",
+        "min": 0,
+        "max": 1023,
+        "step": 1,
+        "options": "",
+    },
+    {
+        "chinese_name": "连续自动对焦",
+        "v4l2_param": "focus_automatic_continuous",
+        "hex_numbers": "0x009a090c",
+        "type": "bool",
+        "min": None,
+        "max": None,
+        "step": None,
+        "options": "0 表示关闭；1 表示开启",
+    }
+]
+
+# 根据方案初始化参数
+def initialize_params_with_scheme(scheme):
+    for i, param in enumerate(BASE_CAMERA_PARAMS): # 初始化参数
+        param["default"] = scheme[i]
+        param["value"] = scheme[i]
+        param["setvalue"] = scheme[i]
+    return BASE_CAMERA_PARAMS
+
+# 初始化参数，使用方在创建控制器前可按所选方案重新初始化
+BASE_CAMERA_PARAMS = initialize_params_with_scheme(SCHEMES[DEFAULT_SCHEME])
+
+
+# 摄像头控制器：采集与参数读写，不依赖 Tk 与 HighGUI
+class CameraController: # 摄像头控制器
+    max_fps = MAX_FPS  # 最大帧率
+    shared_ring = False  # 是否把全分辨率帧发布到共享内存帧环，供其他进程读取
+    preview_size = PREVIEW_SIZE  # 帧缩放尺寸，None 时输出全分辨率帧
+    preprocess = PREPROCESS  # 裁剪与颜色转换，缩放尺寸取 preview_size
+    pixelformat = V4L2_PIX_FMT_MJPEG  # 优先协商的像素格式，驱动不支持时使用驱动调整后的格式
+    capture_mode = None  # 采集需求（格式见 SCHEME_MODES），None 时由 mode_request() 按帧缩放尺寸与最大帧率生成
+    frame_slots = None  # 最新帧槽位集合（FrameSlots），为 None 时由调用方设置 slot
+
+    def __init__(self, index, device_id):
+        self.cap = None
+        self.index = index
+        self.device_id = device_id
+        self.exit_event = Event()
+        self.lock = Lock()
+        self.last_frame_time = 0
+        self.device = V4L2Device(index)  # 原生参数控制设备
+        self.on_ctrl_event = None  # 参数事件回调，由控制界面设置
+        self.name = f"{device_id} video{index}"  # 窗口名称，同型号多台相机时保持唯一
+        self.slot = self.frame_slots.slot(self.name) if self.frame_slots is not None else None  # 最新帧槽位或帧输出
+        self.latency = get_latency(self.name)  # 各阶段延迟统计
+        self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS] # 摄像头参数
+
+    @classmethod
+    def base_request(cls):  # 类配置的采集需求：帧环与全分辨率输出不限制尺寸，取满足帧率的最大模式
+        if cls.capture_mode is not None:
+            return cls.capture_mode
+        size = None if cls.shared_ring else cls.preview_size
+        return {"format": fourcc_to_str(cls.pixelformat), "size": size, "fps": cls.max_fps}
+
+    def mode_request(self):  # 本台相机的采集需求，带宽规划可按相机覆盖 capture_mode
+        return self.capture_mode if self.capture_mode is not None else self.base_request()
+
+    def initialize(self):  # 初始化摄像头
+        with self.lock:
+            # 按需求协商原生模式后 mmap 零拷贝采集，与参数控制共用设备
+            self.cap = open_capture(self.device, self.device_id, self.mode_request(), self.name)
+            if self.cap is None:  # 原生采集不可用时回退 OpenCV
+                self.cap = OpenCVCapture(self.index)
+            if not self.cap.isOpened():  # 检查是否打开成功
+                return False # 打开失败
+            self.device.open()  # 打开一次设备，后续参数读写复用
+            # 订阅参数事件：驱动自行修改的参数值、范围与非激活标志同步到缓存和界面
+            ControlEventListener(self.device, lambda event: self.on_ctrl_event and self.on_ctrl_event(event)).start()
             return True
 
-    def _init_params(self):  # 初始化参数
-        for param in self.camera_params:
-            value = param["value"]
-            self._set_v4l2_param(param, value)
+    def init_params(self):  # 初始化参数，由控制界面的参数命令线程执行
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items(): # 批量原子写入
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
+
+    def apply_values(self, values): # 按参数顺序批量写入，返回 {参数索引: 错误信息}
+        return self.device.apply_params(self.camera_params, values)  # 只写入与缓存值不同的参数
+
+    def run(self):  # 运行摄像头：由设备可读事件驱动，仅在出队期间持锁
+        frame_interval = self.cap.frame_interval  # 驱动报告的帧间隔
+        ring = FrameRingWriter(self.name, self.device_id, frame_interval=frame_interval) if self.shared_ring else None
+        min_interval = throttle_interval(frame_interval, self.max_fps)  # 驱动帧率高于 max_fps 时按时间戳丢帧
+        preprocessor = Preprocessor(self.preview_size, **self.preprocess)  # 输出写入本台相机预分配的轮换缓冲区
+        scale = preprocessor.decode_scale(self.cap) if ring is None else 1  # 帧环需要全分辨率帧
+        passthrough = preprocessor.identity and ring is None and getattr(self.slot, "accepts_encoded", False)
+        while not self.exit_event.is_set():  # 循环读取摄像头
+            if not self.cap.wait(0.5):  # 阻塞等待新帧，空闲时不占用 CPU
+                continue
+            with self.lock:  # 出队
+                try:
+                    frame = self.cap.grab_frame(timeout=0) if self.cap.isOpened() else None
+                except OSError:  # 设备已拔出
+                    break
+            if frame is None:
+                continue
+            with frame:  # 处理完毕后缓冲区归还驱动
+                if frame.timestamp - self.last_frame_time < min_interval:  # 丢弃的帧不解码
+                    continue
+                self.last_frame_time = frame.timestamp
+                self.latency.record("dequeue", frame.dequeued - frame.timestamp)  # 驱动写入 → 出队
+                if passthrough and frame.encoded is not None:  # 帧输出直接使用 MJPEG 压缩数据，不解码
+                    self.slot.put_encoded(frame.encoded, frame.timestamp)
+                    continue
+                bgr = frame.to_bgr(scale=scale)  # MJPEG 按缩小倍数解码
+                if bgr is None:  # MJPEG 数据损坏（如 USB 传输出错），丢弃该帧
+                    continue
+                decoded = time.monotonic()
+                self.latency.record("decode", decoded - frame.dequeued)
+                if not preprocessor.identity:
+                    image = preprocessor.apply(bgr, scale)  # 裁剪、缩放、颜色转换，不逐帧分配内存
+                    self.latency.record("preprocess", time.monotonic() - decoded)
+                else:
+                    image = bgr  # 全分辨率帧，写入采集源的轮换缓冲区，帧输出需在 put() 内处理完毕或自行拷贝
+                if ring is not None:  # 发布到共享内存帧环
+                    ring.publish(bgr, frame.sequence, frame.timestamp)
+            self.slot.put(image, frame.timestamp)  # 覆盖槽位中尚未显示的旧帧
+        with self.lock:
+            if self.cap.isOpened():
+                self.cap.release()
+        self.device.close()
+        if ring is not None:
+            ring.close()
+        print(f"{self.name}: 采集 {self.slot.seq} 帧，未显示即被覆盖 {self.slot.dropped} 帧")  # 丢帧统计
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${FRAME_SINKS} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 无界面帧输出模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_FRAME_SINKS}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 无界面运行的帧输出：接口与 FrameSlot 一致（put(帧, 时间戳)、seq、dropped），可直接作为 CameraController.slot
+# put() 在采集线程中同步调用，全分辨率帧位于采集源的轮换缓冲区，需要保留帧的输出自行拷贝
+# accepts_encoded 为 True 的输出在全分辨率、相机输出 MJPEG 时改用 put_encoded(压缩数据, 时间戳)，采集线程不解码
+# 输出规格：null（只计数）、ring（共享内存帧环，供其他进程读取）、jpeg:目录[:间隔帧数]（定期保存最新一帧）；SnapshotSink 包装任意输出，按需提供帧快照
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import cv2
+from threading import Condition
+from frame_ring import FrameRingWriter
+from v4l2_capture import decode_jpeg
+
+RING_SLOTS = 4  # ring 输出的帧环槽位数
+JPEG_EVERY = 30  # jpeg 输出默认每隔多少帧保存一次
+JPEG_QUALITY = 90
+SNAPSHOT_TIMEOUT = 2.0  # 等待下一帧快照的超时（秒）
+
+
+# 帧输出基类：只计数
+class FrameSink:
+    accepts_encoded = False  # 是否接受 MJPEG 压缩数据
+
+    def __init__(self, name, device_id=""):
+        self.name = name
+        self.device_id = device_id
+        self.seq = 0  # 已输出帧数
+        self.dropped = 0  # 输出失败的帧数
+
+    def put(self, frame, timestamp=None):
+        return self._output(self.write, frame, timestamp)
+
+    def put_encoded(self, data, timestamp=None):  # data 为采集缓冲区的 memoryview，只在调用期间有效
+        return self._output(self.write_encoded, data, timestamp)
+
+    def _output(self, write, data, timestamp):
+        self.seq += 1
+        try:
+            write(data, timestamp)
+        except Exception as e:
+            self.dropped += 1
+            if self.dropped == 1:  # 只提示第一次，避免每帧刷屏
+                print(f"\033[33m警告：{self.name} 帧输出失败（{e}）\033[0m")
+        return self.seq
+
+    def write(self, frame, timestamp):
+        pass
+
+    def write_encoded(self, data, timestamp):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullSink(FrameSink):  # 丢弃帧，用于测量采集吞吐与延迟
+    accepts_encoded = True
+
+
+class RingSink(FrameSink):  # 发布到共享内存帧环，其他进程用 FrameRingReader 读取；帧环保存像素，需要解码后的帧
+    def __init__(self, name, device_id="", slots=RING_SLOTS):
+        super().__init__(name, device_id)
+        self.ring = FrameRingWriter(name, device_id, slots=slots)
+
+    def write(self, frame, timestamp):
+        self.ring.publish(frame, self.seq, timestamp)
+
+    def close(self):
+        self.ring.close()
+
+
+class JpegSink(FrameSink):  # 每隔 every 帧把最新一帧写入 目录/名称.jpg，先写临时文件再替换，读者不会读到半帧
+    accepts_encoded = True  # 相机输出 MJPEG 时直接保存压缩数据，不解码也不重新编码
+
+    def __init__(self, name, device_id="", directory=".", every=JPEG_EVERY, quality=JPEG_QUALITY):
+        super().__init__(name, device_id)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, name.replace(" ", "_").replace("/", "_") + ".jpg")
+        self.every = max(1, int(every))
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    def write(self, frame, timestamp):
+        if self.seq % self.every:
+            return
+        ok, data = cv2.imencode(".jpg", frame, self.params)
+        if not ok:
+            raise ValueError("JPEG 编码失败")
+        self._save(data.tobytes())
+
+    def write_encoded(self, data, timestamp):
+        if self.seq % self.every:
+            return
+        self._save(data)
+
+    def _save(self, data):
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, self.path)
+
+
+class SnapshotSink:  # 包装其他帧输出：有快照请求时拷贝下一帧，没有请求时不额外拷贝
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.device_id = inner.device_id
+        self.cond = Condition()
+        self.waiting = 0  # 正在等待快照的请求数
+        self.latest = (0, None, None)  # (序号, 帧拷贝或 MJPEG 数据, 采集时间戳)
+        self.accepts_encoded = inner.accepts_encoded
+
+    @property
+    def seq(self):
+        return self.inner.seq
+
+    @property
+    def dropped(self):
+        return self.inner.dropped
+
+    def put(self, frame, timestamp=None):
+        seq = self.inner.put(frame, timestamp)
+        if self.waiting:
+            with self.cond:
+                self.latest = (seq, frame.copy(), timestamp)
+                self.cond.notify_all()
+        return seq
+
+    def put_encoded(self, data, timestamp=None):
+        seq = self.inner.put_encoded(data, timestamp)
+        if self.waiting:
+            with self.cond:
+                self.latest = (seq, bytes(data), timestamp)  # 只拷贝压缩数据，请求线程中再解码
+                self.cond.notify_all()
+        return seq
+
+    def snapshot(self, timeout=SNAPSHOT_TIMEOUT):
+        """等待并返回下一帧的拷贝 (帧, 采集时间戳)，超时返回 None"""
+        with self.cond:
+            start = self.latest[0]
+            self.waiting += 1
+            try:
+                if not self.cond.wait_for(lambda: self.latest[0] > start, timeout):
+                    return None
+            finally:
+                self.waiting -= 1
+            _, frame, timestamp = self.latest
+        if isinstance(frame, bytes):
+            frame = decode_jpeg(frame)
+        return frame, timestamp
+
+    def close(self):
+        self.inner.close()
+
+
+SINKS = {"null": NullSink, "ring": RingSink, "jpeg": JpegSink}
+
+
+def make_sink(spec, name, device_id=""):
+    """按输出规格创建帧输出，如 "null"、"ring"、"jpeg:/var/lib/vitai:10"；规格无效时抛出 ValueError"""
+    kind, _, arg = spec.partition(":")
+    if kind not in SINKS:
+        raise ValueError(f"未知帧输出 {kind}，可选：{'、'.join(SINKS)}")
+    if kind == "jpeg":
+        directory, _, every = arg.rpartition(":") if arg.rpartition(":")[2].isdigit() else (arg, "", "")
+        return JpegSink(name, device_id, directory or ".", int(every) if every else JPEG_EVERY)
+    return SINKS[kind](name, device_id)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${HEADLESS_RUNNER} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 无界面相机运行程序，可作为 systemd 服务 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_HEADLESS_RUNNER}" # 程序路径
+# ====================================================== 程序声明 ======================================================
+print("\n\033[93m【无界面相机运行程序：按方案初始化全部相机参数，帧输出到帧环 / JPEG，提供本地参数接口，不依赖显示器，可作为 systemd 服务运行】\033[0m\n")
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import signal
+from types import SimpleNamespace
+from threading import Thread, Event, Lock
+from v4l2_enum import list_video_nodes
+from hotplug import CameraRegistry
+from latency import latency_report
+import scheme_camera
+from scheme_camera import SCHEMES, SCHEME_MODES, initialize_params_with_scheme
+from v4l2_modes import parse_mode_spec
+from preprocess import parse_preprocess
+from usb_bandwidth import BandwidthPlanner
+from frame_sinks import make_sink, SnapshotSink
+from ctrl_executor import ControlExecutor
+from control_api import start_api, stop_api
+from synthetic_camera import SyntheticCamera, SYNTHETIC_INDEX_BASE
+
+# 全局配置，均可通过环境变量覆盖（systemd 单元中用 Environment= 设置）
+SCHEME_NAME = os.environ.get("VITAI_SCHEME", "默认值")  # 启动时应用的方案，方案定义见 scheme_camera.py
+SINK = os.environ.get("VITAI_SINK", "ring")  # 帧输出：null / ring / jpeg:目录[:间隔帧数]
+MAX_FPS = float(os.environ.get("VITAI_MAX_FPS", "30"))  # 最大帧率
+FRAME_SIZE = os.environ.get("VITAI_FRAME_SIZE", "")  # 输出帧尺寸，如 640x480；留空输出全分辨率帧
+PREPROCESS = os.environ.get("VITAI_PREPROCESS", "")  # 预处理 crop=x:y:宽:高,color=rgb|gray，如 crop=320:0:1280:1080,color=gray；size=宽x高 覆盖输出帧尺寸
+CAPTURE_MODE = os.environ.get("VITAI_CAPTURE_MODE", "")  # 采集需求 [格式:]宽x高[@帧率]，如 MJPG:1280x720@30；留空使用方案声明或按输出尺寸协商
+STATS_INTERVAL = float(os.environ.get("VITAI_STATS_INTERVAL", "60"))  # 周期输出帧数统计的间隔（秒），0 不输出
+API_ADDRESS = os.environ.get("VITAI_API", "127.0.0.1:8765")  # 本地参数接口地址，unix:路径 使用 Unix 套接字，留空不启动
+BANDWIDTH_PLAN = os.environ.get("VITAI_BANDWIDTH_PLAN", "1") != "0"  # 按 USB 总线带宽为每台相机规划采集模式，0 关闭
+SYNTHETIC = int(os.environ.get("VITAI_SYNTHETIC", "0"))  # 大于 0 时不打开真实相机，改为启动指定数量的合成相机（用于测试）
+
+
+# 摄像头控制器：与 v4l2_test_scheme.py 相同的采集与参数写入，帧直接交给帧输出
+class CameraController(scheme_camera.CameraController):
+    max_fps = MAX_FPS
+    preview_size = tuple(int(v) for v in FRAME_SIZE.lower().split("x")) if FRAME_SIZE else None
+
+
+def serve_camera(controller, executor): # 相机线程：采集到相机拔出或退出，方案参数由参数命令线程并行写入
+    try:
+        controller.run()
+    finally:
+        executor.close()
+        controller.slot.close()
+
+
+def main():
+    if SCHEME_NAME not in SCHEMES:
+        print(f"\033[31m错误：未知方案 {SCHEME_NAME}，可选：{'、'.join(SCHEMES)}\033[0m")
+        return 1
+    initialize_params_with_scheme(SCHEMES[SCHEME_NAME])
+    try:
+        CameraController.capture_mode = parse_mode_spec(CAPTURE_MODE) if CAPTURE_MODE else SCHEME_MODES.get(SCHEME_NAME)
+        preprocess = parse_preprocess(PREPROCESS)
+        CameraController.preview_size = preprocess.pop("size", CameraController.preview_size)
+        CameraController.preprocess = preprocess
+    except ValueError as e:
+        print(f"\033[31m错误：{e}\033[0m")
+        return 1
+    stop_event = Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_event.set())  # systemctl stop
+    signal.signal(signal.SIGINT, lambda *args: stop_event.set())
+
+    cameras = {} # {设备序号: (相机控制器, 相机线程, 参数命令线程)}
+    lock = Lock() # 启动时、热插拔监听线程与接口线程同时访问 cameras
+    planner = BandwidthPlanner() if BANDWIDTH_PLAN and not SYNTHETIC else None
+    planned = {} # 启动时整体规划的结果 {设备序号: Assignment}，热插拔接入的相机单独规划
+
+    def start_camera(node, controller_cls=CameraController): # 启动相机：启动时及热插拔接入时调用
+        with lock:
+            if node.index in cameras or stop_event.is_set():
+                return
+            controller = controller_cls(node.index, node.device_id)
+            if planner is not None and controller_cls is CameraController:
+                assignment = planned.pop(node.index, None)  # 启动时的规划说明已整体输出
+                if assignment is None:
+                    assignment = planner.add(node, controller.base_request())
+                    for step in assignment.steps if assignment is not None else []:
+                        print(f"\033[33m{controller.name}: {step}\033[0m")
+                if assignment is not None:
+                    if assignment.mode is None:
+                        return
+                    controller.capture_mode = assignment.capture_request()
+            try:
+                controller.slot = SnapshotSink(make_sink(SINK, controller.name, node.device_id))  # 接口请求时才拷贝帧
+            except ValueError as e:
+                print(f"\033[31m错误：{e}\033[0m")
+                stop_event.set()
+                return
+            if not controller.initialize():
+                print(f"\033[31m错误：{controller.name} 相机初始化失败，未开启\033[0m")
+                if planner is not None:
+                    planner.remove(node.index)
+                return
+            if planner is not None:
+                planner.observe(node.index)  # 以实际备用设置修正保留带宽，供之后接入的相机规划
+            executor = ControlExecutor(controller, name=f"{controller.name} 参数命令")
+            executor.submit(controller.init_params)  # 多台相机各自的命令线程并行写入方案参数
+            thread = Thread(target=serve_camera, args=(controller, executor), name=controller.name, daemon=True)
+            thread.start()
+            cameras[node.index] = (controller, thread, executor)
+            print(f"{controller.name} 已启动，方案 {SCHEME_NAME}，帧输出 {SINK}")
+
+    def stop_camera(index): # 相机拔出：采集线程退出并关闭帧输出
+        with lock:
+            entry = cameras.pop(index, None)
+            if planner is not None:
+                planner.remove(index)
+        if entry is not None:
+            entry[0].exit_event.set()
+            print(f"\033[33m{entry[0].name} 已拔出\033[0m")
+
+    def api_cameras(): # 接口使用的相机列表
+        with lock:
+            return {index: (controller, executor) for index, (controller, _, executor) in cameras.items()}
+
+    registry = CameraRegistry(on_add=start_camera, on_remove=stop_camera)  # 回调在监听线程中执行
+    if SYNTHETIC:  # 测试模式：合成相机，不监听热插拔
+        hotplug = False
+        nodes = []
+        for i in range(SYNTHETIC):
+            start_camera(SimpleNamespace(index=SYNTHETIC_INDEX_BASE + i, device_id="synthetic"), SyntheticCamera)
+    else:
+        hotplug = registry.start()
+        nodes = list_video_nodes()
+        if planner is not None and nodes:  # 同一总线上的相机一起规划，超出预算时逐台降级
+            with lock:
+                planned.update(planner.plan(nodes, CameraController.base_request()))
+            for line in planner.explain():
+                print(line)
+    if not nodes and not cameras:
+        if not hotplug:
+            print("未检测到摄像头设备")
+            return 1
+        print("未检测到摄像头设备，等待相机接入")
+    for node in nodes:
+        start_camera(node)
+    server = None
+    if API_ADDRESS:
+        try:
+            server = start_api(API_ADDRESS, api_cameras, SCHEMES)
+            print(f"参数接口已启动：{API_ADDRESS}")
+        except (OSError, ValueError) as e:
+            print(f"\033[33m警告：参数接口启动失败（{e}），继续无接口运行\033[0m")
+
+    last_seq = {}
+    while not stop_event.wait(STATS_INTERVAL or None):  # 主线程只等待退出信号
+        with lock:
+            entries = list(cameras.values())
+        for controller, _, _ in entries:
+            seq = controller.slot.seq
+            fps = (seq - last_seq.get(controller.name, 0)) / STATS_INTERVAL
+            last_seq[controller.name] = seq
+            print(f"{controller.name}: 输出 {seq} 帧，{fps:.1f} fps，输出失败 {controller.slot.dropped} 帧")
+
+    if server is not None:
+        stop_api(server)
+    registry.stop()
+    with lock:
+        entries = list(cameras.values())
+        cameras.clear()
+    for controller, _, _ in entries: # 关闭相机
+        controller.exit_event.set()
+    for _, thread, _ in entries: # 等待采集线程释放摄像头与帧输出
+        thread.join(3)
+    print(latency_report())  # 退出时输出各设备延迟统计
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${CONTROL_API} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 本地参数与状态接口模块（HTTP / Unix 套接字） ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_CONTROL_API}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 本地参数与状态接口：HTTP（仅监听本机地址）或 Unix 套接字上的 JSON 接口，每个请求一个线程
+# 参数读写与方案应用提交到各相机的参数命令线程（ctrl_executor），对多台相机的请求并行执行；帧快照按需编码为 JPEG
+#   GET  /schemes                        方案列表
+#   GET  /devices                        相机列表
+#   GET  /devices/<序号>/controls         读取全部参数
+#   POST /devices/<序号|all>/controls     写入参数，请求体 {"brightness": 10, ...}，键为 v4l2 名称或参数 ID
+#   POST /devices/<序号|all>/scheme       应用方案，请求体 {"scheme": "产品1"}
+#   GET  /devices/<序号>/frame.jpg        最新一帧 JPEG，可带 ?quality=80
+#   GET  /stats                          各相机帧数与延迟统计
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import socketserver
+from threading import Thread
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from latency import get_latency
+
+COMMAND_TIMEOUT = 5.0  # 等待参数命令完成的超时（秒）
+MAX_BODY = 64 * 1024  # 请求体大小上限（字节）
+JPEG_QUALITY = 85
+
+
+class APIError(Exception):  # 以指定状态码返回 {"error": 信息}
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _param_info(param, value):
+    return {
+        "name": param["v4l2_param"],
+        "chinese_name": param["chinese_name"],
+        "id": param["hex_numbers"],
+        "type": param["type"],
+        "min": param["min"],
+        "max": param["max"],
+        "options": param["options"],
+        "value": value,
+    }
+
+
+def _wait(futures, timeout=COMMAND_TIMEOUT):  # 等待一组 Future，返回结果列表；超时返回 504
+    try:
+        return [future.result(timeout) for future in futures]
+    except FutureTimeout:
+        raise APIError(504, "参数命令执行超时")
+
+
+class ControlAPI:
+    def __init__(self, cameras, schemes):
+        self.cameras = cameras  # 可调用对象，返回 {设备序号: (相机控制器, 参数命令线程)}
+        self.schemes = schemes
+
+    def _targets(self, key, allow_all=False):  # 按序号（或 all）选出相机
+        cameras = self.cameras()
+        if allow_all and key == "all":
+            return list(cameras.values())
+        if not key.isdigit() or int(key) not in cameras:
+            raise APIError(404, f"相机 {key} 不存在")
+        return [cameras[int(key)]]
+
+    def list_devices(self):
+        return [{"index": index, "name": controller.name, "device_id": controller.device_id}
+                for index, (controller, _) in sorted(self.cameras().items())]
+
+    def read_controls(self, key):
+        controller, executor = self._targets(key)[0]
+        values = _wait([executor.get(param) for param in controller.camera_params])
+        return [_param_info(param, value) for param, value in zip(controller.camera_params, values)]
+
+    def write_controls(self, key, body):
+        if not isinstance(body, dict) or not body:
+            raise APIError(400, "请求体应为 {参数名称: 值}")
+        targets = self._targets(key, allow_all=True)
+        pending = []  # (相机名称, 参数名称, Future)，先全部提交，多台相机并行执行
+        for controller, executor in targets:
+            params = {}
+            for param in controller.camera_params:
+                params[param["v4l2_param"]] = param
+                params[param["hex_numbers"]] = param
+            for name, value in body.items():
+                if name not in params:
+                    raise APIError(400, f"未知参数 {name}")
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise APIError(400, f"参数 {name} 的值应为整数")
+            for name, value in body.items():
+                pending.append((controller.name, params[name]["v4l2_param"], executor.set(params[name], value)))
+        results = _wait([future for _, _, future in pending])
+        errors = {}
+        for (camera, name, _), (ok, error) in zip(pending, results):
+            if not ok:
+                errors.setdefault(camera, {})[name] = error
+        return {"errors": errors}
+
+    def apply_scheme(self, key, body):
+        scheme = body.get("scheme") if isinstance(body, dict) else None
+        if scheme not in self.schemes:
+            raise APIError(400, f"未知方案 {scheme}，可选：{'、'.join(self.schemes)}")
+        targets = self._targets(key, allow_all=True)
+        futures = [executor.apply_profile(self.schemes[scheme]) for _, executor in targets]  # 各相机的命令线程并行写入
+        errors = {}
+        for (controller, _), result in zip(targets, _wait(futures)):
+            if result:
+                errors[controller.name] = {controller.camera_params[idx]["v4l2_param"]: error for idx, error in result.items()}
+        return {"scheme": scheme, "errors": errors}
+
+    def frame_jpeg(self, key, quality=JPEG_QUALITY):
+        import cv2  # 只有请求帧快照时才需要 OpenCV
+        controller, _ = self._targets(key)[0]
+        snapshot = getattr(controller.slot, "snapshot", None)
+        if snapshot is None:
+            raise APIError(404, f"{controller.name} 未启用帧快照")
+        taken = snapshot()
+        if taken is None:
+            raise APIError(504, f"{controller.name} 等待画面超时")
+        ok, data = cv2.imencode(".jpg", taken[0], [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise APIError(500, "JPEG 编码失败")
+        return data.tobytes()
+
+    def stats(self):
+        return [{"index": index, "name": controller.name, "frames": controller.slot.seq,
+                 "dropped": controller.slot.dropped, "latency": get_latency(controller.name).as_dict()}
+                for index, (controller, _) in sorted(self.cameras().items())]
+
+    def handle(self, method, path, query, body):
+        """路由请求，返回 (状态码, JSON 对象或 JPEG 字节)"""
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["schemes"]:
+            return 200, self.schemes
+        if method == "GET" and parts == ["devices"]:
+            return 200, self.list_devices()
+        if method == "GET" and parts == ["stats"]:
+            return 200, self.stats()
+        if len(parts) == 3 and parts[0] == "devices":
+            key, action = parts[1], parts[2]
+            if method == "GET" and action == "controls":
+                return 200, self.read_controls(key)
+            if method == "POST" and action == "controls":
+                return 200, self.write_controls(key, body)
+            if method == "POST" and action == "scheme":
+                return 200, self.apply_scheme(key, body)
+            if method == "GET" and action == "frame.jpg":
+                try:
+                    quality = int(query.get("quality", [JPEG_QUALITY])[0])
+                except ValueError:
+                    raise APIError(400, "quality 应为 1 ~ 100 的整数") from None
+                return 200, self.frame_jpeg(key, max(1, min(100, quality)))
+        raise APIError(404, f"未知接口 {method} {path}")
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    api = None  # ControlAPI，由 start_api 设置
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        try:
+            body = None
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise APIError(413, "请求体过大")
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                except ValueError:
+                    raise APIError(400, "请求体不是有效的 JSON")
+            status, payload = self.api.handle(method, url.path, parse_qs(url.query), body)
+        except APIError as e:
+            status, payload = e.status, {"error": str(e)}
+            self.close_connection = status == 413  # 未读取的请求体不能留在连接中
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        if isinstance(payload, bytes):
+            content_type, data = "image/jpeg", payload
+        else:
+            content_type, data = "application/json; charset=utf-8", json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):  # Unix 套接字没有客户端地址
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):  # 只记录出错的请求
+        if len(args) > 1 and str(args[1]).startswith(("4", "5")):
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):  # 清理上次异常退出遗留的套接字文件
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def start_api(address, cameras, schemes):
+    """在后台线程中启动接口，address 为 "127.0.0.1:8765" 或 "unix:/run/vitai.sock"，返回服务器对象"""
+    handler = type("Handler", (APIRequestHandler,), {"api": ControlAPI(cameras, schemes)})
+    if address.startswith("unix:"):
+        server = UnixHTTPServer(address[len("unix:"):], handler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+        server.daemon_threads = True
+    Thread(target=server.serve_forever, name="control api", daemon=True).start()
+    return server
+
+
+def stop_api(server):  # 停止接口并删除 Unix 套接字文件
+    server.shutdown()
+    server.server_close()
+    if isinstance(server, UnixHTTPServer) and os.path.exists(server.server_address):
+        os.unlink(server.server_address)
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${SYNTHETIC_CAMERA} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 合成相机模块（测试用） ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_SYNTHETIC_CAMERA}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 合成相机：接口与 scheme_camera.CameraController 一致，不打开任何设备，参数保存在内存中，按帧率生成测试画面
+# 画面亮度随 brightness 参数变化，可在没有相机的机器上验证无界面运行、参数接口与帧快照
+# ----------------------------------------------------------------------------------------------------------------------
+import time
+import numpy as np
+from threading import Event, Lock
+from v4l2_ctrl import parse_ctrl_id
+from latency import get_latency
+from scheme_camera import BASE_CAMERA_PARAMS
+
+FRAME_SIZE = (640, 480)  # 合成画面尺寸（宽, 高）
+SYNTHETIC_INDEX_BASE = 1000  # 合成相机的设备序号起点，不与 /dev/videoN 冲突
+
+
+# 内存中的参数设备，接口与 V4L2Device 的参数读写部分一致
+class SyntheticDevice:
+    def __init__(self, params):
+        self.limits = {parse_ctrl_id(p["hex_numbers"]): (p["min"], p["max"]) for p in params}
+        self.values = {}  # 参数值缓存：参数 ID -> 当前值
+        self.lock = Lock()
+
+    def close(self):
+        pass
+
+    def cached(self, ctrl_id):
+        return self.values.get(parse_ctrl_id(ctrl_id))
+
+    def get_param(self, param):
+        return self.cached(param["hex_numbers"])
+
+    def set_param(self, param, value):
+        ctrl_id = parse_ctrl_id(param["hex_numbers"])
+        low, high = self.limits.get(ctrl_id, (None, None))
+        if low is not None and not (low <= int(value) <= high):
+            return False, "Numerical result out of range"
+        with self.lock:
+            self.values[ctrl_id] = int(value)
+        return True, ""
+
+    def apply_params(self, params, values):  # 与 V4L2Device.apply_params 一致：只写入变化的参数，返回 {索引: 错误信息}
+        errors = {}
+        for idx, (param, value) in enumerate(zip(params, values)):
+            if self.cached(param["hex_numbers"]) == int(value):
+                continue
+            ok, error = self.set_param(param, value)
+            if not ok:
+                errors[idx] = error
+        return errors
+
+
+# 合成相机：序号与名称不与真实设备冲突
+class SyntheticCamera:
+    max_fps = 30
+
+    def __init__(self, index, device_id="synthetic"):
+        self.index = index
+        self.device_id = device_id
+        self.exit_event = Event()
+        self.lock = Lock()
+        self.name = f"{device_id} video{index}"
+        self.slot = None  # 帧输出，由调用方设置
+        self.latency = get_latency(self.name)
+        self.camera_params = [param.copy() for param in BASE_CAMERA_PARAMS]
+        self.device = SyntheticDevice(self.camera_params)
+        self.on_ctrl_event = None
+
+    def initialize(self):
+        return True
+
+    def init_params(self):
+        values = [param["value"] for param in self.camera_params]
+        for param_idx, error in self.apply_values(values).items():
+            print(f"{self.camera_params[param_idx]['v4l2_param']} 设置失败，错误信息: {error}")
+
+    def apply_values(self, values):
+        return self.device.apply_params(self.camera_params, values)
+
+    def run(self):  # 按帧率生成水平渐变画面，整体亮度跟随 brightness 参数
+        width, height = FRAME_SIZE
+        ramp = np.tile(np.linspace(0, 191, width, dtype=np.float32), (height, 1))
+        frame = np.empty((height, width, 3), np.uint8)
+        brightness = next(param for param in self.camera_params if param["v4l2_param"] == "brightness")
+        next_frame = time.monotonic()
+        while not self.exit_event.wait(max(0.0, next_frame - time.monotonic())):
+            next_frame += 1 / self.max_fps
+            timestamp = time.monotonic()
+            offset = (self.device.get_param(brightness) or 0) + 64  # brightness 范围 -64 ~ 64
+            np.clip(ramp + offset, 0, 255, out=frame[..., 0], casting="unsafe")
+            frame[..., 1] = frame[..., 0]
+            frame[..., 2] = frame[..., 0]
+            self.latency.record("decode", time.monotonic() - timestamp)
+            self.slot.put(frame, timestamp)
+        print(f"{self.name}: 生成 {self.slot.seq} 帧")
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${V4L2_MODES} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 采集模式协商模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_V4L2_MODES}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 采集模式协商：用 VIDIOC_ENUM_FMT / ENUM_FRAMESIZES / ENUM_FRAMEINTERVALS 列出设备的 像素格式 × 分辨率 × 帧间隔
+# 采集需求为 {"format": "MJPG", "size": (宽, 高), "fps": 帧率}，各项可省略；选出满足需求且开销最小的原生模式，不再采集后缩放
+# 选择结果按 VID-PID 与需求缓存到文件，同型号相机下次启动直接使用，驱动不再接受缓存的模式时自动重新协商
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+import json
+import ctypes
+from fractions import Fraction
+from threading import Lock
+from v4l2_ctrl import _IOWR
+from v4l2_capture import (V4L2Capture, v4l2_fract, fourcc, fourcc_to_str, V4L2_BUF_TYPE_VIDEO_CAPTURE,
+                          V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_GREY)
+
+MODE_CACHE = os.environ.get("VITAI_MODE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "vitai", "capture_modes.json"))
+PREFERRED_FORMATS = (V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_GREY)  # 未指定格式时的优先顺序，均为采集引擎支持的格式
+FPS_TOLERANCE = 0.99  # 29.97 fps（1001/30000）视为满足 30 fps
+MAX_ENUM = 64  # 每级枚举的最大项数，防止驱动异常时死循环
+
+# 帧尺寸 / 帧间隔类型
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+V4L2_FRMIVAL_TYPE_DISCRETE = 1
+
+
+class v4l2_fmtdesc(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("description", ctypes.c_char * 32),
+        ("pixelformat", ctypes.c_uint32),
+        ("mbus_code", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_frmsize_discrete(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+    ]
+
+
+class v4l2_frmsize_stepwise(ctypes.Structure):
+    _fields_ = [
+        ("min_width", ctypes.c_uint32),
+        ("max_width", ctypes.c_uint32),
+        ("step_width", ctypes.c_uint32),
+        ("min_height", ctypes.c_uint32),
+        ("max_height", ctypes.c_uint32),
+        ("step_height", ctypes.c_uint32),
+    ]
+
+
+class v4l2_frmsize_union(ctypes.Union):
+    _fields_ = [
+        ("discrete", v4l2_frmsize_discrete),
+        ("stepwise", v4l2_frmsize_stepwise),
+    ]
+
+
+class v4l2_frmsizeenum(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("pixel_format", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_frmsize_union),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class v4l2_frmival_stepwise(ctypes.Structure):
+    _fields_ = [
+        ("min", v4l2_fract),
+        ("max", v4l2_fract),
+        ("step", v4l2_fract),
+    ]
+
+
+class v4l2_frmival_union(ctypes.Union):
+    _fields_ = [
+        ("discrete", v4l2_fract),
+        ("stepwise", v4l2_frmival_stepwise),
+    ]
+
+
+class v4l2_frmivalenum(ctypes.Structure):
+    _anonymous_ = ("u",)
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("pixel_format", ctypes.c_uint32),
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("u", v4l2_frmival_union),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
 
-    def _set_v4l2_param(self, param, value): # 设置摄像头参数
-        device = f"/dev/video{self.index}"
-        cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}" # 设置摄像头参数
-        print(f"执行命令: {cmd}")
-        result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"命令执行失败，错误信息: {result.stderr}")
 
-    def run(self):  # 运行摄像头
-        while not self.exit_event.is_set():  # 循环读取摄像头
-            with self.lock:  # 加锁
-                if self.cap.isOpened():  # 检查摄像头是否打开
-                    if time.time() - self.last_frame_time < 1 / MAX_FPS:  # 限制帧率
-                        time.sleep(0.001)
-                        continue
-                    ret, frame = self.cap.read() # 读取摄像头
-                    self.last_frame_time = time.time()
-                    if ret and not frame_queue.full():  # 将帧放入队列
-                        #frame = cv2.resize(frame, (640, 480))  # 缩放  #由于相机 HD WebCam 的分辨率是 1920x1080，所以特此修改
-                        frame_queue.put((self.device_id, frame), block=False)
-            time.sleep(0.001)
-        with self.lock:
-            if self.cap.isOpened():
-                self.cap.release()
+VIDIOC_ENUM_FMT = _IOWR(2, v4l2_fmtdesc)
+VIDIOC_ENUM_FRAMESIZES = _IOWR(74, v4l2_frmsizeenum)
+VIDIOC_ENUM_FRAMEINTERVALS = _IOWR(75, v4l2_frmivalenum)
 
 
-class CameraControlPro(tk.Toplevel):  # 摄像头控制界面
-    def __init__(self, master, camera_controller):
-        super().__init__(master)
-        self.camera_controller = camera_controller  # 摄像头控制器
-        self.scheme_values = SCHEMES
-        self.title(camera_controller.device_id)  # 设置标题
-        self.protocol("WM_DELETE_WINDOW", self.exit_app)  # 退出时关闭窗口
-        self.row = 0
-        self.main_frame = ttk.Frame(self, padding=20)  # 主框架
-        self.main_frame.pack(fill=tk.BOTH, expand=True)  # 设置主框架
-        self.create_controls()  # 创建控件
-        self.add_buttons()  # 添加按钮
-        self.bind('<KeyPress-q>', lambda e: self.exit_app())  # 退出
-        self.device_id = camera_controller.device_id  # 设备ID
+# 一个原生采集模式
+class CaptureMode:
+    def __init__(self, pixelformat, width, height, interval=None):
+        self.pixelformat = pixelformat
+        self.width = width
+        self.height = height
+        self.interval = interval  # 帧间隔 (分子, 分母) 秒，驱动未报告时为 None
 
-    def create_controls(self):  # 创建控件
-        param_list = self.camera_controller.camera_params # 摄像头参数
-        for i in range(0, len(param_list), 3):
-            for col in range(3): # 3列
-                if i + col < len(param_list):
-                    param = param_list[i + col]
-                    frame = ttk.LabelFrame(self.main_frame, text=param["chinese_name"])
-                    frame.grid(row=self.row, column=col, padx=5, pady=5, sticky="nsew")
-                    self._create_control_widget(frame, param)
-            self.row += 1
+    @property
+    def fps(self):  # 帧率，未知为 0
+        return self.interval[1] / self.interval[0] if self.interval and self.interval[0] else 0
 
-    def _create_control_widget(self, frame, param): # 创建控件
-        control_frame = ttk.Frame(frame)
-        control_frame.pack(fill=tk.X, pady=2)
+    @property
+    def pixels(self):
+        return self.width * self.height
 
-        # 显示值范围
-        range_label = ttk.Label(frame, text=f"范围: {param['min']} ~ {param['max']}")
-        range_label.pack(fill=tk.X)
-        # 显示用户值
-        user_value_label = ttk.Label(frame, text=f"用户值: {param['setvalue']}")
-        user_value_label.pack(fill=tk.X)
+    def capture_args(self):  # V4L2Capture 的构造参数
+        return {"width": self.width, "height": self.height, "pixelformat": self.pixelformat, "interval": self.interval}
 
-        if param["type"] == "int": # 整数
-            var = tk.IntVar(value=param["value"]) # 整数变量
-            slider = ttk.Scale(
-                control_frame,
-                from_=param["min"],
-                to=param["max"],
-                variable=var,
-                orient=tk.HORIZONTAL
-            )
-            slider.pack(side=tk.LEFT, fill=tk.X, expand=True) # 设置滑块
-            entry = ttk.Entry(control_frame, textvariable=var, width=8)
-            entry.pack(side=tk.LEFT)
-            param["var"] = var
-            var.trace("w", lambda *args: self.on_param_change(param)) # 监听变量变化
-        elif param["type"] == "menu":
-            options = param["options"].split("；")
-            if 0 <= param["value"] < len(options):
-                var = tk.StringVar(value=options[param["value"]]) # 字符串变量
-            else:
-                var = tk.StringVar(value=options[0])
-                print(f"警告: 参数 {param['chinese_name']} 的值 {param['value']} 超出选项索引范围，使用第一个选项。") # 终端红色输出警告
-            cb = ttk.Combobox(control_frame, textvariable=var, values=options)
-            cb.pack(fill=tk.X, expand=True)
-            param["var"] = var
-            cb.bind("<<ComboboxSelected>>", lambda event: self.on_param_change(param)) # 监听变量变化
-        elif param["type"] == "bool":
-            var = tk.IntVar(value=param["value"])
-            cb = ttk.Checkbutton(control_frame, variable=var)
-            cb.pack(side=tk.LEFT)
-            param["var"] = var
-            var.trace("w", lambda *args: self.on_param_change(param))
+    def as_dict(self):
+        return {"format": fourcc_to_str(self.pixelformat), "width": self.width, "height": self.height,
+                "interval": list(self.interval) if self.interval else None}
 
-        status_label = ttk.Label(frame, text="设置状态: 未设置", foreground="gray") # 设置状态
-        status_label.pack(fill=tk.X)
-        param["status_label"] = status_label
+    @classmethod
+    def from_dict(cls, data):
+        interval = data.get("interval")
+        return cls(fourcc(data["format"]), int(data["width"]), int(data["height"]), tuple(interval) if interval else None)
 
-    def on_param_change(self, param): # 设置参数
+    def __str__(self):
+        fps = f"@{self.fps:.4g}" if self.interval else ""
+        return f"{fourcc_to_str(self.pixelformat)} {self.width}x{self.height}{fps}"
+
+    def __repr__(self):
+        return f"CaptureMode({self})"
+
+
+def enum_formats(device):
+    """VIDIOC_ENUM_FMT：返回 [(像素格式, 描述)]"""
+    formats = []
+    for index in range(MAX_ENUM):
+        desc = v4l2_fmtdesc(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
         try:
-            value = None
-            if param["type"] == "int":
-                value = param["var"].get()
-                if not (param["min"] <= value <= param["max"]):
-                    raise ValueError(f"数值超出范围 {param['min']}~{param['max']}")
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                value = options.index(param["var"].get())
-            elif param["type"] == "bool":
-                value = param["var"].get()
+            device.ioctl(VIDIOC_ENUM_FMT, desc)
+        except OSError:  # EINVAL 表示枚举结束
+            break
+        formats.append((desc.pixelformat, desc.description.decode(errors="replace")))
+    return formats
 
-            device = f"/dev/video{self.camera_controller.index}" # 摄像头设备
-            cmd = f"v4l2-ctl -d {device} --set-ctrl={param['v4l2_param']}={value}"
-            result = subprocess.run(cmd, shell=True, check=False, capture_output=True, text=True) # 设置摄像头参数
-            if result.returncode == 0:
-                param["status_label"].config(text="设置状态: 成功", foreground="green")
-            else:
-                param["status_label"].config(text="设置状态: 失败", foreground="red")
-                print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置失败\033[0m")  # 终端红色输出错误提示
-        except ValueError as ve:
-            param["status_label"].config(text="设置状态: 数值超出范围", foreground="red")
-            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 数值超出范围\033[0m")
-        except Exception:
-            param["status_label"].config(text="设置状态: 出错", foreground="red")
-            print(f"\033[31m错误：{self.camera_controller.device_id} 的 {param['chinese_name']} 设置出错\033[0m")
 
-    def add_buttons(self):  # 添加按钮
-        button_frame = ttk.Frame(self.main_frame)
-        button_frame.grid(row=self.row, column=0, columnspan=3, pady=10)
-        for name in self.scheme_values.keys():
-            ttk.Button(button_frame, text=name, command=lambda name=name: self.reset_params(name)).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="退出(Q)", command=self.exit_app).pack(side=tk.LEFT, padx=5)
+def _align(value, low, high, step):  # 把目标值向上对齐到步进范围内
+    step = step or 1
+    value = low + -(-(max(value, low) - low) // step) * step
+    return min(value, high)
 
-    def reset_params(self, scheme_name):  # 修改参数重置逻辑
-        scheme = self.scheme_values[scheme_name]
-        for param_idx, param in enumerate(self.camera_controller.camera_params):
-            val = scheme[param_idx]
-            if param["type"] == "int":
-                param["var"].set(val)
-            elif param["type"] == "menu":
-                options = param["options"].split("；")
-                if val < len(options):
-                    param["var"].set(options[val])
-            elif param["type"] == "bool":
-                param["var"].set(val)
-            self.on_param_change(param)
 
-    def exit_app(self):  # 退出
-        self.camera_controller.exit_event.set()
-        with self.camera_controller.lock:
-            if self.camera_controller.cap.isOpened():
-                self.camera_controller.cap.release()
-        cv2.destroyWindow(self.camera_controller.device_id)  # 关闭窗口
-        self.destroy()
+def enum_frame_sizes(device, pixelformat, target=None):
+    """VIDIOC_ENUM_FRAMESIZES：返回 [(宽, 高)]；连续或步进范围返回最小、最大尺寸与对齐后的目标尺寸"""
+    sizes = []
+    for index in range(MAX_ENUM):
+        fs = v4l2_frmsizeenum(index=index, pixel_format=pixelformat)
+        try:
+            device.ioctl(VIDIOC_ENUM_FRAMESIZES, fs)
+        except OSError:
+            break
+        if fs.type == V4L2_FRMSIZE_TYPE_DISCRETE:
+            sizes.append((fs.discrete.width, fs.discrete.height))
+            continue
+        sw = fs.stepwise  # 连续 / 步进范围只有一项
+        sizes += [(sw.min_width, sw.min_height), (sw.max_width, sw.max_height)]
+        if target:
+            sizes.append((_align(target[0], sw.min_width, sw.max_width, sw.step_width),
+                          _align(target[1], sw.min_height, sw.max_height, sw.step_height)))
+        break
+    return list(dict.fromkeys(sizes))
 
 
-def list_cameras(): # 检测摄像头
-    available = []
-    video_devices = [f"/dev/{d}" for d in os.listdir("/dev") if d.startswith("video")]  # 视频设备
+def enum_frame_intervals(device, pixelformat, width, height, fps=None):
+    """VIDIOC_ENUM_FRAMEINTERVALS：返回 [(分子, 分母)]；连续或步进范围返回两端与目标帧率对应的间隔"""
+    intervals = []
+    for index in range(MAX_ENUM):
+        fi = v4l2_frmivalenum(index=index, pixel_format=pixelformat, width=width, height=height)
+        try:
+            device.ioctl(VIDIOC_ENUM_FRAMEINTERVALS, fi)
+        except OSError:
+            break
+        if fi.type == V4L2_FRMIVAL_TYPE_DISCRETE:
+            intervals.append((fi.discrete.numerator, fi.discrete.denominator))
+            continue
+        low, high = fi.stepwise.min, fi.stepwise.max  # 最短、最长帧间隔
+        intervals += [(low.numerator, low.denominator), (high.numerator, high.denominator)]
+        if fps and low.denominator and high.denominator and Fraction(low.numerator, low.denominator) <= 1 / Fraction(fps) <= Fraction(high.numerator, high.denominator):
+            target = (1 / Fraction(fps)).limit_denominator(100000)
+            intervals.append((target.numerator, target.denominator))
+        break
+    return [interval for interval in dict.fromkeys(intervals) if interval[0] and interval[1]]
 
-    for device in video_devices:  # 检测设备
+
+def enum_modes(device, request=None):
+    """列出设备支持、且采集引擎能转换的全部模式；request 中的尺寸与帧率用于连续 / 步进范围的取值"""
+    request = request or {}
+    modes = []
+    for pixelformat, _ in enum_formats(device):
+        if pixelformat not in PREFERRED_FORMATS:
+            continue
+        for width, height in enum_frame_sizes(device, pixelformat, request.get("size")):
+            intervals = enum_frame_intervals(device, pixelformat, width, height, request.get("fps"))
+            for interval in intervals or [None]:  # 驱动不报告帧间隔时帧率未知
+                modes.append(CaptureMode(pixelformat, width, height, interval))
+    return modes
+
+
+def format_rank(mode, request):  # 格式优先级：需求指定的格式最优先，其余按 PREFERRED_FORMATS
+    wanted = request.get("format")
+    if wanted and mode.pixelformat == fourcc(wanted):
+        return -1
+    return PREFERRED_FORMATS.index(mode.pixelformat)
+
+
+def choose_mode(modes, request):
+    """选出满足需求且开销最小的模式：像素最少（未指定尺寸时取最大尺寸）、格式优先、帧率最低；没有满足的模式时依次放宽帧率、尺寸"""
+    size, fps, wanted = request.get("size"), request.get("fps"), request.get("format")
+    if not modes:
+        return None
+    candidates = [m for m in modes if m.pixelformat == fourcc(wanted)] if wanted else modes
+    candidates = candidates or modes  # 设备不支持指定格式时使用其他格式
+    fits_size = [m for m in candidates if m.width >= size[0] and m.height >= size[1]] if size else candidates
+    fits = [m for m in fits_size if not m.interval or m.fps >= fps * FPS_TOLERANCE] if fps else fits_size
+    if fits:
+        return min(fits, key=lambda m: (m.pixels if size else -m.pixels, format_rank(m, request), not m.interval, m.fps))
+    if fits_size:  # 尺寸满足但帧率不足：取帧率最高的
+        return min(fits_size, key=lambda m: (-m.fps, m.pixels if size else -m.pixels, format_rank(m, request)))
+    return min(candidates, key=lambda m: (-m.pixels, -m.fps, format_rank(m, request)))  # 尺寸都不够：取最大尺寸
+
+
+def request_key(request):  # 需求的缓存键，如 "MJPG:640x480@30"、"*:max"
+    size, fps = request.get("size"), request.get("fps")
+    key = f"{request.get('format') or '*'}:{'%dx%d' % tuple(size) if size else 'max'}"
+    return f"{key}@{fps:g}" if fps else key
+
+
+def parse_mode_spec(spec):
+    """解析采集需求字符串 "[格式:]宽x高[@帧率]"，如 "MJPG:1280x720@30"、"640x480"、"max@60"；格式错误时抛出 ValueError"""
+    request = {}
+    fmt, _, rest = spec.strip().rpartition(":")
+    if fmt:
+        if len(fmt) != 4:
+            raise ValueError(f"像素格式应为四字符码：{fmt}")
+        request["format"] = fmt.upper()
+    size, _, fps = rest.partition("@")
+    if fps:
+        request["fps"] = float(fps)
+    if size.lower() != "max":
+        width, _, height = size.lower().partition("x")
+        if not (width.isdigit() and height.isdigit()):
+            raise ValueError(f"无效的采集需求 {spec}，应为 [格式:]宽x高[@帧率]")
+        request["size"] = (int(width), int(height))
+    return request
+
+
+# 按 VID-PID 缓存的协商结果：{"VID-PID 需求": 模式}
+_cache_lock = Lock()
+_cache = None
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
         try:
-            index = int(device.split('video')[1])
-            cmd = ["udevadm", "info", "-q", "property", device] # 获取设备信息
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            vid, pid = "N/A", "N/A"
-            for line in result.stdout.splitlines():   # 解析设备信息
-                if line.startswith("ID_VENDOR_ID="):
-                    vid = line.split('=')[1].strip().upper()
-                elif line.startswith("ID_MODEL_ID="):
-                    pid = line.split('=')[1].strip().upper()
-            device_id = f"{vid}-{pid}" if vid != "N/A" and pid != "N/A" else "UNKNOWN" # 设备ID
-            available.append((index, device_id)) # 添加设备信息
-        except Exception as e:
-            print(f"设备检测错误: {str(e)}")
-    return available
+            with open(MODE_CACHE, encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):  # 首次运行或文件损坏
+            _cache = {}
+    return _cache
 
 
-def display_frames():  # 显示帧
-    windows = {}
-    while True:
+def _save_cache():  # 先写临时文件再替换，多个进程同时写入时不会留下半个文件
+    try:
+        os.makedirs(os.path.dirname(MODE_CACHE), exist_ok=True)
+        temp = f"{MODE_CACHE}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(_cache, f, indent=2, ensure_ascii=False)
+        os.replace(temp, MODE_CACHE)
+    except OSError as e:
+        print(f"\033[33m警告：采集模式缓存写入失败（{e}）\033[0m")
+
+
+def _cacheable(device_id):  # 无法识别型号的设备不缓存
+    return device_id and device_id != "UNKNOWN"
+
+
+def cached_mode(device_id, request):
+    if not _cacheable(device_id):
+        return None
+    with _cache_lock:
+        data = _load_cache().get(f"{device_id} {request_key(request)}")
+    try:
+        return CaptureMode.from_dict(data) if data else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def store_mode(device_id, request, mode):
+    if not _cacheable(device_id):
+        return
+    with _cache_lock:
+        _load_cache()[f"{device_id} {request_key(request)}"] = mode.as_dict()
+        _save_cache()
+
+
+def forget_mode(device_id, request):  # 驱动不再接受缓存的模式（如固件升级）时清除
+    if not _cacheable(device_id):
+        return
+    with _cache_lock:
+        if _load_cache().pop(f"{device_id} {request_key(request)}", None) is not None:
+            _save_cache()
+
+
+def negotiate(device, device_id, request):
+    """返回 (模式, 是否来自缓存)；设备无法打开或不支持枚举时模式为 None"""
+    mode = cached_mode(device_id, request)
+    if mode is not None:
+        return mode, True
+    if not device.open():
+        return None, False
+    return choose_mode(enum_modes(device, request), request), False
+
+
+def open_capture(device, device_id, request, name=""):
+    """按需求协商模式并打开 mmap 采集，返回已开始采集的 V4L2Capture，失败返回 None（调用方回退 OpenCV）"""
+    for _ in range(2):  # 缓存的模式失效时重新协商一次
+        mode, cached = negotiate(device, device_id, request)
+        if mode is None:  # 不支持枚举：只指定格式，由驱动决定尺寸
+            cap = V4L2Capture(device, pixelformat=fourcc(request["format"]) if request.get("format") else None)
+            return cap if cap.open() else None
+        cap = V4L2Capture(device, **mode.capture_args())
+        opened = cap.open()
+        if opened and (cap.pixelformat, cap.width, cap.height) == (mode.pixelformat, mode.width, mode.height):
+            print(f"{name or device_id}: 采集模式 {mode}{'（缓存）' if cached else ''}")
+            if not cached:  # 驱动接受后才写入缓存
+                store_mode(device_id, request, mode)
+            return cap
+        if not cached:  # 刚枚举出的模式也被驱动调整：接受驱动的结果
+            return cap if opened else None
+        cap.release()
+        forget_mode(device_id, request)
+    return None
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${USB_BANDWIDTH} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} USB 带宽规划模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_USB_BANDWIDTH}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# USB 带宽规划：按 sysfs USB 拓扑（总线号 / 根集线器）把相机分组，估计每个候选采集模式占用的等时带宽，为每台相机选择模式使同一总线上的相机都能启动
+# UVC 驱动按相机申请的每微帧负载选择视频流接口的备用设置（alternate setting），并按该设置的端点容量整块保留带宽；同一总线的保留总量超过周期传输上限时 STREAMON 返回 ENOSPC
+# 端点容量来自 sysfs descriptors 中视频流接口各备用设置的等时端点；未压缩格式按帧大小 × 帧率估计，MJPEG 按压缩率估计，相机启动后以实际备用设置修正
+# 超出预算时逐步降级：先换 MJPEG 等带宽更低且仍满足需求的模式，再降低帧率，最后降低分辨率；仍放不下的相机不启动，每一步都记录原因
+# ----------------------------------------------------------------------------------------------------------------------
+import os
+from v4l2_ctrl import V4L2Device
+from v4l2_capture import fourcc_to_str, V4L2_PIX_FMT_MJPEG, V4L2_PIX_FMT_YUYV, V4L2_PIX_FMT_GREY
+from v4l2_modes import enum_modes, choose_mode, format_rank, FPS_TOLERANCE
+
+SYSFS_USB = "/sys/bus/usb/devices"
+BYTES_PER_PIXEL = {V4L2_PIX_FMT_YUYV: 2, V4L2_PIX_FMT_GREY: 1, V4L2_PIX_FMT_MJPEG: 2}  # MJPEG 按压缩前的 YUV422 计算
+MJPEG_RATIO = 0.25  # MJPEG 负载估计为未压缩的比例；多数相机按峰值码率申请，取偏保守的值
+PAYLOAD_HEADER = 12  # UVC 每个负载包的头部字节数
+# 周期传输（等时 + 中断）可占用的总线带宽（字节/秒），按根集线器速率（Mbit/s）：全速 90%，高速及以上 80%
+BUS_BUDGET = {
+    12: 12e6 / 8 * 0.9,
+    480: 480e6 / 8 * 0.8,
+    5000: 5e9 * 0.8 / 8 * 0.8,  # 8b/10b 编码
+    10000: 10e9 * 128 / 132 / 8 * 0.8,  # 128b/132b 编码
+}
+DEFAULT_SPEED = 480
+
+# 描述符类型与视频类代码
+USB_DT_INTERFACE = 4
+USB_DT_ENDPOINT = 5
+USB_DT_SS_ENDPOINT_COMP = 0x30
+USB_CLASS_VIDEO = 0x0E
+USB_SUBCLASS_VIDEOSTREAMING = 0x02
+
+# 降级原因，按代价从低到高
+STEP_REASONS = ("改用带宽更低的格式", "降低帧率", "降低分辨率")
+
+
+def _read_attr(path):
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _speed(value):  # sysfs speed 属性（如 "480"、"5000"、"1.5"）转为 Mbit/s
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_SPEED
+
+
+def bus_budget(speed):
+    """总线可用于周期传输的带宽（字节/秒）"""
+    for limit in sorted(BUS_BUDGET):
+        if speed <= limit:
+            return BUS_BUDGET[limit]
+    return BUS_BUDGET[max(BUS_BUDGET)]
+
+
+def streaming_alt_settings(usb_dir, speed):
+    """解析 USB 设备 descriptors，返回 {(接口号, 备用设置): 端点容量（字节/秒）}，只含视频流接口的等时输入端点"""
+    try:
+        with open(os.path.join(usb_dir, "descriptors"), "rb") as f:
+            data = f.read()
+    except (OSError, TypeError):
+        return {}
+    per_second = 8000 if speed >= 480 else 1000  # 高速及以上按微帧（125us）服务，全速按帧（1ms）
+    alts = {}
+    current = None  # 当前所在的视频流接口 (接口号, 备用设置)
+    pos = 0
+    while pos + 2 <= len(data):
+        length, dtype = data[pos], data[pos + 1]
+        if length < 2:
+            break
+        desc = data[pos:pos + length]
+        if dtype == USB_DT_INTERFACE and length >= 9:
+            current = (desc[2], desc[3]) if (desc[5], desc[6]) == (USB_CLASS_VIDEO, USB_SUBCLASS_VIDEOSTREAMING) else None
+        elif dtype == USB_DT_ENDPOINT and current is not None and length >= 7 and desc[3] & 0x03 == 1 and desc[2] & 0x80:
+            packet = desc[4] | (desc[5] << 8)
+            size, mult = packet & 0x7FF, (packet >> 11) & 0x03  # 高速端点每微帧可附加 1~2 次传输
+            interval = 2 ** (max(desc[6], 1) - 1)
+            alts[current] = size * (mult + 1) * per_second // interval
+        elif dtype == USB_DT_SS_ENDPOINT_COMP and current in alts and length >= 4:
+            alts[current] *= (desc[2] + 1) * ((desc[3] & 0x03) + 1)  # 超高速端点：突发数 × 倍数
+        pos += length
+    return alts
+
+
+def current_alt_setting(usb_dir):
+    """正在使用的视频流接口备用设置 (接口号, 备用设置)；未开始采集时为 None"""
+    if not usb_dir:
+        return None
+    for entry in os.listdir(usb_dir) if os.path.isdir(usb_dir) else []:
+        path = os.path.join(usb_dir, entry)
+        if ":" not in entry or _read_attr(os.path.join(path, "bInterfaceClass")) != "0e":
+            continue
+        if _read_attr(os.path.join(path, "bInterfaceSubClass")) != "02":
+            continue
+        alt = _read_attr(os.path.join(path, "bAlternateSetting"))
+        number = _read_attr(os.path.join(path, "bInterfaceNumber"))
+        if alt and number and alt.strip() != "0":
+            return int(number, 16), int(alt)
+    return None
+
+
+def payload_rate(mode):
+    """采集模式的估计负载（字节/秒），含 UVC 包头"""
+    rate = mode.width * mode.height * BYTES_PER_PIXEL.get(mode.pixelformat, 2) * (mode.fps or 30)
+    if mode.pixelformat == V4L2_PIX_FMT_MJPEG:
+        rate *= MJPEG_RATIO
+    return rate + PAYLOAD_HEADER * 8000
+
+
+def _fmt_rate(rate):
+    return f"{rate / 1e6:.1f} MB/s"
+
+
+# 单台相机：拓扑、端点容量与候选模式
+class CameraLink:
+    def __init__(self, node, modes, request):
+        self.node = node
+        self.index = node.index
+        self.name = f"{node.device_id} video{node.index}"
+        self.device_id = node.device_id
+        self.usb_dir = node.usb_dir
+        self.port = node.port
+        self.busnum = node.usb_attr("busnum") or "N/A"
+        self.speed = _speed(node.usb_attr("speed"))
+        self.alts = streaming_alt_settings(self.usb_dir, self.speed)
+        self.capacities = sorted(set(self.alts.values()))  # 各备用设置的端点容量，升序
+        self.modes = modes
+        self.request = request
+        self.observed = {}  # 实测的保留带宽：str(模式) -> 字节/秒
+
+    def reservation(self, mode):
+        """返回 (保留带宽, 来源)：实测值优先；否则取能容纳估计负载的最小备用设置"""
+        if str(mode) in self.observed:
+            return self.observed[str(mode)], "实测"
+        rate = payload_rate(mode)
+        for capacity in self.capacities:
+            if capacity >= rate:
+                return capacity, "估计"
+        return (self.capacities[-1] if self.capacities else rate), "估计"
+
+    def observe(self, mode):  # 采集开始后读取实际备用设置，修正该模式的保留带宽
+        alt = current_alt_setting(self.usb_dir)
+        if alt in self.alts:
+            self.observed[str(mode)] = self.alts[alt]
+        return self.observed.get(str(mode))
+
+    def level(self, mode):  # 相对需求的降级程度：0 满足需求，1 帧率不足，2 尺寸不足
+        size, fps = self.request.get("size"), self.request.get("fps")
+        if size and (mode.width < size[0] or mode.height < size[1]):
+            return 2
+        if fps and mode.interval and mode.fps < fps * FPS_TOLERANCE:
+            return 1
+        return 0
+
+    def rank(self, mode):
+        """降级候选的排序键：仍满足需求时与 choose_mode 相同取开销最小的，帧率不足时取帧率最高的，尺寸不足时取尺寸最大的"""
+        level = self.level(mode)
+        if level == 0:
+            return 0, mode.pixels, format_rank(mode, self.request), mode.fps
+        if level == 1:
+            return 1, -mode.fps, mode.pixels, format_rank(mode, self.request)
+        return 2, -mode.pixels, -mode.fps, format_rank(mode, self.request)
+
+    def ladder(self, current):
+        """比 current 保留带宽更低的候选模式，按 rank 排列"""
+        reserved = self.reservation(current)[0]
+        return sorted((m for m in self.modes if self.reservation(m)[0] < reserved), key=self.rank)
+
+
+# 一台相机的规划结果
+class Assignment:
+    def __init__(self, link, mode):
+        self.link = link
+        self.mode = mode  # None 表示带宽不足，不启动
+        self.steps = []  # 降级记录
+
+    @property
+    def reserved(self):
+        return self.link.reservation(self.mode)[0] if self.mode else 0
+
+    def capture_request(self):
+        """供 CameraController.capture_mode 使用的采集需求，精确对应所选模式"""
+        if self.mode is None:
+            return None
+        request = {"format": fourcc_to_str(self.mode.pixelformat), "size": (self.mode.width, self.mode.height)}
+        if self.mode.interval:
+            request["fps"] = self.mode.fps
+        return request
+
+    def as_dict(self):
+        reserved, source = self.link.reservation(self.mode) if self.mode else (0, "")
+        return {"index": self.link.index, "name": self.link.name, "bus": self.link.busnum, "port": self.link.port,
+                "speed": self.link.speed, "mode": str(self.mode) if self.mode else None,
+                "reserved": round(reserved), "source": source, "steps": list(self.steps)}
+
+
+# 带宽规划器：启动时整体规划，热插拔时在已启动相机不变的前提下为新相机选择模式
+class BandwidthPlanner:
+    def __init__(self):
+        self.assignments = {}  # 设备序号 -> Assignment
+        self.notes = []  # 规划说明
+
+    def bus_speed(self, busnum):  # 根集线器速率，如 usb1 为 480、usb2 为 5000
+        return _speed(_read_attr(os.path.join(SYSFS_USB, f"usb{busnum}", "speed")))
+
+    def bus_total(self, busnum):
+        return sum(a.reserved for a in self.assignments.values() if a.link.busnum == busnum)
+
+    def link(self, node, request):  # 枚举相机模式并读取拓扑；设备无法打开时返回 None
+        device = V4L2Device(node.index)
+        if not device.open():
+            return None
         try:
-            device_id, frame = frame_queue.get(timeout=0.1)  # 获取帧
-            if device_id not in windows:
-                cv2.namedWindow(device_id, cv2.WINDOW_NORMAL)  # 创建窗口
-                cv2.resizeWindow(device_id, 640, 480)
-            cv2.imshow(device_id, frame) # 显示帧
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            modes = enum_modes(device, request)
+        finally:
+            device.close()
+        return CameraLink(node, modes, request) if modes else None
+
+    def plan(self, nodes, request):
+        """为全部相机规划模式，返回 {设备序号: Assignment}；request 为采集需求或按节点返回需求的函数"""
+        links = []
+        for node in nodes:
+            link = self.link(node, request(node) if callable(request) else request)
+            if link is None:
+                self.notes.append(f"video{node.index}：无法枚举采集模式，不参与规划")
+                continue
+            links.append(link)
+            self.assignments[link.index] = Assignment(link, choose_mode(link.modes, link.request))
+        for busnum in sorted({link.busnum for link in links}):
+            self._fit(busnum, [self.assignments[link.index] for link in links if link.busnum == busnum])
+        return {link.index: self.assignments[link.index] for link in links}
+
+    def add(self, node, request):
+        """热插拔接入：已启动的相机保持不变，只为新相机选择模式；无法枚举时返回 None"""
+        link = self.link(node, request)
+        if link is None:
+            return None
+        assignment = Assignment(link, choose_mode(link.modes, link.request))
+        self.assignments[link.index] = assignment
+        self._fit(link.busnum, [assignment])
+        return assignment
+
+    def remove(self, index):  # 相机拔出，释放其带宽
+        self.assignments.pop(index, None)
+
+    def observe(self, index):  # 相机开始采集后以实际备用设置修正保留带宽
+        assignment = self.assignments.get(index)
+        if assignment is not None and assignment.mode is not None:
+            return assignment.link.observe(assignment.mode)
+        return None
+
+    def _fit(self, busnum, movable):
+        """逐步降级 movable 中的相机，直到总线保留带宽不超过预算；仍超出时从最后接入的相机开始不启动"""
+        if busnum == "N/A":  # 非 USB 相机不占用 USB 带宽
+            return
+        budget = bus_budget(self.bus_speed(busnum))
+        while self.bus_total(busnum) > budget:
+            best = None  # (降级程度, -当前保留带宽, 相机, 下一模式)
+            for assignment in movable:
+                if assignment.mode is None:
+                    continue
+                ladder = assignment.link.ladder(assignment.mode)
+                if ladder:
+                    key = (assignment.link.level(ladder[0]), -assignment.reserved)
+                    if best is None or key < best[0]:
+                        best = (key, assignment, ladder[0])
+            if best is None:
                 break
-        except Empty:
-            pass
-        except Exception as e:
-            print(f"显示异常: {str(e)}")
-    cv2.destroyAllWindows()
+            _, assignment, mode = best
+            self._step(assignment, mode, budget)
+        while self.bus_total(busnum) > budget:
+            active = [a for a in movable if a.mode is not None]
+            if not active:
+                break
+            assignment = max(active, key=lambda a: a.link.index)
+            assignment.steps.append(f"最低带宽模式 {assignment.mode} 仍需 {_fmt_rate(assignment.reserved)}，总线 {busnum} 预算 {_fmt_rate(budget)} 不足，不启动")
+            assignment.mode = None
+
+    def _step(self, assignment, mode, budget):
+        old, old_reserved = assignment.mode, assignment.reserved
+        level = assignment.link.level(mode)
+        if level == 0:
+            reason = STEP_REASONS[0] if mode.pixelformat != old.pixelformat else "改用带宽更低的模式"
+        else:
+            reason = STEP_REASONS[level]
+        assignment.mode = mode
+        assignment.steps.append(f"{old} → {mode}：{reason}（{_fmt_rate(old_reserved)} → {_fmt_rate(assignment.reserved)}，"
+                                f"总线 {assignment.link.busnum} 预算 {_fmt_rate(budget)}）")
+
+    def explain(self):
+        """按总线输出规划说明（字符串列表）"""
+        lines = []
+        for busnum in sorted({a.link.busnum for a in self.assignments.values()}):
+            speed = self.bus_speed(busnum)
+            budget = bus_budget(speed)
+            total = self.bus_total(busnum)
+            lines.append(f"总线 {busnum}（usb{busnum}，{speed:g}M）：预计保留 {_fmt_rate(total)} / 预算 {_fmt_rate(budget)}")
+            for index in sorted(self.assignments):
+                assignment = self.assignments[index]
+                link = assignment.link
+                if link.busnum != busnum:
+                    continue
+                if assignment.mode is None:
+                    lines.append(f"  {link.name}（端口 {link.port}，{link.speed:g}M）：不启动")
+                else:
+                    reserved, source = link.reservation(assignment.mode)
+                    lines.append(f"  {link.name}（端口 {link.port}，{link.speed:g}M）：{assignment.mode}，保留 {_fmt_rate(reserved)}（{source}）")
+                for step in assignment.steps:
+                    lines.append(f"    - {step}")
+        return lines + self.notes
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${USB_PLAN} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} USB 带宽规划，按总线列出每台相机的采集模式与原因 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_USB_PLAN}" # 程序路径
+# ====================================================== 程序声明 ======================================================
+import sys
+BANNER_OUT = sys.stderr if "--json" in sys.argv[1:] else sys.stdout  # --json 时标准输出只保留 JSON 记录
+print("\n\033[93m【USB 带宽规划程序：按 USB 总线分组已接入的相机，估计各采集模式的等时带宽，给出每台相机的模式与原因】\033[0m\n", file=BANNER_OUT)
+# ----------------------------------------------------------------------------------------------------------------------
+from contextlib import redirect_stdout
+from v4l2_enum import list_video_nodes
+from usb_bandwidth import BandwidthPlanner, bus_budget
+from json_output import NDJSONWriter, json_mode
+
+# 每台相机的采集需求，与预览工具一致；格式见 v4l2_modes.py
+REQUEST = {"format": "MJPG", "size": (640, 480), "fps": 30}
 
 
 def main():
-    global frame_queue # 帧队列
-    frame_queue = Queue(maxsize=2) # 帧队列
-    camera_info = list_cameras() # 摄像头信息
-    if not camera_info:
+    nodes = list_video_nodes()
+    if not nodes:
         print("未检测到摄像头设备")
         return
-    root = tk.Tk()  # 主窗口
-    root.withdraw()  # 隐藏主窗口
-    display_thread = Thread(target=display_frames, daemon=True)  # 显示线程
-    display_thread.start()  # 启动显示线程
+    planner = BandwidthPlanner()
+    assignments = planner.plan(nodes, REQUEST)
+    for line in planner.explain():
+        print(line)
+    running = sum(1 for a in assignments.values() if a.mode is not None)
+    print(f"\n需求 {REQUEST}：{len(assignments)} 台相机中可同时运行 {running} 台")
+
+
+def main_json():
+    """--json：每台相机输出一条 camera 记录，每条总线输出一条 bus 记录，最后输出 summary 记录"""
+    writer = NDJSONWriter(sys.stdout)
+    with redirect_stdout(sys.stderr):
+        planner = BandwidthPlanner()
+        assignments = planner.plan(list_video_nodes(), REQUEST)
+        for index in sorted(assignments):
+            writer.emit("camera", **assignments[index].as_dict())
+        for busnum in sorted({a.link.busnum for a in assignments.values()}):
+            speed = planner.bus_speed(busnum)
+            writer.emit("bus", bus=busnum, speed=speed, budget=round(bus_budget(speed)), reserved=round(planner.bus_total(busnum)))
+        writer.emit("summary", cameras=len(assignments), running=sum(1 for a in assignments.values() if a.mode is not None),
+                    notes=planner.notes)
 
-    controllers = [] # 相机控制器
-    apps = []
-    for index, device_id in camera_info: # 创建相机控制器
-        camera_controller = CameraController(index, device_id)
-        if not camera_controller.initialize(): # 初始化相机
-            print(f"{device_id} 相机初始化失败，未开启")
-            continue
-        app = CameraControlPro(root, camera_controller)  # 创建窗口
-        camera_thread = Thread(target=camera_controller.run, daemon=True)  # 相机线程
-        camera_thread.start()  # 启动相机线程
-        controllers.append(camera_controller) # 添加相机控制器
-        apps.append(app)
 
-    root.mainloop()
-    for controller in controllers: # 关闭相机
-        controller.exit_event.set()
-    cv2.destroyAllWindows()  # 关闭窗口
+if __name__ == '__main__':
+    if json_mode():
+        main_json()
+    else:
+        main()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${MOSAIC} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 多相机拼接显示模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_MOSAIC}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 拼接显示：全部相机画面拼接到一个窗口，取代每台相机一个 HighGUI 窗口
+# 画布按相机数量一次性分配，每台相机对应画布中的一格（NumPy 视图），新帧直接缩放写入格子（cv2.resize 的 dst），不逐帧分配内存
+# 格子左上角叠加设备名称、帧率与丢帧数；每个屏幕刷新周期最多调用一次 imshow，同一周期内到达的帧合并显示
+# ----------------------------------------------------------------------------------------------------------------------
+import math
+import time
+import cv2
+import numpy as np
+from latency import get_latency, latency_report
 
+MOSAIC_TITLE = "ViTai"  # 拼接窗口标题
+TILE_SIZE = (640, 480)  # 单格最大尺寸（宽, 高）
+MAX_CANVAS = (1920, 1080)  # 画布最大尺寸，相机较多时按比例缩小格子
+REFRESH_HZ = 60  # 显示刷新率，两次 imshow 之间至少间隔 1/REFRESH_HZ 秒
+FPS_WINDOW = 1.0  # 帧率统计窗口（秒）
+FONT = cv2.FONT_HERSHEY_SIMPLEX  # HighGUI 字体只支持 ASCII，叠加信息不使用中文
 
-if __name__ == "__main__":
-    main()
+
+# 单个格子的帧率统计
+class TileStats:
+    def __init__(self):
+        self.seq = 0  # 统计窗口起点的帧序号
+        self.start = time.monotonic()
+        self.count = 0  # 窗口内显示的帧数
+        self.fps = 0.0
+
+
+class Mosaic:
+    def __init__(self, title=MOSAIC_TITLE, tile_size=TILE_SIZE, max_size=MAX_CANVAS):
+        self.title = title
+        self.tile_size = tile_size
+        self.max_size = max_size
+        self.names = []  # 格子顺序
+        self.canvas = None
+        self.tiles = {}  # 名称 -> 画布中的格子视图
+        self.gray = {}  # 名称 -> 灰度帧缩放用的暂存区（预处理输出灰度时使用）
+        self.stats = {}  # 名称 -> TileStats
+        self.dirty = False  # 画布有未显示的变化
+        self.window = False  # 窗口是否已创建
+
+    def sync(self, names):
+        """相机集合变化时重新分配画布与格子；未变化时不做任何事"""
+        names = list(names)
+        if names == self.names:
+            return
+        self.names = names
+        if not names:  # 没有相机：窗口保留最后的画面，不再显示
+            self.canvas, self.tiles, self.dirty = None, {}, False
+            return
+        if not self.window:  # 有相机后才创建窗口，只创建一次
+            cv2.namedWindow(self.title, cv2.WINDOW_NORMAL)
+            self.window = True
+        count = len(names)
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+        width, height = self.tile_size
+        scale = min(1.0, self.max_size[0] / (columns * width), self.max_size[1] / (rows * height))
+        width, height = int(width * scale) & ~1, int(height * scale) & ~1
+        self.canvas = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        self.tiles, self.gray = {}, {}
+        for i, name in enumerate(names):
+            row, column = divmod(i, columns)
+            self.tiles[name] = self.canvas[row * height:(row + 1) * height, column * width:(column + 1) * width]
+            self._overlay(name, self.tiles[name], "waiting")
+        self.stats = {name: self.stats.get(name, TileStats()) for name in names}
+        cv2.resizeWindow(self.title, columns * width, rows * height)
+        self.dirty = True
+
+    def draw(self, name, frame, seq=None, dropped=0):
+        """把一帧写入对应格子并更新叠加信息；seq 为帧序号（用于计算帧率），dropped 为未显示即被覆盖的帧数"""
+        tile = self.tiles.get(name)
+        if tile is None or frame is None:
+            return
+        if frame.ndim == 2:  # 灰度帧：缩放到暂存区后转换为 BGR 写入格子
+            if frame.shape != tile.shape[:2]:
+                if name not in self.gray:
+                    self.gray[name] = np.empty(tile.shape[:2], dtype=np.uint8)
+                frame = cv2.resize(frame, (tile.shape[1], tile.shape[0]), dst=self.gray[name], interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=tile)
+        elif frame.shape == tile.shape:
+            np.copyto(tile, frame)
+        else:
+            cv2.resize(frame, (tile.shape[1], tile.shape[0]), dst=tile, interpolation=cv2.INTER_AREA)
+        stats = self.stats[name]
+        stats.count += 1
+        now = time.monotonic()
+        if now - stats.start >= FPS_WINDOW:
+            frames = seq - stats.seq if seq is not None and stats.seq else stats.count
+            stats.fps = frames / (now - stats.start)
+            stats.seq, stats.start, stats.count = seq or 0, now, 0
+        self._overlay(name, tile, f"{stats.fps:.1f} fps  drop {dropped}")
+        self.dirty = True
+
+    def _overlay(self, name, tile, info):  # 在格子左上角绘制设备名称与状态，底色保证在亮画面上可读
+        scale = max(0.4, tile.shape[1] / 1280)
+        line = int(24 * scale / 0.5)
+        cv2.rectangle(tile, (0, 0), (min(tile.shape[1] - 1, int(560 * scale)), 2 * line + 4), (0, 0, 0), -1)
+        cv2.putText(tile, name, (6, line - 4), FONT, scale, (255, 255, 255), 1, cv2.LINE_AA)
+        cv2.putText(tile, info, (6, 2 * line - 4), FONT, scale, (0, 255, 0), 1, cv2.LINE_AA)
+
+    def show(self):  # 整个画布只调用一次 imshow
+        cv2.imshow(self.title, self.canvas)
+        self.dirty = False
+
+
+def display_mosaic(frame_slots, title=MOSAIC_TITLE, refresh_hz=REFRESH_HZ):
+    """显示线程主循环：拼接全部槽位的最新帧，每个刷新周期最多显示一次；按 l 打印延迟统计，按 q 退出"""
+    mosaic = Mosaic(title)
+    interval = 1 / refresh_hz
+    next_show = 0.0
+    while True:
+        try:
+            frame_slots.wait(0.1)  # 任一相机有新帧时唤醒
+            delay = next_show - time.monotonic()
+            if delay > 0:  # 距上次显示不足一个刷新周期：等到下个周期，期间到达的帧一起显示
+                time.sleep(delay)
+            items = frame_slots.items()
+            mosaic.sync(name for name, _ in items)
+            shown_frames = []  # (延迟统计, 采集时间戳)
+            for name, slot in items:
+                latest = slot.take()  # 只取比上次更新的帧
+                if latest is None:
+                    continue
+                taken = time.monotonic()
+                mosaic.draw(name, latest[1], latest[0], slot.dropped)
+                latency = get_latency(name)
+                latency.record("queue", taken - latest[2])  # 放入槽位 → 取走
+                latency.record("compose", time.monotonic() - taken)
+                shown_frames.append((latency, latest[3]))
+            if mosaic.dirty:
+                shown = time.monotonic()
+                mosaic.show()
+                done = time.monotonic()
+                next_show = shown + interval
+                for latency, captured in shown_frames:
+                    latency.record("imshow", done - shown)
+                    latency.record("total", done - captured)  # 传感器时间戳 → 显示
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('l'): # 按下l键打印延迟统计
+                print(latency_report())
+            elif key == ord('q'): # 按下q键退出
+                break
+        except Exception as e:
+            print(f"显示异常: {str(e)}")
+    cv2.destroyAllWindows()
+# ----------------------------------------------------------------------------------------------------------------------
+EOF
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+# ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████
+echo -e "${COLOR_PY} ${PREPROCESS} ${COLOR_RESET}" # 程序名称
+echo -e "${COLOR_PY} 帧预处理模块 ${COLOR_RESET}" # 程序声明
+echo # 输出空行
+cat << 'EOF' > "${PATH_PREPROCESS}" # 程序路径
+# ====================================================== 模块声明 ======================================================
+# 帧预处理：裁剪（ROI）→ 缩放 → 颜色转换（RGB / 灰度），替代采集循环中逐帧分配新数组的 cv2.resize(frame, 尺寸)
+# 各步骤通过 OpenCV 的 dst 参数写入预分配缓冲区：每台相机一个 BufferPool，按 (步骤, 形状, 类型) 轮换复用，稳定运行后不再分配内存
+# 输出位于轮换缓冲区中，POOL_DEPTH 帧后被覆盖；显示槽位与队列只保留最近几帧，需要长期保留的使用方自行拷贝
+# BatchPreprocessor 对多台相机执行同一预处理，结果堆叠为一个 (相机数, 高, 宽[, 通道]) 数组，颜色转换对整个堆叠只调用一次
+# 规格字符串：crop=x:y:宽:高,size=宽x高,color=bgr|rgb|gray，各项可省略，例如 crop=320:0:1280:1080,size=640x480,color=gray
+# ----------------------------------------------------------------------------------------------------------------------
+import cv2
+import numpy as np
+from v4l2_capture import reduced_scale
+
+POOL_DEPTH = 4  # 每个步骤轮换的缓冲区数，与采集源的 output_buffers 一致
+COLOR_CODES = {  # 颜色转换 → (OpenCV 转换码, 输出通道数)；输入均为 BGR
+    "bgr": None,
+    "rgb": (cv2.COLOR_BGR2RGB, 3),
+    "gray": (cv2.COLOR_BGR2GRAY, 1),
+}
+
+
+def color_code(color):  # 颜色转换名称 → (转换码, 通道数)，保持 BGR 时为 None
+    if color is not None and color not in COLOR_CODES:
+        raise ValueError(f"未知的颜色转换 {color}，可选：{'、'.join(COLOR_CODES)}")
+    return COLOR_CODES[color] if color is not None else None
+
+
+def parse_preprocess(spec):
+    """解析预处理规格字符串，返回 {"roi": (x, y, 宽, 高), "size": (宽, 高), "color": 名称}，格式错误时抛出 ValueError"""
+    options = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        key, value = key.strip().lower(), value.strip().lower()
+        try:
+            if key in ("crop", "roi"):
+                x, y, width, height = (int(v) for v in value.split(":"))
+                if width <= 0 or height <= 0 or x < 0 or y < 0:
+                    raise ValueError
+                options["roi"] = (x, y, width, height)
+            elif key == "size":
+                width, height = (int(v) for v in value.split("x"))
+                if width <= 0 or height <= 0:
+                    raise ValueError
+                options["size"] = (width, height)
+            elif key == "color" and value in COLOR_CODES:
+                options["color"] = value
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"无效的预处理规格 {item}（格式：crop=x:y:宽:高,size=宽x高,color=bgr|rgb|gray）") from None
+    return options
+
+
+# 轮换复用的输出缓冲区，每台相机（每个 Preprocessor）一个
+class BufferPool:
+    def __init__(self, depth=POOL_DEPTH):
+        self.depth = depth
+        self.buffers = {}  # (步骤, 形状, 类型) -> [缓冲区列表, 下次使用的序号]
+
+    def get(self, stage, shape, dtype=np.uint8):
+        """取下一个缓冲区；不足 depth 个时分配新缓冲区，之后轮换复用，不再分配"""
+        key = (stage, tuple(shape), np.dtype(dtype).str)
+        entry = self.buffers.get(key)
+        if entry is None:
+            entry = self.buffers[key] = [[], 0]
+        buffers, index = entry
+        if len(buffers) < self.depth:
+            buffers.append(np.empty(shape, dtype))
+        entry[1] = index + 1
+        return buffers[index % len(buffers)]
+
+
+# 单台相机的预处理，在采集线程中调用
+class Preprocessor:
+    def __init__(self, size=None, roi=None, color=None, depth=POOL_DEPTH):
+        self.size = tuple(size) if size else None  # 输出尺寸 (宽, 高)，None 时保持裁剪后的尺寸
+        self.roi = tuple(roi) if roi else None  # 裁剪区域 (x, y, 宽, 高)，按全分辨率坐标
+        self.color = color_code(color)  # (转换码, 通道数)，None 时保持 BGR
+        self.pool = BufferPool(depth)
+
+    @property
+    def identity(self):  # 不做任何处理，输出即采集帧（此时帧输出可直接接收 MJPEG 压缩数据）
+        return self.size is None and self.roi is None and self.color is None
+
+    def decode_scale(self, cap):
+        """MJPEG 缩小解码倍数：裁剪区域缩小后仍不小于输出尺寸"""
+        scale = cap.decode_scale(self.size)  # 采集源不支持缩小解码时为 1
+        if scale > 1 and self.roi is not None:
+            scale = reduced_scale(self.roi[2], self.roi[3], self.size)
+        return scale
+
+    def apply(self, frame, scale=1, dst=None):
+        """预处理一帧 BGR 图像，scale 为解码时的缩小倍数（裁剪坐标随之缩小）；dst 为最后一步的输出位置，省略时使用轮换缓冲区"""
+        image = frame
+        if self.roi is not None:  # 裁剪只取视图，不拷贝
+            x, y, width, height = (v // scale for v in self.roi)
+            image = image[y:y + height, x:x + width]
+        if self.size is not None and image.shape[1::-1] != self.size:
+            last = self.color is None
+            shape = (self.size[1], self.size[0]) + image.shape[2:]
+            out = dst if last and dst is not None else self.pool.get("resize", shape, image.dtype)
+            shrink = image.shape[1] > self.size[0]  # 缩小用 INTER_AREA 避免混叠，放大用双线性
+            image = cv2.resize(image, self.size, dst=out, interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+        if self.color is not None and image.ndim == 3:
+            code, channels = self.color
+            shape = image.shape[:2] + ((channels,) if channels > 1 else ())
+            out = dst if dst is not None else self.pool.get("color", shape, image.dtype)
+            image = cv2.cvtColor(image, code, dst=out)
+        elif dst is not None and image is not dst:  # 只裁剪或尺寸已符合：拷贝到指定位置
+            np.copyto(dst, image)
+            image = dst
+        return image
+
+
+# 多台相机的批量预处理：同一规格，结果堆叠为一个数组
+class BatchPreprocessor:
+    def __init__(self, size, roi=None, color=None, depth=POOL_DEPTH):
+        if not size:
+            raise ValueError("批量预处理需要指定输出尺寸")
+        self.stage = Preprocessor(size, roi, depth=1)  # 逐台相机裁剪、缩放，直接写入堆叠数组的对应行
+        self.size = self.stage.size
+        self.color = color_code(color)
+        self.pool = BufferPool(depth)
+
+    def apply(self, frames, scales=None):
+        """frames 为各相机的 BGR 帧列表（尺寸可以不同），返回 (相机数, 高, 宽[, 通道]) 堆叠数组，位于轮换缓冲区中
+        相机数量变化时按新形状分配，数量不变时复用"""
+        width, height = self.size
+        stack = self.pool.get("stack", (len(frames), height, width, 3))
+        for i, frame in enumerate(frames):
+            self.stage.apply(frame, scales[i] if scales else 1, dst=stack[i])
+        if self.color is None:
+            return stack
+        code, channels = self.color
+        shape = (len(frames), height, width) + ((channels,) if channels > 1 else ())
+        out = self.pool.get("color", shape)
+        # 堆叠数组连续存放，按 (相机数 × 高, 宽) 的一张大图转换，整批只调用一次 cvtColor
+        cv2.cvtColor(stack.reshape(-1, width, 3), code, dst=out.reshape((-1, width) + shape[3:]))
+        return out
+
+    def gather(self, frame_slots):
+        """取各槽位的最新帧（不标记为已取走）批量预处理，返回 (名称列表, 帧序号列表, 堆叠数组)；没有帧时返回 None"""
+        names, seqs, frames = [], [], []
+        for name, slot in frame_slots.items():
+            latest = slot.peek()
+            if latest is None or latest[1] is None or latest[1].ndim != 3:
+                continue
+            names.append(name)
+            seqs.append(latest[0])
+            frames.append(latest[1])
+        if not frames:
+            return None
+        return names, seqs, self.apply(frames)
 # ----------------------------------------------------------------------------------------------------------------------
 EOF
 # ██████████████████████████████████████████████████████████████████████████████████████████████████████████████████████